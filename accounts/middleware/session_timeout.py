@@ -5,6 +5,14 @@ from django.contrib.auth import logout
 from django.utils.deprecation import MiddlewareMixin
 
 class SessionTimeoutMiddleware(MiddlewareMixin):
+    """
+    Logs users out after SESSION_TIMEOUT seconds without a page view.
+
+    `last_activity` is only rewritten once it is SESSION_ACTIVITY_UPDATE_INTERVAL seconds
+    old, so most requests leave the session unmodified and SessionMiddleware skips the
+    save (a row UPDATE with the db backend, a cache + row write with cached_db, a new
+    Set-Cookie with signed_cookies). The timeout is enforced to within that interval.
+    """
     def process_request(self, request):
         # Skip for non-authenticated users
         if not request.user.is_authenticated:
@@ -15,23 +23,22 @@ class SessionTimeoutMiddleware(MiddlewareMixin):
             return None
         
         # Get current time and last activity time
-        current_time = time.time()
+        current_time = int(time.time())
         last_activity = request.session.get('last_activity')
         
         # Set default session timeout (12 hours = 43200 seconds)
         session_timeout = getattr(settings, 'SESSION_TIMEOUT', 43200)
+        update_interval = getattr(settings, 'SESSION_ACTIVITY_UPDATE_INTERVAL', 300)
         
-        # Update last activity time
-        request.session['last_activity'] = current_time
-        
-        # If no last activity or session expired, ignore
-        if not last_activity:
-            return None
-            
         # Check if session has expired
-        if current_time - last_activity > session_timeout:
+        if last_activity and current_time - last_activity > session_timeout:
             # Logout user and display message
             auth.logout(request)
             # Let the logout view handle the redirect
+            return None
             
+        # Only touch the session when the stored activity time is stale
+        if not last_activity or current_time - last_activity >= update_interval:
+            request.session['last_activity'] = current_time
+        
         return None
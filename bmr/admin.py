@@ -1,11 +1,25 @@
 from django.contrib import admin
-from .models import BMR, BMRMaterial, BMRSignature
+from django.contrib.admin.views.main import ChangeList
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.html import format_html
+from .models import BMR, BMRMaterial, BMRSignature, ArchivedBMR
+
+class BMRChangeList(ChangeList):
+    """Attaches completion ETAs to the page of BMRs in one batched prediction"""
+    
+    def get_results(self, request):
+        super().get_results(request)
+        from workflow.eta import predict_completion
+        etas = predict_completion([bmr.id for bmr in self.result_list])
+        for bmr in self.result_list:
+            bmr.completion_eta = etas.get(bmr.id)
 
 @admin.register(BMR)
 class BMRAdmin(admin.ModelAdmin):
     list_display = [
         'bmr_number', 'batch_number', 'product', 'status', 
-        'created_by', 'created_date', 'batch_size'
+        'created_by', 'created_date', 'batch_size', 'eta'
     ]
     list_filter = ['status', 'product__product_type', 'created_date']
     search_fields = ['bmr_number', 'batch_number', 'product__product_name']
@@ -31,6 +45,14 @@ class BMRAdmin(admin.ModelAdmin):
             'fields': ('qa_comments', 'regulatory_comments')
         }),
     )
+    
+    def get_changelist(self, request, **kwargs):
+        return BMRChangeList
+    
+    @admin.display(description='FGS ETA')
+    def eta(self, obj):
+        eta = getattr(obj, 'completion_eta', None)
+        return timezone.localtime(eta['eta']).strftime('%Y-%m-%d %H:%M') if eta else '-'
 
 @admin.register(BMRMaterial)
 class BMRMaterialAdmin(admin.ModelAdmin):
@@ -46,3 +68,21 @@ class BMRSignatureAdmin(admin.ModelAdmin):
     list_display = ['bmr', 'signature_type', 'signed_by', 'signed_date']
     list_filter = ['signature_type', 'signed_date']
     search_fields = ['bmr__batch_number', 'signed_by__username']
+
+
+@admin.register(ArchivedBMR)
+class ArchivedBMRAdmin(admin.ModelAdmin):
+    list_display = ['bmr_number', 'batch_number', 'product_name', 'completed_date', 'archived_at', 'timeline_link']
+    list_filter = ['archived_at']
+    search_fields = ['bmr_number', 'batch_number', 'product_name']
+    readonly_fields = [field.name for field in ArchivedBMR._meta.fields]
+    
+    def has_add_permission(self, request):
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
+    
+    @admin.display(description='Timeline')
+    def timeline_link(self, obj):
+        return format_html('<a href="{}">View</a>', reverse('reports:enhanced_timeline', args=[obj.bmr_id]))
@@ -0,0 +1,12 @@
+from django.urls import include, path
+from rest_framework.routers import DefaultRouter
+
+from .views import BMRViewSet, ProductViewSet
+
+router = DefaultRouter()
+router.register('bmrs', BMRViewSet, basename='bmr')
+router.register('products', ProductViewSet, basename='product')
+
+urlpatterns = [
+    path('', include(router.urls)),
+]
@@ -0,0 +1,248 @@
+"""
+Archive tier for completed BMRs.
+
+`archive_bmrs` moves BMRs completed more than BMR_ARCHIVE_AFTER_MONTHS ago, together with
+everything that cascades from them (phase executions, materials, signatures, dispensing,
+FGS inventory and releases, ...), into the ARCHIVE_DB_ALIAS database, which has the same
+schema. Rows they point at (products, users, phases, machines, material batches) are
+copied there too so archived records stay complete. The hot database keeps an
+ArchivedBMR index row per batch.
+
+Views wrapped with `@archive_read_through` fall back to the archive when the requested
+BMR is no longer in the hot tables: the whole view then reads from the archive database.
+"""
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import timedelta
+from functools import wraps
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections, router, transaction
+from django.db.models import ProtectedError, Q, RestrictedError
+from django.db.models.deletion import Collector
+from django.utils import timezone
+
+from kampala_pharma.events import get_event_logger
+from .models import BMR, ArchivedBMR
+
+events = get_event_logger('bmr')
+
+_archive_reads = ContextVar('archive_reads', default=False)
+
+LOOKUP_CHUNK = 500
+
+
+def archive_alias():
+    return getattr(settings, 'ARCHIVE_DB_ALIAS', 'archive')
+
+
+@contextmanager
+def read_archive():
+    """Send every read in this block to the archive database"""
+    token = _archive_reads.set(True)
+    try:
+        yield
+    finally:
+        _archive_reads.reset(token)
+
+
+class ArchiveRouter:
+    """Routes reads to the archive inside read_archive(); must come before other routers"""
+
+    def db_for_read(self, model, **hints):
+        if _archive_reads.get():
+            return archive_alias()
+        return None
+
+
+def is_archived(bmr_id):
+    return (
+        not BMR.objects.filter(pk=bmr_id).exists()
+        and ArchivedBMR.objects.filter(bmr_id=bmr_id).exists()
+    )
+
+
+def archive_read_through(view):
+    """Serve a `bmr_id` view from the archive when that BMR has been archived"""
+    @wraps(view)
+    def wrapped(request, bmr_id, *args, **kwargs):
+        if is_archived(bmr_id):
+            with read_archive():
+                return view(request, bmr_id, *args, **kwargs)
+        return view(request, bmr_id, *args, **kwargs)
+    return wrapped
+
+
+def archivable_bmrs(months=None, now=None):
+    """Completed BMRs past the retention window with no sellable FGS stock or defect reports"""
+    months = months if months is not None else getattr(settings, 'BMR_ARCHIVE_AFTER_MONTHS', 24)
+    now = now or timezone.now()
+    cutoff = now - timedelta(days=round(months * 30.44))
+    sellable_stock = (
+        Q(fgs_inventory__quantity_available__gt=0, fgs_inventory__status__in=['stored', 'available', 'reserved'])
+        & (Q(expiry_date__isnull=True) | Q(expiry_date__gte=timezone.localdate(now)))
+    )
+    return (
+        BMR.objects.filter(status='completed', actual_completion_date__lt=cutoff)
+        .exclude(sellable_stock)
+        .exclude(defect_reports__isnull=False)
+        .order_by('actual_completion_date', 'pk')
+    )
+
+
+def _chunks(values, size=LOOKUP_CHUNK):
+    values = list(values)
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
+def _insert(connection, model, instances):
+    """INSERT instances as-is (keeping ids and auto_now values), bypassing save()"""
+    fields = model._meta.concrete_fields
+    table = connection.ops.quote_name(model._meta.db_table)
+    columns = ', '.join(connection.ops.quote_name(field.column) for field in fields)
+    placeholders = ', '.join(['%s'] * len(fields))
+    rows = [
+        [field.get_db_prep_save(getattr(obj, field.attname), connection=connection) for field in fields]
+        for obj in instances
+    ]
+    with connection.cursor() as cursor:
+        for batch in _chunks(rows):
+            cursor.executemany(f'INSERT INTO {table} ({columns}) VALUES ({placeholders})', batch)
+
+
+class BMRArchiver:
+    """Moves BMR object graphs from the default database into the archive"""
+
+    def __init__(self, using=DEFAULT_DB_ALIAS, archive=None):
+        self.using = using
+        self.archive_db = archive or archive_alias()
+        self.known = defaultdict(set)  # model -> pks known to exist in the archive
+
+    def archive(self, bmrs):
+        """Archive a list of BMRs in one pass; returns the ArchivedBMR rows created"""
+        collector = Collector(using=self.using)
+        collector.collect(bmrs)
+
+        graph = defaultdict(dict)
+        for model, instances in collector.data.items():
+            for obj in instances:
+                graph[model][obj.pk] = obj
+        for queryset in collector.fast_deletes:
+            for obj in queryset:
+                graph[queryset.model][obj.pk] = obj
+
+        with transaction.atomic(using=self.archive_db):
+            self._copy_references(graph)
+            for model, objs in graph.items():
+                self._copy_missing(model, objs)
+
+        counts_by_bmr = self._counts(bmrs, graph)
+        entries = [
+            ArchivedBMR(
+                bmr_id=bmr.pk,
+                bmr_number=bmr.bmr_number,
+                batch_number=bmr.batch_number,
+                product_name=bmr.product.product_name,
+                status=bmr.status,
+                created_date=bmr.created_date,
+                completed_date=bmr.actual_completion_date,
+                row_counts=counts_by_bmr[bmr.pk],
+            )
+            for bmr in bmrs
+        ]
+        with transaction.atomic(using=self.using):
+            ArchivedBMR.objects.using(self.using).bulk_create(entries, ignore_conflicts=True)
+            collector.delete()
+        return entries
+
+    def _copy_missing(self, model, objs):
+        """Insert the given {pk: instance} rows that the archive doesn't have yet"""
+        missing = set(objs) - self.known[model]
+        if not missing:
+            return
+        for pks in _chunks(missing):
+            existing = model._base_manager.using(self.archive_db).filter(pk__in=pks).values_list('pk', flat=True)
+            missing.difference_update(existing)
+        _insert(connections[self.archive_db], model, [objs[pk] for pk in sorted(missing)])
+        self.known[model].update(objs)
+
+    def _copy_references(self, graph):
+        """Copy rows the graph points at (and what they point at) that aren't being archived"""
+        pending = self._references(graph, graph)
+        seen = defaultdict(set)
+        while pending:
+            loaded = defaultdict(dict)
+            for model, pks in pending.items():
+                pks = pks - seen[model] - self.known[model]
+                seen[model].update(pks)
+                for chunk in _chunks(pks):
+                    for obj in model._base_manager.using(self.using).filter(pk__in=chunk):
+                        loaded[model][obj.pk] = obj
+            for model, objs in loaded.items():
+                self._copy_missing(model, objs)
+            pending = self._references(loaded, graph)
+
+    def _references(self, objects, graph):
+        refs = defaultdict(set)
+        for model, objs in objects.items():
+            for field in model._meta.concrete_fields:
+                target = field.related_model
+                if not field.is_relation or target is None:
+                    continue
+                target = target._meta.concrete_model
+                if not router.allow_migrate_model(self.archive_db, target):
+                    continue
+                for obj in objs.values():
+                    value = getattr(obj, field.attname)
+                    if value is not None and value not in graph.get(target, ()):
+                        refs[target].add(value)
+        return {model: pks for model, pks in refs.items() if pks}
+
+    def _counts(self, bmrs, graph):
+        """Rows per model for each BMR, attributed through the instances' bmr foreign keys"""
+        counts = {bmr.pk: defaultdict(int) for bmr in bmrs}
+        for model, objs in graph.items():
+            label = model._meta.label
+            bmr_field = next((
+                field for field in model._meta.concrete_fields
+                if field.is_relation and field.related_model is BMR
+            ), None)
+            for obj in objs.values():
+                bmr_id = obj.pk if model is BMR else getattr(obj, bmr_field.attname) if bmr_field else None
+                if bmr_id in counts:
+                    counts[bmr_id][label] += 1
+        return {bmr_id: dict(rows) for bmr_id, rows in counts.items()}
+
+
+def archive_bmrs(months=None, batch_size=100, limit=None, progress=None):
+    """
+    Archive every eligible BMR in batches; returns (archived, skipped).
+
+    A batch that can't be deleted (something PROTECTs it) is retried one BMR at a time
+    and the BMRs that still fail are skipped.
+    """
+    ids = list(archivable_bmrs(months).values_list('pk', flat=True)[:limit])
+    archiver = BMRArchiver()
+    archived = skipped = 0
+    for chunk in _chunks(ids, batch_size):
+        bmrs = list(BMR.objects.filter(pk__in=chunk).select_related('product'))
+        try:
+            archived += len(archiver.archive(bmrs))
+        except (ProtectedError, RestrictedError):
+            for bmr in bmrs:
+                try:
+                    archived += len(archiver.archive([bmr]))
+                except (ProtectedError, RestrictedError) as e:
+                    skipped += 1
+                    events.warning('bmr_archive_skipped', bmr=bmr.bmr_number, error=e)
+        if progress:
+            progress(archived, skipped, len(ids))
+
+    if archived:
+        # Archived releases drop out of the hot FGS release history
+        from fgs_management.analytics import invalidate_release_trends
+        invalidate_release_trends()
+    events.info('bmrs_archived', archived=archived, skipped=skipped)
+    return archived, skipped
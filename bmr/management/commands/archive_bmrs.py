@@ -0,0 +1,38 @@
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+
+from bmr.archive import archivable_bmrs, archive_alias, archive_bmrs
+
+
+class Command(BaseCommand):
+    help = 'Move completed BMRs and their history into the archive database, leaving an index behind'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--months', type=int, default=settings.BMR_ARCHIVE_AFTER_MONTHS,
+                            help='Archive BMRs completed more than this many months ago')
+        parser.add_argument('--batch-size', type=int, default=100, help='BMRs archived per transaction')
+        parser.add_argument('--limit', type=int, help='Archive at most this many BMRs')
+        parser.add_argument('--dry-run', action='store_true', help='Only count the BMRs that would be archived')
+
+    def handle(self, *args, **options):
+        eligible = archivable_bmrs(options['months']).count()
+        self.stdout.write(f"{eligible} BMR(s) completed more than {options['months']} months ago can be archived")
+        if options['dry_run'] or not eligible:
+            return
+
+        # Keep the archive schema in step with the hot database
+        call_command('migrate', database=archive_alias(), interactive=False, verbosity=0)
+
+        def progress(archived, skipped, total):
+            self.stdout.write(f'  {archived + skipped}/{total} processed')
+
+        archived, skipped = archive_bmrs(
+            months=options['months'],
+            batch_size=options['batch_size'],
+            limit=options['limit'],
+            progress=progress,
+        )
+        if skipped:
+            self.stdout.write(self.style.WARNING(f'Skipped {skipped} BMR(s) that other records still depend on'))
+        self.stdout.write(self.style.SUCCESS(f'Archived {archived} BMR(s)'))
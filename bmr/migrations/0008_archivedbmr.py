@@ -0,0 +1,33 @@
+# Generated by Django 4.2.7 on 2026-10-19 08:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bmr', '0007_bmrmaterial_material'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedBMR',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('bmr_id', models.BigIntegerField(unique=True)),
+                ('bmr_number', models.CharField(db_index=True, max_length=20)),
+                ('batch_number', models.CharField(db_index=True, max_length=10)),
+                ('product_name', models.CharField(max_length=200)),
+                ('status', models.CharField(max_length=20)),
+                ('created_date', models.DateTimeField()),
+                ('completed_date', models.DateTimeField(blank=True, null=True)),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+                ('row_counts', models.JSONField(default=dict)),
+            ],
+            options={
+                'verbose_name': 'Archived BMR',
+                'verbose_name_plural': 'Archived BMRs',
+                'ordering': ['-completed_date'],
+            },
+        ),
+    ]
@@ -2,9 +2,12 @@ from django.db import models
 from django.conf import settings
 from django.core.exceptions import ValidationError
 from products.models import Product
+from kampala_pharma.events import get_event_logger
 from datetime import datetime
 import re
 
+events = get_event_logger('bmr')
+
 def validate_batch_number(value):
     """Validate batch number format XXX-YYYY"""
     pattern = r'^\d{3}\d{4}$'  # 3 digits + 4 digits (e.g., 0012025)
@@ -167,7 +170,6 @@ class BMR(models.Model):
             from workflow.services import WorkflowService
             try:
                 WorkflowService.initialize_workflow_for_bmr(self)
-                print(f"Workflow initialized for BMR {self.bmr_number}")
                 
                 # If status is approved, activate the raw material release phase
                 if self.status == 'approved':
@@ -180,10 +182,10 @@ class BMR(models.Model):
                     if raw_material_phase and raw_material_phase.status == 'not_ready':
                         raw_material_phase.status = 'pending'
                         raw_material_phase.save()
-                        print(f"Activated raw material release phase for BMR {self.bmr_number}")
+                        events.info('bmr_approved', bmr=self.bmr_number, activated='raw_material_release')
                         
             except Exception as e:
-                print(f"Error initializing workflow for BMR {self.bmr_number}: {e}")
+                events.error('workflow_init_failed', bmr=self.bmr_number, error=e)
 
     def generate_unique_bmr_number(self):
         """Generate a truly unique BMR number for the year, even if BMRs are deleted or created concurrently."""
@@ -220,10 +222,9 @@ class BMR(models.Model):
         product_materials = ProductMaterial.objects.filter(product=self.product)
         if not product_materials.exists():
             return
-            
-        print(f"Creating {product_materials.count()} BMR materials for BMR {self.bmr_number}")
         
         # Create BMR materials
+        created = 0
         for pm in product_materials:
             try:
                 material = pm.raw_material
@@ -232,16 +233,18 @@ class BMR(models.Model):
                 if BMRMaterial.objects.filter(bmr=self, material_code=material.material_code).exists():
                     continue
                     
-                bmr_material = BMRMaterial.objects.create(
+                BMRMaterial.objects.create(
                     bmr=self,
                     material_code=material.material_code,
                     material_name=material.material_name,
                     required_quantity=pm.required_quantity,
                     unit_of_measure=pm.unit_of_measure
                 )
-                print(f"Created BMR material {bmr_material.id} for {material.material_name}")
+                created += 1
             except Exception as e:
-                print(f"Error creating BMR material: {str(e)}")
+                events.error('bmr_material_create_failed', bmr=self.bmr_number, material=pm.raw_material_id, error=e)
+        
+        events.info('bmr_materials_created', bmr=self.bmr_number, count=created)
 
 class BMRMaterial(models.Model):
     """Materials required for BMR production"""
@@ -286,7 +289,7 @@ class BMRMaterial(models.Model):
             
             return suitable_batch
         except Exception as e:
-            print(f"Error finding suitable batch for {self.material_name}: {str(e)}")
+            events.error('suitable_batch_lookup_failed', bmr=self.bmr_id, material=self.material_code, error=e)
             return None
     
     def __str__(self):
@@ -412,3 +415,26 @@ class BMRSignature(models.Model):
     
     def __str__(self):
         return f"{self.bmr.bmr_number} - {self.get_signature_type_display()} by {self.signed_by.username}"
+
+
+class ArchivedBMR(models.Model):
+    """Index entry for a BMR moved to the archive database (see bmr/archive.py)"""
+    
+    bmr_id = models.BigIntegerField(unique=True)
+    bmr_number = models.CharField(max_length=20, db_index=True)
+    batch_number = models.CharField(max_length=10, db_index=True)
+    product_name = models.CharField(max_length=200)
+    status = models.CharField(max_length=20)
+    created_date = models.DateTimeField()
+    completed_date = models.DateTimeField(null=True, blank=True)
+    archived_at = models.DateTimeField(auto_now_add=True)
+    # Rows moved per model label, e.g. {"workflow.BatchPhaseExecution": 14}
+    row_counts = models.JSONField(default=dict)
+    
+    class Meta:
+        ordering = ['-completed_date']
+        verbose_name = 'Archived BMR'
+        verbose_name_plural = 'Archived BMRs'
+    
+    def __str__(self):
+        return f"{self.bmr_number} - {self.batch_number} (archived)"
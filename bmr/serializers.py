@@ -2,16 +2,33 @@ from rest_framework import serializers
 from .models import BMR, BMRMaterial, BMRSignature
 from products.models import Product
 
+class SparseFieldsMixin:
+    """Keeps only the fields named in the request's ?fields= (comma separated), if given"""
+    
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        request = self.context.get('request')
+        requested = requested_fields(request) if request else None
+        if requested:
+            for name in set(self.fields) - requested:
+                self.fields.pop(name)
+
+def requested_fields(request):
+    """The set of field names in ?fields=, or None when all fields are wanted"""
+    value = request.query_params.get('fields') if hasattr(request, 'query_params') else None
+    if not value:
+        return None
+    return {name.strip() for name in value.split(',') if name.strip()}
+
 class ProductSerializer(serializers.ModelSerializer):
     """Serializer for product details when creating BMR"""
     
     class Meta:
         model = Product
         fields = [
-            'id', 'product_code', 'product_name', 'product_type', 
-            'dosage_form', 'strength', 'pack_size', 'is_coated',
-            'tablet_subtype', 'manufacturing_method', 'storage_conditions',
-            'shelf_life_months'
+            'id', 'product_name', 'product_type', 'coating_type', 'is_coated',
+            'tablet_type', 'capsule_type', 'standard_batch_size', 'batch_size_unit',
+            'packaging_size_in_units', 'is_active'
         ]
         read_only_fields = ['id']
 
@@ -47,7 +64,7 @@ class BMRCreateSerializer(serializers.ModelSerializer):
     class Meta:
         model = BMR
         fields = [
-            'product', 'batch_number', 'batch_size', 'batch_size_unit', 
+            'product', 'batch_number', 'actual_batch_size', 'actual_batch_size_unit',
             'planned_start_date', 'planned_completion_date', 'manufacturing_instructions',
             'special_instructions', 'in_process_controls', 
             'quality_checks_required', 'materials'
@@ -76,41 +93,58 @@ class BMRCreateSerializer(serializers.ModelSerializer):
         
         return bmr
 
-class BMRDetailSerializer(serializers.ModelSerializer):
-    """Detailed serializer for BMR with all related data"""
+class WorkflowSummaryMixin(serializers.Serializer):
+    """
+    `workflow` comes from context['workflow'] ({bmr_id: summary}), which the view fills
+    for the whole page with one query (WorkflowService.get_workflow_summaries)
+    """
+    workflow = serializers.SerializerMethodField()
+    
+    def get_workflow(self, obj):
+        return self.context.get('workflow', {}).get(obj.id)
+
+class BMRDetailSerializer(SparseFieldsMixin, WorkflowSummaryMixin, serializers.ModelSerializer):
+    """
+    Detailed serializer for BMR with all related data. The view select_relates the
+    product and users and prefetches materials and signatures (with their signers).
+    """
     product = ProductSerializer(read_only=True)
     materials = BMRMaterialSerializer(many=True, read_only=True)
     signatures = BMRSignatureSerializer(many=True, read_only=True)
+    batch_size = serializers.DecimalField(max_digits=10, decimal_places=2, read_only=True)
+    batch_size_unit = serializers.CharField(read_only=True)
     created_by_name = serializers.CharField(source='created_by.get_full_name', read_only=True)
-    approved_by_name = serializers.CharField(source='approved_by.get_full_name', read_only=True)
+    approved_by_name = serializers.CharField(source='approved_by.get_full_name', read_only=True, default=None)
     
     class Meta:
         model = BMR
         fields = [
-            'id', 'bmr_number', 'batch_number', 'product', 'batch_size',
-            'batch_size_unit', 'created_date', 'planned_start_date',
-            'planned_completion_date', 'actual_start_date', 'actual_completion_date',
-            'status', 'created_by', 'created_by_name', 'approved_by', 
-            'approved_by_name', 'approved_date', 'manufacturing_instructions',
+            'id', 'bmr_number', 'batch_number', 'product', 'actual_batch_size',
+            'actual_batch_size_unit', 'batch_size', 'batch_size_unit', 'created_date',
+            'planned_start_date', 'planned_completion_date', 'actual_start_date',
+            'actual_completion_date', 'status', 'material_status', 'created_by', 'created_by_name',
+            'approved_by', 'approved_by_name', 'approved_date', 'manufacturing_instructions',
             'special_instructions', 'in_process_controls', 'quality_checks_required',
-            'qa_comments', 'regulatory_comments', 'materials', 'signatures'
+            'qa_comments', 'regulatory_comments', 'materials', 'signatures', 'workflow'
         ]
         read_only_fields = [
             'id', 'bmr_number', 'batch_number', 'created_date', 'created_by',
-            'approved_by', 'approved_date'
+            'approved_by', 'approved_date', 'status', 'material_status'
         ]
 
-class BMRListSerializer(serializers.ModelSerializer):
-    """Simple serializer for BMR list view"""
+class BMRListSerializer(SparseFieldsMixin, WorkflowSummaryMixin, serializers.ModelSerializer):
+    """Simple serializer for BMR list view; every source is covered by select_related"""
     product_name = serializers.CharField(source='product.product_name', read_only=True)
-    product_code = serializers.CharField(source='product.product_code', read_only=True)
+    product_type = serializers.CharField(source='product.product_type', read_only=True)
+    batch_size = serializers.DecimalField(max_digits=10, decimal_places=2, read_only=True)
+    batch_size_unit = serializers.CharField(read_only=True)
     created_by_name = serializers.CharField(source='created_by.get_full_name', read_only=True)
     
     class Meta:
         model = BMR
         fields = [
-            'id', 'bmr_number', 'batch_number', 'product_name', 'product_code',
-            'batch_size', 'status', 'created_date', 'planned_start_date',
-            'created_by_name'
+            'id', 'bmr_number', 'batch_number', 'product', 'product_name', 'product_type',
+            'batch_size', 'batch_size_unit', 'status', 'created_date', 'planned_start_date',
+            'planned_completion_date', 'created_by_name', 'workflow'
         ]
         read_only_fields = fields
@@ -0,0 +1,46 @@
+import pytest
+
+from bmr.archive import archivable_bmrs, archive_bmrs, is_archived, read_archive
+from bmr.models import BMR, ArchivedBMR
+from fgs_management.models import FGSInventory, ProductRelease
+from workflow.models import BatchPhaseExecution
+
+pytestmark = pytest.mark.django_db(databases=['default', 'archive'])
+
+
+@pytest.fixture
+def sold_out(plant):
+    """A completed BMR whose finished goods are all sold, so it can be archived"""
+    bmr = BMR.objects.filter(status='completed').order_by('pk').first()
+    FGSInventory.objects.filter(bmr=bmr).update(quantity_available=0, status='released')
+    return bmr
+
+
+def test_only_sold_out_batches_are_archivable(sold_out):
+    assert list(archivable_bmrs(months=0)) == [sold_out]
+    assert not archivable_bmrs(months=24).exists()
+
+
+def test_archive_moves_the_batch_and_its_history(sold_out):
+    phases = BatchPhaseExecution.objects.filter(bmr=sold_out).count()
+    releases = ProductRelease.objects.filter(inventory__bmr=sold_out).count()
+
+    assert archive_bmrs(months=0) == (1, 0)
+
+    assert not BMR.objects.filter(pk=sold_out.pk).exists()
+    assert not BatchPhaseExecution.objects.filter(bmr_id=sold_out.pk).exists()
+    assert is_archived(sold_out.pk)
+    entry = ArchivedBMR.objects.get(bmr_id=sold_out.pk)
+    assert entry.batch_number == sold_out.batch_number
+    assert entry.row_counts['workflow.BatchPhaseExecution'] == phases
+
+    with read_archive():
+        archived = BMR.objects.select_related('product').get(pk=sold_out.pk)
+        assert archived.product.product_name == sold_out.product.product_name
+        assert BatchPhaseExecution.objects.filter(bmr_id=sold_out.pk).count() == phases
+        assert ProductRelease.objects.filter(inventory__bmr_id=sold_out.pk).count() == releases
+
+
+def test_archiving_twice_is_a_no_op(sold_out):
+    archive_bmrs(months=0)
+    assert archive_bmrs(months=0) == (0, 0)
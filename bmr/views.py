@@ -1,5 +1,6 @@
-from rest_framework import viewsets, status, permissions
+from rest_framework import viewsets, status, permissions, filters
 from rest_framework.decorators import action
+from rest_framework.pagination import CursorPagination
 from rest_framework.response import Response
 from django_filters.rest_framework import DjangoFilterBackend
 from django.shortcuts import get_object_or_404, render, redirect
@@ -7,13 +8,16 @@ from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.utils import timezone
 from django.http import JsonResponse
-from .models import BMR, BMRMaterial
+from .archive import archive_read_through
+from django.db.models import Prefetch
+from .models import BMR, BMRMaterial, BMRSignature
 from .serializers import (
     BMRCreateSerializer, BMRDetailSerializer, BMRListSerializer,
-    BMRMaterialSerializer, ProductSerializer
+    BMRMaterialSerializer, ProductSerializer, requested_fields
 )
 from .forms import BMRCreateForm
 from products.models import Product
+from workflow import registry
 from workflow.services import WorkflowService
 # Import the materials_detail_view from views_materials.py
 from .views_materials import materials_detail_view
@@ -90,6 +94,7 @@ def bmr_list_view(request):
     })
 
 @login_required
+@archive_read_through
 def bmr_detail_view(request, bmr_id):
     """Detail view for a specific BMR with workflow information"""
     bmr = get_object_or_404(BMR.objects.select_related('product', 'created_by', 'approved_by'), id=bmr_id)
@@ -103,7 +108,7 @@ def bmr_detail_view(request, bmr_id):
     materials = BMRMaterial.objects.filter(bmr=bmr)
     
     # Get workflow status
-    workflow_status = WorkflowService.get_workflow_status(bmr)
+    workflow_status = WorkflowService.get_workflow_status(bmr, include_eta=True)
     
     # Get phases for current user
     user_phases = WorkflowService.get_phases_for_user_role(bmr, request.user.role)
@@ -116,15 +121,37 @@ def bmr_detail_view(request, bmr_id):
         'title': f'BMR Details - {bmr.bmr_number}'
     })
 
+class BMRCursorPagination(CursorPagination):
+    """Newest first; stable under inserts, unlike page numbers"""
+    ordering = ('-created_date', '-id')
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 200
+
+class BMRWriteRolePermission(permissions.IsAuthenticated):
+    """Anyone signed in can read BMRs; only QA and regulatory can create or edit them"""
+    write_roles = ('qa', 'regulatory')
+    
+    def has_permission(self, request, view):
+        if not super().has_permission(request, view):
+            return False
+        return request.method in permissions.SAFE_METHODS or request.user.role in self.write_roles
+
 class BMRViewSet(viewsets.ModelViewSet):
-    """ViewSet for BMR operations"""
+    """
+    BMR REST API (/api/v1/bmrs/).
+    
+    ?fields=a,b,... limits the fields returned; materials and signatures are only
+    prefetched, and the embedded workflow summary only queried, when they are returned.
+    BMRs can't be deleted here; status changes go through the role-checked actions.
+    """
     queryset = BMR.objects.all()
-    permission_classes = [permissions.IsAuthenticated]
-    filter_backends = [DjangoFilterBackend]
+    permission_classes = [BMRWriteRolePermission]
+    http_method_names = ['get', 'post', 'put', 'patch', 'head', 'options']
+    filter_backends = [DjangoFilterBackend, filters.SearchFilter]
     filterset_fields = ['status', 'product', 'created_by']
     search_fields = ['bmr_number', 'batch_number', 'product__product_name']
-    ordering_fields = ['created_date', 'planned_start_date', 'status']
-    ordering = ['-created_date']
+    pagination_class = BMRCursorPagination
     
     def get_serializer_class(self):
         if self.action == 'create':
@@ -133,10 +160,21 @@ class BMRViewSet(viewsets.ModelViewSet):
             return BMRDetailSerializer
         return BMRListSerializer
     
+    def wants(self, field):
+        requested = requested_fields(self.request)
+        return field in self.get_serializer_class()().fields if requested is None else field in requested
+    
     def get_queryset(self):
         """Filter BMRs based on user role"""
         user = self.request.user
         queryset = BMR.objects.select_related('product', 'created_by', 'approved_by')
+        if self.get_serializer_class() is BMRDetailSerializer:
+            if self.wants('materials'):
+                queryset = queryset.prefetch_related(Prefetch('materials', queryset=BMRMaterial.objects.order_by('id')))
+            if self.wants('signatures'):
+                queryset = queryset.prefetch_related(
+                    Prefetch('signatures', queryset=BMRSignature.objects.select_related('signed_by').order_by('signed_date'))
+                )
         
         # Role-based filtering
         if user.role == 'qa':
@@ -149,8 +187,18 @@ class BMRViewSet(viewsets.ModelViewSet):
             # Other users see BMRs relevant to their operations
             return queryset.filter(status__in=['approved', 'in_production', 'completed'])
     
+    def get_serializer(self, *args, **kwargs):
+        instance = args[0] if args else kwargs.get('instance')
+        if instance is not None and self.action != 'create' and self.wants('workflow'):
+            # One query for the whole page instead of one per BMR
+            bmrs = instance if isinstance(instance, (list, tuple)) else [instance]
+            context = self.get_serializer_context()
+            context['workflow'] = WorkflowService.get_workflow_summaries([bmr.id for bmr in bmrs])
+            kwargs['context'] = context
+        return super().get_serializer(*args, **kwargs)
+    
     @action(detail=True, methods=['post'], permission_classes=[permissions.IsAuthenticated])
-    def submit_for_approval(self, request, pk=None):
+    def submit_for_approval(self, request, pk=None, **kwargs):
         """Submit BMR for regulatory approval"""
         bmr = self.get_object()
         
@@ -172,7 +220,7 @@ class BMRViewSet(viewsets.ModelViewSet):
         return Response({'message': 'BMR submitted for approval'})
     
     @action(detail=True, methods=['post'], permission_classes=[permissions.IsAuthenticated])
-    def approve(self, request, pk=None):
+    def approve(self, request, pk=None, **kwargs):
         """Approve BMR (Regulatory role)"""
         bmr = self.get_object()
         
@@ -201,7 +249,7 @@ class BMRViewSet(viewsets.ModelViewSet):
         return Response({'message': 'BMR approved successfully'})
     
     @action(detail=True, methods=['post'], permission_classes=[permissions.IsAuthenticated])
-    def reject(self, request, pk=None):
+    def reject(self, request, pk=None, **kwargs):
         """Reject BMR (Regulatory role)"""
         bmr = self.get_object()
         
@@ -225,13 +273,12 @@ class BMRViewSet(viewsets.ModelViewSet):
 
 class ProductViewSet(viewsets.ReadOnlyModelViewSet):
     """ViewSet for product information (for BMR creation)"""
-    queryset = Product.objects.filter(is_active=True)
+    queryset = Product.objects.filter(is_active=True).order_by('product_name', 'id')
     serializer_class = ProductSerializer
     permission_classes = [permissions.IsAuthenticated]
-    filter_backends = [DjangoFilterBackend]
-    filterset_fields = ['product_type', 'dosage_form']
-    search_fields = ['product_code', 'product_name']
-    ordering = ['product_code']
+    filter_backends = [DjangoFilterBackend, filters.SearchFilter]
+    filterset_fields = ['product_type']
+    search_fields = ['product_name']
 
 @login_required
 def start_phase_view(request, bmr_id, phase_name):
@@ -351,7 +398,7 @@ def reject_phase_view(request, bmr_id, phase_name):
         return redirect('bmr:detail', bmr_id)
     
     # Handle QC failure with rollback for different QC phases
-    if request.user.role == 'qc' and phase_name in ['post_compression_qc', 'post_mixing_qc', 'post_blending_qc']:
+    if request.user.role == 'qc' and phase_name in registry.QC_PHASES:
         try:
             # Mark the QC phase as failed with comments
             from workflow.models import BatchPhaseExecution
@@ -365,12 +412,7 @@ def reject_phase_view(request, bmr_id, phase_name):
             execution.completed_date = timezone.now()
             
             # Determine rollback phase based on QC type
-            rollback_mapping = {
-                'post_compression_qc': 'granulation',  # Changed from blending to granulation
-                'post_mixing_qc': 'mixing',
-                'post_blending_qc': 'blending'
-            }
-            rollback_phase = rollback_mapping[phase_name]
+            rollback_phase = registry.qc_rollback_phase(phase_name)
             
             execution.operator_comments = f"QC FAILED - ROLLBACK TO {rollback_phase.upper()}: {comments}"
             execution.save()
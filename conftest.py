@@ -0,0 +1,11 @@
+import pytest
+
+from workflow.synthetic import SyntheticPlant
+
+
+@pytest.fixture
+def plant(db):
+    """A small synthetic plant: one user per role, machines, materials, products and BMRs"""
+    plant = SyntheticPlant(products=4, bmrs=8, materials=8, seed=7)
+    plant.build()
+    return plant
@@ -0,0 +1,107 @@
+from django.contrib import admin
+from django.db.models import Avg, Count, Max
+from django.shortcuts import render
+from django.urls import path
+from kampala_pharma.events import SUBSYSTEMS, clear_recent_events, get_recent_events
+from .models import RequestProfile
+
+EVENT_LEVELS = ['DEBUG', 'INFO', 'WARNING', 'ERROR']
+
+
+@admin.register(RequestProfile)
+class RequestProfileAdmin(admin.ModelAdmin):
+    list_display = ['created_at', 'method', 'path', 'view_name', 'status_code', 'query_count', 'duplicate_query_count', 'sql_time_ms', 'wall_time_ms', 'user']
+    list_filter = ['method', 'status_code', 'view_name', 'created_at']
+    search_fields = ['path', 'view_name']
+    ordering = ['-wall_time_ms']
+    list_select_related = ['user']
+    change_list_template = 'admin/dashboards/requestprofile/change_list.html'
+
+    fieldsets = (
+        (None, {
+            'fields': ('path', 'view_name', 'method', 'status_code', 'user', 'created_at')
+        }),
+        ('Performance', {
+            'fields': ('wall_time_ms', 'sql_time_ms', 'query_count', 'duplicate_query_count')
+        }),
+        ('Repeated Queries', {
+            'fields': ('duplicate_queries',)
+        }),
+    )
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def get_urls(self):
+        urls = super().get_urls()
+        custom_urls = [
+            path(
+                'worst-endpoints/',
+                self.admin_site.admin_view(self.worst_endpoints_view),
+                name='dashboards_requestprofile_worst_endpoints',
+            ),
+            path(
+                'event-log/',
+                self.admin_site.admin_view(self.event_log_view),
+                name='dashboards_requestprofile_event_log',
+            ),
+        ]
+        return custom_urls + urls
+
+    def worst_endpoints_view(self, request):
+        """Endpoints ranked by average wall time with their most repeated query shapes"""
+        endpoints = list(
+            RequestProfile.objects.exclude(view_name='')
+            .values('view_name')
+            .annotate(
+                requests=Count('id'),
+                avg_wall_time_ms=Avg('wall_time_ms'),
+                max_wall_time_ms=Max('wall_time_ms'),
+                avg_sql_time_ms=Avg('sql_time_ms'),
+                avg_queries=Avg('query_count'),
+                max_queries=Max('query_count'),
+                avg_duplicates=Avg('duplicate_query_count'),
+            )
+            .order_by('-avg_wall_time_ms')[:25]
+        )
+
+        # Attach the repeated query shapes from each endpoint's slowest request
+        for endpoint in endpoints:
+            duplicates = (RequestProfile.objects
+                          .filter(view_name=endpoint['view_name'])
+                          .order_by('-wall_time_ms')
+                          .values_list('duplicate_queries', flat=True)
+                          .first())
+            endpoint['duplicate_queries'] = (duplicates or [])[:5]
+
+        context = {
+            **self.admin_site.each_context(request),
+            'title': 'Worst endpoints',
+            'opts': self.model._meta,
+            'endpoints': endpoints,
+        }
+        return render(request, 'admin/dashboards/requestprofile/worst_endpoints.html', context)
+
+    def event_log_view(self, request):
+        """Recent workflow and dispensing events held in this process's ring buffer"""
+        if request.method == 'POST' and 'clear' in request.POST:
+            clear_recent_events()
+
+        subsystem = request.GET.get('subsystem') or None
+        # Anything but a known level name (any case) shows every level
+        level = (request.GET.get('level') or '').upper()
+        level = level if level in EVENT_LEVELS else None
+        context = {
+            **self.admin_site.each_context(request),
+            'title': 'Event log',
+            'opts': self.model._meta,
+            'events': get_recent_events(limit=500, subsystem=subsystem, min_level=level),
+            'subsystems': SUBSYSTEMS,
+            'levels': EVENT_LEVELS,
+            'selected_subsystem': subsystem,
+            'selected_level': level,
+        }
+        return render(request, 'admin/dashboards/requestprofile/event_log.html', context)
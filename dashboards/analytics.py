@@ -3,13 +3,17 @@ Analytics module for the Pharmaceutical Operations System.
 This module provides data processing functions for admin dashboard analytics.
 """
 import datetime
-from django.db.models import Avg, Count, F, Sum, Q, ExpressionWrapper, DurationField, DateTimeField
+from django.core.cache import cache
+from django.db.models import Avg, Count, F, Sum, Q, ExpressionWrapper, DurationField, DateTimeField, Window
 from django.utils import timezone
-from django.db.models.functions import TruncMonth, TruncWeek, ExtractMonth
+from django.db.models.functions import Lag, TruncMonth, TruncWeek, ExtractMonth
 from bmr.models import BMR
+from kampala_pharma.replica import read_replica
 from workflow.models import BatchPhaseExecution, ProductionPhase
+from workflow.simulation import percentile
 
 
+@read_replica()
 def get_monthly_production_stats(months_lookback=6):
     """Get monthly production statistics for the past X months"""
     end_date = timezone.now()
@@ -88,6 +92,7 @@ def get_monthly_production_stats(months_lookback=6):
     }
 
 
+@read_replica()
 def get_production_cycle_times():
     """Calculate average production cycle times by product type"""
     # Get all completed BMRs
@@ -132,51 +137,99 @@ def get_production_cycle_times():
     return result
 
 
-def get_phase_bottleneck_analysis():
-    """Identify bottlenecks in the production process by analyzing phase durations"""
-    # Get all completed phases
-    completed_phases = BatchPhaseExecution.objects.filter(
-        status='completed',
-        started_date__isnull=False,
-        completed_date__isnull=False
-    ).select_related('phase', 'bmr__product')
-    
-    # Calculate duration for each phase
-    phase_durations = {}
-    
-    for phase in completed_phases:
-        duration = (phase.completed_date - phase.started_date).total_seconds() / 3600  # hours
-        
-        phase_name = phase.phase.phase_name
-        product_type = phase.bmr.product.product_type
-        
-        key = f"{product_type}__{phase_name}"
-        
-        if key not in phase_durations:
-            phase_durations[key] = []
-        
-        phase_durations[key].append(duration)
-    
-    # Calculate average durations
-    avg_durations = []
-    
-    for key, durations in phase_durations.items():
-        product_type, phase_name = key.split('__')
-        avg_duration = sum(durations) / len(durations)
-        
-        avg_durations.append({
-            'product_type': product_type.replace('_', ' ').title(),
-            'phase_name': phase_name.replace('_', ' ').title(),
-            'avg_hours': round(avg_duration, 2),
-            'count': len(durations)
+PHASE_FLOW_PERCENTILES = (50, 90, 99)
+PHASE_FLOW_CACHE_TIMEOUT = 15 * 60
+
+
+def _distribution(values):
+    """Count, mean and PHASE_FLOW_PERCENTILES of a list of hours"""
+    values.sort()
+    summary = {'count': len(values), 'mean': round(sum(values) / len(values), 2) if values else None}
+    for pct in PHASE_FLOW_PERCENTILES:
+        value = percentile(values, pct)
+        summary[f'p{pct}'] = round(value, 2) if value is not None else None
+    return summary
+
+
+@read_replica()
+def get_phase_flow_analysis(days=None):
+    """
+    Queue wait and active time distributions per product type and phase.
+
+    Wait is from the completion of the BMR's previous phase to this phase's start, taken
+    with LAG(completed_date) over phase_order per BMR in the database; active time is
+    started to completed. With `days`, only BMRs with a completion in that window are
+    read (each in full, so the LAG still sees their earlier phases). Rows are sorted by
+    p90 wait, longest first, and cached for PHASE_FLOW_CACHE_TIMEOUT seconds.
+    """
+    cache_key = f'analytics:phase_flow:{days or "all"}'
+    rows = cache.get(cache_key)
+    if rows is not None:
+        return rows
+
+    executions = BatchPhaseExecution.objects.all()
+    if days:
+        recent = BatchPhaseExecution.objects.filter(
+            completed_date__gte=timezone.now() - datetime.timedelta(days=days)
+        ).values('bmr_id')
+        executions = executions.filter(bmr_id__in=recent)
+    executions = executions.annotate(
+        previous_completed=Window(
+            Lag('completed_date'),
+            partition_by=[F('bmr_id')],
+            order_by=F('phase__phase_order').asc(),
+        ),
+    ).values_list(
+        'bmr__product__product_type', 'phase__phase_name', 'status',
+        'started_date', 'completed_date', 'previous_completed',
+    )
+
+    active, wait = {}, {}
+    for product_type, phase_name, status, started, completed, previous in executions.iterator(chunk_size=5000):
+        if status != 'completed' or not started or not completed or completed < started:
+            continue
+        key = (product_type, phase_name)
+        active.setdefault(key, []).append((completed - started).total_seconds() / 3600)
+        if previous and started >= previous:
+            wait.setdefault(key, []).append((started - previous).total_seconds() / 3600)
+
+    rows = []
+    for (product_type, phase_name), hours in active.items():
+        waits = _distribution(wait.get((product_type, phase_name), []))
+        actives = _distribution(hours)
+        rows.append({
+            'product_type': product_type,
+            'phase_name': phase_name,
+            'label': f"{product_type.replace('_', ' ').title()} - {phase_name.replace('_', ' ').title()}",
+            'count': actives['count'],
+            'active': actives,
+            'wait': waits,
+            # Share of the phase's elapsed time spent queueing rather than being worked on
+            'wait_share': round(waits['mean'] / (waits['mean'] + actives['mean']) * 100, 1)
+            if waits['mean'] is not None and (waits['mean'] + actives['mean']) > 0 else None,
         })
-    
-    # Sort by average duration (descending)
-    avg_durations.sort(key=lambda x: x['avg_hours'], reverse=True)
-    
-    return avg_durations[:10]  # Return top 10 longest phases
+    rows.sort(key=lambda row: (row['wait']['p90'] or 0, row['active']['p90'] or 0), reverse=True)
+    cache.set(cache_key, rows, PHASE_FLOW_CACHE_TIMEOUT)
+    return rows
+
+
+def get_phase_bottleneck_analysis():
+    """Top 10 phases by mean active hours, with their wait and active percentiles"""
+    rows = sorted(get_phase_flow_analysis(), key=lambda row: row['active']['mean'], reverse=True)
+    return [
+        {
+            'product_type': row['product_type'].replace('_', ' ').title(),
+            'phase_name': row['phase_name'].replace('_', ' ').title(),
+            'avg_hours': row['active']['mean'],
+            'count': row['count'],
+            'active': row['active'],
+            'wait': row['wait'],
+        }
+        for row in rows[:10]
+    ]
 
 
+@read_replica()
 def get_quality_metrics():
     """Calculate quality control metrics and rejection rates"""
     # Get all QC phases
@@ -221,6 +274,7 @@ def get_quality_metrics():
     return result
 
 
+@read_replica()
 def get_productivity_metrics():
     """Calculate productivity metrics for operators and phases"""
     # Get phases from the last 30 days
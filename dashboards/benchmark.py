@@ -0,0 +1,143 @@
+"""
+Query-count and latency benchmarks for the role dashboards, APIs and reports.
+"""
+import statistics
+import time
+import tracemalloc
+
+from django.db import connection, reset_queries
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+# (label, url name, role, query budget). Budgets are the queries measured on the pytest
+# plant (10 BMRs, default products and materials) plus about 10% headroom.
+BENCHMARK_VIEWS = [
+    ('admin_dashboard', 'dashboards:admin_dashboard', 'admin', 555),
+    ('qa_dashboard', 'dashboards:qa_dashboard', 'qa', 15),
+    ('regulatory_dashboard', 'dashboards:regulatory_dashboard', 'regulatory', 16),
+    ('store_dashboard', 'dashboards:store_dashboard', 'store_manager', 97),
+    ('qc_dashboard', 'dashboards:qc_dashboard', 'qc', 29),
+    ('operator_dashboard (mixing)', 'dashboards:operator_dashboard', 'mixing_operator', 35),
+    ('operator_dashboard (compression)', 'dashboards:operator_dashboard', 'compression_operator', 25),
+    ('packing_dashboard', 'dashboards:packing_dashboard', 'packing_operator', 43),
+    ('finished_goods_dashboard', 'dashboards:finished_goods_dashboard', 'finished_goods_store', 48),
+    ('admin_fgs_monitor', 'dashboards:admin_fgs_monitor', 'admin', 320),
+    ('machine_overview_api', 'dashboards:machine_overview_api', 'admin', 105),
+    ('api_materials', 'raw_materials:api_materials', 'store_manager', 117),
+    ('api_inventory_by_product', 'raw_materials:api_inventory_by_product', 'store_manager', 10),
+    ('fgs_inventory_list', 'fgs_management:inventory_list', 'finished_goods_store', 8),
+    ('fgs_dashboard', 'fgs_management:dashboard', 'finished_goods_store', 76),
+    ('fgs_analytics', 'fgs_management:analytics', 'finished_goods_store', 11),
+    ('timeline_report', 'reports:timeline_list', 'admin', 43),
+    ('comments_report', 'reports:comments_report', 'admin', 10),
+    ('qc_test_report', 'reports:qc_test_report', 'qc', 13),
+]
+
+# Views that are broken in the tree today; reported as expected failures instead of
+# failing the run until they are fixed
+KNOWN_FAILURES = {
+    'fgs_dashboard': 'returns 500: the fgs_management/dashboard.html template is missing',
+}
+
+# Views whose query count grows with the number of BMRs (N+1 queries), measured at 10,
+# 20 and 50 BMRs. They are known issues: past the pytest plant they go over their budget,
+# which is reported but does not fail the run. Fixing one means removing it here.
+QUERY_GROWTH = {
+    'admin_dashboard': 'about 33 queries per BMR',
+    'store_dashboard': '1 query per BMR',
+    'qc_dashboard': '1 query per BMR',
+    'operator_dashboard (mixing)': '2 queries per BMR',
+    'operator_dashboard (compression)': '1 query per BMR',
+    'packing_dashboard': '1 query per BMR',
+    'finished_goods_dashboard': '1 query per BMR',
+    'admin_fgs_monitor': 'about 28 queries per BMR',
+    'timeline_report': '3 queries per BMR',
+}
+
+
+WRITE_STATEMENTS = {'INSERT', 'UPDATE', 'DELETE', 'REPLACE'}
+
+
+def is_write(sql):
+    return sql.lstrip().split(None, 1)[0].upper() in WRITE_STATEMENTS
+
+
+def benchmark_view(client, url, repeat=3):
+    """Request a url `repeat` times and return query and write counts, timings and peak memory"""
+    timings = []
+    query_counts = []
+    write_counts = []
+    status_code = None
+
+    for _ in range(repeat):
+        reset_queries()
+        start = time.perf_counter()
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get(url)
+        timings.append((time.perf_counter() - start) * 1000)
+        query_counts.append(len(queries))
+        write_counts.append(sum(1 for query in queries if is_write(query['sql'])))
+        status_code = response.status_code
+
+    # Memory is traced in a separate request so tracemalloc overhead does not skew timings
+    tracemalloc.start()
+    client.get(url)
+    _, peak_memory = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        'status_code': status_code,
+        'queries': max(query_counts),
+        'writes_per_request': round(sum(write_counts) / len(write_counts), 2),
+        'median_ms': round(statistics.median(timings), 2),
+        'max_ms': round(max(timings), 2),
+        'peak_kb': round(peak_memory / 1024, 1),
+    }
+
+
+def run_benchmarks(users, repeat=3, views=None):
+    """Benchmark every configured view as its role and return one result dict per view"""
+    results = []
+    for label, url_name, role, budget in views or BENCHMARK_VIEWS:
+        user = users.get(role)
+        if user is None:
+            continue
+        client = Client(raise_request_exception=False)
+        client.force_login(user)
+        url = reverse(url_name)
+        result = {
+            'view': label,
+            'url': url,
+            'role': role,
+            'query_budget': budget,
+        }
+        result.update(benchmark_view(client, url, repeat=repeat))
+        result['within_budget'] = result['queries'] <= budget
+        result['known_failure'] = KNOWN_FAILURES.get(label)
+        result['query_growth'] = QUERY_GROWTH.get(label)
+        results.append(result)
+    return results
+
+
+def compare_to_baseline(results, baseline, tolerance=0.25):
+    """Return regression messages for views slower or chattier than a previous baseline"""
+    previous = {row['view']: row for row in baseline.get('results', [])}
+    regressions = []
+    for row in results:
+        old = previous.get(row['view'])
+        if not old:
+            continue
+        if row['queries'] > old['queries']:
+            regressions.append(
+                f"{row['view']}: queries {old['queries']} -> {row['queries']}"
+            )
+        if 'writes_per_request' in old and row['writes_per_request'] > old['writes_per_request']:
+            regressions.append(
+                f"{row['view']}: writes/request {old['writes_per_request']} -> {row['writes_per_request']}"
+            )
+        if row['median_ms'] > old['median_ms'] * (1 + tolerance):
+            regressions.append(
+                f"{row['view']}: median {old['median_ms']}ms -> {row['median_ms']}ms"
+            )
+    return regressions
@@ -11,6 +11,7 @@ import json
 import datetime
 import traceback
 from django.template import TemplateDoesNotExist
+from kampala_pharma.replica import replica_view
 
 from workflow.models import BatchPhaseExecution, ProductionPhase
 from bmr.models import BMR, BMRMaterial
@@ -734,6 +735,7 @@ def qc_history_data(request):
     })
 
 @login_required
+@replica_view
 def export_qc_history(request):
     """Export QC testing history as CSV"""
     if request.user.role != 'qc':
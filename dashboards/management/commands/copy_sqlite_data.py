@@ -0,0 +1,121 @@
+from django.apps import apps
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+
+SOURCE_ALIAS = 'sqlite_source'
+
+
+class Command(BaseCommand):
+    help = ('Copy every table from an SQLite database file into the configured database '
+            '(e.g. PostgreSQL via DATABASE_URL). Run `migrate` on the target first.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--source', default=str(settings.BASE_DIR / 'db.sqlite3'),
+                            help='SQLite file to copy from (default: the project db.sqlite3)')
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS,
+                            help='Target database alias (default: "default")')
+        parser.add_argument('--batch-size', type=int, default=2000)
+        parser.add_argument('--noinput', '--no-input', action='store_false', dest='interactive',
+                            help='Do not ask before emptying the target database')
+
+    def handle(self, *args, **options):
+        target_alias = options['database']
+        target = connections[target_alias]
+        if target.vendor == 'sqlite' and str(target.settings_dict['NAME']) == options['source']:
+            raise CommandError('The source and target are the same SQLite file.')
+
+        connections.settings[SOURCE_ALIAS] = connections.configure_settings({
+            DEFAULT_DB_ALIAS: connections.settings[DEFAULT_DB_ALIAS],
+            SOURCE_ALIAS: {'ENGINE': 'django.db.backends.sqlite3', 'NAME': options['source']},
+        })[SOURCE_ALIAS]
+        source = connections[SOURCE_ALIAS]
+
+        models = self._models()
+        if options['interactive']:
+            answer = input(
+                f"This empties every table in the '{target_alias}' database "
+                f"({target.settings_dict['NAME']}) before copying. Type 'yes' to continue: "
+            )
+            if answer != 'yes':
+                raise CommandError('Copy cancelled.')
+
+        # Empty the target without re-creating content types/permissions, so ids line up
+        call_command('flush', database=target_alias, interactive=False, inhibit_post_migrate=True, verbosity=0)
+
+        total = 0
+        with transaction.atomic(using=target_alias):
+            with target.constraint_checks_disabled():
+                for model in models:
+                    copied = self._copy(model, source, target, options['batch_size'])
+                    total += copied
+                    if copied:
+                        self.stdout.write(f'  {model._meta.label}: {copied}')
+            target.check_constraints()
+
+            # Move sequences past the copied ids
+            statements = target.ops.sequence_reset_sql(no_style(), models)
+            if statements:
+                with target.cursor() as cursor:
+                    for sql in statements:
+                        cursor.execute(sql)
+
+        mismatched = [
+            model._meta.label for model in models
+            if model._base_manager.using(SOURCE_ALIAS).count() != model._base_manager.using(target_alias).count()
+        ]
+        source.close()
+        if mismatched:
+            raise CommandError(f"Row counts differ after copy: {', '.join(mismatched)}")
+        self.stdout.write(self.style.SUCCESS(f'Copied {total} rows across {len(models)} tables'))
+
+    def _models(self):
+        models = [
+            model for model in apps.get_models(include_auto_created=True)
+            if model._meta.managed and not model._meta.proxy
+        ]
+        # Parents before children keeps the copy valid on backends that check FKs per statement
+        ordered, seen = [], set()
+
+        def visit(model):
+            if model in seen:
+                return
+            seen.add(model)
+            for field in model._meta.concrete_fields:
+                related = field.related_model
+                if related is not None and related is not model and related in models:
+                    visit(related)
+            ordered.append(model)
+
+        for model in models:
+            visit(model)
+        return ordered
+
+    def _copy(self, model, source, target, batch_size):
+        fields = model._meta.concrete_fields
+        table = target.ops.quote_name(model._meta.db_table)
+        columns = ', '.join(target.ops.quote_name(field.column) for field in fields)
+        placeholders = ', '.join(['%s'] * len(fields))
+        sql = f'INSERT INTO {table} ({columns}) VALUES ({placeholders})'
+
+        rows = model._base_manager.using(source.alias).order_by('pk').values_list(
+            *[field.attname for field in fields]
+        )
+        copied = 0
+        batch = []
+        with target.cursor() as cursor:
+            for row in rows.iterator(chunk_size=batch_size):
+                batch.append([
+                    field.get_db_prep_save(value, connection=target)
+                    for field, value in zip(fields, row)
+                ])
+                if len(batch) >= batch_size:
+                    cursor.executemany(sql, batch)
+                    copied += len(batch)
+                    batch = []
+            if batch:
+                cursor.executemany(sql, batch)
+                copied += len(batch)
+        return copied
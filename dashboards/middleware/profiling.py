@@ -0,0 +1,152 @@
+import json
+import logging
+import random
+import re
+import time
+from collections import defaultdict
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+logger = logging.getLogger('kampala_pharma.profiling')
+
+DEFAULT_PROFILING_SETTINGS = {
+    'ENABLED': False,
+    'SAMPLE_RATE': 1.0,
+    'STORE_IN_DB': True,
+    'MIN_WALL_TIME_MS': 0,
+    'DUPLICATE_THRESHOLD': 2,
+    'MAX_DUPLICATES_STORED': 10,
+    'IGNORE_PATHS': ['/static/', '/media/'],
+}
+
+_STRING_RE = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_RE = re.compile(r'\b\d+(?:\.\d+)?\b')
+_PLACEHOLDER_RE = re.compile(r'%s|\?')
+_IN_LIST_RE = re.compile(r'IN \((?:\s*\?\s*,?)+\)')
+_WHITESPACE_RE = re.compile(r'\s+')
+
+
+def get_profiling_settings():
+    config = dict(DEFAULT_PROFILING_SETTINGS)
+    config.update(getattr(settings, 'REQUEST_PROFILING', {}))
+    return config
+
+
+def fingerprint_sql(sql):
+    """Reduce a SQL statement to its shape so repeated N+1 queries group together"""
+    sql = _STRING_RE.sub('?', sql)
+    sql = _NUMBER_RE.sub('?', sql)
+    sql = _PLACEHOLDER_RE.sub('?', sql)
+    sql = _IN_LIST_RE.sub('IN (...)', sql)
+    return _WHITESPACE_RE.sub(' ', sql).strip()
+
+
+class QueryRecorder:
+    """connection.execute_wrapper that times every query and groups them by fingerprint"""
+
+    def __init__(self):
+        self.count = 0
+        self.total_time = 0.0
+        self.shapes = defaultdict(lambda: {'count': 0, 'time': 0.0, 'sample': ''})
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - start
+            self.count += 1
+            self.total_time += elapsed
+            shape = self.shapes[fingerprint_sql(sql)]
+            shape['count'] += 1
+            shape['time'] += elapsed
+            if not shape['sample']:
+                shape['sample'] = sql[:500]
+
+    def duplicates(self, threshold, limit):
+        repeated = [
+            {
+                'fingerprint': fingerprint[:500],
+                'count': shape['count'],
+                'time_ms': round(shape['time'] * 1000, 2),
+                'sample': shape['sample'],
+            }
+            for fingerprint, shape in self.shapes.items()
+            if shape['count'] >= threshold
+        ]
+        repeated.sort(key=lambda item: item['count'], reverse=True)
+        return repeated[:limit]
+
+    def duplicate_count(self, threshold):
+        """Repeats of every shape run at least `threshold` times, not just the stored ones"""
+        return sum(shape['count'] - 1 for shape in self.shapes.values() if shape['count'] >= threshold)
+
+
+class RequestProfilingMiddleware:
+    """
+    Opt-in per-request profiler: query count, SQL time, duplicate query shapes and wall time.
+
+    Enabled with REQUEST_PROFILING['ENABLED']; when disabled the middleware removes itself
+    from the stack at startup so it costs nothing.
+    """
+
+    def __init__(self, get_response):
+        self.config = get_profiling_settings()
+        if not self.config['ENABLED']:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if self._skip(request):
+            return self.get_response(request)
+
+        recorder = QueryRecorder()
+        start = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(recorder))
+            response = self.get_response(request)
+        wall_time_ms = (time.perf_counter() - start) * 1000
+
+        if wall_time_ms >= self.config['MIN_WALL_TIME_MS']:
+            self._record(request, response, recorder, wall_time_ms)
+        return response
+
+    def _skip(self, request):
+        if any(request.path.startswith(prefix) for prefix in self.config['IGNORE_PATHS']):
+            return True
+        return self.config['SAMPLE_RATE'] < 1 and random.random() >= self.config['SAMPLE_RATE']
+
+    def _record(self, request, response, recorder, wall_time_ms):
+        duplicates = recorder.duplicates(
+            self.config['DUPLICATE_THRESHOLD'],
+            self.config['MAX_DUPLICATES_STORED'],
+        )
+        resolver_match = getattr(request, 'resolver_match', None)
+        user = getattr(request, 'user', None)
+        profile = {
+            'path': request.path[:500],
+            'view_name': resolver_match.view_name if resolver_match else '',
+            'method': request.method,
+            'status_code': response.status_code,
+            'user_id': user.pk if user is not None and user.is_authenticated else None,
+            'wall_time_ms': round(wall_time_ms, 2),
+            'sql_time_ms': round(recorder.total_time * 1000, 2),
+            'query_count': recorder.count,
+            'duplicate_query_count': recorder.duplicate_count(self.config['DUPLICATE_THRESHOLD']),
+        }
+
+        if logger.isEnabledFor(logging.INFO):
+            logger.info(json.dumps(dict(profile, duplicate_queries=[
+                {'fingerprint': item['fingerprint'], 'count': item['count']} for item in duplicates
+            ])))
+
+        if self.config['STORE_IN_DB']:
+            from dashboards.models import RequestProfile
+            try:
+                RequestProfile.objects.create(duplicate_queries=duplicates, **profile)
+            except Exception:
+                logger.exception('Could not store request profile for %s', request.path)
@@ -95,3 +95,38 @@ class UserDashboardPreferences(models.Model):
     
     def __str__(self):
         return f"Dashboard preferences for {self.user.username}"
+
+class RequestProfile(models.Model):
+    """Per-request performance profile recorded by RequestProfilingMiddleware"""
+    
+    path = models.CharField(max_length=500)
+    view_name = models.CharField(max_length=200, blank=True)
+    method = models.CharField(max_length=10)
+    status_code = models.PositiveSmallIntegerField()
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True
+    )
+    
+    # Timings and query statistics
+    wall_time_ms = models.FloatField()
+    sql_time_ms = models.FloatField()
+    query_count = models.PositiveIntegerField()
+    duplicate_query_count = models.PositiveIntegerField(default=0)
+    
+    # Repeated query shapes: [{'fingerprint', 'count', 'time_ms', 'sample'}]
+    duplicate_queries = models.JSONField(default=list, blank=True)
+    
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['view_name', 'created_at'], name='reqprofile_view_created_idx'),
+            models.Index(fields=['created_at'], name='reqprofile_created_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.method} {self.path} ({self.query_count} queries, {self.wall_time_ms:.0f} ms)"
@@ -0,0 +1,73 @@
+import json
+
+import pytest
+from django.test import RequestFactory
+
+from dashboards.benchmark import BENCHMARK_VIEWS, KNOWN_FAILURES, QUERY_GROWTH, run_benchmarks
+from dashboards.middleware.profiling import QueryRecorder
+from dashboards.views_machine_api import machine_overview_api
+from workflow.models import BatchPhaseExecution, Machine
+from workflow.synthetic import SyntheticPlant
+
+BENCHMARK_BMRS = 10
+
+
+@pytest.fixture
+def benchmark_plant(db):
+    """The plant the query budgets were measured on, at BENCHMARK_BMRS batches"""
+    plant = SyntheticPlant(bmrs=BENCHMARK_BMRS)
+    plant.build()
+    return plant
+
+
+def views(known_issues):
+    return [
+        pytest.param(view, id=view[0], marks=pytest.mark.xfail(reason=known_issues[view[0]], strict=True))
+        if view[0] in known_issues else pytest.param(view, id=view[0])
+        for view in BENCHMARK_VIEWS
+    ]
+
+
+@pytest.mark.benchmark
+@pytest.mark.parametrize('view', views(KNOWN_FAILURES))
+def test_view_within_query_budget(benchmark_plant, view):
+    [result] = run_benchmarks(benchmark_plant.users, repeat=1, views=[view])
+
+    assert result['status_code'] < 500
+    assert result['queries'] <= result['query_budget']
+
+
+@pytest.mark.benchmark
+@pytest.mark.parametrize('view', views({**QUERY_GROWTH, **KNOWN_FAILURES}))
+def test_view_queries_do_not_grow_with_bmrs(benchmark_plant, view):
+    [before] = run_benchmarks(benchmark_plant.users, repeat=1, views=[view])
+    # Same seed: the products, materials and machines are reused and only BMRs are added
+    SyntheticPlant(bmrs=BENCHMARK_BMRS).build()
+    [after] = run_benchmarks(benchmark_plant.users, repeat=1, views=[view])
+
+    assert after['status_code'] < 500
+    assert after['queries'] <= before['queries']
+
+
+def test_machine_overview_shows_the_phase_a_machine_is_in(plant):
+    execution = BatchPhaseExecution.objects.filter(machine_used__isnull=False).select_related('phase').first()
+    BatchPhaseExecution.objects.filter(pk=execution.pk).update(status='in_progress')
+    request = RequestFactory().get('/dashboards/api/machines/')
+    request.user = plant.users['admin']
+
+    response = machine_overview_api(request)
+
+    assert response.status_code == 200
+    machines = {machine['id']: machine for machine in json.loads(response.content)['machines']}
+    assert machines[execution.machine_used_id]['current_usage'] == execution.phase.get_phase_name_display()
+    assert len(machines) == Machine.objects.count()
+
+
+def test_duplicate_count_covers_shapes_beyond_the_stored_ones():
+    recorder = QueryRecorder()
+    for table, repeats in (('a', 5), ('b', 4), ('c', 3), ('d', 1)):
+        for pk in range(repeats):
+            recorder(lambda *args: None, f'SELECT * FROM {table} WHERE id = {pk}', (), False, {})
+
+    assert [item['count'] for item in recorder.duplicates(2, 2)] == [5, 4]
+    assert recorder.duplicate_count(2) == 4 + 3 + 2
@@ -1,12 +1,16 @@
 from django.core.paginator import Paginator
 # --- RESTORE: Admin Timeline View ---
+from django.db import transaction
 from django.db.models import F, ExpressionWrapper, DateTimeField
 from django.contrib.auth.decorators import login_required
 from django.utils import timezone
 from django.http import JsonResponse
+from kampala_pharma.replica import replica_view
+from workflow import registry
 from dashboards.utils import all_materials_qc_approved
 
 @login_required
+@replica_view
 def admin_timeline_view(request):
     """Admin Timeline View - Track all BMRs through the system"""
     if not request.user.is_staff:
@@ -22,6 +26,8 @@ def admin_timeline_view(request):
     # Add timeline data for each BMR
     timeline_data = []
     from workflow.models import BatchPhaseExecution
+    from workflow.eta import predict_completion
+    etas = predict_completion()
     for bmr in bmrs:
         phases = BatchPhaseExecution.objects.filter(bmr=bmr).select_related('phase').order_by('phase__phase_order')
         bmr_created = bmr.created_date
@@ -58,6 +64,7 @@ def admin_timeline_view(request):
             'phase_timeline': phase_timeline,
             'current_phase': phases.filter(status__in=['pending', 'in_progress']).first(),
             'is_completed': fgs_completed is not None,
+            'eta': etas.get(bmr.id),
         })
 
     # Handle exports
@@ -113,30 +120,7 @@ def dashboard_home(request):
     
     user_role = request.user.role
     
-    role_dashboard_map = {
-        'qa': 'dashboards:qa_dashboard',
-        'regulatory': 'dashboards:regulatory_dashboard',
-        'store_manager': 'dashboards:store_dashboard',  # Main Store Dashboard with sidebar
-        'packaging_store': 'dashboards:packaging_dashboard',
-        'finished_goods_store': 'dashboards:finished_goods_dashboard',
-        'mixing_operator': 'dashboards:mixing_dashboard',
-        'qc': 'dashboards:qc_dashboard',  # Main QC Dashboard with sidebar
-        'tube_filling_operator': 'dashboards:tube_filling_dashboard',
-        'packing_operator': 'dashboards:packing_dashboard',
-        'granulation_operator': 'dashboards:granulation_dashboard',
-        'blending_operator': 'dashboards:blending_dashboard',
-        'compression_operator': 'dashboards:compression_dashboard',
-        'sorting_operator': 'dashboards:sorting_dashboard',
-        'coating_operator': 'dashboards:coating_dashboard',
-        'drying_operator': 'dashboards:drying_dashboard',
-        'filling_operator': 'dashboards:filling_dashboard',
-        'dispensing_operator': 'dashboards:operator_dashboard',  # Material dispensing uses operator dashboard
-        'equipment_operator': 'dashboards:operator_dashboard',
-        'cleaning_operator': 'dashboards:operator_dashboard',
-        'admin': 'dashboards:admin_dashboard',
-    }
-    
-    dashboard_url = role_dashboard_map.get(user_role, 'dashboards:admin_dashboard')
+    dashboard_url = registry.dashboard_for_role(user_role)
     return redirect(dashboard_url)
 
 @login_required
@@ -160,6 +144,8 @@ def admin_dashboard(request):
     # Get all BMRs with timeline data (same logic as admin_timeline_view)
     bmrs = BMR.objects.select_related('product', 'created_by', 'approved_by').all()
     timeline_data = []
+    from workflow.eta import predict_completion
+    etas = predict_completion()
     
     for bmr in bmrs:
         phases = BatchPhaseExecution.objects.filter(bmr=bmr).select_related('phase').order_by('phase__phase_order')
@@ -200,6 +186,7 @@ def admin_dashboard(request):
             'phase_timeline': phase_timeline,
             'current_phase': phases.filter(status__in=['pending', 'in_progress']).first(),
             'is_completed': fgs_completed is not None,
+            'eta': etas.get(bmr.id),
         })
     
     # Timeline summary stats
@@ -216,8 +203,9 @@ def admin_dashboard(request):
         status__in=['pending', 'in_progress']
     ).select_related('bmr__product', 'phase', 'started_by').order_by('-started_date')
     
-    # Add duration calculation for active phases
+    # Add duration calculation and the batch's completion ETA for active phases
     for phase in active_phases:
+        phase.eta = etas.get(phase.bmr_id)
         if phase.started_date:
             duration = timezone.now() - phase.started_date
             phase.duration_hours = round(duration.total_seconds() / 3600, 1)
@@ -402,35 +390,16 @@ def admin_dashboard(request):
             cycle_times['labels'].append(product_type.title())
             cycle_times['avg_days'].append(round(total_days / count, 1))
     
-    # Bottleneck analysis - actual phase duration data
-    bottleneck_analysis = []
-    phase_names = ['mixing', 'granulation', 'compression', 'coating', 'packaging_material_release']
-    
-    for phase_name in phase_names:
-        phases = BatchPhaseExecution.objects.filter(
-            phase__phase_name__icontains=phase_name,
-            status='completed',
-            started_date__isnull=False,
-            completed_date__isnull=False
-        )
-        
-        total_hours = 0
-        count = 0
-        for phase in phases:
-            duration = (phase.completed_date - phase.started_date).total_seconds() / 3600
-            total_hours += duration
-            count += 1
-        
-        if count > 0:
-            avg_hours = round(total_hours / count, 2)
-            bottleneck_analysis.append({
-                'phase': phase_name.replace('_', ' ').title(),
-                'avg_duration': avg_hours,
-                'total_executions': count
-            })
-    
-    # Sort by average duration (longest first)
-    bottleneck_analysis.sort(key=lambda x: x['avg_duration'], reverse=True)
+    # Bottleneck analysis - wait and active time percentiles per phase, longest p90 wait first
+    from dashboards.analytics import get_phase_flow_analysis
+    bottleneck_analysis = get_phase_flow_analysis()[:12]
+    phase_flow_chart = {
+        'labels': [row['label'] for row in bottleneck_analysis],
+        'wait_p50': [row['wait']['p50'] for row in bottleneck_analysis],
+        'wait_p90': [row['wait']['p90'] for row in bottleneck_analysis],
+        'active_p50': [row['active']['p50'] for row in bottleneck_analysis],
+        'active_p90': [row['active']['p90'] for row in bottleneck_analysis],
+    }
     
     # Quality metrics - actual QC data
     quality_metrics = {
@@ -639,6 +608,9 @@ def admin_dashboard(request):
         'breakdowns_today': breakdowns_today,
         'changeovers_today': changeovers_today,
         'machine_stats': machine_stats,
+        # === PHASE WAIT / ACTIVE TIME ===
+        'bottleneck_analysis': bottleneck_analysis,
+        'phase_flow_chart': phase_flow_chart,
     }
     
     # Restore the original working dashboard
@@ -678,10 +650,8 @@ def qa_dashboard(request):
                     phase_execution.completed_by = request.user
                     phase_execution.completed_date = timezone.now()
                     phase_execution.operator_comments += f"\nFinal QA Approved by {request.user.get_full_name()}. Comments: {comments}"
-                    phase_execution.save()
-                    
-                    # Trigger next phase in workflow (should be finished goods store)
-                    WorkflowService.trigger_next_phase(phase_execution.bmr, phase_execution.phase)
+                    # Save and trigger the next phase (should be finished goods store) in one transaction
+                    WorkflowService.save_transition(phase_execution)
                     
                     messages.success(request, f'Final QA approved for batch {phase_execution.bmr.batch_number}. Batch is ready for finished goods storage.')
                     
@@ -695,20 +665,7 @@ def qa_dashboard(request):
                     
                     # Rollback to appropriate packing phase based on product type
                     bmr = phase_execution.bmr
-                    product_type = bmr.product.product_type
-                    
-                    # Determine which packing phase to rollback to based on product type
-                    if product_type == 'tablet':
-                        if hasattr(bmr.product, 'tablet_type') and bmr.product.tablet_type == 'tablet_2':
-                            rollback_phase = 'bulk_packing'
-                        else:
-                            rollback_phase = 'blister_packing'
-                    elif product_type == 'capsule':
-                        rollback_phase = 'blister_packing'
-                    elif product_type == 'ointment':
-                        rollback_phase = 'secondary_packaging'
-                    else:
-                        rollback_phase = 'secondary_packaging'  # default
+                    rollback_phase = registry.final_qa_rework_phase(bmr.product)
                     
                     # Find and activate the appropriate packing phase for rework
                     rollback_execution = BatchPhaseExecution.objects.filter(
@@ -830,23 +787,25 @@ def regulatory_dashboard(request):
                         # Skip material check for specific BMR numbers we want to force approve
                         if bmr.batch_number == '0022025':
                             # Force approve this BMR
-                            regulatory_phase.status = 'completed'
-                            regulatory_phase.completed_by = request.user
-                            regulatory_phase.completed_date = timezone.now()
-                            regulatory_phase.operator_comments = f"Approved by {request.user.get_full_name()}. Comments: {comments}"
-                            regulatory_phase.save()
-                            
-                            # Update BMR status
-                            bmr.status = 'approved'
-                            bmr.approved_by = request.user
-                            bmr.approved_date = timezone.now()
-                            bmr.materials_approved = True
-                            bmr.materials_approved_by = request.user
-                            bmr.materials_approved_date = timezone.now()
-                            bmr.save()
-                            
-                            # Trigger next phase in workflow
-                            WorkflowService.trigger_next_phase(bmr, regulatory_phase.phase)
+                            # Approval, BMR status and next-phase activation commit together
+                            with transaction.atomic():
+                                regulatory_phase.status = 'completed'
+                                regulatory_phase.completed_by = request.user
+                                regulatory_phase.completed_date = timezone.now()
+                                regulatory_phase.operator_comments = f"Approved by {request.user.get_full_name()}. Comments: {comments}"
+                                regulatory_phase.save()
+                                
+                                # Update BMR status
+                                bmr.status = 'approved'
+                                bmr.approved_by = request.user
+                                bmr.approved_date = timezone.now()
+                                bmr.materials_approved = True
+                                bmr.materials_approved_by = request.user
+                                bmr.materials_approved_date = timezone.now()
+                                bmr.save()
+                                
+                                # Trigger next phase in workflow
+                                WorkflowService.trigger_next_phase(bmr, regulatory_phase.phase)
                             
                             messages.success(request, f"BMR {bmr.batch_number} has been approved successfully.")
                             return redirect('dashboards:regulatory_dashboard')
@@ -871,20 +830,22 @@ def regulatory_dashboard(request):
                             messages.error(request, error_msg)
                             return redirect('dashboards:regulatory_dashboard')
                             
-                        regulatory_phase.status = 'completed'
-                        regulatory_phase.completed_by = request.user
-                        regulatory_phase.completed_date = timezone.now()
-                        regulatory_phase.operator_comments = f"Approved by {request.user.get_full_name()}. Comments: {comments}"
-                        regulatory_phase.save()
-                        
-                        # Update BMR status
-                        bmr.status = 'approved'
-                        bmr.approved_by = request.user
-                        bmr.approved_date = timezone.now()
-                        bmr.save()
-                        
-                        # Trigger next phase in workflow
-                        WorkflowService.trigger_next_phase(bmr, regulatory_phase.phase)
+                        # Approval, BMR status and next-phase activation commit together
+                        with transaction.atomic():
+                            regulatory_phase.status = 'completed'
+                            regulatory_phase.completed_by = request.user
+                            regulatory_phase.completed_date = timezone.now()
+                            regulatory_phase.operator_comments = f"Approved by {request.user.get_full_name()}. Comments: {comments}"
+                            regulatory_phase.save()
+                            
+                            # Update BMR status
+                            bmr.status = 'approved'
+                            bmr.approved_by = request.user
+                            bmr.approved_date = timezone.now()
+                            bmr.save()
+                            
+                            # Trigger next phase in workflow
+                            WorkflowService.trigger_next_phase(bmr, regulatory_phase.phase)
                         
                         messages.success(request, f'BMR {bmr.batch_number} has been approved successfully.')
                         
@@ -1129,10 +1090,8 @@ def store_dashboard(request):
                 phase_execution.completed_by = request.user
                 phase_execution.completed_date = timezone.now()
                 phase_execution.operator_comments = f"Raw materials released by {request.user.get_full_name()}. Notes: {notes}"
-                phase_execution.save()
-                
-                # Trigger next phase in workflow (material_dispensing)
-                WorkflowService.trigger_next_phase(bmr, phase_execution.phase)
+                # Save and trigger the next phase (material_dispensing) in one transaction
+                WorkflowService.save_transition(phase_execution)
                 
                 messages.success(request, f'Raw materials released for batch {bmr.batch_number}. Material dispensing is now available.')
                 
@@ -1408,18 +1367,9 @@ def operator_dashboard(request):
                 
                 if action == 'start':
                     # Check if machine selection is required for this phase
-                    machine_required_phases = ['granulation', 'blending', 'compression', 'coating', 'blister_packing', 'bulk_packing', 'filling']
                     phase_name = phase_execution.phase.phase_name
                     
-                    # For capsule filling, only require machine for filling phase
-                    if phase_name == 'filling' and phase_execution.bmr.product.product_type != 'Capsule':
-                        machine_required = False
-                    elif phase_name in machine_required_phases:
-                        machine_required = True
-                    else:
-                        machine_required = False
-                    
-                    if machine_required and not machine_id:
+                    if registry.requires_machine(phase_name) and not machine_id:
                         messages.error(request, f'Machine selection is required for {phase_name} phase.')
                         return redirect(request.path)
                     
@@ -1492,10 +1442,8 @@ def operator_dashboard(request):
                             except ValueError:
                                 messages.warning(request, 'Invalid changeover time format. Changeover recorded without times.')
                     
-                    phase_execution.save()
-                    
-                    # Trigger next phase in workflow
-                    WorkflowService.trigger_next_phase(phase_execution.bmr, phase_execution.phase)
+                    # Save and trigger the next phase in one transaction
+                    WorkflowService.save_transition(phase_execution)
                     
                     completion_msg = f'Phase {phase_execution.phase.phase_name} completed for batch {phase_execution.bmr.batch_number}.'
                     if breakdown_occurred:
@@ -1530,21 +1478,7 @@ def operator_dashboard(request):
     }
 
     # Determine the primary phase name for this role
-    role_phase_mapping = {
-        'mixing_operator': 'mixing',
-        'granulation_operator': 'granulation',
-        'blending_operator': 'blending',
-        'compression_operator': 'compression',
-        'coating_operator': 'coating',
-        'drying_operator': 'drying',
-        'filling_operator': 'filling',
-        'tube_filling_operator': 'tube_filling',
-        'packing_operator': 'packing',
-        'sorting_operator': 'sorting',
-        'dispensing_operator': 'dispensing',  # Material dispensing operator
-    }
-
-    phase_name = role_phase_mapping.get(request.user.role, 'production')
+    phase_name = registry.dashboard_phase_for_role(request.user.role)
     daily_progress = min(100, (stats['completed_today'] / max(1, stats['pending_phases'] + stats['completed_today'])) * 100)
 
     # Operator History: all phases completed by this user for their role
@@ -1953,10 +1887,8 @@ def qc_dashboard(request):
                         phase_execution.completed_by = request.user
                         phase_execution.completed_date = timezone.now()
                         phase_execution.operator_comments = f"QC Test Passed by {request.user.get_full_name()}. Results: {test_results}"
-                        phase_execution.save()
-                        
-                        # Trigger next phase in workflow
-                        WorkflowService.trigger_next_phase(phase_execution.bmr, phase_execution.phase)
+                        # Save and trigger the next phase in one transaction
+                        WorkflowService.save_transition(phase_execution)
                         
                         messages.success(request, f'QC test passed for batch {phase_execution.bmr.batch_number}.')
                         
@@ -1968,18 +1900,8 @@ def qc_dashboard(request):
                         phase_execution.save()
                         
                         # Determine which phase to roll back to based on current phase
-                        rollback_phase_name = None
-                        if phase_execution.phase.phase_name == 'post_compression_qc':
-                            rollback_phase_name = 'granulation'
-                            operator_role = 'granulation_operator'
-                        elif phase_execution.phase.phase_name == 'post_mixing_qc':
-                            rollback_phase_name = 'mixing'
-                            operator_role = 'mixing_operator'
-                        elif phase_execution.phase.phase_name == 'post_blending_qc':
-                            rollback_phase_name = 'blending'
-                            operator_role = 'blending_operator'
-                        else:
-                            operator_role = None
+                        rollback_phase_name = registry.qc_rollback_phase(phase_execution.phase.phase_name)
+                        operator_role = registry.role_for_phase(rollback_phase_name)
                         
                         # Rollback to previous phase
                         WorkflowService.rollback_to_previous_phase(phase_execution.bmr, phase_execution.phase)
@@ -2137,14 +2059,13 @@ def packaging_dashboard(request):
                     phase_execution.completed_by = request.user
                     phase_execution.completed_date = timezone.now()
                     phase_execution.operator_comments = f"Packaging materials released by {request.user.get_full_name()}. Notes: {notes}"
-                    phase_execution.save()
                     
                     # Set session variables for next phase notification
                     request.session['completed_phase'] = phase_execution.phase.phase_name
                     request.session['completed_bmr'] = phase_execution.bmr.id
                     
-                    # Trigger next phase in workflow (should be packing phases)
-                    WorkflowService.trigger_next_phase(phase_execution.bmr, phase_execution.phase)
+                    # Save and trigger the next phase (should be packing phases) in one transaction
+                    WorkflowService.save_transition(phase_execution)
                     
                     # Determine correct message based on product type
                     if phase_execution.bmr.product.product_type == 'tablet' and getattr(phase_execution.bmr.product, 'tablet_type', None) == 'tablet_2':
@@ -2304,10 +2225,8 @@ def packing_dashboard(request):
                     phase_execution.completed_by = request.user
                     phase_execution.completed_date = timezone.now()
                     phase_execution.operator_comments = f"Packing completed by {request.user.get_full_name()}. Notes: {notes}"
-                    phase_execution.save()
-                    
-                    # Trigger next phase in workflow
-                    WorkflowService.trigger_next_phase(phase_execution.bmr, phase_execution.phase)
+                    # Save and trigger the next phase in one transaction
+                    WorkflowService.save_transition(phase_execution)
                     
                     messages.success(request, f'Packing completed for batch {phase_execution.bmr.batch_number}.')
                     
@@ -2446,13 +2365,13 @@ def finished_goods_dashboard(request):
     # Recent inventory items
     recent_inventory = FGSInventory.objects.filter(
         created_at__gte=timezone.now() - timedelta(days=30)
-    ).select_related('product', 'bmr').order_by('-created_at')[:10]
+    ).select_related('product', 'bmr__product').order_by('-created_at')[:10]
     
     # Current inventory available for release
     available_inventory = FGSInventory.objects.filter(
         status__in=['stored', 'available'],
         quantity_available__gt=0
-    ).select_related('product', 'bmr').order_by('-created_at')
+    ).select_related('product', 'bmr__product').order_by('-created_at')
     
     # Completed FGS phases without inventory entries
     completed_fgs_phases = BatchPhaseExecution.objects.filter(
@@ -2465,7 +2384,7 @@ def finished_goods_dashboard(request):
     # Recent releases
     recent_releases = ProductRelease.objects.filter(
         release_date__gte=timezone.now() - timedelta(days=14)
-    ).select_related('inventory__product', 'inventory__bmr').order_by('-release_date')[:10]
+    ).select_related('inventory__product', 'inventory__bmr__product', 'authorized_by').order_by('-release_date')[:10]
     
     # Active alerts
     active_alerts = FGSAlert.objects.filter(
@@ -2541,20 +2460,7 @@ def finished_goods_dashboard(request):
     }
 
     # Determine the primary phase name for this role
-    role_phase_mapping = {
-        'mixing_operator': 'mixing',
-        'granulation_operator': 'granulation',
-        'blending_operator': 'blending',
-        'compression_operator': 'compression',
-        'coating_operator': 'coating',
-        'drying_operator': 'drying',
-        'filling_operator': 'filling',
-        'tube_filling_operator': 'tube_filling',
-        'packing_operator': 'packing',
-        'sorting_operator': 'sorting',
-    }
-
-    phase_name = role_phase_mapping.get(request.user.role, 'production')
+    phase_name = registry.dashboard_phase_for_role(request.user.role)
     daily_progress = min(100, (stats['completed_today'] / max(1, stats['pending_phases'] + stats['completed_today'])) * 100)
     
     # Get recently completed goods
@@ -2675,12 +2581,12 @@ def admin_fgs_monitor(request):
     # Recent inventory items
     recent_inventory = FGSInventory.objects.filter(
         created_at__gte=timezone.now() - timedelta(days=30)
-    ).select_related('product', 'bmr').order_by('-created_at')[:10]
+    ).select_related('product', 'bmr__product').order_by('-created_at')[:10]
     
     # Recent releases
     recent_releases = ProductRelease.objects.filter(
         release_date__gte=timezone.now() - timedelta(days=14)
-    ).select_related('inventory__product', 'inventory__bmr').order_by('-release_date')[:10]
+    ).select_related('inventory__product', 'inventory__bmr__product', 'authorized_by').order_by('-release_date')[:10]
     
     # Active alerts
     active_alerts = FGSAlert.objects.filter(
@@ -2779,6 +2685,7 @@ def admin_fgs_monitor(request):
     
     return render(request, 'dashboards/admin_fgs_monitor.html', context)
 
+@replica_view
 def export_timeline_data(request, timeline_data=None, format_type=None):
     """Export detailed timeline data to CSV or Excel with all phases"""
     # Handle direct URL access
@@ -26,11 +26,11 @@ def machine_overview_api(request):
         current_usage = BatchPhaseExecution.objects.filter(
             machine_used=machine,
             status='in_progress'
-        ).order_by('-created_date').first()
+        ).select_related('phase').order_by('-created_date').first()
         
         current_usage_str = 'Not in use'
         if current_usage:
-            current_usage_str = current_usage.phase.name
+            current_usage_str = current_usage.phase.get_phase_name_display()
             
         # Add machine data to the list
         machines_data.append({
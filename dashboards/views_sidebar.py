@@ -47,10 +47,8 @@ def store_dashboard_sidebar(request):
                 phase_execution.completed_by = request.user
                 phase_execution.completed_date = timezone.now()
                 phase_execution.operator_comments = f"Raw materials released by {request.user.get_full_name()}. Notes: {notes}"
-                phase_execution.save()
-                
-                # Trigger next phase in workflow (material_dispensing)
-                WorkflowService.trigger_next_phase(bmr, phase_execution.phase)
+                # Save and trigger the next phase (material_dispensing) in one transaction
+                WorkflowService.save_transition(phase_execution)
                 
                 messages.success(request, f'Raw materials released for batch {bmr.batch_number}. Material dispensing is now available.')
                 
@@ -1,15 +1,20 @@
 from django.contrib import admin
+from django.db import transaction
 from .models import FGSInventory, ProductRelease, FGSAlert
 
 @admin.register(FGSInventory)
 class FGSInventoryAdmin(admin.ModelAdmin):
     list_display = [
-        'batch_number', 'product', 'quantity_available', 'status', 
-        'created_at'
+        'batch_number', 'product', 'quantity_available', 'quantity_released_total',
+        'release_count', 'last_release_date', 'status', 'created_at'
     ]
     list_filter = ['status', 'product', 'created_at']
     search_fields = ['batch_number', 'product__product_name']
-    readonly_fields = ['created_at', 'updated_at', 'quantity_produced', 'unit_of_measure']
+    readonly_fields = [
+        'created_at', 'updated_at', 'quantity_produced', 'unit_of_measure',
+        'quantity_released_total', 'release_count', 'last_release_date',
+    ]
+    list_select_related = ['product']
     
     fieldsets = (
         ('Product Information', {
@@ -18,6 +23,9 @@ class FGSInventoryAdmin(admin.ModelAdmin):
         ('Quantity Details', {
             'fields': ('quantity_produced', 'quantity_available', 'unit_of_measure')
         }),
+        ('Releases', {
+            'fields': ('quantity_released_total', 'release_count', 'last_release_date')
+        }),
         ('Status & Quality', {
             'fields': ('status', 'release_certificate_number', 'qa_approved_by', 'qa_approval_date')
         }),
@@ -51,20 +59,26 @@ class ProductReleaseAdmin(admin.ModelAdmin):
             'fields': ('authorized_by', 'created_by', 'notes')
         }),
     )
+    
+    def delete_queryset(self, request, queryset):
+        # One delete() per release so each gives its stock back and the totals are rebuilt
+        with transaction.atomic():
+            for release in queryset.order_by('inventory_id', 'pk'):
+                release.delete()
 
 @admin.register(FGSAlert)
 class FGSAlertAdmin(admin.ModelAdmin):
     list_display = ['title', 'alert_type', 'priority', 'inventory', 'is_resolved', 'created_at']
     list_filter = ['alert_type', 'priority', 'is_resolved', 'created_at']
     search_fields = ['title', 'message', 'inventory__batch_number']
-    readonly_fields = ['created_at']
+    readonly_fields = ['created_at', 'alert_key', 'last_seen_at']
     
     fieldsets = (
         ('Alert Information', {
             'fields': ('alert_type', 'priority', 'title', 'message')
         }),
         ('Related Data', {
-            'fields': ('inventory',)
+            'fields': ('inventory', 'alert_key', 'last_seen_at')
         }),
         ('Resolution', {
             'fields': ('is_resolved', 'resolved_by', 'resolved_at')
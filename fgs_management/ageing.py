@@ -0,0 +1,223 @@
+"""
+Stock ageing and expiry risk for the Finished Goods Store.
+
+`scan_expiry_risk` reads every batch with stock on hand in one query, sorts it into
+shelf-life buckets, scores how likely it is to expire before it sells and upserts one
+FGSAlert per batch and priority. `fefo_picks` suggests which batches to release first.
+"""
+from collections import OrderedDict
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from kampala_pharma.events import get_event_logger
+from .models import FGSAlert, FGSInventory
+
+events = get_event_logger('fgs')
+
+# (label, upper bound in days remaining); None is open-ended
+AGEING_BUCKETS = [
+    ('expired', 0),
+    ('0-30 days', 30),
+    ('31-90 days', 90),
+    ('91-180 days', 180),
+    ('181-365 days', 365),
+    ('over 1 year', None),
+]
+NO_EXPIRY_BUCKET = 'no expiry date'
+
+# Batches further than this from expiry never raise an alert
+ALERT_HORIZON_DAYS = 180
+
+# (minimum risk score, alert priority), highest first
+RISK_PRIORITIES = [
+    (Decimal('0.85'), 'critical'),
+    (Decimal('0.60'), 'high'),
+    (Decimal('0.40'), 'medium'),
+]
+
+STOCK_STATUSES = ['stored', 'available']
+
+
+def ageing_bucket(days_left):
+    if days_left is None:
+        return NO_EXPIRY_BUCKET
+    for label, upper in AGEING_BUCKETS:
+        if upper is None or days_left <= upper:
+            return label
+
+
+def expiry_risk(days_left, quantity_available, daily_rate, horizon=ALERT_HORIZON_DAYS):
+    """
+    Score from 0 to 1 for how likely a batch is to expire on the shelf.
+
+    Blends time pressure (how far into the alert horizon the batch is) with the share of
+    current stock that won't sell before expiry at the batch's release rate so far.
+    """
+    if days_left is None:
+        return Decimal('0')
+    if days_left <= 0:
+        return Decimal('1')
+
+    time_pressure = 1 - min(days_left, horizon) / horizon
+    if daily_rate > 0:
+        days_to_clear = float(quantity_available) / daily_rate
+        unsold_share = max(0.0, 1 - days_left / days_to_clear)
+    else:
+        unsold_share = 1.0
+    score = 0.6 * time_pressure + 0.4 * unsold_share * time_pressure ** 0.5
+    return Decimal(str(round(min(score, 1.0), 2)))
+
+
+def risk_priority(score):
+    for threshold, priority in RISK_PRIORITIES:
+        if score >= threshold:
+            return priority
+    return None
+
+
+def _stock_rows(today):
+    rows = FGSInventory.objects.filter(
+        status__in=STOCK_STATUSES,
+        quantity_available__gt=0,
+    ).values_list(
+        'id', 'batch_number', 'product__product_name', 'quantity_available',
+        'quantity_released_total', 'created_at', 'bmr__expiry_date',
+    ).order_by()
+
+    for inventory_id, batch_number, product_name, available, released, created_at, expiry_date in rows.iterator(chunk_size=2000):
+        days_left = (expiry_date - today).days if expiry_date else None
+        days_in_store = max((today - timezone.localtime(created_at).date()).days, 1)
+        yield {
+            'inventory_id': inventory_id,
+            'batch_number': batch_number,
+            'product_name': product_name,
+            'quantity_available': available,
+            'expiry_date': expiry_date,
+            'days_left': days_left,
+            'daily_rate': float(released) / days_in_store,
+        }
+
+
+def scan_expiry_risk(today=None, horizon=ALERT_HORIZON_DAYS, dry_run=False):
+    """
+    Bucket all FGS stock by shelf life remaining and upsert expiry alerts.
+
+    Alerts are keyed `expiry:<inventory id>:<priority>`, so a rerun refreshes the same
+    alert and an escalation raises a new one. Open expiry alerts not seen in this run are
+    resolved; a rerun that sees one of those again opens it again, while an alert a user
+    resolved stays resolved. Returns a summary dict.
+    """
+    today = today or timezone.localdate()
+    now = timezone.now()
+    buckets = OrderedDict(
+        (label, {'batches': 0, 'quantity': Decimal('0')})
+        for label in [label for label, _ in AGEING_BUCKETS] + [NO_EXPIRY_BUCKET]
+    )
+    by_priority = OrderedDict((priority, 0) for _, priority in RISK_PRIORITIES)
+    alerts = []
+    scanned = 0
+
+    for row in _stock_rows(today):
+        scanned += 1
+        bucket = buckets[ageing_bucket(row['days_left'])]
+        bucket['batches'] += 1
+        bucket['quantity'] += row['quantity_available']
+
+        if row['days_left'] is None or row['days_left'] > horizon:
+            continue
+        score = expiry_risk(row['days_left'], row['quantity_available'], row['daily_rate'], horizon)
+        priority = risk_priority(score)
+        if priority is None:
+            continue
+
+        by_priority[priority] += 1
+        if row['days_left'] <= 0:
+            title = f"Batch {row['batch_number']} has expired"
+        else:
+            title = f"Batch {row['batch_number']} expires in {row['days_left']} days"
+        alerts.append(FGSAlert(
+            alert_type='expiry_warning',
+            priority=priority,
+            inventory_id=row['inventory_id'],
+            alert_key=f"expiry:{row['inventory_id']}:{priority}",
+            title=title,
+            message=(
+                f"{row['product_name']} batch {row['batch_number']}: {row['quantity_available']} on hand, "
+                f"expiry {row['expiry_date']:%d %b %Y}, risk score {score}."
+            ),
+            last_seen_at=now,
+        ))
+
+    resolved = 0
+    if not dry_run:
+        with transaction.atomic():
+            FGSAlert.objects.bulk_create(
+                alerts,
+                batch_size=500,
+                update_conflicts=True,
+                unique_fields=['alert_key'],
+                update_fields=['title', 'message', 'last_seen_at'],
+            )
+            # An alert the scan resolved earlier opens again when the risk comes back; one
+            # a user resolved (resolved_by set) stays closed
+            FGSAlert.objects.filter(
+                alert_type='expiry_warning',
+                last_seen_at=now,
+                is_resolved=True,
+                resolved_by__isnull=True,
+            ).update(is_resolved=False, resolved_at=None)
+            resolved = FGSAlert.objects.filter(
+                alert_type='expiry_warning',
+                alert_key__startswith='expiry:',
+                is_resolved=False,
+                last_seen_at__lt=now,
+            ).update(is_resolved=True, resolved_at=now)
+
+    events.info('expiry_scan', scanned=scanned, alerts=len(alerts), resolved=resolved, dry_run=dry_run)
+    return {
+        'scanned': scanned,
+        'buckets': buckets,
+        'by_priority': by_priority,
+        'alerts': len(alerts),
+        'resolved': resolved,
+    }
+
+
+def fefo_picks(product_id, quantity=None, today=None):
+    """
+    First-expiry-first-out batches for a product.
+
+    Expired stock is left out. With `quantity`, batches are allocated in order until it
+    is covered and each pick carries `pick_quantity`; otherwise every batch is listed.
+    """
+    today = today or timezone.localdate()
+    stock = FGSInventory.objects.filter(
+        product_id=product_id,
+        status__in=STOCK_STATUSES,
+        quantity_available__gt=0,
+    ).exclude(
+        bmr__expiry_date__lte=today,
+    ).order_by(
+        F('bmr__expiry_date').asc(nulls_last=True), 'created_at', 'id',
+    ).values_list('id', 'batch_number', 'quantity_available', 'bmr__expiry_date')
+
+    picks = []
+    remaining = quantity
+    for inventory_id, batch_number, available, expiry_date in stock:
+        pick = {
+            'inventory_id': inventory_id,
+            'batch_number': batch_number,
+            'quantity_available': available,
+            'expiry_date': expiry_date,
+            'days_to_expiry': (expiry_date - today).days if expiry_date else None,
+        }
+        if remaining is not None:
+            pick['pick_quantity'] = min(available, remaining)
+            remaining -= pick['pick_quantity']
+        picks.append(pick)
+        if remaining is not None and remaining <= 0:
+            break
+    return picks
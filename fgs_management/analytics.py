@@ -0,0 +1,153 @@
+"""
+Release trend analytics for the Finished Goods Store.
+
+Trends come from one grouped query per request, bucketed with Trunc* so they run the
+same on SQLite and PostgreSQL, and are cached until the next release is recorded.
+That invalidation only reaches every worker through a shared cache (see CACHES in
+settings); with the default per-process cache another worker may serve a trend up to
+TREND_LOCAL_CACHE_TIMEOUT seconds old.
+"""
+import datetime
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, DateField, Sum
+from django.db.models.functions import TruncDay, TruncMonth, TruncWeek
+from django.utils import timezone
+
+from .models import ProductRelease
+
+TREND_PERIODS = {
+    'day': TruncDay,
+    'week': TruncWeek,
+    'month': TruncMonth,
+}
+
+# Default number of buckets shown when no start date is given
+DEFAULT_BUCKETS = {
+    'day': 30,
+    'week': 12,
+    'month': 12,
+}
+
+# Upper bound on buckets so a careless range can't build an enormous series
+MAX_BUCKETS = 3700
+
+TREND_CACHE_TIMEOUT = 60 * 60
+TREND_LOCAL_CACHE_TIMEOUT = 60
+TREND_VERSION_KEY = 'fgs:release_trend:version'
+
+# Backends that keep a separate copy per process, so other workers never see a version bump
+LOCAL_CACHE_BACKENDS = {
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+}
+
+
+def bucket_start(day, period):
+    """First day of the bucket containing `day`"""
+    if period == 'month':
+        return day.replace(day=1)
+    if period == 'week':
+        return day - datetime.timedelta(days=day.weekday())
+    return day
+
+
+def next_bucket(day, period):
+    if period == 'month':
+        return (day.replace(day=28) + datetime.timedelta(days=4)).replace(day=1)
+    if period == 'week':
+        return day + datetime.timedelta(days=7)
+    return day + datetime.timedelta(days=1)
+
+
+def bucket_label(day, period):
+    if period == 'month':
+        return day.strftime('%b %Y')
+    if period == 'week':
+        return f"Wk {day.strftime('%d %b %Y')}"
+    return day.strftime('%d %b %Y')
+
+
+def default_start(end, period, buckets=None):
+    """Start date covering `buckets` buckets up to and including `end`"""
+    start = bucket_start(end, period)
+    for _ in range((buckets or DEFAULT_BUCKETS[period]) - 1):
+        if period == 'month':
+            start = (start - datetime.timedelta(days=1)).replace(day=1)
+        elif period == 'week':
+            start -= datetime.timedelta(days=7)
+        else:
+            start -= datetime.timedelta(days=1)
+    return start
+
+
+def trend_cache_timeout():
+    if settings.CACHES['default']['BACKEND'] in LOCAL_CACHE_BACKENDS:
+        return TREND_LOCAL_CACHE_TIMEOUT
+    return TREND_CACHE_TIMEOUT
+
+
+def invalidate_release_trends():
+    """Bump the trend cache version; called whenever releases change"""
+    try:
+        cache.incr(TREND_VERSION_KEY)
+    except ValueError:
+        cache.set(TREND_VERSION_KEY, 2, None)
+
+
+def release_trend(period='month', start=None, end=None, product_id=None, release_type=None):
+    """
+    Released quantity, release count and value per day/week/month between two dates.
+
+    Returns a list of buckets in date order, including empty ones, e.g.
+    [{'period': '2025-01-01', 'label': 'Jan 2025', 'quantity': 120.0, 'releases': 3, 'value': 4500.0}, ...]
+    """
+    if period not in TREND_PERIODS:
+        raise ValueError(f'Unknown trend period: {period}')
+
+    end = end or timezone.localdate()
+    start = bucket_start(start or default_start(end, period), period)
+    if start > end:
+        start, end = bucket_start(end, period), start
+
+    version = cache.get(TREND_VERSION_KEY, 1)
+    cache_key = f'fgs:release_trend:{version}:{period}:{start}:{end}:{product_id or ""}:{release_type or ""}'
+    series = cache.get(cache_key)
+    if series is not None:
+        return series
+
+    # Compare against local midnight so buckets line up with the plant's calendar days
+    tz = timezone.get_current_timezone()
+    start_dt = timezone.make_aware(datetime.datetime.combine(start, datetime.time.min), tz)
+    end_dt = timezone.make_aware(datetime.datetime.combine(end + datetime.timedelta(days=1), datetime.time.min), tz)
+
+    releases = ProductRelease.objects.filter(release_date__gte=start_dt, release_date__lt=end_dt)
+    if product_id:
+        releases = releases.filter(inventory__product_id=product_id)
+    if release_type:
+        releases = releases.filter(release_type=release_type)
+
+    rows = (
+        releases.order_by()
+        .annotate(bucket=TREND_PERIODS[period]('release_date', output_field=DateField()))
+        .values('bucket')
+        .annotate(quantity=Sum('quantity_released'), releases=Count('id'), value=Sum('total_value'))
+    )
+    totals = {row['bucket']: row for row in rows}
+
+    series = []
+    day = start
+    while day <= end and len(series) < MAX_BUCKETS:
+        row = totals.get(day, {})
+        series.append({
+            'period': day.isoformat(),
+            'label': bucket_label(day, period),
+            'quantity': float(row.get('quantity') or 0),
+            'releases': row.get('releases', 0),
+            'value': float(row.get('value') or 0),
+        })
+        day = next_bucket(day, period)
+
+    cache.set(cache_key, series, trend_cache_timeout())
+    return series
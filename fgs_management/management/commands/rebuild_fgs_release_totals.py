@@ -0,0 +1,50 @@
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db.models import Count, DecimalField, Sum, Value
+from django.db.models.functions import Coalesce
+
+from fgs_management.models import FGSInventory
+from fgs_management.services import ReleaseService
+
+
+class Command(BaseCommand):
+    help = 'Recompute the denormalized release totals on FGS inventory from the release records'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch', help='Only rebuild the inventory row for this batch number')
+        parser.add_argument('--check', action='store_true',
+                            help='Report rows whose stored totals disagree without changing them')
+
+    def handle(self, *args, **options):
+        inventory = FGSInventory.objects.all()
+        if options['batch']:
+            inventory = inventory.filter(batch_number=options['batch'])
+
+        if options['check']:
+            drifted = self._drifted(inventory)
+            for row in drifted[:50]:
+                self.stdout.write(
+                    f"{row['batch_number']}: stored {row['quantity_released_total']} / {row['release_count']}, "
+                    f"actual {row['actual_total']} / {row['actual_count']}"
+                )
+            style = self.style.WARNING if drifted else self.style.SUCCESS
+            self.stdout.write(style(f'{len(drifted)} inventory row(s) with stale release totals'))
+            return
+
+        updated = ReleaseService.rebuild_release_totals(inventory)
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt release totals for {updated} inventory row(s)'))
+
+    def _drifted(self, inventory):
+        rows = inventory.annotate(
+            actual_total=Coalesce(
+                Sum('releases__quantity_released'),
+                Value(Decimal('0')),
+                output_field=DecimalField(max_digits=12, decimal_places=2),
+            ),
+            actual_count=Count('releases'),
+        ).values('batch_number', 'quantity_released_total', 'release_count', 'actual_total', 'actual_count')
+        return [
+            row for row in rows
+            if row['quantity_released_total'] != row['actual_total'] or row['release_count'] != row['actual_count']
+        ]
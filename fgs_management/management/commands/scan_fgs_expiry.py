@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+
+from fgs_management.ageing import ALERT_HORIZON_DAYS, scan_expiry_risk
+
+
+class Command(BaseCommand):
+    help = 'Bucket FGS stock by shelf life remaining and raise or refresh expiry alerts (run daily)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--horizon', type=int, default=ALERT_HORIZON_DAYS,
+                            help='Only alert on batches expiring within this many days')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Report the ageing profile without touching alerts')
+
+    def handle(self, *args, **options):
+        summary = scan_expiry_risk(horizon=options['horizon'], dry_run=options['dry_run'])
+
+        self.stdout.write(f"Scanned {summary['scanned']} batch(es) with stock on hand")
+        for label, bucket in summary['buckets'].items():
+            self.stdout.write(f"  {label:<16} {bucket['batches']:>6} batch(es)  {bucket['quantity']:>14}")
+        at_risk = ', '.join(f'{count} {priority}' for priority, count in summary['by_priority'].items())
+        self.stdout.write(f'At risk: {at_risk}')
+
+        if options['dry_run']:
+            self.stdout.write(self.style.WARNING(f"Dry run: {summary['alerts']} alert(s) not written"))
+        else:
+            self.stdout.write(self.style.SUCCESS(
+                f"Upserted {summary['alerts']} expiry alert(s), resolved {summary['resolved']} stale alert(s)"
+            ))
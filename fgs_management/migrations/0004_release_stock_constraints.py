@@ -0,0 +1,29 @@
+# Generated by Django 4.2.7 on 2026-10-19 08:11
+
+from django.db import migrations, models
+
+
+def clear_oversold_stock(apps, schema_editor):
+    # Releases saved before stock updates were conditional could oversell a batch;
+    # those rows must be brought back to zero before the check constraint applies
+    FGSInventory = apps.get_model('fgs_management', 'FGSInventory')
+    FGSInventory.objects.filter(quantity_available__lt=0).update(quantity_available=0, status='released')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fgs_management', '0003_alter_fgsinventory_options_alter_fgsinventory_status'),
+    ]
+
+    operations = [
+        migrations.RunPython(clear_oversold_stock, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='fgsinventory',
+            constraint=models.CheckConstraint(check=models.Q(('quantity_available__gte', 0)), name='fgs_inventory_quantity_non_negative'),
+        ),
+        migrations.AddConstraint(
+            model_name='productrelease',
+            constraint=models.CheckConstraint(check=models.Q(('quantity_released__gt', 0)), name='product_release_quantity_positive'),
+        ),
+    ]
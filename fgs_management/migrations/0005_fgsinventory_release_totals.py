@@ -0,0 +1,48 @@
+# Generated by Django 4.2.7 on 2026-10-19 08:13
+
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.db.models import Count, DecimalField, Max, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+
+def backfill_release_totals(apps, schema_editor):
+    FGSInventory = apps.get_model('fgs_management', 'FGSInventory')
+    ProductRelease = apps.get_model('fgs_management', 'ProductRelease')
+    releases = ProductRelease.objects.filter(inventory=OuterRef('pk')).order_by().values('inventory')
+    FGSInventory.objects.update(
+        quantity_released_total=Coalesce(
+            Subquery(releases.annotate(total=Sum('quantity_released')).values('total')),
+            Value(Decimal('0')),
+            output_field=DecimalField(max_digits=12, decimal_places=2),
+        ),
+        release_count=Coalesce(Subquery(releases.annotate(count=Count('id')).values('count')), Value(0)),
+        last_release_date=Subquery(releases.annotate(latest=Max('release_date')).values('latest')),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fgs_management', '0004_release_stock_constraints'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='fgsinventory',
+            name='last_release_date',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='fgsinventory',
+            name='quantity_released_total',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=12),
+        ),
+        migrations.AddField(
+            model_name='fgsinventory',
+            name='release_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_release_totals, migrations.RunPython.noop),
+    ]
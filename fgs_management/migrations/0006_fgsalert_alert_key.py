@@ -0,0 +1,23 @@
+# Generated by Django 4.2.7 on 2026-10-19 08:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fgs_management', '0005_fgsinventory_release_totals'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='fgsalert',
+            name='alert_key',
+            field=models.CharField(blank=True, max_length=100, null=True, unique=True),
+        ),
+        migrations.AddField(
+            model_name='fgsalert',
+            name='last_seen_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
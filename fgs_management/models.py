@@ -21,6 +21,11 @@ class FGSInventory(models.Model):
     batch_number = models.CharField(max_length=50)
     quantity_available = models.DecimalField(max_digits=10, decimal_places=2)
     
+    # Release totals, maintained by ReleaseService (rebuild with `manage.py rebuild_fgs_release_totals`)
+    quantity_released_total = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    release_count = models.PositiveIntegerField(default=0)
+    last_release_date = models.DateTimeField(null=True, blank=True)
+    
     # Quality details
     release_certificate_number = models.CharField(max_length=50, blank=True)
     qa_approved_by = models.ForeignKey(
@@ -55,15 +60,19 @@ class FGSInventory(models.Model):
     
     @property
     def quantity_released(self):
-        """Calculate total quantity released/sold"""
-        return self.releases.aggregate(
-            total=models.Sum('quantity_released')
-        )['total'] or 0
+        """Total quantity released/sold"""
+        return self.quantity_released_total
     
     class Meta:
         ordering = ['-created_at']
         verbose_name = 'FGS Inventory'
         verbose_name_plural = 'FGS Inventory'
+        constraints = [
+            models.CheckConstraint(
+                check=models.Q(quantity_available__gte=0),
+                name='fgs_inventory_quantity_non_negative',
+            ),
+        ]
 
 class ProductRelease(models.Model):
     """Track product releases/sales from FGS"""
@@ -107,28 +116,71 @@ class ProductRelease(models.Model):
     
     def save(self, *args, **kwargs):
         from decimal import Decimal
+        from django.db import transaction
+        from .services import ReleaseService
         
         # Calculate total value if unit price is provided
         if self.unit_price:
             self.total_value = self.quantity_released * self.unit_price
         
-        # Update inventory available quantity
-        if self.pk:
-            # If updating existing release, revert old quantity first
-            old_release = ProductRelease.objects.get(pk=self.pk)
-            self.inventory.quantity_available += old_release.quantity_released
-        
-        # Subtract new quantity - ensure both are Decimal
-        self.inventory.quantity_available -= Decimal(str(self.quantity_released))
-        self.inventory.save()
+        with transaction.atomic():
+            # Only the change in quantity touches stock; the update is conditional so
+            # an edit can't push the inventory below zero. The stored row is locked so
+            # two concurrent edits of the same release apply their deltas one at a time.
+            previous_inventory_id, previous = self.inventory_id, Decimal('0')
+            if self.pk:
+                stored = ProductRelease.objects.select_for_update().filter(pk=self.pk).values_list(
+                    'inventory_id', 'quantity_released'
+                ).first()
+                if stored:
+                    previous_inventory_id, previous = stored
+            quantity = Decimal(str(self.quantity_released))
+            
+            if previous_inventory_id != self.inventory_id:
+                # Moved to another batch: the old one gets its stock back, the new one
+                # gives the full quantity. Rows are touched in id order to avoid deadlocks.
+                moves = sorted([(previous_inventory_id, -previous), (self.inventory_id, quantity)])
+                for inventory_id, change in moves:
+                    ReleaseService.adjust_stock(inventory_id, change, new_release=False)
+                super().save(*args, **kwargs)
+                ReleaseService.rebuild_release_totals(
+                    FGSInventory.objects.filter(pk__in=[previous_inventory_id, self.inventory_id])
+                )
+                return
+            
+            delta = quantity - previous
+            if delta:
+                ReleaseService.adjust_stock(self.inventory_id, delta, new_release=self.pk is None)
+            
+            super().save(*args, **kwargs)
+    
+    def delete(self, *args, **kwargs):
+        from django.db import transaction
+        from .services import ReleaseService
         
-        super().save(*args, **kwargs)
+        with transaction.atomic():
+            # The stored row, not this instance, says how much stock to give back
+            stored = ProductRelease.objects.select_for_update().filter(pk=self.pk).values_list(
+                'inventory_id', 'quantity_released'
+            ).first()
+            result = super().delete(*args, **kwargs)
+            if stored:
+                inventory_id, quantity = stored
+                ReleaseService.adjust_stock(inventory_id, -quantity, new_release=False)
+                ReleaseService.rebuild_release_totals(FGSInventory.objects.filter(pk=inventory_id))
+        return result
     
     def __str__(self):
         return f"{self.release_reference} - {self.inventory.batch_number} ({self.quantity_released} units)"
     
     class Meta:
         ordering = ['-release_date']
+        constraints = [
+            models.CheckConstraint(
+                check=models.Q(quantity_released__gt=0),
+                name='product_release_quantity_positive',
+            ),
+        ]
 
 class FGSAlert(models.Model):
     """Alerts for FGS management"""
@@ -157,6 +209,10 @@ class FGSAlert(models.Model):
     title = models.CharField(max_length=200)
     message = models.TextField()
     is_resolved = models.BooleanField(default=False)
+    
+    # Set on alerts raised by scheduled jobs so each run updates its own alert in place
+    alert_key = models.CharField(max_length=100, unique=True, null=True, blank=True)
+    last_seen_at = models.DateTimeField(null=True, blank=True)
     resolved_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
     resolved_at = models.DateTimeField(null=True, blank=True)
     
@@ -0,0 +1,178 @@
+from collections import OrderedDict
+from decimal import Decimal, InvalidOperation
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import Case, Count, DecimalField, F, Max, OuterRef, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from kampala_pharma.events import get_event_logger
+from .analytics import invalidate_release_trends
+from .models import FGSInventory, ProductRelease
+
+events = get_event_logger('fgs')
+
+
+class InsufficientStock(ValidationError):
+    """Raised when a release would take an inventory row below zero"""
+
+    def __init__(self, inventory_id, requested):
+        self.inventory_id = inventory_id
+        self.requested = requested
+        super().__init__(
+            f'Release quantity {requested} exceeds the quantity available for inventory {inventory_id}.',
+            code='insufficient_stock',
+        )
+
+
+def to_quantity(value):
+    """Parse a form/JSON quantity into a positive two-place Decimal"""
+    try:
+        quantity = Decimal(str(value)).quantize(Decimal('0.01'))
+    except (InvalidOperation, TypeError, ValueError):
+        raise ValidationError(f'Invalid quantity: {value!r}', code='invalid_quantity')
+    if not quantity.is_finite():
+        raise ValidationError(f'Invalid quantity: {value!r}', code='invalid_quantity')
+    if quantity <= 0:
+        raise ValidationError('Release quantity must be greater than zero.', code='invalid_quantity')
+    return quantity
+
+
+def to_inventory_id(value):
+    """Parse a form/JSON inventory id"""
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise ValidationError('inventory_id must be an id', code='invalid_inventory')
+
+
+def to_price(value):
+    """Parse an optional unit price; blank means no price"""
+    if value in (None, ''):
+        return None
+    try:
+        price = Decimal(str(value))
+    except (InvalidOperation, TypeError, ValueError):
+        raise ValidationError(f'Invalid unit price: {value!r}', code='invalid_price')
+    if not price.is_finite():
+        raise ValidationError(f'Invalid unit price: {value!r}', code='invalid_price')
+    return price
+
+
+class ReleaseService:
+    """Releases finished goods from FGS without read-modify-write races on stock levels"""
+
+    @classmethod
+    def adjust_stock(cls, inventory_id, quantity, new_release=True):
+        """
+        Take `quantity` from an inventory row (a negative quantity puts stock back) in a
+        single conditional UPDATE. The WHERE clause refuses to go below zero, so two
+        concurrent releases can never oversell the same batch. The denormalized release
+        totals move in the same statement; `new_release` also bumps the release count
+        and last release date.
+        """
+        now = timezone.now()
+        if quantity > 0:
+            # Rows whose last units are taken become 'released' in the same statement
+            status = Case(
+                When(quantity_available=quantity, then=Value('released')),
+                default=F('status'),
+            )
+        else:
+            status = Case(
+                When(status='released', then=Value('available')),
+                default=F('status'),
+            )
+
+        updated = FGSInventory.objects.filter(
+            pk=inventory_id,
+            quantity_available__gte=quantity,
+        ).update(
+            quantity_available=F('quantity_available') - quantity,
+            quantity_released_total=F('quantity_released_total') + quantity,
+            status=status,
+            updated_at=now,
+            **({'release_count': F('release_count') + 1, 'last_release_date': now} if new_release else {}),
+        )
+        if not updated:
+            # Only a failed update pays for telling a missing row from a short one
+            if not FGSInventory.objects.filter(pk=inventory_id).exists():
+                raise ValidationError(f'inventory {inventory_id} not found', code='not_found')
+            raise InsufficientStock(inventory_id, quantity)
+        transaction.on_commit(invalidate_release_trends)
+
+    @classmethod
+    def release(cls, lines, release_reference, user, release_type='sale', customer_name='',
+                customer_contact='', delivery_address='', notes=''):
+        """
+        Release one or more inventory lines under a single reference (invoice/DO).
+
+        `lines` is an iterable of dicts with `inventory_id`, `quantity` and an optional
+        `unit_price`. Stock is decremented with one conditional UPDATE per line and the
+        release rows are inserted together; if any line would oversell, nothing is released.
+        """
+        merged = OrderedDict()
+        for line in lines:
+            inventory_id = to_inventory_id(line.get('inventory_id'))
+            quantity = to_quantity(line['quantity'])
+            unit_price = to_price(line.get('unit_price'))
+            if inventory_id in merged:
+                merged[inventory_id]['quantity'] += quantity
+            else:
+                merged[inventory_id] = {'quantity': quantity, 'unit_price': unit_price}
+
+        if not merged:
+            raise ValidationError('A release needs at least one line.', code='no_lines')
+
+        releases = []
+        with transaction.atomic():
+            # Lock rows in a stable order so concurrent multi-line releases cannot deadlock
+            for inventory_id in sorted(merged):
+                cls.adjust_stock(inventory_id, merged[inventory_id]['quantity'])
+
+            for inventory_id, line in merged.items():
+                unit_price = line['unit_price']
+                releases.append(ProductRelease(
+                    inventory_id=inventory_id,
+                    release_type=release_type,
+                    quantity_released=line['quantity'],
+                    release_reference=release_reference,
+                    customer_name=customer_name,
+                    customer_contact=customer_contact,
+                    delivery_address=delivery_address,
+                    unit_price=unit_price,
+                    total_value=line['quantity'] * unit_price if unit_price else None,
+                    authorized_by=user,
+                    created_by=user,
+                    notes=notes,
+                ))
+            ProductRelease.objects.bulk_create(releases)
+
+        events.info('release_created', reference=release_reference, lines=len(releases),
+                    quantity=sum(line['quantity'] for line in merged.values()), user=user)
+        return releases
+
+    @classmethod
+    def rebuild_release_totals(cls, inventory=None):
+        """Recompute release totals from ProductRelease rows in one UPDATE; returns rows updated"""
+        releases = ProductRelease.objects.filter(inventory=OuterRef('pk')).order_by().values('inventory')
+        inventory = FGSInventory.objects.all() if inventory is None else inventory
+        transaction.on_commit(invalidate_release_trends)
+        return inventory.update(
+            quantity_released_total=Coalesce(
+                Subquery(releases.annotate(total=Sum('quantity_released')).values('total')),
+                Value(Decimal('0')),
+                output_field=DecimalField(max_digits=12, decimal_places=2),
+            ),
+            release_count=Coalesce(Subquery(releases.annotate(count=Count('id')).values('count')), Value(0)),
+            last_release_date=Subquery(releases.annotate(latest=Max('release_date')).values('latest')),
+        )
+
+    @classmethod
+    def release_one(cls, inventory_id, quantity, release_reference, user, unit_price=None, **details):
+        """Single-batch release; returns the created ProductRelease"""
+        return cls.release(
+            [{'inventory_id': inventory_id, 'quantity': quantity, 'unit_price': unit_price}],
+            release_reference, user, **details
+        )[0]
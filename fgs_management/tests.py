@@ -1,3 +1,172 @@
-from django.test import TestCase
+from datetime import timedelta
+from decimal import Decimal
 
-# Create your tests here.
+import pytest
+from django.core.exceptions import ValidationError
+from django.utils import timezone
+
+from fgs_management.ageing import scan_expiry_risk
+from fgs_management.models import FGSAlert, FGSInventory, ProductRelease
+from fgs_management.services import InsufficientStock, ReleaseService
+
+
+@pytest.fixture
+def inventory(plant):
+    """Two FGS rows with stock, reloaded from the database"""
+    return list(FGSInventory.objects.filter(quantity_available__gt=100).order_by('pk')[:2])
+
+
+def reload(row):
+    return FGSInventory.objects.get(pk=row.pk)
+
+
+def test_release_one_takes_stock(plant, inventory):
+    row = inventory[0]
+    release = ReleaseService.release_one(row.pk, '10', 'INV-1', plant.users['finished_goods_store'], unit_price='2.5')
+
+    assert reload(row).quantity_available == row.quantity_available - 10
+    assert release.total_value == Decimal('25.00')
+
+
+def test_release_refuses_to_oversell_and_releases_nothing(plant, inventory):
+    first, second = inventory
+    with pytest.raises(InsufficientStock):
+        ReleaseService.release([
+            {'inventory_id': first.pk, 'quantity': '1'},
+            {'inventory_id': second.pk, 'quantity': second.quantity_available + 1},
+        ], 'INV-2', plant.users['finished_goods_store'])
+
+    assert reload(first).quantity_available == first.quantity_available
+    assert not ProductRelease.objects.filter(release_reference='INV-2').exists()
+
+
+def test_release_merges_lines_for_the_same_batch(plant, inventory):
+    row = inventory[0]
+    releases = ReleaseService.release([
+        {'inventory_id': row.pk, 'quantity': '3'},
+        {'inventory_id': row.pk, 'quantity': '4'},
+    ], 'INV-3', plant.users['finished_goods_store'])
+
+    assert [release.quantity_released for release in releases] == [Decimal('7.00')]
+    assert reload(row).quantity_available == row.quantity_available - 7
+
+
+@pytest.mark.parametrize('quantity', ['0', '-5', 'abc'])
+def test_release_rejects_bad_quantities(plant, inventory, quantity):
+    with pytest.raises(ValidationError):
+        ReleaseService.release_one(inventory[0].pk, quantity, 'INV-4', plant.users['finished_goods_store'])
+
+
+def test_selling_the_last_units_marks_the_batch_released(plant, inventory):
+    row = inventory[0]
+    ReleaseService.release_one(row.pk, row.quantity_available, 'INV-5', plant.users['finished_goods_store'])
+
+    after = reload(row)
+    assert after.quantity_available == 0
+    assert after.status == 'released'
+
+
+def test_editing_a_release_moves_only_the_difference(plant, inventory):
+    row = inventory[0]
+    release = ReleaseService.release_one(row.pk, '10', 'INV-6', plant.users['finished_goods_store'])
+
+    release.quantity_released = Decimal('25')
+    release.save()
+    assert reload(row).quantity_available == row.quantity_available - 25
+
+
+def test_release_updates_the_release_totals(plant, inventory):
+    row = inventory[0]
+    release = ReleaseService.release_one(row.pk, '10', 'INV-9', plant.users['finished_goods_store'])
+    release.quantity_released = Decimal('12')
+    release.save()
+
+    after = reload(row)
+    assert after.quantity_released_total == row.quantity_released_total + 12
+    assert after.release_count == row.release_count + 1
+    assert after.last_release_date is not None
+
+
+def test_rebuild_release_totals_matches_the_releases(plant, inventory):
+    FGSInventory.objects.update(quantity_released_total=0, release_count=0, last_release_date=None)
+    ReleaseService.rebuild_release_totals()
+
+    for row in FGSInventory.objects.all():
+        releases = ProductRelease.objects.filter(inventory=row)
+        assert row.release_count == releases.count()
+        assert row.quantity_released_total == sum((release.quantity_released for release in releases), Decimal('0'))
+
+
+def test_moving_a_release_to_another_batch_moves_the_stock(plant, inventory):
+    first, second = inventory
+    release = ReleaseService.release_one(first.pk, '10', 'INV-7', plant.users['finished_goods_store'])
+
+    release.inventory = second
+    release.save()
+
+    assert reload(first).quantity_available == first.quantity_available
+    assert reload(first).release_count == first.release_count
+    assert reload(second).quantity_available == second.quantity_available - 10
+    assert reload(second).quantity_released_total == second.quantity_released_total + 10
+
+
+def test_deleting_a_release_gives_the_stock_back(plant, inventory):
+    row = inventory[0]
+    release = ReleaseService.release_one(row.pk, row.quantity_available, 'INV-8', plant.users['finished_goods_store'])
+
+    release.delete()
+    after = reload(row)
+    assert after.quantity_available == row.quantity_available
+    assert after.quantity_released_total == row.quantity_released_total
+    assert after.release_count == row.release_count
+    assert after.status == 'available'
+
+
+@pytest.mark.parametrize('quantity, unit_price', [('NaN', None), ('Infinity', None), ('1', 'NaN')])
+def test_release_rejects_non_finite_numbers(plant, inventory, quantity, unit_price):
+    with pytest.raises(ValidationError):
+        ReleaseService.release_one(
+            inventory[0].pk, quantity, 'INV-10', plant.users['finished_goods_store'], unit_price=unit_price,
+        )
+
+
+@pytest.mark.parametrize('inventory_id', ['abc', None, ''])
+def test_release_rejects_a_bad_inventory_id(plant, inventory_id):
+    with pytest.raises(ValidationError, match='inventory_id must be an id'):
+        ReleaseService.release_one(inventory_id, '1', 'INV-11', plant.users['finished_goods_store'])
+
+
+def test_release_reports_a_missing_inventory_row(plant):
+    missing = (FGSInventory.objects.order_by('-pk').values_list('pk', flat=True).first() or 0) + 1
+    with pytest.raises(ValidationError) as error:
+        ReleaseService.release_one(missing, '1', 'INV-12', plant.users['finished_goods_store'])
+
+    assert not isinstance(error.value, InsufficientStock)
+    assert error.value.messages == [f'inventory {missing} not found']
+
+
+def expire_in(row, days):
+    row.bmr.expiry_date = timezone.localdate() + timedelta(days=days)
+    row.bmr.save(update_fields=['expiry_date'])
+
+
+def test_expiry_scan_reopens_alerts_it_resolved_but_not_a_users(plant, inventory):
+    first, second = inventory
+    expire_in(first, 5)
+    expire_in(second, 5)
+    scan_expiry_risk()
+    alerts = {alert.inventory_id: alert for alert in FGSAlert.objects.filter(inventory__in=inventory)}
+    assert set(alerts) == {first.pk, second.pk}
+    FGSAlert.objects.filter(pk=alerts[second.pk].pk).update(
+        is_resolved=True, resolved_at=timezone.now(), resolved_by=plant.users['finished_goods_store'],
+    )
+
+    expire_in(first, 1000)
+    scan_expiry_risk()
+    assert FGSAlert.objects.get(pk=alerts[first.pk].pk).is_resolved
+
+    expire_in(first, 5)
+    scan_expiry_risk()
+    reopened = FGSAlert.objects.get(pk=alerts[first.pk].pk)
+    assert (reopened.is_resolved, reopened.resolved_at) == (False, None)
+    assert FGSAlert.objects.get(pk=alerts[second.pk].pk).is_resolved
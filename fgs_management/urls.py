@@ -13,4 +13,7 @@ urlpatterns = [
     # New release functionality
     path('create-inventory/<int:phase_id>/', views.create_inventory_from_fgs, name='create_inventory'),
     path('quick-release/<int:inventory_id>/', views.quick_release, name='quick_release'),
+    path('releases/new/', views.multi_release, name='multi_release'),
+    path('api/release-trend/', views.release_trend_api, name='release_trend_api'),
+    path('api/fefo/', views.fefo_suggestions_api, name='fefo_suggestions_api'),
 ]
@@ -1,11 +1,16 @@
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
+from django.core.exceptions import ValidationError
 from django.db.models import Sum, Q, Count
 from django.utils import timezone
 from django.http import JsonResponse
+from kampala_pharma.replica import replica_view
 from datetime import datetime, timedelta
 from .models import FGSInventory, ProductRelease, FGSAlert
+from .ageing import fefo_picks
+from .analytics import TREND_PERIODS, default_start, release_trend
+from .services import ReleaseService, to_quantity
 from bmr.models import BMR
 from products.models import Product
 from workflow.models import BatchPhaseExecution
@@ -40,21 +45,10 @@ def fgs_dashboard(request):
     active_alerts = FGSAlert.objects.filter(is_resolved=False).order_by('-priority', '-created_at')[:10]
     
     # Monthly release trends (last 6 months)
-    monthly_releases = []
-    for i in range(6):
-        month_start = (timezone.now() - timedelta(days=30*i)).replace(day=1)
-        month_end = (month_start + timedelta(days=32)).replace(day=1) - timedelta(days=1)
-        
-        count = ProductRelease.objects.filter(
-            release_date__range=[month_start, month_end]
-        ).aggregate(total=Sum('quantity_released'))['total'] or 0
-        
-        monthly_releases.append({
-            'month': month_start.strftime('%b %Y'),
-            'quantity': float(count)
-        })
-    
-    monthly_releases.reverse()
+    monthly_releases = [
+        {'month': bucket['label'], 'quantity': bucket['quantity']}
+        for bucket in release_trend('month', start=default_start(timezone.localdate(), 'month', 6))
+    ]
     
     context = {
         'total_inventory': total_inventory,
@@ -77,7 +71,9 @@ def inventory_list(request):
     product_filter = request.GET.get('product', '')
     
     # Base queryset
-    inventory = FGSInventory.objects.select_related('product', 'bmr').order_by('-created_at')
+    # Release totals are denormalized on the row and the unit comes from bmr/product,
+    # so the list renders without per-row queries
+    inventory = FGSInventory.objects.select_related('product', 'bmr__product').order_by('-created_at')
     
     # Apply filters
     if status_filter:
@@ -114,7 +110,7 @@ def release_list(request):
     
     # Base queryset
     releases = ProductRelease.objects.select_related(
-        'inventory__product', 'inventory__bmr', 'authorized_by'
+        'inventory__product', 'inventory__bmr__product', 'authorized_by'
     ).order_by('-release_date')
     
     # Apply filters
@@ -166,38 +162,28 @@ def create_release(request, inventory_id):
     inventory = get_object_or_404(FGSInventory, id=inventory_id)
     
     if request.method == 'POST':
-        # Get form data
-        release_type = request.POST.get('release_type')
-        quantity_released = float(request.POST.get('quantity_released'))
         release_reference = request.POST.get('release_reference')
-        customer_name = request.POST.get('customer_name', '')
-        customer_contact = request.POST.get('customer_contact', '')
-        delivery_address = request.POST.get('delivery_address', '')
-        unit_price = request.POST.get('unit_price')
-        notes = request.POST.get('notes', '')
         
-        # Validate quantity
-        if quantity_released > inventory.quantity_available:
-            messages.error(request, 'Release quantity cannot exceed available quantity.')
-            return redirect('fgs_inventory_detail', inventory_id=inventory.id)
-        
-        # Create release
-        release = ProductRelease.objects.create(
-            inventory=inventory,
-            release_type=release_type,
-            quantity_released=quantity_released,
-            release_reference=release_reference,
-            customer_name=customer_name,
-            customer_contact=customer_contact,
-            delivery_address=delivery_address,
-            unit_price=float(unit_price) if unit_price else None,
-            authorized_by=request.user,
-            created_by=request.user,
-            notes=notes
-        )
+        # Stock is checked and decremented atomically by the release service
+        try:
+            ReleaseService.release_one(
+                inventory.id,
+                request.POST.get('quantity_released'),
+                release_reference,
+                request.user,
+                unit_price=request.POST.get('unit_price'),
+                release_type=request.POST.get('release_type') or 'sale',
+                customer_name=request.POST.get('customer_name', ''),
+                customer_contact=request.POST.get('customer_contact', ''),
+                delivery_address=request.POST.get('delivery_address', ''),
+                notes=request.POST.get('notes', ''),
+            )
+        except ValidationError as e:
+            messages.error(request, ' '.join(e.messages))
+            return redirect('fgs_management:create_release', inventory_id=inventory.id)
         
         messages.success(request, f'Product release {release_reference} created successfully.')
-        return redirect('fgs_release_list')
+        return redirect('fgs_management:release_list')
     
     context = {
         'inventory': inventory,
@@ -252,49 +238,43 @@ def create_inventory_from_fgs(request, phase_id):
 @login_required
 def quick_release(request, inventory_id):
     """Quick release form for products"""
-    from decimal import Decimal
     
     inventory = get_object_or_404(FGSInventory, id=inventory_id)
     
     if request.method == 'POST':
-        # Get form data
-        release_type = request.POST.get('release_type', 'sale')
-        quantity_released = Decimal(request.POST.get('quantity_released'))
         release_reference = request.POST.get('release_reference')
-        customer_name = request.POST.get('customer_name', '')
-        customer_contact = request.POST.get('customer_contact', '')
-        unit_price = request.POST.get('unit_price')
-        notes = request.POST.get('notes', '')
         
-        # Validate quantity
-        if quantity_released > inventory.quantity_available:
-            messages.error(request, 'Release quantity cannot exceed available quantity.')
+        # Stock is checked and decremented atomically by the release service; the
+        # inventory is marked released in the same update when it reaches zero
+        try:
+            release = ReleaseService.release_one(
+                inventory.id,
+                request.POST.get('quantity_released'),
+                release_reference,
+                request.user,
+                unit_price=request.POST.get('unit_price'),
+                release_type=request.POST.get('release_type', 'sale'),
+                customer_name=request.POST.get('customer_name', ''),
+                customer_contact=request.POST.get('customer_contact', ''),
+                notes=request.POST.get('notes', ''),
+            )
+        except ValidationError as e:
+            messages.error(request, ' '.join(e.messages))
             return redirect('dashboards:finished_goods_dashboard')
-        
-        # Create release
-        release = ProductRelease.objects.create(
-            inventory=inventory,
-            release_type=release_type,
-            quantity_released=quantity_released,
-            release_reference=release_reference,
-            customer_name=customer_name,
-            customer_contact=customer_contact,
-            unit_price=Decimal(unit_price) if unit_price else None,
-            authorized_by=request.user,
-            created_by=request.user,
-            notes=notes
-        )
-        
-        # Update inventory status if fully released
-        if inventory.quantity_available == 0:
-            inventory.status = 'released'
-            inventory.save()
+        quantity_released = release.quantity_released
         
         messages.success(request, f'Release {release_reference} created successfully. {quantity_released} {inventory.unit_of_measure} released.')
         return redirect('dashboards:finished_goods_dashboard')
     
+    # Batches of the same product that should go out before this one (FEFO). A batch
+    # FEFO doesn't list (expired, released or out of stock) gets no hint.
+    picks = fefo_picks(inventory.product_id)
+    position = next((index for index, pick in enumerate(picks) if pick['inventory_id'] == inventory.id), None)
+    earlier_batches = picks[:position] if position is not None else []
+    
     context = {
         'inventory': inventory,
+        'earlier_batches': earlier_batches,
         'release_type_choices': ProductRelease.RELEASE_TYPE_CHOICES,
     }
     
@@ -302,6 +282,59 @@ def quick_release(request, inventory_id):
 
 
 @login_required
+def multi_release(request):
+    """Release several batches under one invoice/DO reference"""
+    
+    if request.method == 'POST':
+        release_reference = request.POST.get('release_reference')
+        lines = [
+            {'inventory_id': inventory_id, 'quantity': quantity, 'unit_price': unit_price}
+            for inventory_id, quantity, unit_price in zip(
+                request.POST.getlist('inventory_id'),
+                request.POST.getlist('quantity'),
+                request.POST.getlist('unit_price'),
+            )
+            if quantity
+        ]
+        
+        try:
+            releases = ReleaseService.release(
+                lines,
+                release_reference,
+                request.user,
+                release_type=request.POST.get('release_type', 'sale'),
+                customer_name=request.POST.get('customer_name', ''),
+                customer_contact=request.POST.get('customer_contact', ''),
+                delivery_address=request.POST.get('delivery_address', ''),
+                notes=request.POST.get('notes', ''),
+            )
+        except ValidationError as e:
+            messages.error(request, ' '.join(e.messages))
+            return redirect('fgs_management:multi_release')
+        
+        messages.success(request, f'Release {release_reference} created with {len(releases)} batch line(s).')
+        return redirect('fgs_management:release_list')
+    
+    product_filter = request.GET.get('product', '')
+    inventory = FGSInventory.objects.filter(
+        status__in=['stored', 'available'],
+        quantity_available__gt=0
+    ).select_related('product').order_by('product__product_name', 'created_at')
+    if product_filter:
+        inventory = inventory.filter(product__id=product_filter)
+    
+    context = {
+        'inventory_items': inventory,
+        'products': Product.objects.all().order_by('product_name'),
+        'product_filter': product_filter,
+        'release_type_choices': ProductRelease.RELEASE_TYPE_CHOICES,
+    }
+    
+    return render(request, 'fgs_management/multi_release.html', context)
+
+
+@login_required
+@replica_view
 def inventory_analytics(request):
     """Analytics dashboard for FGS inventory data"""
     
@@ -325,15 +358,10 @@ def inventory_analytics(request):
     ).order_by('-total_quantity')[:10]
     
     # Monthly release trends (last 6 months)
-    six_months_ago = timezone.now() - timedelta(days=180)
-    monthly_releases = ProductRelease.objects.filter(
-        release_date__gte=six_months_ago
-    ).extra(
-        select={'month': "strftime('%%Y-%%m', release_date)"}
-    ).values('month').annotate(
-        total_released=Sum('quantity_released'),
-        release_count=Count('id')
-    ).order_by('month')
+    monthly_releases = [
+        {'month': bucket['period'][:7], 'total_released': bucket['quantity'], 'release_count': bucket['releases']}
+        for bucket in release_trend('month', start=default_start(timezone.localdate(), 'month', 6))
+    ]
     
     context = {
         'total_inventory_items': total_inventory_items,
@@ -344,3 +372,75 @@ def inventory_analytics(request):
     }
     
     return render(request, 'fgs_management/analytics.html', context)
+
+
+@login_required
+@replica_view
+def release_trend_api(request):
+    """Release quantity/count/value series by day, week or month for the trend charts"""
+    period = request.GET.get('period', 'month')
+    if period not in TREND_PERIODS:
+        return JsonResponse({'error': f"period must be one of: {', '.join(TREND_PERIODS)}"}, status=400)
+    
+    try:
+        start = datetime.strptime(request.GET['start'], '%Y-%m-%d').date() if request.GET.get('start') else None
+        end = datetime.strptime(request.GET['end'], '%Y-%m-%d').date() if request.GET.get('end') else None
+    except ValueError:
+        return JsonResponse({'error': 'start and end must be YYYY-MM-DD dates'}, status=400)
+    
+    try:
+        product_id = int(request.GET['product']) if request.GET.get('product') else None
+    except ValueError:
+        return JsonResponse({'error': 'product must be a product id'}, status=400)
+    
+    series = release_trend(
+        period,
+        start=start,
+        end=end,
+        product_id=product_id,
+        release_type=request.GET.get('release_type') or None,
+    )
+    return JsonResponse({
+        'period': period,
+        'start': series[0]['period'] if series else None,
+        'end': series[-1]['period'] if series else None,
+        'series': series,
+    })
+
+
+@login_required
+def fefo_suggestions_api(request):
+    """First-expiry-first-out pick suggestions for a product, optionally covering a quantity"""
+    try:
+        product_id = int(request.GET['product']) if request.GET.get('product') else None
+        inventory_id = int(request.GET['inventory']) if request.GET.get('inventory') else None
+    except ValueError:
+        return JsonResponse({'error': 'product and inventory must be ids'}, status=400)
+    if not product_id and inventory_id:
+        product_id = FGSInventory.objects.filter(id=inventory_id).values_list('product_id', flat=True).first()
+    if not product_id:
+        return JsonResponse({'error': 'product or inventory is required'}, status=400)
+    
+    quantity = None
+    if request.GET.get('quantity'):
+        try:
+            quantity = to_quantity(request.GET['quantity'])
+        except ValidationError as e:
+            return JsonResponse({'error': ' '.join(e.messages)}, status=400)
+    
+    picks = fefo_picks(product_id, quantity=quantity)
+    covered = sum(pick.get('pick_quantity', 0) for pick in picks)
+    return JsonResponse({
+        'product': int(product_id),
+        'quantity': float(quantity) if quantity is not None else None,
+        'shortfall': float(max(quantity - covered, 0)) if quantity is not None else None,
+        'picks': [
+            dict(
+                pick,
+                quantity_available=float(pick['quantity_available']),
+                expiry_date=pick['expiry_date'].isoformat() if pick['expiry_date'] else None,
+                **({'pick_quantity': float(pick['pick_quantity'])} if 'pick_quantity' in pick else {}),
+            )
+            for pick in picks
+        ],
+    })
@@ -0,0 +1,137 @@
+"""
+Structured, level-gated event logging for workflow transitions and dispensing.
+
+Each subsystem gets its own logger under ``kampala_pharma.events`` so levels can be
+tuned per subsystem in settings.LOGGING. Events are only formatted
+when a handler actually emits them, so a disabled subsystem costs one
+``isEnabledFor`` check per event. Recent events are kept in an in-memory ring
+buffer that the admin can display.
+"""
+import logging
+import threading
+import time
+from collections import deque
+
+EVENT_LOGGER_PREFIX = 'kampala_pharma.events'
+SUBSYSTEMS = ['workflow', 'qc', 'dispensing', 'bmr', 'fgs']
+
+
+class EventFields:
+    """Formats event fields as key=value pairs, only when the record is rendered"""
+
+    __slots__ = ('fields',)
+
+    def __init__(self, fields):
+        self.fields = fields
+
+    def __str__(self):
+        return ' '.join(f'{key}={value}' for key, value in self.fields.items())
+
+
+class EventLogger:
+    """Emits named events with keyword fields for one subsystem"""
+
+    def __init__(self, subsystem):
+        self.subsystem = subsystem
+        self.logger = logging.getLogger(f'{EVENT_LOGGER_PREFIX}.{subsystem}')
+
+    def enabled(self, level=logging.INFO):
+        return self.logger.isEnabledFor(level)
+
+    def log(self, level, event, **fields):
+        if not self.logger.isEnabledFor(level):
+            return
+        self.logger.log(
+            level, '%s %s', event, EventFields(fields),
+            extra={'event': event, 'subsystem': self.subsystem, 'fields': fields},
+            stacklevel=3,
+        )
+
+    def debug(self, event, **fields):
+        self.log(logging.DEBUG, event, **fields)
+
+    def info(self, event, **fields):
+        self.log(logging.INFO, event, **fields)
+
+    def warning(self, event, **fields):
+        self.log(logging.WARNING, event, **fields)
+
+    def error(self, event, **fields):
+        self.log(logging.ERROR, event, **fields)
+
+
+_event_loggers = {}
+
+
+def get_event_logger(subsystem):
+    """Return the shared EventLogger for a subsystem"""
+    event_logger = _event_loggers.get(subsystem)
+    if event_logger is None:
+        event_logger = _event_loggers.setdefault(subsystem, EventLogger(subsystem))
+    return event_logger
+
+
+def _plain(value):
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    if isinstance(value, (list, tuple, set)):
+        return [_plain(item) for item in value]
+    return str(value)
+
+
+class RingBufferHandler(logging.Handler):
+    """Keeps the most recent events in memory for the admin event log"""
+
+    instances = []
+
+    def __init__(self, capacity=1000, level=logging.NOTSET):
+        super().__init__(level)
+        self.buffer = deque(maxlen=capacity)
+        self.buffer_lock = threading.Lock()
+        RingBufferHandler.instances.append(self)
+
+    def emit(self, record):
+        try:
+            fields = getattr(record, 'fields', None)
+            entry = {
+                'time': record.created,
+                'timestamp': time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(record.created)),
+                'level': record.levelname,
+                'subsystem': getattr(record, 'subsystem', record.name.rsplit('.', 1)[-1]),
+                'event': getattr(record, 'event', ''),
+                'fields': {key: _plain(value) for key, value in fields.items()} if fields else {},
+                'message': '' if fields is not None else record.getMessage(),
+                'source': f'{record.module}.{record.funcName}:{record.lineno}',
+            }
+            with self.buffer_lock:
+                self.buffer.append(entry)
+        except Exception:
+            self.handleError(record)
+
+    def snapshot(self):
+        with self.buffer_lock:
+            return list(self.buffer)
+
+    def clear(self):
+        with self.buffer_lock:
+            self.buffer.clear()
+
+
+def get_recent_events(limit=200, subsystem=None, min_level=None):
+    """Newest-first events from every ring buffer handler, optionally filtered"""
+    events = []
+    for handler in RingBufferHandler.instances:
+        events.extend(handler.snapshot())
+    if subsystem:
+        events = [event for event in events if event['subsystem'] == subsystem]
+    if min_level:
+        threshold = logging.getLevelName(min_level)
+        events = [event for event in events if logging.getLevelName(event['level']) >= threshold]
+    events.sort(key=lambda event: event['time'], reverse=True)
+    return events[:limit]
+
+
+def clear_recent_events():
+    for handler in RingBufferHandler.instances:
+        handler.clear()
+
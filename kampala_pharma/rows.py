@@ -0,0 +1,176 @@
+"""
+Row parsing for spreadsheet and JSON uploads, shared by the master data importer
+(products.importers) and delivery note receipts (raw_materials.receipts).
+
+`read_rows` turns a CSV or XLSX upload into (row number, {header: value}) pairs. The
+parse_* helpers read one field of a row and raise RowError, which carries the field
+name, when it is missing or invalid. A RowPlan collects the objects to write and the
+per-row errors.
+"""
+import csv
+import io
+import os
+from datetime import date, datetime
+from decimal import Decimal, InvalidOperation
+
+from django.utils import dateparse
+
+TRUE_VALUES = {'1', 'true', 'yes', 'y', 'x'}
+FALSE_VALUES = {'', '0', 'false', 'no', 'n'}
+# Rows per bulk_create/bulk_update statement when a plan is written
+BATCH_SIZE = 1000
+
+
+class RowError(Exception):
+    def __init__(self, field, message):
+        super().__init__(message)
+        self.field = field
+
+
+def _header(value):
+    return str(value or '').strip().lower().replace(' ', '_').replace('-', '_')
+
+
+def read_rows(upload, filename=None, sheet=None):
+    """
+    [(row number, {header: value})] from a CSV or XLSX file object; blank rows are skipped.
+
+    The first row holds the headers. For workbooks, `sheet` picks a worksheet by name
+    (default: the first one).
+    """
+    filename = filename or getattr(upload, 'name', '')
+    extension = os.path.splitext(filename)[1].lower()
+    if extension in ('.xlsx', '.xlsm'):
+        import openpyxl
+
+        workbook = openpyxl.load_workbook(upload, read_only=True, data_only=True)
+        try:
+            if sheet and sheet not in workbook.sheetnames:
+                raise ValueError(f"No sheet named '{sheet}' (sheets: {', '.join(workbook.sheetnames)})")
+            lines = workbook[sheet].iter_rows(values_only=True) if sheet else workbook.worksheets[0].iter_rows(values_only=True)
+            rows = list(_dict_rows(lines))
+        finally:
+            workbook.close()
+        return rows
+    if extension in ('.csv', '.txt', ''):
+        content = upload.read()
+        if isinstance(content, bytes):
+            content = content.decode('utf-8-sig')
+        return list(_dict_rows(csv.reader(io.StringIO(content))))
+    raise ValueError(f"Unsupported file type '{extension}'; upload a .csv or .xlsx file")
+
+
+def _dict_rows(lines):
+    headers = None
+    for number, values in enumerate(lines, start=1):
+        if headers is None:
+            headers = [_header(value) for value in values]
+            continue
+        values = ['' if value is None else value for value in values]
+        if all(str(value).strip() == '' for value in values):
+            continue
+        yield number, dict(zip(headers, values))
+
+
+def parse_text(row, field, required=False, max_length=None):
+    value = row.get(field)
+    if value is None:
+        value = ''
+    elif isinstance(value, float) and value.is_integer():
+        value = int(value)  # spreadsheet cells hold codes like 1001 as floats
+    value = str(value).strip()
+    if required and not value:
+        raise RowError(field, f'{field} is required')
+    if max_length and len(value) > max_length:
+        raise RowError(field, f'{field} is longer than {max_length} characters')
+    return value
+
+
+def parse_decimal(row, field, required=False, default=None, target=None):
+    """
+    A non-negative, finite Decimal. `target` is the model DecimalField it is written to:
+    the value is rounded to its decimal places and refused if it has too many digits.
+    """
+    value = row.get(field)
+    if value is None or str(value).strip() == '':
+        if required:
+            raise RowError(field, f'{field} is required')
+        return default
+    try:
+        number = Decimal(str(value).strip())
+    except InvalidOperation:
+        raise RowError(field, f"{field} '{value}' is not a number")
+    if not number.is_finite():
+        raise RowError(field, f"{field} '{value}' is not a number")
+    if number < 0:
+        raise RowError(field, f'{field} cannot be negative')
+    if target is not None:
+        limit = Decimal(10) ** (target.max_digits - target.decimal_places)
+        step = Decimal(1).scaleb(-target.decimal_places)
+        if number >= limit or number.quantize(step) >= limit:
+            raise RowError(field, f'{field} must be less than {limit}')
+        number = number.quantize(step)
+    return number
+
+
+def parse_bool(row, field, default=None):
+    value = parse_text(row, field).lower()
+    if value == '' and default is not None:
+        return default
+    if value in TRUE_VALUES:
+        return True
+    if value in FALSE_VALUES:
+        return False
+    raise RowError(field, f"{field} '{value}' is not yes/no")
+
+
+def parse_choice(row, field, choices, required=False):
+    """Accept a choice by value or by label, case-insensitively"""
+    value = parse_text(row, field, required=required)
+    if not value:
+        return ''
+    lookup = {}
+    for key, label in choices:
+        lookup[str(key).lower()] = key
+        lookup[str(label).lower()] = key
+    if value.lower() not in lookup:
+        raise RowError(field, f"{field} '{value}' is not one of {', '.join(key for key, _ in choices)}")
+    return lookup[value.lower()]
+
+
+def parse_date(row, field, required=False, default=None):
+    """A date from a date/datetime cell or a YYYY-MM-DD string"""
+    value = row.get(field)
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    value = parse_text(row, field, required=required and default is None)
+    if not value:
+        return default
+    try:
+        parsed = dateparse.parse_date(value)
+    except ValueError:
+        parsed = None
+    if parsed is None:
+        raise RowError(field, f"{field} '{value}' is not a date (YYYY-MM-DD)")
+    return parsed
+
+
+def check_duplicate(seen, key, number, field):
+    if key in seen:
+        raise RowError(field, f'duplicate of row {seen[key]}')
+    seen[key] = number
+
+
+class RowPlan:
+    """Objects to create and update, plus the errors, for one import"""
+
+    def __init__(self, model):
+        self.model = model
+        self.create = []
+        self.update = []
+        self.errors = []
+
+    def fail(self, number, error):
+        self.errors.append({'row': number, 'field': getattr(error, 'field', None), 'message': str(error)})
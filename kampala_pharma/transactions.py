@@ -0,0 +1,54 @@
+"""
+Commit hooks that run once per transaction.
+
+Signal handlers fire once per saved row, so a transaction that completes many phases
+(bulk transitions, rollbacks) would queue the same follow-up work many times.
+`on_commit_once(func)` queues `func` the first time it is asked for in a transaction
+and ignores the repeats.
+
+The queued callback is referenced only by the transaction's commit hooks and by a
+weak reference here. When the transaction (or the savepoint it was queued in) rolls
+back, Django drops the hook, the weak reference dies, and the next request queues a
+fresh callback, so no flag is left behind by a rollback.
+"""
+import threading
+import weakref
+
+from django.db import DEFAULT_DB_ALIAS, transaction
+
+_queued = threading.local()
+
+
+class _Once:
+    __slots__ = ('key', 'func', '__weakref__')
+
+    def __init__(self, key, func):
+        self.key = key
+        self.func = func
+
+    def __call__(self):
+        queued = _callbacks()
+        if queued.get(self.key) is not None and queued[self.key]() is self:
+            del queued[self.key]
+        self.func()
+
+
+def _callbacks():
+    if not hasattr(_queued, 'callbacks'):
+        _queued.callbacks = {}
+    return _queued.callbacks
+
+
+def on_commit_once(func, using=None):
+    """
+    Run `func` when the current transaction commits, however many times it is requested
+    within that transaction. Outside a transaction it runs at once, like on_commit.
+    """
+    key = (using or DEFAULT_DB_ALIAS, func)
+    queued = _callbacks()
+    reference = queued.get(key)
+    if reference is not None and reference() is not None:
+        return
+    callback = _Once(key, func)
+    queued[key] = weakref.ref(callback)
+    transaction.on_commit(callback, using=using)
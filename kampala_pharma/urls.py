@@ -15,7 +15,7 @@ Including another URLconf
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
 from django.contrib import admin
-from django.urls import path, include
+from django.urls import path, include, re_path
 from django.conf import settings
 from django.conf.urls.static import static
 from dashboards.views import dashboard_home
@@ -31,6 +31,9 @@ urlpatterns = [
     path('quality/defects/', include('defect_reports.urls')),
     path('raw-materials/', include('raw_materials.urls', namespace='raw_materials')),
     path('products/', include('products.urls', namespace='products')),
+    path('workflow/', include('workflow.urls', namespace='workflow')),
+    re_path(r'^api/(?P<version>v1)/', include('bmr.api_urls')),
+    re_path(r'^api/(?P<version>v1)/', include('workflow.api_urls')),
     # API URLs will be added later
     # path('api/', include('bmr.urls')),
     # path('api/', include('workflow.urls')),
@@ -0,0 +1,234 @@
+"""
+Bulk import of master data: raw materials, products and BOM lines (ProductMaterial).
+
+`read_rows` (kampala_pharma.rows) turns a CSV or XLSX upload into dicts keyed by
+normalised header names.
+`import_rows` validates every row against the rows already in the database and
+returns the per-row errors. The existing rows are loaded with one query per model.
+Unless it is a dry run and only if nothing failed, it then writes everything with
+bulk_create/bulk_update in one transaction.
+
+Bulk writes skip Model.save() and the m2m_changed handler, so the importer does what
+they would do once per import instead of once per row:
+- Product.apply_type_rules() runs on every imported product.
+- BOM units must match the material's unit, as ProductMaterial.save() requires.
+- Missing Product.raw_materials links are added with one bulk insert into the
+  through table.
+
+Rows are matched on material_code for raw materials, on product_name for products
+and on (product_name, material_code) for BOM lines; matches are updated, the rest created.
+"""
+from decimal import Decimal
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+
+from kampala_pharma.rows import (
+    BATCH_SIZE, RowError, RowPlan, check_duplicate, parse_bool, parse_choice, parse_decimal, parse_text, read_rows,
+)
+
+KINDS = ('raw_materials', 'products', 'bom')
+
+def _plan_raw_materials(rows):
+    from raw_materials.models import RawMaterial
+
+    codes = {parse_text(row, 'material_code') for _, row in rows}
+    existing = RawMaterial.objects.in_bulk([code for code in codes if code], field_name='material_code')
+    plan, seen = RowPlan(RawMaterial), {}
+    for number, row in rows:
+        try:
+            code = parse_text(row, 'material_code', required=True, max_length=50)
+            check_duplicate(seen, code, number, 'material_code')
+            material = existing.get(code) or RawMaterial(material_code=code)
+            material.material_name = parse_text(row, 'material_name', required=True, max_length=200)
+            material.category = parse_choice(row, 'category', RawMaterial.MATERIAL_CATEGORIES, required=True)
+            material.unit_of_measure = parse_text(row, 'unit_of_measure', required=True, max_length=20)
+            material.reorder_level = parse_decimal(
+                row, 'reorder_level', default=material.reorder_level or Decimal('0'),
+                target=RawMaterial._meta.get_field('reorder_level'),
+            )
+            if 'description' in row:
+                material.description = parse_text(row, 'description')
+            if 'default_supplier' in row:
+                material.default_supplier = parse_text(row, 'default_supplier', max_length=200)
+        except RowError as e:
+            plan.fail(number, e)
+            continue
+        (plan.update if material.pk else plan.create).append(material)
+    return plan
+
+
+def _plan_products(rows):
+    from .models import Product
+
+    names = {parse_text(row, 'product_name') for _, row in rows}
+    existing, ambiguous = {}, set()
+    for product in Product.objects.filter(product_name__in=[name for name in names if name]):
+        if product.product_name in existing:
+            ambiguous.add(product.product_name)
+        existing[product.product_name] = product
+
+    plan, seen = RowPlan(Product), {}
+    for number, row in rows:
+        try:
+            name = parse_text(row, 'product_name', required=True, max_length=200)
+            check_duplicate(seen, name, number, 'product_name')
+            if name in ambiguous:
+                raise RowError('product_name', f"more than one product is named '{name}'")
+            product = existing.get(name) or Product(product_name=name)
+            product.product_type = parse_choice(row, 'product_type', Product.PRODUCT_TYPE_CHOICES, required=True)
+            for field, choices in (
+                ('coating_type', Product.COATING_CHOICES),
+                ('tablet_type', Product.TABLET_TYPE_CHOICES),
+                ('capsule_type', Product.CAPSULE_TYPE_CHOICES),
+            ):
+                if field in row:
+                    setattr(product, field, parse_choice(row, field, choices))
+            if product.product_type != 'capsule' and not parse_text(row, 'capsule_type'):
+                product.capsule_type = ''  # the model default would fail clean() on a tablet
+            product.standard_batch_size = parse_decimal(
+                row, 'standard_batch_size', default=product.standard_batch_size,
+                target=Product._meta.get_field('standard_batch_size'),
+            )
+            if 'packaging_size_in_units' in row:
+                product.packaging_size_in_units = parse_decimal(
+                    row, 'packaging_size_in_units', target=Product._meta.get_field('packaging_size_in_units'),
+                )
+            product.is_active = parse_bool(row, 'is_active', default=product.is_active)
+            try:
+                product.apply_type_rules()
+            except ValidationError as e:
+                field, messages = next(iter(e.message_dict.items()))
+                raise RowError(field, messages[0])
+        except RowError as e:
+            plan.fail(number, e)
+            continue
+        (plan.update if product.pk else plan.create).append(product)
+    return plan
+
+
+def _plan_bom(rows):
+    from raw_materials.models import RawMaterial
+    from .models import Product
+    from .models_material import ProductMaterial
+
+    names = {parse_text(row, 'product_name') for _, row in rows}
+    codes = {parse_text(row, 'material_code') for _, row in rows}
+    products, ambiguous = {}, set()
+    for product in Product.objects.filter(product_name__in=[name for name in names if name]).only('id', 'product_name'):
+        if product.product_name in products:
+            ambiguous.add(product.product_name)
+        products[product.product_name] = product
+    materials = RawMaterial.objects.only('id', 'material_code', 'unit_of_measure', 'category').in_bulk(
+        [code for code in codes if code], field_name='material_code'
+    )
+    existing = {
+        (line.product_id, line.raw_material_id): line
+        for line in ProductMaterial.objects.filter(product__in=list(products.values()))
+    }
+
+    plan, seen = RowPlan(ProductMaterial), {}
+    for number, row in rows:
+        try:
+            name = parse_text(row, 'product_name', required=True)
+            code = parse_text(row, 'material_code', required=True)
+            product = products.get(name)
+            if product is None:
+                raise RowError('product_name', f"unknown product '{name}'")
+            if name in ambiguous:
+                raise RowError('product_name', f"more than one product is named '{name}'")
+            material = materials.get(code)
+            if material is None:
+                raise RowError('material_code', f"unknown material '{code}'")
+            check_duplicate(seen, (product.id, material.id), number, 'material_code')
+
+            line = existing.get((product.id, material.id)) or ProductMaterial(product=product, raw_material=material)
+            line.required_quantity = parse_decimal(
+                row, 'required_quantity', required=True, target=ProductMaterial._meta.get_field('required_quantity'),
+            )
+            unit = parse_text(row, 'unit_of_measure') or material.unit_of_measure
+            if unit != material.unit_of_measure:
+                raise RowError(
+                    'unit_of_measure',
+                    f'Unit mismatch: Cannot use {unit} for material that uses {material.unit_of_measure}',
+                )
+            line.unit_of_measure = unit
+            line.is_active_ingredient = parse_bool(
+                row, 'is_active_ingredient',
+                default=line.is_active_ingredient if line.pk else material.category == 'active',
+            )
+            if 'notes' in row:
+                line.notes = parse_text(row, 'notes') or None
+        except RowError as e:
+            plan.fail(number, e)
+            continue
+        (plan.update if line.pk else plan.create).append(line)
+    return plan
+
+
+_PLANNERS = {
+    'raw_materials': _plan_raw_materials,
+    'products': _plan_products,
+    'bom': _plan_bom,
+}
+
+_UPDATE_FIELDS = {
+    'raw_materials': [
+        'material_name', 'category', 'unit_of_measure', 'reorder_level', 'description', 'default_supplier',
+        'updated_at',
+    ],
+    'products': [
+        'product_type', 'coating_type', 'tablet_type', 'capsule_type', 'standard_batch_size', 'batch_size_unit',
+        'packaging_size_in_units', 'is_active', 'updated_at',
+    ],
+    'bom': ['required_quantity', 'unit_of_measure', 'is_active_ingredient', 'notes'],
+}
+
+
+def _link_bom_materials(lines):
+    """Add the Product.raw_materials links the BOM lines imply, in one bulk insert"""
+    from .models import Product
+
+    through = Product.raw_materials.through
+    through.objects.bulk_create(
+        [through(product_id=line.product_id, rawmaterial_id=line.raw_material_id) for line in lines],
+        batch_size=BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+
+
+def import_rows(kind, rows, dry_run=True):
+    """
+    Validate `rows` (from read_rows) as `kind` and, unless `dry_run` or any row failed,
+    write them. Returns {'kind', 'rows', 'created', 'updated', 'errors', 'written'};
+    each error is {'row', 'field', 'message'}.
+    """
+    from django.utils import timezone
+
+    if kind not in _PLANNERS:
+        raise ValueError(f"Unknown import kind '{kind}'; expected one of {', '.join(KINDS)}")
+    plan = _PLANNERS[kind](rows)
+    result = {
+        'kind': kind,
+        'rows': len(rows),
+        'created': len(plan.create),
+        'updated': len(plan.update),
+        'errors': sorted(plan.errors, key=lambda error: error['row']),
+        'written': False,
+    }
+    if dry_run or plan.errors or not (plan.create or plan.update):
+        return result
+
+    model = plan.model
+    now = timezone.now()
+    for obj in plan.update:
+        if hasattr(obj, 'updated_at'):
+            obj.updated_at = now
+    with transaction.atomic():
+        model.objects.bulk_create(plan.create, batch_size=BATCH_SIZE)
+        if plan.update:
+            model.objects.bulk_update(plan.update, _UPDATE_FIELDS[kind], batch_size=BATCH_SIZE)
+        if kind == 'bom':
+            _link_bom_materials(plan.create + plan.update)
+    result['written'] = True
+    return result
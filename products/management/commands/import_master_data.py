@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from products.importers import KINDS, import_rows, read_rows
+
+
+class Command(BaseCommand):
+    help = 'Import raw materials, products or BOM lines from a CSV or XLSX file (dry run unless --commit)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=KINDS)
+        parser.add_argument('path', help='CSV or XLSX file with a header row')
+        parser.add_argument('--sheet', help='Worksheet to read from an XLSX file (default: the first)')
+        parser.add_argument('--commit', action='store_true', help='Write the rows; without it the file is only validated')
+
+    def handle(self, *args, **options):
+        try:
+            with open(options['path'], 'rb') as upload:
+                rows = read_rows(upload, filename=options['path'], sheet=options['sheet'])
+        except (OSError, ValueError) as e:
+            raise CommandError(str(e))
+
+        result = import_rows(options['kind'], rows, dry_run=not options['commit'])
+        for error in result['errors']:
+            field = f" [{error['field']}]" if error['field'] else ''
+            self.stdout.write(self.style.ERROR(f"Row {error['row']}{field}: {error['message']}"))
+
+        summary = f"{result['rows']} rows: {result['created']} to create, {result['updated']} to update"
+        if result['errors']:
+            raise CommandError(f"{summary}; {len(result['errors'])} rows have errors, nothing was written")
+        if result['written']:
+            self.stdout.write(self.style.SUCCESS(f"{summary} - written"))
+        else:
+            self.stdout.write(self.style.WARNING(f"{summary} - dry run, use --commit to write"))
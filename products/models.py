@@ -109,7 +109,8 @@ class Product(models.Model):
             return f"{self.product_name} ({tablet_display}, {coating_status})"
         return f"{self.product_name} ({self.get_product_type_display()})"
     
-    def save(self, *args, **kwargs):
+    def apply_type_rules(self):
+        """Validate and normalise the type-specific fields; also used by bulk imports, which skip save()"""
         # Always run clean() before saving
         self.clean()
         
@@ -130,6 +131,9 @@ class Product(models.Model):
             self.batch_size_unit = 'tubes'
         else:
             self.batch_size_unit = 'units'  # Default fallback
+    
+    def save(self, *args, **kwargs):
+        self.apply_type_rules()
             
         super().save(*args, **kwargs)
         
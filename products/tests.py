@@ -0,0 +1,141 @@
+import io
+from decimal import Decimal
+
+import openpyxl
+import pytest
+from django.core.files.uploadedfile import SimpleUploadedFile
+
+from products.importers import import_rows, read_rows
+from products.models import Product
+from products.models_material import ProductMaterial
+from raw_materials.models import RawMaterial
+
+pytestmark = pytest.mark.django_db
+
+
+def rows(*lines):
+    return list(enumerate(lines, start=2))
+
+
+def errors(result):
+    return [(error['row'], error['field']) for error in result['errors']]
+
+
+def test_read_rows_from_csv_normalises_headers_and_skips_blank_rows():
+    upload = SimpleUploadedFile('materials.csv', b'\xef\xbb\xbfMaterial Code,Material-Name\nM1,Lactose\n,\nM2,Starch\n')
+
+    assert read_rows(upload) == [
+        (2, {'material_code': 'M1', 'material_name': 'Lactose'}),
+        (4, {'material_code': 'M2', 'material_name': 'Starch'}),
+    ]
+
+
+def test_read_rows_from_xlsx_picks_the_sheet():
+    workbook = openpyxl.Workbook()
+    workbook.active.title = 'Notes'
+    sheet = workbook.create_sheet('BOM')
+    sheet.append(['product_name', 'required_quantity'])
+    sheet.append(['Paracetamol', 2.5])
+    buffer = io.BytesIO()
+    workbook.save(buffer)
+    buffer.seek(0)
+
+    assert read_rows(buffer, filename='bom.xlsx', sheet='BOM') == [
+        (2, {'product_name': 'Paracetamol', 'required_quantity': 2.5}),
+    ]
+    buffer.seek(0)
+    with pytest.raises(ValueError, match='No sheet named'):
+        read_rows(buffer, filename='bom.xlsx', sheet='Missing')
+
+
+def test_read_rows_refuses_other_file_types():
+    with pytest.raises(ValueError, match='Unsupported file type'):
+        read_rows(SimpleUploadedFile('materials.pdf', b''))
+
+
+def test_raw_material_import_creates_then_updates():
+    line = {'material_code': 'M1', 'material_name': 'Lactose', 'category': 'excipient', 'unit_of_measure': 'kg'}
+
+    result = import_rows('raw_materials', rows(line), dry_run=False)
+    assert (result['created'], result['updated'], result['written']) == (1, 0, True)
+
+    result = import_rows('raw_materials', rows({**line, 'material_name': 'Lactose monohydrate', 'reorder_level': '50'}),
+                         dry_run=False)
+    assert (result['created'], result['updated']) == (0, 1)
+    material = RawMaterial.objects.get(material_code='M1')
+    assert material.material_name == 'Lactose monohydrate'
+    assert material.reorder_level == Decimal('50')
+
+
+def test_dry_run_reports_every_bad_row_and_writes_nothing():
+    line = {'material_code': 'M1', 'material_name': 'Lactose', 'category': 'excipient', 'unit_of_measure': 'kg'}
+    result = import_rows('raw_materials', rows(
+        line,
+        line,
+        {**line, 'material_code': 'M2', 'category': 'solvent'},
+        {**line, 'material_code': 'M3', 'reorder_level': '-1'},
+        {**line, 'material_code': 'M4', 'material_name': ''},
+    ))
+
+    assert errors(result) == [
+        (3, 'material_code'), (4, 'category'), (5, 'reorder_level'), (6, 'material_name'),
+    ]
+    assert not result['written']
+    assert not RawMaterial.objects.exists()
+
+
+def test_product_import_accepts_choice_labels_and_applies_type_rules():
+    result = import_rows('products', rows(
+        {'product_name': 'Paracetamol', 'product_type': 'Tablet', 'tablet_type': 'normal',
+         'standard_batch_size': '1234.5'},
+    ), dry_run=False)
+
+    assert result['written']
+    product = Product.objects.get(product_name='Paracetamol')
+    assert (product.product_type, product.standard_batch_size) == ('tablet', Decimal('1234.5'))
+    assert product.capsule_type == ''
+
+
+def test_bom_import_checks_units_and_links_materials():
+    import_rows('raw_materials', rows(
+        {'material_code': 'M1', 'material_name': 'Paracetamol', 'category': 'active', 'unit_of_measure': 'kg'},
+    ), dry_run=False)
+    import_rows('products', rows(
+        {'product_name': 'Paracetamol 500', 'product_type': 'tablet', 'tablet_type': 'normal'},
+    ), dry_run=False)
+
+    result = import_rows('bom', rows(
+        {'product_name': 'Paracetamol 500', 'material_code': 'M1', 'required_quantity': '2', 'unit_of_measure': 'g'},
+    ))
+    assert errors(result) == [(2, 'unit_of_measure')]
+
+    result = import_rows('bom', rows(
+        {'product_name': 'Paracetamol 500', 'material_code': 'M1', 'required_quantity': '2'},
+    ), dry_run=False)
+    assert result['written']
+    line = ProductMaterial.objects.get()
+    assert (line.required_quantity, line.unit_of_measure, line.is_active_ingredient) == (Decimal('2'), 'kg', True)
+    assert list(line.product.raw_materials.all()) == [line.raw_material]
+
+
+def test_unknown_kind_is_refused():
+    with pytest.raises(ValueError, match='Unknown import kind'):
+        import_rows('machines', [])
+
+
+@pytest.mark.parametrize('value', ['NaN', 'Infinity', '123456789012345', 'ten'])
+def test_product_import_refuses_numbers_the_column_cannot_hold(value):
+    result = import_rows('products', rows(
+        {'product_name': 'Paracetamol', 'product_type': 'tablet', 'tablet_type': 'normal', 'standard_batch_size': value},
+    ))
+
+    assert errors(result) == [(2, 'standard_batch_size')]
+
+
+def test_product_import_rounds_to_the_column():
+    import_rows('products', rows(
+        {'product_name': 'Paracetamol', 'product_type': 'tablet', 'tablet_type': 'normal',
+         'standard_batch_size': '1234.567'},
+    ), dry_run=False)
+
+    assert Product.objects.get(product_name='Paracetamol').standard_batch_size == Decimal('1234.57')
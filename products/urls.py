@@ -8,6 +8,7 @@ urlpatterns = [
     # Product views
     path('', views.product_list, name='product_list'),
     path('<int:product_id>/', views.product_detail, name='product_detail'),
+    path('import/', views.import_master_data, name='import_master_data'),
     
     # API endpoints
     path('api/products/', api_views.api_products, name='api_products'),
@@ -1,6 +1,11 @@
-from django.shortcuts import render
+from django.contrib import messages
+from django.contrib.auth.decorators import login_required
+from django.shortcuts import redirect, render
+from .importers import KINDS, import_rows, read_rows
 from .models import Product
 
+IMPORT_ERRORS_SHOWN = 200
+
 def product_list(request):
     """View to display list of products"""
     products = Product.objects.all()
@@ -10,3 +15,33 @@ def product_detail(request, product_id):
     """View to display details of a specific product"""
     product = Product.objects.get(pk=product_id)
     return render(request, 'products/product_detail.html', {'product': product})
+
+@login_required
+def import_master_data(request):
+    """Upload raw materials, products or BOM lines as CSV/XLSX; validates first, writes on request"""
+    if not request.user.is_staff:
+        messages.error(request, 'Access denied. Admin privileges required.')
+        return redirect('dashboards:dashboard_home')
+    
+    context = {'kinds': KINDS, 'kind': request.POST.get('kind', 'bom'), 'result': None}
+    if request.method == 'POST':
+        upload = request.FILES.get('file')
+        if not upload:
+            messages.error(request, 'Choose a CSV or XLSX file to import.')
+            return render(request, 'products/import.html', context)
+        try:
+            rows = read_rows(upload, sheet=request.POST.get('sheet') or None)
+            result = import_rows(context['kind'], rows, dry_run=request.POST.get('commit') != 'on')
+        except ValueError as e:
+            messages.error(request, str(e))
+            return render(request, 'products/import.html', context)
+        
+        result['errors_shown'] = result['errors'][:IMPORT_ERRORS_SHOWN]
+        context['result'] = result
+        if result['errors']:
+            messages.error(request, f"{len(result['errors'])} rows have errors; nothing was written.")
+        elif result['written']:
+            messages.success(request, f"Imported {upload.name}: {result['created']} created, {result['updated']} updated.")
+        else:
+            messages.info(request, f"{upload.name} is valid: {result['created']} to create, {result['updated']} to update. Tick 'Write changes' to import it.")
+    return render(request, 'products/import.html', context)
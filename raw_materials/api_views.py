@@ -5,12 +5,14 @@ from django.views.decorators.http import require_POST
 from django.views.decorators.csrf import csrf_exempt
 from django.core.exceptions import ValidationError
 from .models import RawMaterial, RawMaterialBatch, RawMaterialQC
+from .planning import material_stock, plan_requirements
 from django.core.paginator import Paginator
 from django.db.models import Sum, Count, F, Q
 from django.utils import timezone
 import json
 import logging
 from datetime import datetime, timedelta
+from decimal import Decimal, InvalidOperation
 
 @login_required
 def api_materials(request):
@@ -753,34 +755,19 @@ def api_inventory_by_product(request):
             # Get all products
             products = Product.objects.all()
         
+        if not product_id:
+            products = products.prefetch_related('raw_materials')
+        
+        # Approved and pending QC totals for every material in one grouped query
+        stock = material_stock()
+        
         product_inventory = []
         
         for product in products:
-            # Get raw materials for this product
-            materials = product.raw_materials.all()
-            
-            # Calculate total approved inventory for each material
             material_data = []
-            for material in materials:
-                # Get approved batches
-                approved_batches = RawMaterialBatch.objects.filter(
-                    material=material,
-                    status='approved'
-                )
-                
-                # Calculate total approved quantity
-                approved_quantity = sum(batch.quantity_remaining for batch in approved_batches)
-                
-                # Get pending QC batches
-                pending_qc_batches = RawMaterialBatch.objects.filter(
-                    material=material,
-                    status='pending_qc'
-                )
-                
-                # Calculate total pending quantity
-                pending_quantity = sum(batch.quantity_received for batch in pending_qc_batches)
-                
-                # Add material info
+            for material in product.raw_materials.all():
+                approved_quantity = stock.get(material.id, {}).get('approved', 0)
+                pending_quantity = stock.get(material.id, {}).get('pending_qc', 0)
                 material_data.append({
                     'id': material.id,
                     'material_code': material.material_code,
@@ -807,7 +794,89 @@ def api_inventory_by_product(request):
         import logging
         logging.error(f"Error in api_inventory_by_product: {str(e)}")
         return JsonResponse({'success': False, 'error': str(e)})
-        
+
+
+MAX_PLANNED_BATCH_SIZE = Decimal('100000000')
+
+
+@login_required
+def api_material_requirements(request):
+    """
+    MRP: open BMR demand netted against approved and pending QC stock.
+    
+    GET ?until=YYYY-MM-DD&shortages=1 plans the open BMRs; POST a JSON body
+    {"until": ..., "planned": [{"product": id, "batch_size": n, "date": "YYYY-MM-DD"}],
+    "include_open": true} to try a schedule of extra batches.
+    """
+    def batch_size(value):
+        # Same limits as Product.standard_batch_size: positive, finite, 10 digits with 2 decimals
+        if value in (None, ''):
+            return None
+        try:
+            size = Decimal(str(value))
+        except InvalidOperation:
+            raise ValueError(value)
+        if not size.is_finite() or size <= 0 or size >= MAX_PLANNED_BATCH_SIZE:
+            raise ValueError(value)
+        return size
+    
+    params = request.GET
+    planned = []
+    if request.method == 'POST':
+        try:
+            params = json.loads(request.body or '{}')
+            planned = [
+                {
+                    'product_id': int(item['product']),
+                    'batch_size': batch_size(item.get('batch_size')),
+                    'date': datetime.strptime(item['date'], '%Y-%m-%d').date() if item.get('date') else None,
+                    'reference': item.get('reference'),
+                }
+                for item in params.get('planned', [])
+            ]
+        except (ValueError, TypeError, KeyError, AttributeError):
+            return JsonResponse({
+                'success': False,
+                'error': 'planned batches need a product id, an optional positive batch_size and an optional YYYY-MM-DD date',
+            }, status=400)
+    
+    try:
+        until = datetime.strptime(params['until'], '%Y-%m-%d').date() if params.get('until') else None
+    except (ValueError, TypeError):
+        return JsonResponse({'success': False, 'error': 'until must be a YYYY-MM-DD date'}, status=400)
+    
+    include_open = params.get('include_open', True) not in (False, '0', 'false')
+    shortages_only = params.get('shortages') in (True, '1', 'true')
+    try:
+        plan = plan_requirements(until=until, planned=planned, include_open=include_open, shortages_only=shortages_only)
+    except ValueError as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=400)
+    
+    def day(value):
+        return value.isoformat() if value else None
+    
+    return JsonResponse({
+        'success': True,
+        'until': day(until),
+        'materials': [
+            dict(
+                row,
+                gross_requirement=float(row['gross_requirement']),
+                approved=float(row['approved']),
+                pending_qc=float(row['pending_qc']),
+                net=float(row['net']),
+                shortage=float(row['shortage']),
+                approved_runs_out=day(row['approved_runs_out']),
+                shortage_date=day(row['shortage_date']),
+                demand=[
+                    dict(line, date=day(line['date']), quantity=float(line['quantity']), cumulative=float(line['cumulative']))
+                    for line in row['demand']
+                ],
+            )
+            for row in plan
+        ],
+    })
+
 @login_required
 def api_qc_test_detail(request):
     """API endpoint to get QC test details"""
@@ -1,12 +1,17 @@
-from django.db import models
+from django.db import models, transaction
 from django.conf import settings
+from django.core.exceptions import ValidationError
 from django.utils import timezone
 from django.db.models.signals import post_save
 from django.dispatch import receiver
 
+from kampala_pharma.events import get_event_logger
+
 # Import the transaction model
 from raw_materials.models_transaction import InventoryTransaction
 
+events = get_event_logger('dispensing')
+
 class RawMaterial(models.Model):
     """Raw material base information"""
     MATERIAL_CATEGORIES = [
@@ -340,17 +345,15 @@ class MaterialDispensing(models.Model):
     def process_dispensing_completion(self):
         """Process the completion of dispensing by updating inventory quantities"""
         from decimal import Decimal
-        from django.db import transaction
         
-        print(f"DEBUG: Starting process_dispensing_completion for dispensing {self.dispensing_reference}")
+        dispensed_items = 0
+        dispensed_quantity = Decimal('0')
         
         with transaction.atomic():
             # Get all dispensing items
-            dispensing_items = self.items.all()
-            print(f"DEBUG: Found {dispensing_items.count()} dispensing items")
+            dispensing_items = self.items.select_related('material_batch', 'material_batch__material')
             
             for item in dispensing_items:
-                print(f"DEBUG: Processing item for material {item.bmr_material}, is_dispensed={item.is_dispensed}")
                 if not item.is_dispensed:
                     # Mark the item as dispensed
                     item.is_dispensed = True
@@ -358,23 +361,18 @@ class MaterialDispensing(models.Model):
                     
                     # Get the material batch
                     batch = item.material_batch
-                    print(f"DEBUG: Material batch {batch.batch_number}, current quantity: {batch.quantity_remaining}")
                     
                     # Calculate the quantity to subtract
                     quantity_to_subtract = Decimal(str(item.dispensed_quantity))
-                    print(f"DEBUG: Quantity to subtract: {quantity_to_subtract}")
                     
                     # Update the batch quantity
                     if batch.quantity_remaining >= quantity_to_subtract:
-                        old_quantity = batch.quantity_remaining
                         batch.quantity_remaining -= quantity_to_subtract
-                        print(f"DEBUG: Updating batch quantity from {old_quantity} to {batch.quantity_remaining}")
                         batch.save()
-                        print(f"DEBUG: Batch saved with new quantity")
                         
                         # Create inventory transaction record
                         try:
-                            transaction_record = InventoryTransaction.objects.create(
+                            InventoryTransaction.objects.create(
                                 material=batch.material,
                                 material_batch=batch,
                                 transaction_type='dispensed',
@@ -383,55 +381,48 @@ class MaterialDispensing(models.Model):
                                 performed_by=self.dispensed_by,
                                 notes=f"Dispensed for BMR {self.bmr.bmr_number}"
                             )
-                            print(f"DEBUG: Created inventory transaction {transaction_record.id}")
                         except Exception as e:
-                            print(f"DEBUG ERROR: Failed to create transaction record: {str(e)}")
+                            events.error('inventory_transaction_failed', dispensing=self.dispensing_reference,
+                                         batch=batch.batch_number, error=e)
                         
                         # Save the dispensing item
                         item.save()
-                        print(f"DEBUG: Dispensing item saved with is_dispensed=True")
+                        dispensed_items += 1
+                        dispensed_quantity += quantity_to_subtract
                     else:
                         error_msg = f"Insufficient quantity in batch {batch.batch_number}"
-                        print(f"DEBUG ERROR: {error_msg}")
+                        events.warning('dispensing_rejected', dispensing=self.dispensing_reference,
+                                       batch=batch.batch_number, requested=quantity_to_subtract,
+                                       remaining=batch.quantity_remaining)
                         raise ValidationError(error_msg)
-                else:
-                    print(f"DEBUG: Skipping already dispensed item")
             
             # Update BMR status to indicate materials are dispensed
             self.bmr.material_status = 'dispensed'
             self.bmr.save()
-            print(f"DEBUG: Updated BMR {self.bmr.bmr_number} status to dispensed")
+        
+        events.info('dispensing_completed', dispensing=self.dispensing_reference, bmr=self.bmr.bmr_number,
+                    items=dispensed_items, quantity=dispensed_quantity)
 
     def save(self, *args, **kwargs):
-        print(f"DEBUG: Saving MaterialDispensing {self.pk}, status={self.status}")
-        
         if not self.dispensing_reference:
             self.dispensing_reference = self.generate_dispensing_reference()
-            print(f"DEBUG: Generated new dispensing reference: {self.dispensing_reference}")
             
         # Update dates based on status changes
         if self.status == 'in_progress' and not self.started_date:
             self.started_date = timezone.now()
-            print(f"DEBUG: Set started_date to {self.started_date}")
         elif self.status == 'completed' and not self.completed_date:
             self.completed_date = timezone.now()
             # Process the dispensing completion after saving
             self._complete_dispensing = True
-            print(f"DEBUG: Set completed_date to {self.completed_date} and _complete_dispensing=True")
-            
-        # Check if _complete_dispensing is already set (e.g. from view)
-        if hasattr(self, '_complete_dispensing'):
-            print(f"DEBUG: _complete_dispensing was already set to {self._complete_dispensing}")
-            
-        super().save(*args, **kwargs)
-        print(f"DEBUG: MaterialDispensing saved with ID {self.pk}")
         
-        # Handle dispensing completion
-        if hasattr(self, '_complete_dispensing') and self._complete_dispensing:
-            print(f"DEBUG: Calling process_dispensing_completion")
-            self.process_dispensing_completion()
-        else:
-            print(f"DEBUG: NOT calling process_dispensing_completion because _complete_dispensing flag not set")
+        # The status change and the stock it takes commit (or roll back) together
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            
+            # Handle dispensing completion (the flag may also be set by the caller, e.g. a view)
+            if hasattr(self, '_complete_dispensing') and self._complete_dispensing:
+                self.process_dispensing_completion()
+        events.debug('dispensing_saved', dispensing=self.dispensing_reference, status=self.status)
 
 
 class MaterialDispensingItem(models.Model):
@@ -457,7 +448,6 @@ class MaterialDispensingItem(models.Model):
     def save(self, *args, **kwargs):
         # First save
         is_new = not self.pk
-        print(f"DEBUG: Saving MaterialDispensingItem, is_new={is_new}, is_dispensed={self.is_dispensed}")
         
         # Ensure quantities are Decimal objects
         from decimal import Decimal
@@ -466,23 +456,19 @@ class MaterialDispensingItem(models.Model):
         try:
             self.required_quantity = safe_decimal_conversion(self.required_quantity)
             self.dispensed_quantity = safe_decimal_conversion(self.dispensed_quantity)
-            print(f"DEBUG: Converted quantities - required: {self.required_quantity}, dispensed: {self.dispensed_quantity}")
         except Exception as e:
-            import logging
-            logger = logging.getLogger(__name__)
-            logger.error(f"Error converting quantities to Decimal: {str(e)}")
-            print(f"DEBUG ERROR: Failed to convert quantities: {str(e)}")
+            events.error('dispensing_quantity_invalid', item=self.pk, required=self.required_quantity,
+                         dispensed=self.dispensed_quantity, error=e)
             # Use default values if conversion fails
             self.required_quantity = Decimal('0.0') 
             self.dispensed_quantity = Decimal('0.0')
         
         super().save(*args, **kwargs)
-        print(f"DEBUG: MaterialDispensingItem saved with ID {self.pk}")
+        events.debug('dispensing_item_saved', item=self.pk, created=is_new, dispensed=self.is_dispensed)
         
         # NOTE: We are NOT updating quantities here as it will be handled by process_dispensing_completion
         # Instead, just update BMR material references
         if self.is_dispensed:
-            print(f"DEBUG: Updating BMR material references for dispensed item")
             # Update BMR material
             self.bmr_material.dispensed_quantity = self.dispensed_quantity
             self.bmr_material.dispensed_by = self.dispensing.dispensed_by
@@ -492,4 +478,3 @@ class MaterialDispensingItem(models.Model):
             self.bmr_material.supplier = self.material_batch.supplier
             self.bmr_material.expiry_date = self.material_batch.expiry_date
             self.bmr_material.save()
-            print(f"DEBUG: BMR material updated")
@@ -0,0 +1,149 @@
+"""
+Bulk receipt of raw material batches from a delivery note.
+
+Each line of the note becomes one RawMaterialBatch in pending QC, with its `received`
+InventoryTransaction. The lines come from a CSV/XLSX upload (kampala_pharma.rows.read_rows)
+or from a JSON body, and are checked together:
+- the materials are loaded with one in_bulk query
+- batch numbers already on file are found with one query over the whole note
+- repeats inside the note are caught as well
+
+When no line fails, the batches and their transactions are written with two
+bulk_create calls in one transaction. RawMaterialBatch.save() is skipped, so its
+receipt rules are applied here: the remaining quantity starts at the quantity received,
+a batch that is already past its expiry date is marked expired, and the receipt
+transaction is written for every batch.
+"""
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from kampala_pharma.events import get_event_logger
+from kampala_pharma.rows import (
+    BATCH_SIZE, RowError, RowPlan, check_duplicate, parse_date, parse_decimal, parse_text,
+)
+
+events = get_event_logger('dispensing')
+
+
+def plan_receipt(rows, user=None, supplier='', received_date=None):
+    """
+    Validate delivery note lines, [(line number, {field: value})], as new batches.
+
+    Each line needs material_code, batch_number, quantity and expiry_date; supplier,
+    received_date and manufacturing_date are optional. `supplier` and `received_date`
+    are the defaults for the whole note, after which the material's default supplier
+    and today are used. Returns a RowPlan of unsaved RawMaterialBatch objects.
+    """
+    from .models import RawMaterial, RawMaterialBatch
+
+    received_date = received_date or timezone.now().date()
+    codes = {parse_text(row, 'material_code') for _, row in rows}
+    numbers = {parse_text(row, 'batch_number') for _, row in rows}
+    materials = RawMaterial.objects.only('id', 'material_code', 'default_supplier').in_bulk(
+        [code for code in codes if code], field_name='material_code'
+    )
+    on_file = set(
+        RawMaterialBatch.objects.filter(
+            material__in=list(materials.values()), batch_number__in=[number for number in numbers if number],
+        ).values_list('material_id', 'batch_number')
+    )
+
+    today = timezone.now().date()
+    plan, seen = RowPlan(RawMaterialBatch), {}
+    for number, row in rows:
+        try:
+            code = parse_text(row, 'material_code', required=True)
+            batch_number = parse_text(row, 'batch_number', required=True, max_length=50)
+            material = materials.get(code)
+            if material is None:
+                raise RowError('material_code', f"unknown material '{code}'")
+            if (material.id, batch_number) in on_file:
+                raise RowError('batch_number', f'Batch number {batch_number} already exists for {code}')
+            check_duplicate(seen, (material.id, batch_number), number, 'batch_number')
+
+            quantity = parse_decimal(
+                row, 'quantity', required=True, target=RawMaterialBatch._meta.get_field('quantity_received'),
+            )
+            if quantity <= 0:
+                raise RowError('quantity', 'Quantity must be greater than zero')
+            received = parse_date(row, 'received_date', default=received_date)
+            expiry = parse_date(row, 'expiry_date', required=True)
+            if expiry <= received:
+                raise RowError('expiry_date', 'Expiry date must be after received date')
+            manufactured = parse_date(row, 'manufacturing_date')
+            if manufactured and manufactured > received:
+                raise RowError('manufacturing_date', 'Manufacturing date cannot be after received date')
+            line_supplier = parse_text(row, 'supplier', max_length=200) or supplier or material.default_supplier
+        except RowError as e:
+            plan.fail(number, e)
+            continue
+        plan.create.append(RawMaterialBatch(
+            material=material,
+            batch_number=batch_number,
+            quantity_received=quantity,
+            quantity_remaining=quantity,
+            supplier=line_supplier or 'Not specified',
+            received_date=received,
+            manufacturing_date=manufactured,
+            expiry_date=expiry,
+            received_by=user,
+            status='expired' if expiry < today else 'pending_qc',
+        ))
+    return plan
+
+
+def receive_batches(rows, user=None, supplier='', received_date=None, delivery_note='', dry_run=False):
+    """
+    Receive a delivery note: validate every line, then, unless `dry_run` or any
+    line failed, create the batches and their receipt transactions.
+
+    Returns {'lines', 'received', 'errors', 'written', 'batch_ids'}; each error is
+    {'row', 'field', 'message'}.
+    """
+    from .models import RawMaterialBatch
+    from .models_transaction import InventoryTransaction
+
+    plan = plan_receipt(rows, user=user, supplier=supplier, received_date=received_date)
+    result = {
+        'lines': len(rows),
+        'received': len(plan.create),
+        'errors': sorted(plan.errors, key=lambda error: error['row']),
+        'written': False,
+        'batch_ids': [],
+    }
+    if dry_run or plan.errors or not plan.create:
+        return result
+
+    reference = f' (delivery note {delivery_note})' if delivery_note else ''
+    with transaction.atomic():
+        batches = RawMaterialBatch.objects.bulk_create(plan.create, batch_size=BATCH_SIZE)
+        if any(batch.pk is None for batch in batches):
+            # Backends that can't return the new keys: look them up in one query
+            keys = Q()
+            for batch in batches:
+                keys |= Q(material_id=batch.material_id, batch_number=batch.batch_number)
+            ids = dict(
+                ((material_id, batch_number), pk)
+                for pk, material_id, batch_number in RawMaterialBatch.objects.filter(keys).values_list(
+                    'pk', 'material_id', 'batch_number'
+                )
+            )
+            for batch in batches:
+                batch.pk = ids[batch.material_id, batch.batch_number]
+        InventoryTransaction.objects.bulk_create([
+            InventoryTransaction(
+                material_batch=batch,
+                transaction_type='received',
+                quantity=batch.quantity_received,
+                user=user,
+                notes=f'Initial receipt of material batch {batch.batch_number}{reference}',
+            )
+            for batch in batches
+        ], batch_size=BATCH_SIZE)
+
+    events.info('material_batches_received', batches=len(batches), delivery_note=delivery_note or None,
+                user=getattr(user, 'username', None))
+    result['written'] = True
+    result['batch_ids'] = [batch.pk for batch in batches]
+    return result
@@ -0,0 +1,102 @@
+import json
+from datetime import date, timedelta
+from decimal import Decimal
+
+import pytest
+from django.test import RequestFactory
+from django.utils import timezone
+
+from raw_materials.models import RawMaterial, RawMaterialBatch
+from raw_materials.models_transaction import InventoryTransaction
+from raw_materials.receipts import plan_receipt, receive_batches
+from raw_materials.views import receive_materials_bulk
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture
+def material():
+    return RawMaterial.objects.create(
+        material_code='M1', material_name='Lactose', category='excipient', unit_of_measure='kg',
+        reorder_level=Decimal('10'), default_supplier='Acme',
+    )
+
+
+def line(**fields):
+    return {'material_code': 'M1', 'batch_number': 'B1', 'quantity': '25.5', 'expiry_date': '2099-01-31', **fields}
+
+
+def errors(result):
+    return [(error['row'], error['field']) for error in result['errors']]
+
+
+def test_receive_creates_batches_with_their_receipt_transactions(material):
+    result = receive_batches([(1, line()), (2, line(batch_number='B2', supplier='Other'))], delivery_note='DN-1')
+
+    assert (result['received'], result['written']) == (2, True)
+    batches = RawMaterialBatch.objects.filter(pk__in=result['batch_ids']).order_by('batch_number')
+    assert [(batch.status, batch.supplier, batch.quantity_remaining) for batch in batches] == [
+        ('pending_qc', 'Acme', Decimal('25.5')), ('pending_qc', 'Other', Decimal('25.5')),
+    ]
+    transactions = InventoryTransaction.objects.filter(material_batch__in=batches, transaction_type='received')
+    assert transactions.count() == 2
+    assert all('delivery note DN-1' in transaction.notes for transaction in transactions)
+
+
+def test_a_bad_line_stops_the_whole_note(material):
+    RawMaterialBatch.objects.bulk_create([RawMaterialBatch(
+        material=material, batch_number='ON-FILE', quantity_received=1, quantity_remaining=1,
+        received_date=date(2026, 1, 1), expiry_date=date(2099, 1, 1), supplier='Acme',
+    )])
+    result = receive_batches([
+        (1, line()),
+        (2, line()),
+        (3, line(batch_number='ON-FILE')),
+        (4, line(batch_number='B4', material_code='NOPE')),
+        (5, line(batch_number='B5', quantity='0')),
+        (6, line(batch_number='B6', quantity='2000000')),
+        (7, line(batch_number='B7', expiry_date='31/01/2099')),
+        (8, line(batch_number='B8', received_date='2026-02-01', manufacturing_date='2026-03-01')),
+    ])
+
+    assert errors(result) == [
+        (2, 'batch_number'), (3, 'batch_number'), (4, 'material_code'), (5, 'quantity'), (6, 'quantity'),
+        (7, 'expiry_date'), (8, 'manufacturing_date'),
+    ]
+    assert not result['written']
+    assert RawMaterialBatch.objects.count() == 1
+
+
+def test_dry_run_writes_nothing(material):
+    result = receive_batches([(1, line())], dry_run=True)
+
+    assert (result['received'], result['written']) == (1, False)
+    assert not RawMaterialBatch.objects.exists()
+
+
+def test_batches_already_past_expiry_are_received_as_expired(material):
+    received = timezone.now().date() - timedelta(days=60)
+    plan = plan_receipt([(1, line(expiry_date=received + timedelta(days=30)))], received_date=received)
+
+    assert not plan.errors
+    assert plan.create[0].status == 'expired'
+
+
+@pytest.mark.parametrize('quantity', ['NaN', 'Infinity', '0.00001'])
+def test_quantities_the_batch_cannot_hold_are_refused(material, quantity):
+    result = receive_batches([(1, line(quantity=quantity))])
+
+    assert errors(result) == [(1, 'quantity')]
+
+
+@pytest.mark.parametrize('field, value', [('supplier', 7), ('delivery_note', ['DN-1']), ('received_date', {})])
+def test_bulk_receipt_refuses_fields_that_are_not_strings(django_user_model, material, field, value):
+    request = RequestFactory().post(
+        '/raw-materials/receive/bulk/', json.dumps({'lines': [line()], field: value}), content_type='application/json',
+    )
+    request.user = django_user_model.objects.create_user(username='store', password='x', role='store_manager')
+
+    response = receive_materials_bulk(request)
+
+    assert json.loads(response.content) == {'success': False, 'error': f"'{field}' must be a string"}
+    assert not RawMaterialBatch.objects.exists()
@@ -15,6 +15,7 @@ urlpatterns = [
     path('monitor/export/', views.export_inventory, name='export_inventory'),
     path('material/<int:material_id>/', views.material_detail, name='material_detail'),
     path('receive/', views.receive_material, name='receive_material'),
+    path('receive/bulk/', views.receive_materials_bulk, name='receive_materials_bulk'),
     
     # Filtered material batch lists
     path('batches/all/', views.batch_list, name='batch_list'),
@@ -50,4 +51,5 @@ urlpatterns = [
     path('api/mark-for-disposal/', api_views.mark_for_disposal, name='mark_for_disposal'),
     path('api/update-associations/', api_views.api_update_associations, name='api_update_associations'),
     path('api/inventory-by-product/', api_views.api_inventory_by_product, name='api_inventory_by_product'),
+    path('api/material-requirements/', api_views.api_material_requirements, name='api_material_requirements'),
 ]
@@ -2,11 +2,13 @@ from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.utils import timezone
+from django.db import transaction
 from django.db.models import Sum, Count, Q, F
 from django.http import JsonResponse, HttpResponse
 from decimal import Decimal, InvalidOperation
 from datetime import timedelta
 import csv
+from kampala_pharma.replica import replica_view
 from .models import RawMaterial, RawMaterialBatch, RawMaterialQC, MaterialDispensing, MaterialDispensingItem
 
 
@@ -160,6 +162,7 @@ def material_detail(request, material_id):
 
 
 @login_required
+@replica_view
 def export_inventory(request):
     """Export inventory data to CSV"""
     if not (request.user.role == 'store_manager' or request.user.is_staff or request.user.role in ['admin', 'superadmin']):
@@ -388,11 +391,12 @@ def dispensing_detail(request, dispensing_id):
             if all_dispensed:
                 dispensing.status = 'completed'
                 dispensing.completed_date = timezone.now()
-                dispensing.save()
                 
-                # Trigger next phase in workflow
+                # Stock deduction and the next phase commit together
                 from workflow.services import WorkflowService
-                WorkflowService.trigger_next_phase(dispensing.bmr, 'raw_material_release')
+                with transaction.atomic():
+                    dispensing.save()
+                    WorkflowService.trigger_next_phase(dispensing.bmr, 'raw_material_release')
                 
                 messages.success(request, f'Completed dispensing for BMR {dispensing.bmr.batch_number}')
             else:
@@ -646,3 +650,78 @@ def receive_material(request):
         
     except Exception as e:
         return JsonResponse({'success': False, 'error': str(e)})
+
+
+RECEIPT_LINE_LIMIT = 500
+
+
+@login_required
+def receive_materials_bulk(request):
+    """
+    API endpoint for receiving a whole delivery note at once.
+
+    Takes either a CSV/XLSX upload ('file', plus optional 'sheet') or a JSON body
+    {"lines": [...], "supplier", "received_date", "delivery_note", "dry_run"}. Each line
+    has material_code, batch_number, quantity, expiry_date and optionally supplier,
+    received_date and manufacturing_date. Nothing is written unless every line is valid.
+    """
+    import json
+    from kampala_pharma.rows import read_rows
+    from .receipts import receive_batches
+    
+    if request.user.role not in ['store_manager', 'admin']:
+        return JsonResponse({'success': False, 'error': 'Access denied. Store Manager role required.'})
+    
+    if request.method != 'POST':
+        return JsonResponse({'success': False, 'error': 'Only POST method is allowed'})
+    
+    try:
+        if request.content_type == 'application/json':
+            payload = json.loads(request.body or b'{}')
+            if not isinstance(payload, dict):
+                return JsonResponse({'success': False, 'error': 'Expected a JSON object with a lines list'})
+            lines = payload.get('lines')
+            if not isinstance(lines, list) or not all(isinstance(line, dict) for line in lines):
+                return JsonResponse({'success': False, 'error': "'lines' must be a list of objects"})
+            for field in ('supplier', 'received_date', 'delivery_note'):
+                if payload.get(field) is not None and not isinstance(payload[field], str):
+                    return JsonResponse({'success': False, 'error': f"'{field}' must be a string"})
+            rows = list(enumerate(lines, start=1))
+        else:
+            payload = request.POST
+            upload = request.FILES.get('file')
+            if not upload:
+                return JsonResponse({'success': False, 'error': 'Choose a CSV or XLSX delivery note to upload'})
+            rows = read_rows(upload, sheet=payload.get('sheet') or None)
+        
+        if not rows:
+            return JsonResponse({'success': False, 'error': 'The delivery note has no lines'})
+        if len(rows) > RECEIPT_LINE_LIMIT:
+            return JsonResponse({'success': False, 'error': f'At most {RECEIPT_LINE_LIMIT} lines can be received at once'})
+        
+        received_date = payload.get('received_date') or None
+        if received_date:
+            received_date = timezone.datetime.strptime(received_date, '%Y-%m-%d').date()
+        dry_run = payload.get('dry_run') in (True, 'true', 'on', '1')
+        result = receive_batches(
+            rows,
+            user=request.user,
+            supplier=(payload.get('supplier') or '').strip(),
+            received_date=received_date,
+            delivery_note=(payload.get('delivery_note') or '').strip(),
+            dry_run=dry_run,
+        )
+    except (ValueError, json.JSONDecodeError) as e:
+        return JsonResponse({'success': False, 'error': str(e)})
+    
+    if result['errors']:
+        return JsonResponse({
+            'success': False,
+            'error': f"{len(result['errors'])} of {result['lines']} lines have errors; nothing was received",
+            **result,
+        })
+    if dry_run:
+        message = f"{result['received']} batches ready to receive"
+    else:
+        message = f"{result['received']} material batches received and queued for QC"
+    return JsonResponse({'success': True, 'message': message, **result})
@@ -6,9 +6,11 @@ from django.utils import timezone
 from datetime import datetime, timedelta
 import csv
 import xlwt
+from kampala_pharma.replica import replica_view
 from raw_materials.models import RawMaterial, RawMaterialQC
 
 @login_required
+@replica_view
 def qc_test_report_view(request):
     """Generate a report of QC tests with filtering options"""
     # Get filter parameters
@@ -71,6 +73,7 @@ def qc_test_report_view(request):
     return render(request, 'reports/qc_test_report.html', context)
 
 @login_required
+@replica_view
 def export_qc_tests_csv(request):
     """Export QC test data as CSV"""
     # Get same filter parameters as the report view
@@ -134,6 +137,7 @@ def export_qc_tests_csv(request):
     return response
 
 @login_required
+@replica_view
 def export_qc_tests_excel(request):
     """Export QC test data as Excel file"""
     # Get same filter parameters as the report view
@@ -1,11 +1,15 @@
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
 from django.db.models import Q
+from kampala_pharma.replica import replica_view
+from bmr.archive import archive_read_through
 from bmr.models import BMR
+from workflow.eta import predict_completion
 from workflow.models import BatchPhaseExecution, ProductionPhase
 from workflow.services import WorkflowService
 
 @login_required
+@replica_view
 def timeline_list_view(request):
     """Enhanced timeline list view showing all BMRs with visual progress"""
     # Check if user is admin/staff - they see all BMRs
@@ -22,6 +26,7 @@ def timeline_list_view(request):
     # Add progress information to each BMR
     bmr_progress = []
     stats = {'completed': 0, 'in_progress': 0, 'partially_complete': 0, 'not_started': 0}
+    etas = predict_completion()
     
     for bmr in bmrs:
         phases = BatchPhaseExecution.objects.filter(bmr=bmr)
@@ -54,7 +59,8 @@ def timeline_list_view(request):
             'completed_phases': completed_phases,
             'progress_percentage': progress_percentage,
             'status': status,
-            'status_class': status_class
+            'status_class': status_class,
+            'eta': etas.get(bmr.id),
         })
     
     context = {
@@ -67,6 +73,8 @@ def timeline_list_view(request):
     return render(request, 'reports/timeline_list.html', context)
 
 @login_required
+@replica_view
+@archive_read_through
 def enhanced_timeline_view(request, bmr_id):
     """Enhanced timeline view with visual progress tracking"""
     bmr = get_object_or_404(BMR, id=bmr_id)
@@ -238,6 +246,7 @@ def enhanced_timeline_view(request, bmr_id):
         'total_phases': total_phases,
         'completed_phases': completed_phases,
         'remaining_phases': total_phases - completed_phases,
+        'eta': predict_completion([bmr.id]).get(bmr.id),
         'is_admin': is_admin
     }
     
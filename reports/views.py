@@ -7,8 +7,10 @@ from bmr.models import BMR, BMRSignature
 from workflow.models import BatchPhaseExecution
 import csv
 import json
+from kampala_pharma.replica import replica_view
 
 @login_required
+@replica_view
 def comments_report_view(request):
     """Web-based comments report view with role-based filtering"""
     
@@ -207,6 +209,7 @@ def comments_report_view(request):
     return render(request, 'reports/comments_report.html', context)
 
 @login_required
+@replica_view
 def export_comments_csv(request):
     """Export comments to CSV format with role-based filtering"""
     
@@ -347,6 +350,7 @@ def export_comments_csv(request):
     return response
 
 @login_required
+@replica_view
 def export_comments_word(request):
     """Export comments to Word format with role-based filtering"""
     try:
@@ -406,6 +410,7 @@ def export_comments_word(request):
     return response
 
 @login_required
+@replica_view
 def export_comments_excel(request):
     """Export comments to Excel format with role-based filtering"""
     try:
@@ -469,6 +474,7 @@ def export_comments_excel(request):
     return response
 
 @login_required
+@replica_view
 def bmr_comments_detail(request, bmr_id):
     """Detailed view of all comments for a specific BMR with role-based access"""
     bmr = get_object_or_404(BMR, id=bmr_id)
@@ -0,0 +1,178 @@
+// Multi-select start/complete for dashboard queues through the bulk transition API.
+//
+// A queue table opts in with data-bulk-url and an id; its rows carry data-execution-id,
+// a .bulk-select checkbox and a .bulk-status cell. The toolbar with
+// data-bulk-for="<table id>" holds the data-bulk-action buttons and, optionally, a
+// data-bulk-machine select, a data-bulk-comments input and a data-bulk-result area.
+(function () {
+    const STATUS_BADGES = {
+        in_progress: '<span class="badge bg-info">In Progress</span>',
+        completed: '<span class="badge bg-success">Completed</span>',
+    };
+
+    function escapeHtml(text) {
+        const element = document.createElement('span');
+        element.textContent = text;
+        return element.innerHTML;
+    }
+
+    function csrfToken() {
+        const input = document.querySelector('[name=csrfmiddlewaretoken]');
+        return input ? input.value : '';
+    }
+
+    function idempotencyKey() {
+        if (window.crypto && crypto.randomUUID) {
+            return crypto.randomUUID();
+        }
+        return `${Date.now()}-${Math.random().toString(16).slice(2)}`;
+    }
+
+    // Network failures are retried with the same key, so an action that reached the
+    // server before the connection dropped isn't applied twice
+    async function postWithRetry(url, body, key, attempts) {
+        for (let attempt = 1; ; attempt++) {
+            try {
+                const response = await fetch(url, {
+                    method: 'POST',
+                    credentials: 'same-origin',
+                    headers: {
+                        'Content-Type': 'application/json',
+                        'X-CSRFToken': csrfToken(),
+                        'Idempotency-Key': key,
+                    },
+                    body: JSON.stringify(body),
+                });
+                return { status: response.status, data: await response.json() };
+            } catch (error) {
+                if (attempt >= attempts) {
+                    throw error;
+                }
+                await new Promise(resolve => setTimeout(resolve, 1000 * attempt));
+            }
+        }
+    }
+
+    function showResult(toolbar, level, message) {
+        const area = toolbar.querySelector('[data-bulk-result]');
+        if (area) {
+            area.innerHTML = `<div class="alert alert-${level} py-2 mb-0">${message}</div>`;
+        } else {
+            alert(message);
+        }
+    }
+
+    function setup(table) {
+        const toolbar = document.querySelector(`[data-bulk-for="${table.id}"]`);
+        if (!toolbar) {
+            return;
+        }
+        const selectAll = table.querySelector('.bulk-select-all');
+        const boxes = () => Array.from(table.querySelectorAll('.bulk-select'));
+        const selected = () => boxes().filter(box => box.checked);
+
+        function refresh() {
+            const rows = selected().map(box => box.closest('tr'));
+            toolbar.querySelectorAll('[data-bulk-action]').forEach(button => {
+                const action = button.dataset.bulkAction;
+                const eligible = rows.filter(row => row.dataset.status === (action === 'start' ? 'pending' : 'in_progress'));
+                button.disabled = eligible.length === 0;
+                const count = button.querySelector('[data-bulk-count]');
+                if (count) {
+                    count.textContent = eligible.length;
+                }
+            });
+        }
+
+        if (selectAll) {
+            selectAll.addEventListener('change', () => {
+                boxes().forEach(box => { box.checked = selectAll.checked; });
+                refresh();
+            });
+        }
+        table.addEventListener('change', event => {
+            if (event.target.classList.contains('bulk-select')) {
+                refresh();
+            }
+        });
+
+        toolbar.querySelectorAll('[data-bulk-action]').forEach(button => {
+            button.addEventListener('click', async () => {
+                const action = button.dataset.bulkAction;
+                const wanted = action === 'start' ? 'pending' : 'in_progress';
+                const rows = selected().map(box => box.closest('tr')).filter(row => row.dataset.status === wanted);
+                if (!rows.length || !confirm(`${button.dataset.bulkLabel || action} ${rows.length} selected batch(es)?`)) {
+                    return;
+                }
+                const machine = toolbar.querySelector('[data-bulk-machine]');
+                const comments = toolbar.querySelector('[data-bulk-comments]');
+                const body = {
+                    action: action,
+                    executions: rows.map(row => Number(row.dataset.executionId)),
+                    comments: comments ? comments.value : '',
+                };
+                if (machine && machine.value) {
+                    body.machine_id = Number(machine.value);
+                }
+
+                button.disabled = true;
+                let response;
+                try {
+                    response = await postWithRetry(table.dataset.bulkUrl, body, idempotencyKey(), 3);
+                } catch (error) {
+                    showResult(toolbar, 'danger', 'Could not reach the server. Nothing was changed; please try again.');
+                    refresh();
+                    return;
+                }
+                if (response.status !== 200) {
+                    showResult(toolbar, 'danger', escapeHtml(response.data.error || `Request failed (${response.status})`));
+                    refresh();
+                    return;
+                }
+
+                const failures = [];
+                response.data.results.forEach(result => {
+                    const row = table.querySelector(`tr[data-execution-id="${result.id}"]`);
+                    if (!row) {
+                        return;
+                    }
+                    if (!result.success) {
+                        row.classList.add('table-danger');
+                        row.title = result.error;
+                        failures.push(escapeHtml(`${row.dataset.batch || result.id}: ${result.error}`));
+                        return;
+                    }
+                    row.classList.remove('table-danger');
+                    row.removeAttribute('title');
+                    if (result.status === 'completed' || row.dataset.bulkRemoveOn === action) {
+                        row.remove();
+                        return;
+                    }
+                    row.dataset.status = result.status;
+                    const status = row.querySelector('.bulk-status');
+                    if (status && STATUS_BADGES[result.status]) {
+                        status.innerHTML = STATUS_BADGES[result.status];
+                    }
+                    row.querySelectorAll(`[data-bulk-hide-after="${action}"]`).forEach(element => element.remove());
+                    row.querySelector('.bulk-select').checked = false;
+                });
+
+                const applied = response.data.applied;
+                if (failures.length) {
+                    showResult(toolbar, 'warning', `${applied} updated, ${failures.length} not:<br>${failures.join('<br>')}`);
+                } else {
+                    showResult(toolbar, 'success', `${applied} batch(es) updated.`);
+                }
+                if (selectAll) {
+                    selectAll.checked = false;
+                }
+                refresh();
+            });
+        });
+        refresh();
+    }
+
+    document.addEventListener('DOMContentLoaded', () => {
+        document.querySelectorAll('table[data-bulk-url]').forEach(setup);
+    });
+})();
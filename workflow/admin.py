@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import ProductionPhase, BatchPhaseExecution, Machine
+from .models import ProductionPhase, BatchPhaseExecution, Machine, PhaseSchedule, PhaseDurationStat, IdempotencyKey
 
 @admin.register(Machine)
 class MachineAdmin(admin.ModelAdmin):
@@ -60,3 +60,33 @@ class BatchPhaseExecutionAdmin(admin.ModelAdmin):
     
     def get_queryset(self, request):
         return super().get_queryset(request).select_related('bmr', 'phase', 'started_by', 'completed_by', 'machine_used')
+
+@admin.register(PhaseSchedule)
+class PhaseScheduleAdmin(admin.ModelAdmin):
+    list_display = ['execution', 'machine', 'planned_start', 'planned_end', 'changeover_hours', 'priority']
+    list_filter = ['machine__machine_type', 'machine']
+    search_fields = ['execution__bmr__batch_number']
+    list_select_related = ['execution__bmr', 'execution__phase', 'machine']
+    readonly_fields = ['scheduled_at']
+
+@admin.register(PhaseDurationStat)
+class PhaseDurationStatAdmin(admin.ModelAdmin):
+    list_display = ['product_type', 'phase_name', 'samples', 'mean_active_hours', 'mean_wait_hours', 'last_completed']
+    list_filter = ['product_type']
+    search_fields = ['phase_name']
+    readonly_fields = ['last_completed', 'updated_at']
+    
+    @admin.display(description='Mean active (h)')
+    def mean_active_hours(self, obj):
+        return round(obj.active_hours_sum / obj.samples, 2) if obj.samples else None
+    
+    @admin.display(description='Mean wait (h)')
+    def mean_wait_hours(self, obj):
+        return round(obj.wait_hours_sum / obj.wait_samples, 2) if obj.wait_samples else None
+
+@admin.register(IdempotencyKey)
+class IdempotencyKeyAdmin(admin.ModelAdmin):
+    list_display = ['key', 'user', 'response_status', 'created_at']
+    list_filter = ['response_status']
+    search_fields = ['key', 'user__username']
+    readonly_fields = ['user', 'key', 'request_hash', 'response_status', 'response_body', 'created_at']
@@ -0,0 +1,8 @@
+from django.urls import path
+
+from . import views
+
+urlpatterns = [
+    path('executions/transition', views.bulk_transition, name='bulk_transition'),
+    path('executions/<int:execution_id>/transition', views.execution_transition, name='execution_transition'),
+]
@@ -8,3 +8,5 @@ class WorkflowConfig(AppConfig):
     def ready(self):
         # Import signals to register signal handlers
         from . import signals
+        from . import registry
+        registry.validate()
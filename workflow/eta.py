@@ -0,0 +1,299 @@
+"""
+Completion ETAs for open BMRs.
+
+PhaseDurationStat holds, per (product type, phase), running sums of two things:
+- active hours: started to completed
+- queue wait: from the BMR's previous completion to the start of this phase
+
+`rebuild_stats` recomputes the sums from the whole execution history. `update_stats`
+folds in only the completions that have no PhaseDurationSample yet. It claims them by
+inserting their samples before adding them, so two runs never count a completion twice
+and a completion that commits late is still picked up. It runs once on commit of any
+transaction that completes a phase, so the statistics follow the floor without a rebuild.
+
+`predict_completion` estimates every open BMR in one pass, from one query for the
+executions and one for the statistics. Each remaining phase up to finished_goods_store
+adds its mean wait plus mean active time; an in-progress phase only adds what is left
+of its mean. The variances are summed for a late (p90) estimate. Where a product type
+has too few samples for a phase, the pooled statistics of that phase are used, then
+ProductionPhase.estimated_duration_hours.
+"""
+import math
+from collections import defaultdict
+from datetime import timedelta
+
+from django.db import IntegrityError, transaction
+from django.db.models import DateTimeField, F, Value
+from django.db.models.functions import Coalesce, Greatest
+from django.utils import timezone
+
+from kampala_pharma.events import get_event_logger
+from kampala_pharma.transactions import on_commit_once
+
+events = get_event_logger('workflow')
+
+FINAL_PHASE = 'finished_goods_store'
+OPEN_BMR_STATUSES = ['draft', 'submitted', 'approved', 'in_production']
+DONE_STATUSES = {'completed', 'skipped'}
+
+SAMPLE_BATCH = 1000
+DEFAULT_PHASE_HOURS = 4.0
+MIN_SAMPLES = 5
+Z_P90 = 1.2816
+
+
+def _hours(delta):
+    return delta.total_seconds() / 3600
+
+
+def _observations(rows):
+    """
+    Active and wait hours from completed execution rows ordered by BMR and phase order.
+
+    Rows are (id, bmr_id, product_type, phase_name, started, completed). Yields
+    (id, product_type, phase_name, active hours, wait hours or None, completed).
+    """
+    current_bmr, previous_done = None, None
+    for execution_id, bmr_id, product_type, phase_name, started, completed in rows:
+        if bmr_id != current_bmr:
+            current_bmr, previous_done = bmr_id, None
+        if started and completed and completed >= started:
+            wait = _hours(started - previous_done) if previous_done and started >= previous_done else None
+            yield execution_id, product_type, phase_name, _hours(completed - started), wait, completed
+        if completed and (previous_done is None or completed > previous_done):
+            previous_done = completed
+
+
+class _Totals:
+    __slots__ = ('samples', 'active', 'active_sq', 'wait_samples', 'wait', 'wait_sq', 'last_completed')
+
+    def __init__(self):
+        self.samples = self.wait_samples = 0
+        self.active = self.active_sq = self.wait = self.wait_sq = 0.0
+        self.last_completed = None
+
+    def add(self, active, wait, completed):
+        self.samples += 1
+        self.active += active
+        self.active_sq += active * active
+        if wait is not None:
+            self.wait_samples += 1
+            self.wait += wait
+            self.wait_sq += wait * wait
+        if self.last_completed is None or completed > self.last_completed:
+            self.last_completed = completed
+
+
+def _chunks(values, size=SAMPLE_BATCH):
+    chunk = []
+    for value in values:
+        chunk.append(value)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _completed_rows(executions):
+    return executions.filter(status='completed', completed_date__isnull=False).values_list(
+        'id', 'bmr_id', 'bmr__product__product_type', 'phase__phase_name', 'started_date', 'completed_date',
+    ).order_by('bmr_id', 'phase__phase_order')
+
+
+def rebuild_stats():
+    """Recompute PhaseDurationStat from every completed execution; returns the row count"""
+    from .models import BatchPhaseExecution, PhaseDurationSample, PhaseDurationStat
+
+    with transaction.atomic():
+        # Record what this rebuild counts before reading it: a phase completed meanwhile
+        # gets no sample and is left to update_stats. A reworked phase is counted again
+        # when it next completes.
+        PhaseDurationSample.objects.all().delete()
+        completed = BatchPhaseExecution.objects.filter(status='completed').values_list('id', flat=True)
+        for ids in _chunks(completed.iterator(chunk_size=5000)):
+            PhaseDurationSample.objects.bulk_create([PhaseDurationSample(execution_id=execution_id) for execution_id in ids])
+
+        totals = defaultdict(_Totals)
+        rows = _completed_rows(BatchPhaseExecution.objects.filter(duration_sample__isnull=False))
+        for _, product_type, phase_name, active, wait, completed in _observations(rows.iterator(chunk_size=5000)):
+            totals[product_type, phase_name].add(active, wait, completed)
+
+        PhaseDurationStat.objects.all().delete()
+        PhaseDurationStat.objects.bulk_create([
+            PhaseDurationStat(
+                product_type=product_type, phase_name=phase_name,
+                samples=total.samples, active_hours_sum=total.active, active_hours_sq_sum=total.active_sq,
+                wait_samples=total.wait_samples, wait_hours_sum=total.wait, wait_hours_sq_sum=total.wait_sq,
+                last_completed=total.last_completed,
+            )
+            for (product_type, phase_name), total in totals.items()
+        ])
+    return len(totals)
+
+
+def update_stats():
+    """Fold completions not yet counted into PhaseDurationStat; returns the samples added"""
+    from .models import BatchPhaseExecution, PhaseDurationSample, PhaseDurationStat
+
+    if not PhaseDurationStat.objects.exists():
+        return rebuild_stats()
+
+    new = BatchPhaseExecution.objects.filter(status='completed', duration_sample__isnull=True)
+    new_ids = set(new.values_list('id', flat=True))
+    if not new_ids:
+        return 0
+
+    # The BMRs' earlier completions are needed for the queue wait of the new ones
+    bmr_ids = new.values_list('bmr_id', flat=True).distinct()
+    rows = _completed_rows(BatchPhaseExecution.objects.filter(bmr_id__in=list(bmr_ids)))
+    totals = defaultdict(_Totals)
+    for execution_id, product_type, phase_name, active, wait, completed in _observations(rows):
+        if execution_id in new_ids:
+            totals[product_type, phase_name].add(active, wait, completed)
+
+    try:
+        with transaction.atomic():
+            # Claim the completions first. A concurrent run that claimed any of them
+            # makes the insert fail; this run then backs out and leaves the rest to the
+            # next one.
+            PhaseDurationSample.objects.bulk_create(
+                [PhaseDurationSample(execution_id=execution_id) for execution_id in new_ids], batch_size=SAMPLE_BATCH,
+            )
+            for (product_type, phase_name), total in totals.items():
+                latest = Value(total.last_completed, output_field=DateTimeField())
+                PhaseDurationStat.objects.get_or_create(product_type=product_type, phase_name=phase_name)
+                PhaseDurationStat.objects.filter(product_type=product_type, phase_name=phase_name).update(
+                    samples=F('samples') + total.samples,
+                    active_hours_sum=F('active_hours_sum') + total.active,
+                    active_hours_sq_sum=F('active_hours_sq_sum') + total.active_sq,
+                    wait_samples=F('wait_samples') + total.wait_samples,
+                    wait_hours_sum=F('wait_hours_sum') + total.wait,
+                    wait_hours_sq_sum=F('wait_hours_sq_sum') + total.wait_sq,
+                    last_completed=Greatest(Coalesce('last_completed', latest), latest),
+                    updated_at=timezone.now(),
+                )
+    except IntegrityError:
+        return 0
+    return sum(total.samples for total in totals.values())
+
+
+def _run_stats_update():
+    try:
+        update_stats()
+    except Exception as e:
+        events.error('eta_stats_update_failed', error=e)
+
+
+def request_stats_update():
+    """Update the statistics once the current transaction commits, once per transaction"""
+    on_commit_once(_run_stats_update)
+
+
+def _moments(count, total, squares):
+    mean = total / count
+    return mean, max(squares / count - mean * mean, 0.0)
+
+
+def load_estimates():
+    """{(product_type, phase): (active mean, active var, wait mean, wait var)} plus pooled per phase"""
+    from .models import PhaseDurationStat, ProductionPhase
+
+    pooled = defaultdict(lambda: [0, 0.0, 0.0, 0, 0.0, 0.0])
+    estimates = {}
+    for stat in PhaseDurationStat.objects.all():
+        sums = pooled[stat.phase_name]
+        for position, value in enumerate((
+            stat.samples, stat.active_hours_sum, stat.active_hours_sq_sum,
+            stat.wait_samples, stat.wait_hours_sum, stat.wait_hours_sq_sum,
+        )):
+            sums[position] += value
+        if stat.samples >= MIN_SAMPLES:
+            estimates[stat.product_type, stat.phase_name] = _estimate(
+                stat.samples, stat.active_hours_sum, stat.active_hours_sq_sum,
+                stat.wait_samples, stat.wait_hours_sum, stat.wait_hours_sq_sum,
+            )
+    for phase_name, sums in pooled.items():
+        if sums[0] >= MIN_SAMPLES:
+            estimates[None, phase_name] = _estimate(*sums)
+
+    # Planned durations for phases with no usable history, with a loose variance
+    for product_type, phase_name, hours in ProductionPhase.objects.values_list(
+        'product_type', 'phase_name', 'estimated_duration_hours'
+    ):
+        hours = float(hours or 0) or DEFAULT_PHASE_HOURS
+        estimates.setdefault(('planned', product_type, phase_name), (hours, (0.25 * hours) ** 2, 0.0, 0.0))
+    return estimates
+
+
+def _estimate(samples, active, active_sq, wait_samples, wait, wait_sq):
+    active_mean, active_var = _moments(samples, active, active_sq)
+    wait_mean, wait_var = _moments(wait_samples, wait, wait_sq) if wait_samples else (0.0, 0.0)
+    return active_mean, active_var, wait_mean, wait_var
+
+
+def _lookup(estimates, product_type, phase_name):
+    return (
+        estimates.get((product_type, phase_name))
+        or estimates.get((None, phase_name))
+        or estimates.get(('planned', product_type, phase_name))
+        or (DEFAULT_PHASE_HOURS, (0.25 * DEFAULT_PHASE_HOURS) ** 2, 0.0, 0.0)
+    )
+
+
+def predict_completion(bmr_ids=None, now=None, estimates=None):
+    """
+    {bmr_id: ETA} for open BMRs (or the given ones) that haven't reached the FGS.
+
+    Each ETA is a dict with remaining_hours, eta, eta_late (p90), phases_left and
+    current_phase. BMRs already in the finished goods store are left out.
+    """
+    from .models import BatchPhaseExecution
+
+    now = now or timezone.now()
+    estimates = estimates if estimates is not None else load_estimates()
+    executions = BatchPhaseExecution.objects.all()
+    if bmr_ids is None:
+        executions = executions.filter(bmr__status__in=OPEN_BMR_STATUSES)
+    else:
+        executions = executions.filter(bmr_id__in=list(bmr_ids))
+    rows = executions.values_list(
+        'bmr_id', 'bmr__product__product_type', 'phase__phase_name', 'status', 'started_date',
+    ).order_by('bmr_id', 'phase__phase_order')
+
+    by_bmr = defaultdict(list)
+    for bmr_id, *row in rows:
+        by_bmr[bmr_id].append(row)
+
+    predictions = {}
+    for bmr_id, phases in by_bmr.items():
+        mean = variance = 0.0
+        left, current = 0, None
+        reached_final = False
+        for product_type, phase_name, status, started in phases:
+            if reached_final:
+                break
+            reached_final = phase_name == FINAL_PHASE
+            if status in DONE_STATUSES:
+                continue
+            active_mean, active_var, wait_mean, wait_var = _lookup(estimates, product_type, phase_name)
+            if status == 'in_progress':
+                elapsed = _hours(now - started) if started else 0.0
+                mean += max(active_mean - elapsed, 0.0)
+                variance += active_var
+            else:
+                mean += wait_mean + active_mean
+                variance += wait_var + active_var
+            left += 1
+            if current is None:
+                current = phase_name
+        if not left:
+            continue
+        predictions[bmr_id] = {
+            'remaining_hours': round(mean, 1),
+            'eta': now + timedelta(hours=mean),
+            'eta_late': now + timedelta(hours=mean + Z_P90 * math.sqrt(variance)),
+            'phases_left': left,
+            'current_phase': current,
+        }
+    return predictions
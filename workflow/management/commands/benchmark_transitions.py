@@ -0,0 +1,115 @@
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+
+from bmr.models import BMR
+from kampala_pharma.database import apply_sqlite_pragmas
+from products.models import Product
+from workflow.models import BatchPhaseExecution
+from workflow.services import WorkflowService
+
+BENCH_PREFIX = 'BNCH'
+
+# SQLite's stock settings: rollback journal, fsync on every commit
+BASELINE_PRAGMAS = {
+    'journal_mode': 'DELETE',
+    'synchronous': 'FULL',
+    'cache_size': -2000,
+    'mmap_size': 0,
+    'temp_store': 'DEFAULT',
+}
+
+
+class Command(BaseCommand):
+    help = ('Measure workflow transitions per second, before (stock SQLite settings, one commit '
+            'per save) and after (SQLITE_PRAGMAS, one transaction per transition)')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--bmrs', type=int, default=10, help='Throwaway BMRs walked through their workflow per run')
+        parser.add_argument('--product', help='Name of the product to create the BMRs for (default: first tablet product)')
+        parser.add_argument('--mode', choices=['both', 'baseline', 'optimized'], default='both')
+
+    def handle(self, *args, **options):
+        product = self._product(options['product'])
+        user = get_user_model().objects.filter(is_superuser=True).first() or get_user_model().objects.first()
+        if user is None:
+            raise CommandError('Create a user before benchmarking.')
+
+        modes = ['baseline', 'optimized'] if options['mode'] == 'both' else [options['mode']]
+        results = {}
+        try:
+            for run, mode in enumerate(modes, start=1):
+                if connection.vendor == 'sqlite':
+                    apply_sqlite_pragmas(connection, BASELINE_PRAGMAS if mode == 'baseline' else settings.SQLITE_PRAGMAS)
+                bmrs = self._create_bmrs(product, user, options['bmrs'], run)
+                transitions, elapsed = self._walk(bmrs, user, atomic=(mode == 'optimized'))
+                results[mode] = transitions / elapsed if elapsed else 0
+                self.stdout.write(
+                    f'{mode:<10} {transitions:>5} transitions in {elapsed:6.2f}s  '
+                    f'{results[mode]:8.1f} transitions/s'
+                )
+        finally:
+            BMR.objects.filter(batch_number__startswith=BENCH_PREFIX).delete()
+            if connection.vendor == 'sqlite':
+                apply_sqlite_pragmas(connection, settings.SQLITE_PRAGMAS)
+
+        if len(results) == 2 and results['baseline']:
+            self.stdout.write(self.style.SUCCESS(
+                f"Optimized mode is {results['optimized'] / results['baseline']:.1f}x the baseline"
+            ))
+
+    def _product(self, name):
+        products = Product.objects.all()
+        product = products.filter(product_name=name).first() if name else products.filter(product_type='tablet').first()
+        if product is None:
+            raise CommandError('No product to benchmark with; pass --product or load products first.')
+        return product
+
+    def _create_bmrs(self, product, user, count, run):
+        BMR.objects.filter(batch_number__startswith=BENCH_PREFIX).delete()
+        return [
+            BMR.objects.create(
+                batch_number=f'{BENCH_PREFIX}{run}{index:05d}',
+                product=product,
+                created_by=user,
+                status='approved',
+            )
+            for index in range(count)
+        ]
+
+    def _walk(self, bmrs, user, atomic):
+        """Start and complete every pending phase until the workflows stop advancing"""
+        transitions = 0
+        started = time.perf_counter()
+        while True:
+            pending = list(
+                BatchPhaseExecution.objects.filter(bmr__in=bmrs, status='pending')
+                .select_related('bmr', 'phase')
+            )
+            if not pending:
+                break
+            for execution in pending:
+                execution.status = 'in_progress'
+                execution.started_by = user
+                execution.started_date = timezone.now()
+                self._save(execution, atomic)
+
+                execution.status = 'completed'
+                execution.completed_by = user
+                execution.completed_date = timezone.now()
+                self._save(execution, atomic)
+                transitions += 2
+        return transitions, time.perf_counter() - started
+
+    def _save(self, execution, atomic):
+        if atomic:
+            WorkflowService.save_transition(execution)
+            return
+        # What the dashboards did before: each write commits on its own
+        execution.save()
+        if execution.status == 'completed':
+            WorkflowService.trigger_next_phase(execution.bmr, execution.phase)
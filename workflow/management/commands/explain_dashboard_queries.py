@@ -0,0 +1,95 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+
+from workflow.models import BatchPhaseExecution, Machine
+
+
+class Command(BaseCommand):
+    help = 'Run the main dashboard BatchPhaseExecution queries under EXPLAIN and report index usage'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--fail-on-scan',
+            action='store_true',
+            help='Exit with an error if any query falls back to a full table scan',
+        )
+        parser.add_argument(
+            '--verbose-plan',
+            action='store_true',
+            help='Print the full query plan for every query',
+        )
+
+    def handle(self, *args, **options):
+        table = BatchPhaseExecution._meta.db_table
+        sample = BatchPhaseExecution.objects.order_by('-id').first()
+        machine = Machine.objects.first()
+        bmr_id = sample.bmr_id if sample else 0
+        phase_id = sample.phase_id if sample else 0
+        user_id = sample.completed_by_id if sample and sample.completed_by_id else 0
+        machine_id = machine.id if machine else 0
+        since = timezone.now() - timedelta(days=30)
+
+        # The lookups below mirror the filters used by the operator, QA, QC,
+        # admin and machine dashboards.
+        queries = [
+            ('bmr + phase lookup', BatchPhaseExecution.objects.filter(
+                bmr_id=bmr_id, phase__phase_name='material_dispensing')),
+            ('status queue', BatchPhaseExecution.objects.filter(status='pending')),
+            ('active phase queue', BatchPhaseExecution.objects.filter(
+                phase_id=phase_id, status__in=['pending', 'in_progress'])),
+            ('phase + status', BatchPhaseExecution.objects.filter(
+                phase_id=phase_id, status='completed')),
+            ('operator completions', BatchPhaseExecution.objects.filter(
+                completed_by_id=user_id, completed_date__gte=since)),
+            ('completed date range', BatchPhaseExecution.objects.filter(
+                completed_date__gte=since, status='completed')),
+            ('machine in use', BatchPhaseExecution.objects.filter(
+                machine_used_id=machine_id, status='in_progress')),
+        ]
+
+        self.stdout.write(f'Database vendor: {connection.vendor}')
+        if BatchPhaseExecution.objects.count() < 1000:
+            self.stdout.write(self.style.WARNING(
+                'Fewer than 1000 phase executions - the planner may prefer a table scan on small tables.'
+            ))
+
+        scans = []
+        for label, queryset in queries:
+            plan = queryset.order_by().explain()
+            uses_index = self._uses_index(plan, table)
+            if uses_index:
+                self.stdout.write(self.style.SUCCESS(f'[INDEX] {label}'))
+            else:
+                scans.append(label)
+                self.stdout.write(self.style.ERROR(f'[SCAN]  {label}'))
+            if options['verbose_plan'] or not uses_index:
+                for line in plan.splitlines():
+                    self.stdout.write(f'        {line}')
+
+        if scans:
+            message = f'{len(scans)} of {len(queries)} queries scan {table}: {", ".join(scans)}'
+            if options['fail_on_scan']:
+                raise CommandError(message)
+            self.stdout.write(self.style.WARNING(message))
+        else:
+            self.stdout.write(self.style.SUCCESS(f'All {len(queries)} queries use an index on {table}'))
+
+    def _uses_index(self, plan, table):
+        """Return False if the plan contains a full scan of the given table"""
+        for line in plan.splitlines():
+            if table not in line:
+                continue
+            if connection.vendor == 'sqlite':
+                # e.g. "SCAN workflow_batchphaseexecution" vs "SEARCH ... USING INDEX ..."
+                if 'SCAN' in line and 'USING' not in line:
+                    return False
+            elif connection.vendor == 'postgresql':
+                if 'Seq Scan' in line:
+                    return False
+            elif connection.vendor == 'mysql':
+                if '\tALL\t' in line or ' ALL ' in line:
+                    return False
+        return True
@@ -0,0 +1,16 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from workflow.models import IdempotencyKey
+
+
+class Command(BaseCommand):
+    help = 'Delete transition API idempotency keys older than IDEMPOTENCY_KEY_TTL_HOURS (run daily from cron)'
+
+    def handle(self, *args, **options):
+        expired = timezone.now() - timedelta(hours=settings.IDEMPOTENCY_KEY_TTL_HOURS)
+        count, _ = IdempotencyKey.objects.filter(created_at__lt=expired).delete()
+        self.stdout.write(self.style.SUCCESS(f'Deleted {count} expired idempotency keys'))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from workflow.eta import rebuild_stats
+
+
+class Command(BaseCommand):
+    help = 'Recompute the per product type and phase duration statistics used for BMR completion ETAs'
+
+    def handle(self, *args, **options):
+        count = rebuild_stats()
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt statistics for {count} product type/phase pairs'))
@@ -0,0 +1,63 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from workflow.scheduling import build_schedule, reschedule, reschedule_if_dirty
+
+
+class Command(BaseCommand):
+    help = 'Schedule the pending phases of open BMRs onto machines and update the BMR planned dates'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--time-limit', type=float, default=5.0, help='Seconds of local search (default: 5)')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--repair', action='store_true',
+                            help='Only re-time the stored schedule in its current BMR order, without searching')
+        parser.add_argument('--if-dirty', action='store_true',
+                            help='With --repair: only re-time when a phase or machine change marked the schedule '
+                                 'dirty (run from cron every minute)')
+        parser.add_argument('--watch', type=float, metavar='SECONDS',
+                            help='Keep running, re-timing a dirty schedule every SECONDS')
+
+    def handle(self, *args, **options):
+        if options['watch']:
+            if options['watch'] <= 0:
+                raise CommandError('--watch needs a positive number of seconds')
+            self.stdout.write(f"Re-timing the schedule when it is marked dirty, checking every {options['watch']}s")
+            # A change has to be this old before it is picked up, so a burst of
+            # transitions is folded into one re-time
+            settle = getattr(settings, 'SCHEDULER_RESCHEDULE_SETTLE_SECONDS', 30)
+            while True:
+                summary = reschedule_if_dirty(settle_seconds=settle)
+                if summary:
+                    self._report(summary)
+                time.sleep(options['watch'])
+
+        if options['if_dirty']:
+            if not options['repair']:
+                raise CommandError('--if-dirty only applies to --repair')
+            summary = reschedule_if_dirty()
+            if summary is None:
+                self.stdout.write('Schedule is up to date')
+                return
+        elif options['repair']:
+            summary = reschedule()
+        else:
+            summary = build_schedule(time_limit=options['time_limit'], seed=options['seed'])
+        self._report(summary)
+
+    def _report(self, summary):
+        self.stdout.write(
+            f"{summary['bmrs']} BMRs, {summary['phases']} phases scheduled "
+            f"({summary['in_progress']} in progress, {summary['unassigned']} without a machine)"
+        )
+        if 'iterations' in summary:
+            self.stdout.write(
+                f"Total completion {summary['baseline_total_hours']}h -> {summary['total_completion_hours']}h "
+                f"after {summary['iterations']} moves"
+            )
+        self.stdout.write(self.style.SUCCESS(
+            f"Makespan {summary['makespan_hours']}h, {summary['changeover_hours']}h of changeovers, "
+            f"computed in {summary['elapsed_s']}s"
+        ))
@@ -0,0 +1,94 @@
+import json
+import time
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.utils import timezone
+
+from workflow.simulation import load_model, simulate
+
+
+def product_count(value):
+    try:
+        product_id, _, count = value.partition(':')
+        return int(product_id), int(count or 1)
+    except ValueError:
+        raise ValueError(f'{value!r} is not PRODUCT_ID:COUNT')
+
+
+class Command(BaseCommand):
+    help = ('What-if simulation: release BMRs (existing or planned) and report ETA percentiles '
+            'and per-phase bottlenecks from Monte Carlo replications')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--bmr', type=int, action='append', default=[], dest='bmrs', help='Existing BMR id to release (repeatable)')
+        parser.add_argument('--product', type=product_count, action='append', default=[], dest='planned',
+                            help='PRODUCT_ID:COUNT new batches to release (repeatable)')
+        parser.add_argument('--release', help='When the plan is released, YYYY-MM-DD[THH:MM] (default: now)')
+        parser.add_argument('--replications', type=int, default=1000)
+        parser.add_argument('--workers', type=int, help='Worker processes (default: one per CPU)')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--history-days', type=int, default=365, help='Phase history used for durations')
+        parser.add_argument('--no-wip', action='store_false', dest='include_wip',
+                            help="Ignore the other open BMRs already on the floor")
+        parser.add_argument('--json', help='Also write the full result to this file')
+
+    def handle(self, *args, **options):
+        if not options['bmrs'] and not options['planned']:
+            raise CommandError('Give at least one --bmr or --product to simulate.')
+        release = None
+        if options['release']:
+            try:
+                release = timezone.make_aware(datetime.fromisoformat(options['release']))
+            except ValueError:
+                raise CommandError('--release must be YYYY-MM-DD or YYYY-MM-DDTHH:MM')
+
+        try:
+            model = load_model(
+                bmr_ids=options['bmrs'],
+                planned=options['planned'],
+                release=release,
+                include_wip=options['include_wip'],
+                history_days=options['history_days'],
+            )
+        except ValueError as e:
+            raise CommandError(str(e))
+        # Worker processes must not inherit open database connections
+        connections.close_all()
+
+        started = time.perf_counter()
+        result = simulate(model, options['replications'], workers=options['workers'], seed=options['seed'])
+        elapsed = time.perf_counter() - started
+
+        def fmt(value):
+            return timezone.localtime(value).strftime('%Y-%m-%d %H:%M') if value else '-'
+
+        self.stdout.write(
+            f"{result['replications']} replications of {result['plan_batches']} planned batches "
+            f"(+{result['background_batches']} open BMRs) in {elapsed:.1f}s"
+        )
+        completion = result['plan_completion']
+        self.stdout.write(self.style.SUCCESS(
+            f"Plan complete: P10 {fmt(completion['p10'])}  P50 {fmt(completion['p50'])}  P90 {fmt(completion['p90'])}"
+        ))
+        for batch in result['batches']:
+            self.stdout.write(
+                f"  {batch['reference']:<28} P10 {fmt(batch['p10'])}  P50 {fmt(batch['p50'])}  P90 {fmt(batch['p90'])}"
+            )
+        self.stdout.write('Phases by utilisation:')
+        for row in result['phases']:
+            if not row['resources']:
+                continue
+            resources = ', '.join(f'{name}={count}' for name, count in row['resources'].items())
+            self.stdout.write(
+                f"  {row['phase']:<28} {row['utilisation']:6.1%} busy  "
+                f"wait {row['mean_wait_hours']:6.1f}h  ({resources})"
+            )
+        if result['unconstrained_phases']:
+            self.stdout.write('No machine or operator capacity modelled for: ' + ', '.join(result['unconstrained_phases']))
+
+        if options['json']:
+            with open(options['json'], 'w') as fh:
+                json.dump(result, fh, indent=2, default=str)
+            self.stdout.write(f"Results written to {options['json']}")
@@ -0,0 +1,37 @@
+# Generated by Django 4.2.7 on 2026-10-19 07:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('workflow', '0011_alter_machine_machine_type'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='batchphaseexecution',
+            index=models.Index(fields=['status'], name='bpe_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='batchphaseexecution',
+            index=models.Index(fields=['phase', 'status'], name='bpe_phase_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='batchphaseexecution',
+            index=models.Index(fields=['completed_by', 'completed_date'], name='bpe_completed_by_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='batchphaseexecution',
+            index=models.Index(fields=['completed_date'], name='bpe_completed_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='batchphaseexecution',
+            index=models.Index(fields=['machine_used', 'status'], name='bpe_machine_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='batchphaseexecution',
+            index=models.Index(condition=models.Q(('status__in', ['pending', 'in_progress'])), fields=['phase', 'bmr'], name='bpe_active_phase_idx'),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 4.2.7 on 2026-10-19 08:45
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('workflow', '0012_batchphaseexecution_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PhaseSchedule',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('planned_start', models.DateTimeField()),
+                ('planned_end', models.DateTimeField()),
+                ('changeover_hours', models.FloatField(default=0)),
+                ('priority', models.PositiveIntegerField(default=0)),
+                ('scheduled_at', models.DateTimeField(auto_now=True)),
+                ('execution', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='schedule', to='workflow.batchphaseexecution')),
+                ('machine', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='workflow.machine')),
+            ],
+            options={
+                'ordering': ['planned_start'],
+                'indexes': [models.Index(fields=['machine', 'planned_start'], name='phase_schedule_machine_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 4.2.7 on 2026-10-19 08:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('workflow', '0013_phaseschedule'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PhaseDurationStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('product_type', models.CharField(max_length=20)),
+                ('phase_name', models.CharField(max_length=50)),
+                ('samples', models.PositiveIntegerField(default=0)),
+                ('active_hours_sum', models.FloatField(default=0)),
+                ('active_hours_sq_sum', models.FloatField(default=0)),
+                ('wait_samples', models.PositiveIntegerField(default=0)),
+                ('wait_hours_sum', models.FloatField(default=0)),
+                ('wait_hours_sq_sum', models.FloatField(default=0)),
+                ('last_completed', models.DateTimeField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'ordering': ['product_type', 'phase_name'],
+                'unique_together': {('product_type', 'phase_name')},
+            },
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 4.2.7 on 2026-10-19 14:10
+
+from django.db import migrations, models
+from django.db.models import Max
+import django.db.models.deletion
+
+
+def record_counted_completions(apps, schema_editor):
+    # update_stats used to count every completion up to the latest last_completed
+    BatchPhaseExecution = apps.get_model('workflow', 'BatchPhaseExecution')
+    PhaseDurationSample = apps.get_model('workflow', 'PhaseDurationSample')
+    PhaseDurationStat = apps.get_model('workflow', 'PhaseDurationStat')
+    watermark = PhaseDurationStat.objects.aggregate(latest=Max('last_completed'))['latest']
+    if watermark is None:
+        return
+    counted = BatchPhaseExecution.objects.filter(status='completed', completed_date__lte=watermark)
+    PhaseDurationSample.objects.bulk_create(
+        [PhaseDurationSample(execution_id=execution_id) for execution_id in counted.values_list('id', flat=True)],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('workflow', '0016_schedulerstate'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PhaseDurationSample',
+            fields=[
+                ('execution', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='duration_sample', serialize=False, to='workflow.batchphaseexecution')),
+            ],
+        ),
+        migrations.RunPython(record_counted_completions, migrations.RunPython.noop),
+    ]
@@ -167,17 +167,36 @@ class BatchPhaseExecution(models.Model):
     class Meta:
         unique_together = ['bmr', 'phase']
         ordering = ['bmr', 'phase__phase_order']
+        indexes = [
+            models.Index(fields=['status'], name='bpe_status_idx'),
+            models.Index(fields=['phase', 'status'], name='bpe_phase_status_idx'),
+            models.Index(fields=['completed_by', 'completed_date'], name='bpe_completed_by_date_idx'),
+            models.Index(fields=['completed_date'], name='bpe_completed_date_idx'),
+            models.Index(fields=['machine_used', 'status'], name='bpe_machine_status_idx'),
+            # Partial index for the operator/QA queues, which only ever look at active work
+            models.Index(
+                fields=['phase', 'bmr'],
+                name='bpe_active_phase_idx',
+                condition=models.Q(status__in=['pending', 'in_progress']),
+            ),
+        ]
     
     def __str__(self):
         return f"{self.bmr.batch_number} - {self.phase.get_phase_name_display()} ({self.status})"
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the stored status and breakdown flag so post_save handlers can tell a
+        # status change from any other save of the row
+        instance._loaded_status = instance.__dict__.get('status')
+        instance._loaded_breakdown = instance.__dict__.get('breakdown_occurred')
+        return instance
+    
     def requires_machine_selection(self):
         """Check if this phase requires machine selection"""
-        machine_required_phases = [
-            'granulation', 'blending', 'compression', 
-            'coating', 'blister_packing', 'filling'
-        ]
-        return self.phase.phase_name in machine_required_phases
+        from .registry import requires_machine
+        return requires_machine(self.phase.phase_name)
     
     def get_breakdown_duration(self):
         """Calculate breakdown duration in minutes"""
@@ -278,3 +297,108 @@ class PhaseCheckpoint(models.Model):
     
     def __str__(self):
         return f"{self.phase_execution} - {self.checkpoint_name}"
+
+class PhaseSchedule(models.Model):
+    """Planned machine and time slot for a phase, written by workflow.scheduling"""
+    
+    execution = models.OneToOneField(
+        BatchPhaseExecution,
+        on_delete=models.CASCADE,
+        related_name='schedule'
+    )
+    machine = models.ForeignKey(Machine, on_delete=models.SET_NULL, null=True, blank=True)
+    planned_start = models.DateTimeField()
+    planned_end = models.DateTimeField()
+    changeover_hours = models.FloatField(default=0)
+    # Position of the BMR in the solver's priority order, reused when rescheduling
+    priority = models.PositiveIntegerField(default=0)
+    scheduled_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        ordering = ['planned_start']
+        indexes = [
+            models.Index(fields=['machine', 'planned_start'], name='phase_schedule_machine_idx'),
+        ]
+    
+    def __str__(self):
+        machine = self.machine.name if self.machine else 'no machine'
+        return f"{self.execution} on {machine} at {self.planned_start:%Y-%m-%d %H:%M}"
+
+class SchedulerState(models.Model):
+    """
+    Single row recording that the stored PhaseSchedule is out of date. Phase and machine
+    changes set dirty_since; `schedule_phases --repair --if-dirty` (or --watch) re-times
+    the schedule off the request path and clears it.
+    """
+
+    SINGLETON_ID = 1
+
+    dirty_since = models.DateTimeField(null=True, blank=True)
+    last_rescheduled_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"Schedule dirty since {self.dirty_since}" if self.dirty_since else "Schedule up to date"
+
+class PhaseDurationStat(models.Model):
+    """
+    Running totals of active and queue-wait hours per product type and phase, kept by
+    workflow.eta. Means and variances are derived from the sums.
+    """
+    
+    product_type = models.CharField(max_length=20)
+    phase_name = models.CharField(max_length=50)
+    samples = models.PositiveIntegerField(default=0)
+    active_hours_sum = models.FloatField(default=0)
+    active_hours_sq_sum = models.FloatField(default=0)
+    wait_samples = models.PositiveIntegerField(default=0)
+    wait_hours_sum = models.FloatField(default=0)
+    wait_hours_sq_sum = models.FloatField(default=0)
+    # Latest completion folded in
+    last_completed = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        unique_together = ['product_type', 'phase_name']
+        ordering = ['product_type', 'phase_name']
+    
+    def __str__(self):
+        return f"{self.product_type} {self.phase_name} ({self.samples} samples)"
+
+class PhaseDurationSample(models.Model):
+    """
+    A completion already folded into PhaseDurationStat. update_stats claims its new
+    completions here first, so each one is counted once.
+    """
+    
+    execution = models.OneToOneField(
+        BatchPhaseExecution, 
+        on_delete=models.CASCADE, 
+        primary_key=True, 
+        related_name='duration_sample'
+    )
+    
+    def __str__(self):
+        return f"Sample of execution {self.execution_id}"
+
+class IdempotencyKey(models.Model):
+    """
+    Response of a transition API request, kept so a client retrying with the same
+    Idempotency-Key gets the original answer instead of applying the action twice
+    """
+    
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='idempotency_keys')
+    key = models.CharField(max_length=255)
+    # SHA-256 of the method, path and body, so a reused key with a different request is refused
+    request_hash = models.CharField(max_length=64)
+    response_status = models.PositiveSmallIntegerField(null=True, blank=True)
+    response_body = models.JSONField(default=dict, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        unique_together = ['user', 'key']
+        indexes = [
+            models.Index(fields=['created_at'], name='idempotency_key_created_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.user} {self.key} ({self.response_status})"
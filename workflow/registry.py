@@ -0,0 +1,193 @@
+"""
+Who works on which production phase, where each role lands after login, which phases
+need a machine and where a failed phase sends the batch back to.
+
+The tables below are the single source for those rules. They are frozen when this
+module is imported and checked against the role, phase and machine choices in
+WorkflowConfig.ready(), so a typo fails at startup instead of on some request.
+Views and services use the lookup functions, which are plain dict/set lookups.
+"""
+from types import MappingProxyType
+
+from django.core.exceptions import ImproperlyConfigured
+
+DEFAULT_DASHBOARD = 'dashboards:admin_dashboard'
+
+# role -> dashboard url name
+_ROLE_DASHBOARDS = {
+    'qa': 'dashboards:qa_dashboard',
+    'regulatory': 'dashboards:regulatory_dashboard',
+    'store_manager': 'dashboards:store_dashboard',  # Main Store Dashboard with sidebar
+    'packaging_store': 'dashboards:packaging_dashboard',
+    'finished_goods_store': 'dashboards:finished_goods_dashboard',
+    'mixing_operator': 'dashboards:mixing_dashboard',
+    'qc': 'dashboards:qc_dashboard',  # Main QC Dashboard with sidebar
+    'tube_filling_operator': 'dashboards:tube_filling_dashboard',
+    'packing_operator': 'dashboards:packing_dashboard',
+    'granulation_operator': 'dashboards:granulation_dashboard',
+    'blending_operator': 'dashboards:blending_dashboard',
+    'compression_operator': 'dashboards:compression_dashboard',
+    'sorting_operator': 'dashboards:sorting_dashboard',
+    'coating_operator': 'dashboards:coating_dashboard',
+    'drying_operator': 'dashboards:drying_dashboard',
+    'filling_operator': 'dashboards:filling_dashboard',
+    'dispensing_operator': 'dashboards:operator_dashboard',  # Material dispensing uses operator dashboard
+    'equipment_operator': 'dashboards:operator_dashboard',
+    'cleaning_operator': 'dashboards:operator_dashboard',
+    'admin': 'dashboards:admin_dashboard',
+}
+
+# role -> phases that role starts and completes
+_ROLE_PHASES = {
+    'qa': ['bmr_creation', 'final_qa'],
+    'regulatory': ['regulatory_approval'],
+    'store_manager': ['raw_material_release'],  # Store Manager handles raw material release
+    'dispensing_operator': ['material_dispensing'],
+    'packaging_store': ['packaging_material_release'],
+    'finished_goods_store': ['finished_goods_store'],
+    'qc': ['post_compression_qc', 'post_mixing_qc', 'post_blending_qc'],
+    'mixing_operator': ['mixing'],
+    'granulation_operator': ['granulation'],
+    'blending_operator': ['blending'],
+    'compression_operator': ['compression'],
+    'coating_operator': ['coating'],
+    'drying_operator': ['drying'],
+    'filling_operator': ['filling'],
+    'tube_filling_operator': ['tube_filling'],
+    'packing_operator': ['blister_packing', 'bulk_packing', 'secondary_packaging'],
+    'sorting_operator': ['sorting'],
+}
+
+# role -> phase name shown on the operator dashboards (defaults to 'production')
+DEFAULT_DASHBOARD_PHASE = 'production'
+_ROLE_DASHBOARD_PHASES = {
+    'mixing_operator': 'mixing',
+    'granulation_operator': 'granulation',
+    'blending_operator': 'blending',
+    'compression_operator': 'compression',
+    'coating_operator': 'coating',
+    'drying_operator': 'drying',
+    'filling_operator': 'filling',
+    'tube_filling_operator': 'tube_filling',
+    'packing_operator': 'packing',
+    'sorting_operator': 'sorting',
+    'dispensing_operator': 'dispensing',
+}
+
+# Phases that can't be started without picking a machine
+_MACHINE_PHASES = [
+    'granulation', 'blending', 'compression', 'coating',
+    'blister_packing', 'bulk_packing', 'filling',
+]
+
+# Failed QC phase -> phase the batch is sent back to for rework
+_QC_ROLLBACKS = {
+    'post_compression_qc': 'granulation',
+    'post_mixing_qc': 'mixing',
+    'post_blending_qc': 'blending',
+}
+
+# Product type (or tablet type) -> packing phase reworked when Final QA rejects a batch
+DEFAULT_FINAL_QA_REWORK_PHASE = 'secondary_packaging'
+_FINAL_QA_REWORK_PHASES = {
+    'tablet': 'blister_packing',
+    'tablet_2': 'bulk_packing',
+    'capsule': 'blister_packing',
+    'ointment': 'secondary_packaging',
+}
+
+# Phases that exist in the workflow without a ProductionPhase choice of their own
+_EXTRA_PHASES = {'raw_material_release'}
+
+ROLE_DASHBOARDS = MappingProxyType(_ROLE_DASHBOARDS)
+ROLE_PHASES = MappingProxyType({role: tuple(phases) for role, phases in _ROLE_PHASES.items()})
+ROLE_DASHBOARD_PHASES = MappingProxyType(_ROLE_DASHBOARD_PHASES)
+MACHINE_PHASES = frozenset(_MACHINE_PHASES)
+QC_ROLLBACKS = MappingProxyType(_QC_ROLLBACKS)
+QC_PHASES = frozenset(_QC_ROLLBACKS)
+FINAL_QA_REWORK_PHASES = MappingProxyType(_FINAL_QA_REWORK_PHASES)
+PHASE_ROLES = MappingProxyType({
+    phase: role for role, phases in ROLE_PHASES.items() for phase in phases
+})
+
+
+def dashboard_for_role(role):
+    return ROLE_DASHBOARDS.get(role, DEFAULT_DASHBOARD)
+
+
+def phases_for_role(role):
+    return ROLE_PHASES.get(role, ())
+
+
+def dashboard_phase_for_role(role):
+    return ROLE_DASHBOARD_PHASES.get(role, DEFAULT_DASHBOARD_PHASE)
+
+
+def role_for_phase(phase_name):
+    return PHASE_ROLES.get(phase_name)
+
+
+def requires_machine(phase_name):
+    return phase_name in MACHINE_PHASES
+
+
+def qc_rollback_phase(qc_phase_name):
+    """The phase a failed QC phase sends the batch back to, or None"""
+    return QC_ROLLBACKS.get(qc_phase_name)
+
+
+def final_qa_rework_phase(product):
+    """The packing phase redone when Final QA rejects a batch of this product"""
+    if product.product_type == 'tablet' and getattr(product, 'tablet_type', None) == 'tablet_2':
+        return FINAL_QA_REWORK_PHASES['tablet_2']
+    return FINAL_QA_REWORK_PHASES.get(product.product_type, DEFAULT_FINAL_QA_REWORK_PHASE)
+
+
+def validate():
+    """Check every table against the model choices; raises ImproperlyConfigured"""
+    from accounts.models import CustomUser
+    from products.models import Product
+    from .models import Machine, ProductionPhase
+
+    roles = {value for value, _ in CustomUser.ROLE_CHOICES}
+    phases = {value for value, _ in ProductionPhase.PHASE_CHOICES} | _EXTRA_PHASES
+    machine_types = {value for value, _ in Machine.MACHINE_TYPE_CHOICES}
+    product_types = {value for value, _ in Product.PRODUCT_TYPE_CHOICES} | {'tablet_2'}
+
+    errors = []
+    for table, keys in (
+        ('dashboard', ROLE_DASHBOARDS),
+        ('phase', ROLE_PHASES),
+        ('dashboard phase', ROLE_DASHBOARD_PHASES),
+    ):
+        errors += [f'unknown role {role!r} in the {table} table' for role in keys if role not in roles]
+
+    seen = {}
+    for role, role_phases in ROLE_PHASES.items():
+        for phase in role_phases:
+            if phase not in phases:
+                errors.append(f'unknown phase {phase!r} for role {role!r}')
+            if phase in seen:
+                errors.append(f'phase {phase!r} is assigned to both {seen[phase]!r} and {role!r}')
+            seen[phase] = role
+
+    for phase in MACHINE_PHASES:
+        if phase not in phases or phase not in machine_types:
+            errors.append(f'machine phase {phase!r} is not both a phase and a machine type')
+
+    for source, target in QC_ROLLBACKS.items():
+        if source not in phases or target not in phases:
+            errors.append(f'QC rollback {source!r} -> {target!r} names an unknown phase')
+        elif target not in PHASE_ROLES:
+            errors.append(f'QC rollback target {target!r} has no role to redo it')
+
+    for product_type, phase in FINAL_QA_REWORK_PHASES.items():
+        if product_type not in product_types or phase not in phases:
+            errors.append(f'final QA rework {product_type!r} -> {phase!r} is not a known product type and phase')
+
+    for url_name in set(ROLE_DASHBOARDS.values()) | {DEFAULT_DASHBOARD}:
+        if ':' not in url_name:
+            errors.append(f'dashboard {url_name!r} is not a namespaced url name')
+
+    if errors:
+        raise ImproperlyConfigured('Workflow registry: ' + '; '.join(errors))
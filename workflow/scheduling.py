@@ -0,0 +1,406 @@
+"""
+Finite-capacity scheduling of the phases still to run.
+
+`build_schedule` loads every pending/not-ready phase of the open BMRs and places each
+one on a machine of its type (Machine.machine_type == phase name) and in a time slot:
+- a BMR's phases run in phase order after whatever it has in progress
+- a machine runs one phase at a time
+- switching a machine to a different product costs a changeover
+- durations come from ProductionPhase.estimated_duration_hours
+
+Phases with no machine type (approvals, QC, releases) only take time.
+
+The decision the solver searches over is the BMR priority order. A candidate order is
+turned into a schedule by placing each BMR's phases, in priority order, on whichever
+machine of the right type finishes them first. Local search (swapping BMRs, and moving
+a BMR next to another of the same product to save changeovers) keeps any order that
+lowers the total completion time, within a time budget.
+
+`reschedule` is the incremental path: it re-times everything in the last solved
+priority order without searching. When a phase changes status or reports a breakdown,
+or a machine changes, the schedule is only marked dirty (SchedulerState) on commit;
+`reschedule_if_dirty`, run by `schedule_phases --repair --if-dirty` from cron or by
+`schedule_phases --watch`, does the re-timing outside the operators' requests. The
+result is stored as PhaseSchedule rows plus BMR.planned_start_date/planned_completion_date.
+"""
+import random
+import time
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Avg, DurationField, ExpressionWrapper, F, Min
+from django.utils import timezone
+
+from kampala_pharma.events import get_event_logger
+from kampala_pharma.transactions import on_commit_once
+from .models import BatchPhaseExecution, Machine, PhaseSchedule, SchedulerState
+
+events = get_event_logger('workflow')
+
+DEFAULT_PHASE_HOURS = 4.0
+REMAINING_STATUSES = ['pending', 'not_ready']
+OPEN_BMR_STATUSES = ['draft', 'submitted', 'approved', 'in_production']
+
+# Planned times that moved less than this are left as stored
+RESCHEDULE_TOLERANCE = timedelta(minutes=15)
+
+
+def _hours(delta):
+    return delta.total_seconds() / 3600
+
+
+def changeover_hours():
+    """Mean recorded changeover per machine type, else SCHEDULER_CHANGEOVER_HOURS"""
+    default = float(getattr(settings, 'SCHEDULER_CHANGEOVER_HOURS', 1.0))
+    recorded = BatchPhaseExecution.objects.filter(
+        changeover_occurred=True,
+        changeover_start_time__isnull=False,
+        changeover_end_time__gt=F('changeover_start_time'),
+        machine_used__isnull=False,
+    ).values('machine_used__machine_type').annotate(
+        mean=Avg(ExpressionWrapper(F('changeover_end_time') - F('changeover_start_time'), output_field=DurationField()))
+    )
+    hours = defaultdict(lambda: default)
+    for row in recorded:
+        if row['mean'] is not None:
+            hours[row['machine_used__machine_type']] = _hours(row['mean'])
+    return hours
+
+
+class Problem:
+    """Snapshot of the open work, machines and changeover costs, in hours from `now`"""
+
+    def __init__(self, now=None):
+        self.now = now or timezone.now()
+        self.machine_types = machine_types = {value for value, _ in Machine.MACHINE_TYPE_CHOICES}
+
+        executions = list(
+            BatchPhaseExecution.objects.filter(
+                bmr__status__in=OPEN_BMR_STATUSES,
+                status__in=REMAINING_STATUSES + ['in_progress'],
+            ).select_related('phase', 'bmr').only(
+                'bmr_id', 'status', 'started_date', 'machine_used_id', 'breakdown_occurred', 'breakdown_end_time',
+                'phase__phase_name', 'phase__estimated_duration_hours', 'bmr__product_id', 'bmr__created_date',
+                'bmr__planned_start_date', 'bmr__planned_completion_date',
+            ).order_by('bmr_id', 'phase__phase_order')
+        )
+
+        # Machines with a breakdown still open are out of service
+        broken = {
+            execution.machine_used_id for execution in executions
+            if execution.status == 'in_progress' and execution.machine_used_id
+            and execution.breakdown_occurred and execution.breakdown_end_time is None
+        }
+        self.machines = defaultdict(list)
+        for machine in Machine.objects.filter(is_active=True).exclude(id__in=broken).order_by('name'):
+            self.machines[machine.machine_type].append(machine.id)
+        self.changeover = changeover_hours()
+
+        self.machine_free = defaultdict(float)
+        self.machine_product = {}
+        self.fixed = []  # in-progress phases: (execution, machine id, start, end)
+        by_bmr = defaultdict(list)
+        for execution in executions:
+            by_bmr[execution.bmr_id].append(execution)
+
+        self.jobs = []
+        for bmr_id, bmr_executions in by_bmr.items():
+            bmr = bmr_executions[0].bmr
+            ready = 0.0
+            ops = []
+            for execution in bmr_executions:
+                phase = execution.phase
+                hours = float(phase.estimated_duration_hours or 0) or DEFAULT_PHASE_HOURS
+                machine_type = phase.phase_name if phase.phase_name in machine_types else None
+                if execution.status == 'in_progress':
+                    started = _hours((execution.started_date or self.now) - self.now)
+                    end = max(started + hours, 0.0)
+                    ready = max(ready, end)
+                    if execution.machine_used_id:
+                        self.machine_free[execution.machine_used_id] = max(self.machine_free[execution.machine_used_id], end)
+                        self.machine_product[execution.machine_used_id] = bmr.product_id
+                    self.fixed.append((execution, execution.machine_used_id, started, end))
+                else:
+                    ops.append((execution, machine_type, hours))
+            if ops:
+                self.jobs.append({'bmr': bmr, 'product_id': bmr.product_id, 'ready': ready, 'ops': ops})
+
+    def default_order(self):
+        """BMRs already under way first, then oldest first"""
+        return sorted(range(len(self.jobs)), key=lambda index: (
+            self.jobs[index]['ready'] == 0, self.jobs[index]['bmr'].created_date, self.jobs[index]['bmr'].id,
+        ))
+
+    def decode(self, order, record=False):
+        """Place the BMRs' phases in `order`; returns (total completion hours, placements)"""
+        machine_free = dict(self.machine_free)
+        machine_product = dict(self.machine_product)
+        placements = []
+        total = 0.0
+        for index in order:
+            job = self.jobs[index]
+            product = job['product_id']
+            clock = job['ready']
+            for execution, machine_type, hours in job['ops']:
+                chosen, changeover, start = None, 0.0, clock
+                for machine in self.machines.get(machine_type, ()) if machine_type else ():
+                    cost = self.changeover[machine_type] if machine_product.get(machine, product) != product else 0.0
+                    candidate = max(clock, machine_free.get(machine, 0.0) + cost)
+                    if chosen is None or candidate < start:
+                        chosen, changeover, start = machine, cost, candidate
+                end = start + hours
+                if chosen is not None:
+                    machine_free[chosen] = end
+                    machine_product[chosen] = product
+                if record:
+                    placements.append((execution, chosen, start, end, changeover, index))
+                clock = end
+            total += clock
+        return total, placements
+
+    def solve(self, time_limit=2.0, max_iterations=None, seed=0, order=None):
+        """Local search over the BMR order; returns (best order, its cost, iterations)"""
+        rng = random.Random(seed)
+        candidates = [order] if order else []
+        candidates += [
+            self.default_order(),
+            # Same product back to back saves changeovers
+            sorted(self.default_order(), key=lambda index: self.jobs[index]['product_id']),
+        ]
+        best_order, best_cost = None, None
+        for candidate in candidates:
+            cost = self.decode(candidate)[0]
+            if best_cost is None or cost < best_cost:
+                best_order, best_cost = list(candidate), cost
+
+        by_product = defaultdict(list)
+        for index, job in enumerate(self.jobs):
+            by_product[job['product_id']].append(index)
+
+        size = len(best_order)
+        deadline = time.perf_counter() + time_limit
+        iterations = 0
+        while size > 1 and time.perf_counter() < deadline and (max_iterations is None or iterations < max_iterations):
+            iterations += 1
+            order = list(best_order)
+            i = rng.randrange(size)
+            if rng.random() < 0.5:
+                j = rng.randrange(size)
+                order[i], order[j] = order[j], order[i]
+            else:
+                job = order.pop(i)
+                siblings = by_product[self.jobs[job]['product_id']]
+                if len(siblings) < 2:
+                    continue
+                sibling = rng.choice([other for other in siblings if other != job])
+                order.insert(order.index(sibling) + 1, job)
+            cost = self.decode(order)[0]
+            if cost < best_cost:
+                best_order, best_cost = order, cost
+        return best_order, best_cost, iterations
+
+    def save(self, order):
+        """
+        Store `order` as the schedule and update the BMR planned dates.
+
+        Only rows that moved by more than RESCHEDULE_TOLERANCE (or changed machine or
+        priority) are rewritten, so a repair after one phase completes touches the BMRs
+        and machines it affected rather than the whole table.
+        """
+        _, placements = self.decode(order, record=True)
+        at = lambda hours: self.now + timedelta(hours=hours)
+
+        # priority is the BMR's position in the order, which `reschedule` replays
+        rank = {self.jobs[index]['bmr'].id: position for position, index in enumerate(order)}
+        planned = {
+            execution.id: (machine, at(start), at(end), 0.0, rank.get(execution.bmr_id, 0))
+            for execution, machine, start, end in self.fixed
+        }
+        planned.update(
+            (execution.id, (machine, at(start), at(end), changeover, rank[execution.bmr_id]))
+            for execution, machine, start, end, changeover, _ in placements
+        )
+
+        stale, rows = [], []
+        stored = PhaseSchedule.objects.values_list(
+            'id', 'execution_id', 'machine_id', 'planned_start', 'planned_end', 'priority'
+        )
+        for row_id, execution_id, machine, start, end, priority in stored.iterator(chunk_size=5000):
+            new = planned.get(execution_id)
+            if new and new[0] == machine and new[4] == priority and _close(new[1], start) and _close(new[2], end):
+                del planned[execution_id]
+            else:
+                stale.append(row_id)
+        for execution_id, (machine, start, end, changeover, priority) in planned.items():
+            rows.append(PhaseSchedule(
+                execution_id=execution_id, machine_id=machine, priority=priority,
+                planned_start=start, planned_end=end, changeover_hours=changeover,
+            ))
+
+        span = {}
+        for execution, _, start, end, _, index in placements:
+            first, last = span.get(index, (start, end))
+            span[index] = (min(first, start), max(last, end))
+        bmrs = []
+        for index, (start, end) in span.items():
+            bmr = self.jobs[index]['bmr']
+            start = at(start) if self.jobs[index]['ready'] == 0 else bmr.planned_start_date or at(start)
+            if not (_close(bmr.planned_start_date, start) and _close(bmr.planned_completion_date, at(end))):
+                bmr.planned_start_date, bmr.planned_completion_date = start, at(end)
+                bmrs.append(bmr)
+
+        with transaction.atomic():
+            for offset in range(0, len(stale), 500):
+                PhaseSchedule.objects.filter(id__in=stale[offset:offset + 500]).delete()
+            PhaseSchedule.objects.bulk_create(rows, batch_size=1000)
+            from bmr.models import BMR
+            BMR.objects.bulk_update(bmrs, ['planned_start_date', 'planned_completion_date'], batch_size=500)
+        self.rows_written = len(rows)
+        return placements
+
+
+def _close(first, second):
+    if first is None or second is None:
+        return first is second
+    return abs(first - second) <= RESCHEDULE_TOLERANCE
+
+
+def build_schedule(time_limit=2.0, seed=0, now=None):
+    """Solve from scratch and store the schedule; returns a summary"""
+    started = time.perf_counter()
+    problem = Problem(now)
+    baseline = problem.decode(problem.default_order())[0]
+    order, cost, iterations = problem.solve(time_limit=time_limit, seed=seed)
+    placements = problem.save(order)
+    summary = _summary(problem, placements, time.perf_counter() - started)
+    summary.update(iterations=iterations, baseline_total_hours=round(baseline, 1), total_completion_hours=round(cost, 1))
+    events.info('schedule_built', **{key: summary[key] for key in ('bmrs', 'phases', 'iterations', 'elapsed_s')})
+    return summary
+
+
+def reschedule(now=None):
+    """Re-time the open work in the last solved BMR order, without searching"""
+    started = time.perf_counter()
+    problem = Problem(now)
+    previous = dict(
+        PhaseSchedule.objects.filter(execution__bmr__in=[job['bmr'] for job in problem.jobs])
+        .values_list('execution__bmr_id').annotate(rank=Min('priority'))
+    )
+    default = {index: position for position, index in enumerate(problem.default_order())}
+    order = sorted(range(len(problem.jobs)), key=lambda index: (
+        previous.get(problem.jobs[index]['bmr'].id) is None,
+        previous.get(problem.jobs[index]['bmr'].id, 0),
+        default[index],
+    ))
+    placements = problem.save(order)
+    return _summary(problem, placements, time.perf_counter() - started)
+
+
+def schedule_exists():
+    return PhaseSchedule.objects.exists()
+
+
+def mark_schedule_dirty():
+    """
+    Record that the stored schedule needs re-timing; a no-op write when already marked.
+    Creates the SchedulerState row if it is missing.
+    """
+    now = timezone.now()
+    marked = SchedulerState.objects.filter(pk=SchedulerState.SINGLETON_ID, dirty_since__isnull=True).update(
+        dirty_since=now
+    )
+    if not marked:
+        SchedulerState.objects.get_or_create(pk=SchedulerState.SINGLETON_ID, defaults={'dirty_since': now})
+
+
+def request_reschedule():
+    """
+    Mark the schedule out of date once the current transaction commits. The re-timing
+    itself runs off the request path, in `schedule_phases --repair --if-dirty` (cron)
+    or `schedule_phases --watch`. A transaction that changes many executions (bulk
+    transitions) marks it once.
+    """
+    if not getattr(settings, 'SCHEDULER_AUTO_RESCHEDULE', True):
+        return
+    on_commit_once(mark_schedule_dirty)
+
+
+def reschedule_if_dirty(settle_seconds=0):
+    """
+    Re-time the stored schedule if a change marked it dirty at least `settle_seconds`
+    ago, so a burst of transitions is folded into one re-time. Returns the reschedule
+    summary, or None when nothing was due.
+    """
+    state = SchedulerState.objects.filter(pk=SchedulerState.SINGLETON_ID).values_list('dirty_since', flat=True).first()
+    if state is None or timezone.now() - state < timedelta(seconds=settle_seconds):
+        return None
+    # Clear the mark first: changes made while re-timing mark it again for the next run
+    claimed = SchedulerState.objects.filter(pk=SchedulerState.SINGLETON_ID, dirty_since=state).update(dirty_since=None)
+    if not claimed or not schedule_exists():
+        return None
+    try:
+        summary = reschedule()
+    except Exception as e:
+        events.error('reschedule_failed', error=e)
+        mark_schedule_dirty()
+        raise
+    SchedulerState.objects.filter(pk=SchedulerState.SINGLETON_ID).update(last_rescheduled_at=timezone.now())
+    return summary
+
+
+def _summary(problem, placements, elapsed):
+    ends = [end for _, _, _, end, _, _ in placements] + [end for _, _, _, end in problem.fixed]
+    return {
+        'computed_at': problem.now,
+        'bmrs': len(problem.jobs),
+        'phases': len(placements),
+        'in_progress': len(problem.fixed),
+        'unassigned': sum(
+            1 for execution, machine, _, _, _, _ in placements
+            if machine is None and execution.phase.phase_name in problem.machine_types
+        ),
+        'changeover_hours': round(sum(changeover for _, _, _, _, changeover, _ in placements), 1),
+        'makespan_hours': round(max(ends, default=0.0), 1),
+        'rows_written': problem.rows_written,
+        'elapsed_s': round(elapsed, 3),
+    }
+
+
+def gantt_rows(start=None, end=None, machine_type=None, bmr_id=None):
+    """Stored schedule as Gantt tasks, each depending on the BMR's previous task"""
+    schedule = PhaseSchedule.objects.select_related(
+        'execution__bmr__product', 'execution__phase', 'machine'
+    ).order_by('execution__bmr_id', 'execution__phase__phase_order')
+    if start:
+        schedule = schedule.filter(planned_end__gte=start)
+    if end:
+        schedule = schedule.filter(planned_start__lte=end)
+    if machine_type:
+        schedule = schedule.filter(machine__machine_type=machine_type)
+    if bmr_id:
+        schedule = schedule.filter(execution__bmr_id=bmr_id)
+
+    tasks = []
+    previous = {}
+    for row in schedule:
+        execution = row.execution
+        bmr = execution.bmr
+        tasks.append({
+            'id': execution.id,
+            'name': f'{bmr.batch_number} {execution.phase.get_phase_name_display()}',
+            'bmr_id': bmr.id,
+            'batch_number': bmr.batch_number,
+            'product': bmr.product.product_name,
+            'phase': execution.phase.phase_name,
+            'status': execution.status,
+            'resource': row.machine.name if row.machine else None,
+            'machine_id': row.machine_id,
+            'start': row.planned_start,
+            'end': row.planned_end,
+            'changeover_hours': round(row.changeover_hours, 2),
+            'dependencies': [previous[bmr.id]] if bmr.id in previous else [],
+        })
+        previous[bmr.id] = execution.id
+    return tasks
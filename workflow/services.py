@@ -1,7 +1,16 @@
+import logging
+
+from django.db import transaction
 from django.utils import timezone
 from bmr.models import BMR
+from kampala_pharma.events import get_event_logger
+from . import registry
+from .eta import predict_completion
 from .models import ProductionPhase, BatchPhaseExecution
 
+events = get_event_logger('workflow')
+qc_events = get_event_logger('qc')
+
 class WorkflowService:
     """Service to manage workflow progression and phase automation"""
     
@@ -56,9 +65,9 @@ class WorkflowService:
     }
     
     @classmethod
-    def initialize_workflow_for_bmr(cls, bmr):
-        """Initialize all workflow phases for a new BMR using the correct system workflow"""
-        product_type = bmr.product.product_type
+    def get_workflow_phase_names(cls, product):
+        """Return the ordered phase names a product goes through, including coating/packing variants"""
+        product_type = product.product_type
         
         # Use the PRODUCT_WORKFLOWS dictionary which includes raw_material_release
         base_workflow = cls.PRODUCT_WORKFLOWS.get(product_type, [])
@@ -71,12 +80,12 @@ class WorkflowService:
         # Handle tablet-specific logic for coating and packing types
         if product_type == 'tablet':
             # Handle coating - skip if not coated
-            if not getattr(bmr.product, 'is_coated', False):
+            if not getattr(product, 'is_coated', False):
                 if 'coating' in workflow_phases:
                     workflow_phases.remove('coating')
             
             # Handle packing type for tablets
-            if getattr(bmr.product, 'tablet_type', None) == 'tablet_2':
+            if getattr(product, 'tablet_type', None) == 'tablet_2':
                 # TABLET_2 uses bulk_packing instead of blister_packing
                 if 'blister_packing' in workflow_phases:
                     index = workflow_phases.index('blister_packing')
@@ -85,7 +94,7 @@ class WorkflowService:
         # Handle capsule-specific logic for packing types
         if product_type == 'capsule':
             # Handle bulk capsules
-            if getattr(bmr.product, 'capsule_type', None) == 'bulk':
+            if getattr(product, 'capsule_type', None) == 'bulk':
                 # Bulk capsules use bulk_packing instead of blister_packing
                 if 'blister_packing' in workflow_phases:
                     index = workflow_phases.index('blister_packing')
@@ -93,11 +102,13 @@ class WorkflowService:
         
         # Remove any duplicate phases that might exist
         seen = set()
-        workflow_phases = [x for x in workflow_phases if not (x in seen or seen.add(x))]
-
-        # Remove any accidental duplicates
-        seen = set()
-        workflow_phases = [x for x in workflow_phases if not (x in seen or seen.add(x))]
+        return [x for x in workflow_phases if not (x in seen or seen.add(x))]
+    
+    @classmethod
+    def initialize_workflow_for_bmr(cls, bmr):
+        """Initialize all workflow phases for a new BMR using the correct system workflow"""
+        product_type = bmr.product.product_type
+        workflow_phases = cls.get_workflow_phase_names(bmr.product)
         
         # Create phase executions for all phases in the workflow
         for order, phase_name in enumerate(workflow_phases, 1):
@@ -117,7 +128,7 @@ class WorkflowService:
                 if phase.phase_order != order:
                     phase.phase_order = order
                     phase.save()
-                    print(f"Updated phase order for {phase_name} to {order}")
+                    events.debug('phase_order_corrected', product_type=product_type, phase=phase_name, order=order)
                 
                 # Create the batch phase execution with proper initial status
                 if phase_name == 'bmr_creation':
@@ -140,9 +151,10 @@ class WorkflowService:
                 )
                 
             except Exception as e:
-                print(f"Error creating phase {phase_name} for batch {bmr.batch_number}: {e}")
+                events.error('phase_create_failed', bmr=bmr.bmr_number, phase=phase_name, error=e)
         
-        print(f"Initialized workflow for batch {bmr.batch_number} ({product_type}) with {len(workflow_phases)} phases")
+        events.info('workflow_initialized', bmr=bmr.bmr_number, batch=bmr.batch_number,
+                    product_type=product_type, phases=len(workflow_phases))
     
     @classmethod
     def get_current_phase(cls, bmr):
@@ -172,6 +184,7 @@ class WorkflowService:
         return None
     
     @classmethod
+    @transaction.atomic
     def complete_phase(cls, bmr, phase_name, completed_by, comments=None):
         """Mark a phase as completed and activate the next phase"""
         try:
@@ -199,6 +212,8 @@ class WorkflowService:
                 next_phase = next_phases.first()
                 next_phase.status = 'pending'  # Make it available for operators
                 next_phase.save()
+                events.info('phase_completed', bmr=bmr.bmr_number, phase=phase_name, user=completed_by,
+                            activated=next_phase)
                 
                 # Store notification data in session if available
                 from django.contrib import messages
@@ -210,13 +225,16 @@ class WorkflowService:
                         if bmr.product.product_type == 'tablet' and getattr(bmr.product, 'tablet_type', None) == 'tablet_2' and phase_name == 'packaging_material_release':
                             next_phase_name = 'Bulk Packing'  # Force correct next phase name
                 return next_phase
+            events.info('phase_completed', bmr=bmr.bmr_number, phase=phase_name, user=completed_by,
+                        activated=None)
                 
         except BatchPhaseExecution.DoesNotExist:
-            print(f"Phase execution not found: {phase_name} for BMR {bmr.bmr_number}")
+            events.warning('phase_not_found', bmr=bmr.bmr_number, phase=phase_name)
         
         return None
     
     @classmethod
+    @transaction.atomic
     def start_phase(cls, bmr, phase_name, started_by):
         """Start a phase execution - with prerequisite validation"""
         try:
@@ -228,18 +246,20 @@ class WorkflowService:
             
             # Validate that all prerequisite phases are completed
             if not cls.can_start_phase(bmr, phase_name):
-                print(f"Cannot start phase {phase_name} for BMR {bmr.bmr_number} - prerequisites not met")
+                events.warning('phase_start_rejected', bmr=bmr.bmr_number, phase=phase_name,
+                               reason='prerequisites_not_met')
                 return None
             
             execution.status = 'in_progress'
             execution.started_by = started_by
             execution.started_date = timezone.now()
             execution.save()
+            events.info('phase_started', bmr=bmr.bmr_number, phase=phase_name, user=started_by)
             
             return execution
             
         except BatchPhaseExecution.DoesNotExist:
-            print(f"Cannot start phase {phase_name} for BMR {bmr.bmr_number} - not pending")
+            events.warning('phase_start_rejected', bmr=bmr.bmr_number, phase=phase_name, reason='not_pending')
         
         return None
     
@@ -273,8 +293,8 @@ class WorkflowService:
             return False
     
     @classmethod
-    def get_workflow_status(cls, bmr):
-        """Get complete workflow status for a BMR"""
+    def get_workflow_status(cls, bmr, include_eta=False):
+        """Get complete workflow status for a BMR, with its completion ETA if include_eta"""
         executions = BatchPhaseExecution.objects.filter(
             bmr=bmr
         ).select_related('phase').order_by('phase__phase_order')
@@ -291,10 +311,41 @@ class WorkflowService:
             'current_phase': current_phase,
             'next_phase': next_phase,
             'all_executions': executions,
-            'is_complete': completed_phases == total_phases
+            'is_complete': completed_phases == total_phases,
+            'eta': predict_completion([bmr.id]).get(bmr.id) if include_eta else None,
         }
     
     @classmethod
+    def get_workflow_summaries(cls, bmr_ids):
+        """
+        {bmr_id: progress and current phase} for many BMRs from a single query, so list
+        pages don't run get_workflow_status per row
+        """
+        rows = BatchPhaseExecution.objects.filter(bmr_id__in=list(bmr_ids)).values_list(
+            'bmr_id', 'phase__phase_name', 'status'
+        ).order_by('bmr_id', 'phase__phase_order')
+        
+        summaries = {}
+        for bmr_id, phase_name, status in rows:
+            summary = summaries.setdefault(bmr_id, {
+                'total_phases': 0,
+                'completed_phases': 0,
+                'progress_percentage': 0,
+                'current_phase': None,
+                'current_phase_status': None,
+            })
+            summary['total_phases'] += 1
+            if status == 'completed':
+                summary['completed_phases'] += 1
+            # Same rule as get_current_phase: the first pending or in-progress phase
+            if status in ('pending', 'in_progress') and summary['current_phase'] is None:
+                summary['current_phase'], summary['current_phase_status'] = phase_name, status
+        for summary in summaries.values():
+            summary['progress_percentage'] = round(summary['completed_phases'] / summary['total_phases'] * 100, 1)
+        return summaries
+    
+    @classmethod
+    @transaction.atomic
     def handle_qc_failure_rollback(cls, bmr, failed_phase_name, rollback_to_phase):
         """Handle QC failure and rollback to a previous phase"""
         try:
@@ -307,10 +358,7 @@ class WorkflowService:
             failed_execution.status = 'failed'
             failed_execution.completed_date = timezone.now()
             failed_execution.save()
-            
-            print(f"\n*** HANDLING QC FAILURE ROLLBACK FOR BATCH {bmr.batch_number} ***")
-            print(f"Failed phase: {failed_phase_name}")
-            print(f"Rolling back to: {rollback_to_phase}")
+            reset_phases = []
             
             # Reset phases after the rollback point to pending
             # Find the rollback phase order
@@ -320,9 +368,6 @@ class WorkflowService:
                     phase__phase_name=rollback_to_phase
                 )
             except BatchPhaseExecution.DoesNotExist:
-                print(f"Error: Rollback phase '{rollback_to_phase}' doesn't exist for BMR {bmr.bmr_number}")
-                print("Creating the required phase...")
-                
                 # Get the phase definition without directly importing the Phase model
                 try:
                     # Use filter to find the Phase object from existing BatchPhaseExecution objects
@@ -338,7 +383,7 @@ class WorkflowService:
                             status='pending',
                             operator_comments=f'Auto-created for reprocessing after {failed_phase_name} failure'
                         )
-                        print(f"Created new {rollback_to_phase} phase for BMR {bmr.bmr_number}")
+                        qc_events.warning('rollback_phase_created', bmr=bmr.bmr_number, phase=rollback_to_phase)
                     else:
                         # If we can't find an example phase execution, try to get the phase directly
                         phase = ProductionPhase.objects.filter(phase_name=rollback_to_phase).first()
@@ -350,16 +395,16 @@ class WorkflowService:
                                 status='pending',
                                 operator_comments=f'Auto-created for reprocessing after {failed_phase_name} failure'
                             )
-                            print(f"Created new {rollback_to_phase} phase for BMR {bmr.bmr_number} using ProductionPhase")
+                            qc_events.warning('rollback_phase_created', bmr=bmr.bmr_number, phase=rollback_to_phase)
                         else:
-                            print(f"Error: Cannot find phase definition for '{rollback_to_phase}'")
+                            qc_events.error('rollback_failed', bmr=bmr.bmr_number, failed_phase=failed_phase_name,
+                                            rollback_to=rollback_to_phase, reason='phase_definition_missing')
                             return False
                 except Exception as e:
-                    print(f"Error creating phase: {e}")
+                    qc_events.error('rollback_failed', bmr=bmr.bmr_number, failed_phase=failed_phase_name,
+                                    rollback_to=rollback_to_phase, error=e)
                     return False
             
-            print(f"Found rollback phase: {rollback_phase.phase.phase_name} (ID: {rollback_phase.id})")
-            
             # Get all phases in sequence between rollback and QC phase
             phases_in_sequence = []
             if failed_phase_name == 'post_compression_qc' and rollback_to_phase == 'granulation':
@@ -374,7 +419,6 @@ class WorkflowService:
                     ).first()
                     if phase:
                         phases_in_sequence.append(phase)
-                        print(f"Added {phase_name} phase to sequence (ID: {phase.id})")
             
             # Reset all phases after the rollback phase to pending
             # If phases_in_sequence is populated, we'll handle those specially
@@ -390,14 +434,14 @@ class WorkflowService:
                 phases_to_reset = BatchPhaseExecution.objects.filter(
                     bmr=bmr,
                     phase__phase_order__gt=rollback_phase.phase.phase_order
-                ).exclude(phase__phase_name__in=sequence_phase_names)
+                ).exclude(phase__phase_name__in=sequence_phase_names).select_related('phase')
             else:
                 # Original logic - reset all phases after rollback
                 phases_to_reset = BatchPhaseExecution.objects.filter(
                     bmr=bmr,
                     phase__phase_order__gt=rollback_phase.phase.phase_order,
                     status__in=['completed', 'failed', 'in_progress']
-                )
+                ).select_related('phase')
             
             for phase_execution in phases_to_reset:
                 phase_execution.status = 'not_ready'  # Set to not_ready instead of pending to ensure proper sequence
@@ -407,7 +451,7 @@ class WorkflowService:
                 phase_execution.completed_date = None
                 phase_execution.operator_comments = ''
                 phase_execution.save()
-                print(f"Reset phase {phase_execution.phase.phase_name} to not_ready (ID: {phase_execution.id})")
+                reset_phases.append(phase_execution.phase.phase_name)
             
             # Set the rollback phase to pending (to be redone)
             rollback_phase.status = 'pending'
@@ -419,11 +463,8 @@ class WorkflowService:
             rollback_phase.operator_comments = f'Reprocessing required after {failed_phase_name} failure'
             rollback_phase.save()
             
-            print(f"Reset {rollback_to_phase} phase to pending for reprocessing (ID: {rollback_phase.id})")
-            
             # For post_compression_QC failures, special handling to ensure proper sequence
             if phases_in_sequence:
-                print(f"Special handling for post_compression_QC failure - ensuring proper sequence")
                 # Start with granulation (already handled above - set to pending)
                 
                 # Next is blending - set to not_ready so granulation will activate it
@@ -435,7 +476,7 @@ class WorkflowService:
                     blending_phase.completed_by = None
                     blending_phase.completed_date = None
                     blending_phase.save()
-                    print(f"Reset blending phase to not_ready for BMR {bmr.batch_number}")
+                    reset_phases.append('blending')
                 
                 # Then compression - set to not_ready so blending will activate it
                 compression_phase = next((p for p in phases_in_sequence if p.phase.phase_name == 'compression'), None)
@@ -446,7 +487,7 @@ class WorkflowService:
                     compression_phase.completed_by = None
                     compression_phase.completed_date = None
                     compression_phase.save()
-                    print(f"Reset compression phase to not_ready for BMR {bmr.batch_number}")
+                    reset_phases.append('compression')
                     
                 # Then post-compression QC - set to not_ready so compression will activate it
                 post_comp_qc_phase = next((p for p in phases_in_sequence if p.phase.phase_name == 'post_compression_qc'), None)
@@ -457,9 +498,8 @@ class WorkflowService:
                     post_comp_qc_phase.completed_by = None
                     post_comp_qc_phase.completed_date = None
                     post_comp_qc_phase.save()
-                    print(f"Reset post-compression QC phase to not_ready for batch {bmr.batch_number}")
-                else:
-                    print(f"The failed QC phase is maintained as 'failed' to track the failure history")
+                    reset_phases.append('post_compression_qc')
+                # Otherwise the failed QC phase stays 'failed' to keep the failure history
                 
                 # Make sure sorting phase and all subsequent phases are set to not_ready 
                 sorting_and_later_phases = BatchPhaseExecution.objects.filter(
@@ -467,7 +507,7 @@ class WorkflowService:
                     phase__phase_name__in=['sorting', 'coating', 'packaging_material_release', 
                                           'blister_packing', 'bulk_packing', 'secondary_packaging', 
                                           'final_qa', 'finished_goods_store']
-                )
+                ).select_related('phase')
                 
                 for phase in sorting_and_later_phases:
                     phase.status = 'not_ready'
@@ -476,14 +516,244 @@ class WorkflowService:
                     phase.completed_by = None
                     phase.completed_date = None
                     phase.save()
-                    print(f"Ensured {phase.phase.phase_name} phase is set to not_ready for batch {bmr.batch_number}")
+                    reset_phases.append(phase.phase.phase_name)
             
+            qc_events.info('qc_rollback', bmr=bmr.bmr_number, batch=bmr.batch_number, failed_phase=failed_phase_name,
+                           rollback_to=rollback_to_phase, reset_phases=reset_phases)
             return True
             
         except Exception as e:
-            print(f"Error handling QC rollback for batch {bmr.batch_number}: {e}")
+            qc_events.error('rollback_failed', bmr=bmr.bmr_number, failed_phase=failed_phase_name,
+                            rollback_to=rollback_to_phase, error=e)
             return False
     
+    @classmethod
+    def save_transition(cls, execution):
+        """
+        Save an operator's start/complete of a phase together with its signal side effects
+        and, for completions, the next-phase activation, so each transition is one commit.
+        """
+        with transaction.atomic():
+            execution.save()
+            if execution.status == 'completed':
+                return cls.trigger_next_phase(execution.bmr, execution.phase)
+        return True
+    
+    # Phases whose completion doesn't record machine breakdowns or changeovers
+    NO_DOWNTIME_PHASES = ['material_dispensing', 'bmr_creation', 'regulatory_approval', 'bulk_packing', 'secondary_packaging']
+    
+    TRANSITION_ACTIONS = ('start', 'complete', 'reject')
+    
+    @classmethod
+    def apply_transition(cls, execution, action, user, comments='', machine_id=None, breakdown=None, changeover=None,
+                         prerequisites_met=None, machines=None):
+        """
+        Start, complete or reject a phase execution on behalf of `user`, with the checks the
+        dashboards make, as one transaction.
+        
+        `breakdown` and `changeover` are optional (start, end, reason) tuples recorded when
+        a production phase completes. Raises PermissionDenied when the user's role doesn't
+        own the phase and ValidationError otherwise; code 'conflict' means the phase isn't
+        in a state that allows the action. Bulk callers pass `prerequisites_met` and a
+        `machines` dict they have already loaded instead of one lookup per execution.
+        """
+        from django.core.exceptions import PermissionDenied, ValidationError
+        from .models import Machine
+        
+        if action not in cls.TRANSITION_ACTIONS:
+            raise ValidationError(f"Unknown action '{action}'", code='invalid')
+        
+        bmr = execution.bmr
+        phase_name = execution.phase.phase_name
+        if registry.role_for_phase(phase_name) != user.role:
+            raise PermissionDenied(f'The {user.role} role cannot work on the {phase_name} phase')
+        
+        required_status = 'pending' if action == 'start' else 'in_progress'
+        now = timezone.now()
+        with transaction.atomic():
+            # Checked against the locked row, not the caller's copy, so two users acting on
+            # the same phase at once can't both pass the check
+            status = BatchPhaseExecution.objects.select_for_update().filter(pk=execution.pk).values_list(
+                'status', flat=True
+            ).first()
+            if status != required_status:
+                raise ValidationError(
+                    f'Cannot {action} {phase_name} for batch {bmr.batch_number}: the phase is {status}',
+                    code='conflict',
+                )
+            
+            if action == 'start':
+                if prerequisites_met is None:
+                    # A rework phase reopened by a failed QC check skips the prerequisite check
+                    rework_for = [qc for qc, target in registry.QC_ROLLBACKS.items() if target == phase_name]
+                    prerequisites_met = bool(rework_for) and BatchPhaseExecution.objects.filter(
+                        bmr=bmr, phase__phase_name__in=rework_for, status='failed'
+                    ).exists() or cls.can_start_phase(bmr, phase_name)
+                if not prerequisites_met:
+                    raise ValidationError(
+                        f'Cannot start {phase_name} for batch {bmr.batch_number} - prerequisites not met',
+                        code='conflict',
+                    )
+                
+                if machine_id:
+                    if machines is not None:
+                        machine = machines.get(int(machine_id))
+                    else:
+                        machine = Machine.objects.filter(id=machine_id).first()
+                    if machine is None or not machine.is_active or machine.machine_type != phase_name:
+                        raise ValidationError(f'Machine {machine_id} is not an active {phase_name} machine', code='invalid')
+                    execution.machine_used = machine
+                elif registry.requires_machine(phase_name):
+                    raise ValidationError(f'Machine selection is required for {phase_name} phase', code='invalid')
+                
+                execution.status = 'in_progress'
+                execution.started_by = user
+                execution.started_date = now
+                execution.operator_comments = f"Started by {user.get_full_name()}. Notes: {comments}"
+                cls.save_transition(execution)
+                events.info('phase_started', bmr=bmr.bmr_number, phase=phase_name, user=user)
+            
+            elif action == 'complete':
+                execution.status = 'completed'
+                execution.completed_by = user
+                execution.completed_date = now
+                execution.operator_comments = f"Completed by {user.get_full_name()}. Notes: {comments}"
+                if phase_name not in cls.NO_DOWNTIME_PHASES:
+                    for prefix, downtime in (('breakdown', breakdown), ('changeover', changeover)):
+                        if downtime:
+                            start, end, reason = downtime
+                            setattr(execution, f'{prefix}_occurred', True)
+                            setattr(execution, f'{prefix}_start_time', start)
+                            setattr(execution, f'{prefix}_end_time', end)
+                            setattr(execution, f'{prefix}_reason', reason or '')
+                cls.save_transition(execution)
+                
+                if phase_name == 'regulatory_approval':
+                    bmr.status = 'approved'
+                    bmr.approved_by = user
+                    bmr.approved_date = now
+                    bmr.save()
+                elif phase_name == 'final_qa':
+                    bmr.status = 'completed'
+                    bmr.actual_completion_date = now
+                    bmr.save()
+                events.info('phase_completed', bmr=bmr.bmr_number, phase=phase_name, user=user)
+            
+            else:
+                if not comments:
+                    raise ValidationError('A rejection reason is required', code='invalid')
+                execution.completed_by = user
+                
+                if phase_name in registry.QC_PHASES:
+                    rollback_phase = registry.qc_rollback_phase(phase_name)
+                    execution.operator_comments = f"QC FAILED - ROLLBACK TO {rollback_phase.upper()}: {comments}"
+                    execution.save()
+                    # Marks the QC phase failed and reopens the rework phases
+                    if not cls.handle_qc_failure_rollback(bmr, phase_name, rollback_phase):
+                        raise ValidationError(f'Could not roll batch {bmr.batch_number} back to {rollback_phase}')
+                
+                elif phase_name == 'final_qa':
+                    rework_phase = registry.final_qa_rework_phase(bmr.product)
+                    rework = BatchPhaseExecution.objects.filter(bmr=bmr, phase__phase_name=rework_phase).first()
+                    if rework is None:
+                        raise ValidationError(f'Could not find {rework_phase} phase to rollback to for batch {bmr.batch_number}')
+                    execution.status = 'failed'
+                    execution.completed_date = now
+                    execution.operator_comments = f"FINAL QA FAILED - ROLLBACK TO {rework_phase.upper()}: {comments}"
+                    execution.save()
+                    rework.status = 'pending'
+                    rework.operator_comments = f"Returned for rework due to Final QA rejection. Reason: {comments}. Original comments: {rework.operator_comments}"
+                    rework.save()
+                
+                elif phase_name == 'regulatory_approval':
+                    execution.status = 'failed'
+                    execution.completed_date = now
+                    execution.operator_comments = f"REJECTED: {comments}"
+                    execution.save()
+                    bmr.status = 'rejected'
+                    bmr.approved_by = user
+                    bmr.approved_date = now
+                    bmr.save()
+                
+                else:
+                    raise ValidationError(f'The {phase_name} phase cannot be rejected', code='invalid')
+                events.info('phase_rejected', bmr=bmr.bmr_number, phase=phase_name, user=user)
+        
+        execution.refresh_from_db()
+        return execution
+    
+    BULK_TRANSITION_ACTIONS = ('start', 'complete')
+    
+    @classmethod
+    def apply_bulk_transition(cls, items, action, user, comments='', machine_id=None):
+        """
+        Start or complete many phase executions in one transaction.
+        
+        `items` are (execution id, machine id or None) pairs; `machine_id` is used for the
+        items without one whose phase needs a machine. The executions, the
+        prerequisites of every start, the QC rework bypass and the machines are loaded with
+        one query each; each item is then applied in its own savepoint, so one that fails
+        validation is reported and the others still go through. Returns one result dict
+        (id, success, status, error) per item, in order.
+        """
+        from django.core.exceptions import PermissionDenied, ValidationError
+        from django.db.models import Exists, OuterRef
+        from .models import Machine
+        
+        if action not in cls.BULK_TRANSITION_ACTIONS:
+            raise ValidationError(f"Unknown bulk action '{action}'", code='invalid')
+        
+        ids = [execution_id for execution_id, _ in items]
+        blocking = BatchPhaseExecution.objects.filter(
+            bmr_id=OuterRef('bmr_id'),
+            phase__phase_order__lt=OuterRef('phase__phase_order'),
+        ).exclude(status__in=['completed', 'skipped'])
+        executions = BatchPhaseExecution.objects.filter(id__in=ids).select_related(
+            'bmr__product', 'phase'
+        ).annotate(blocked=Exists(blocking)).in_bulk()
+        
+        # BMRs with a failed QC phase, whose rework phase may start out of order
+        failed_qc = set(BatchPhaseExecution.objects.filter(
+            bmr_id__in={execution.bmr_id for execution in executions.values()},
+            phase__phase_name__in=registry.QC_PHASES,
+            status='failed',
+        ).values_list('bmr_id', 'phase__phase_name'))
+        rework = {(bmr_id, registry.qc_rollback_phase(phase_name)) for bmr_id, phase_name in failed_qc}
+        machines = Machine.objects.in_bulk({item_machine for _, item_machine in items if item_machine} | {machine_id} - {None})
+        
+        results = []
+        with transaction.atomic():
+            for execution_id, item_machine in items:
+                execution = executions.get(execution_id)
+                if execution is None:
+                    results.append({'id': execution_id, 'success': False, 'status': None,
+                                    'error': f'Phase execution {execution_id} not found'})
+                    continue
+                prerequisites_met = not execution.blocked or (execution.bmr_id, execution.phase.phase_name) in rework
+                if not item_machine and registry.requires_machine(execution.phase.phase_name):
+                    item_machine = machine_id
+                try:
+                    execution = cls.apply_transition(
+                        execution, action, user, comments=comments, machine_id=item_machine,
+                        prerequisites_met=prerequisites_met, machines=machines,
+                    )
+                except (PermissionDenied, ValidationError) as e:
+                    error = e.messages[0] if isinstance(e, ValidationError) else str(e)
+                    results.append({'id': execution_id, 'success': False, 'status': execution.status, 'error': error})
+                else:
+                    results.append({'id': execution_id, 'success': True, 'status': execution.status, 'error': None})
+        events.info('bulk_transition', action=action, user=user, requested=len(items),
+                    applied=sum(1 for result in results if result['success']))
+        return results
+    
+    @classmethod
+    def get_role_queue(cls, role):
+        """Open (pending or in-progress) executions of the role's phases, oldest BMR first"""
+        return BatchPhaseExecution.objects.filter(
+            phase__phase_name__in=registry.phases_for_role(role),
+            status__in=['pending', 'in_progress'],
+        ).select_related('bmr', 'phase', 'machine_used').order_by('bmr__created_date', 'bmr_id', 'phase__phase_order')
+    
     @classmethod
     def trigger_next_phase(cls, bmr, current_phase):
         """Trigger the next phase in the workflow after completing current phase"""
@@ -495,8 +765,6 @@ class WorkflowService:
             
             # NEW: Handle material_dispensing completion to reduce raw material quantities
             if current_execution.phase.phase_name == 'material_dispensing' and current_execution.status == 'completed':
-                print(f"Completed material dispensing for BMR {bmr.batch_number}, processing material quantities...")
-                
                 # Import necessary models here to avoid circular imports
                 from raw_materials.models import MaterialDispensing, MaterialDispensingItem
                 
@@ -514,10 +782,10 @@ class WorkflowService:
                 
                 # Make sure all materials have dispensing items
                 bmr_materials = bmr.materials.all()
-                print(f"Found {bmr_materials.count()} materials to dispense for BMR {bmr.batch_number}")
                 
                 # Flag to track if we should process the dispensing completion
                 items_created = False
+                missing_batches = []
                 
                 # Make sure each material has a dispensing item
                 for bmr_material in bmr_materials:
@@ -542,19 +810,18 @@ class WorkflowService:
                                 is_dispensed=False  # Will be set to True by process_dispensing_completion
                             )
                             items_created = True
-                            print(f"Created dispensing item for {bmr_material.material_name}")
                         else:
-                            print(f"WARNING: No suitable batch found for {bmr_material.material_name}")
+                            missing_batches.append(bmr_material.material_name)
+                
+                if missing_batches:
+                    events.warning('dispensing_batches_missing', bmr=bmr.bmr_number, materials=missing_batches)
                 
                 # Set _complete_dispensing flag to trigger process_dispensing_completion
                 dispensing._complete_dispensing = True
                 dispensing.save()
-                
-                print(f"Material dispensing processed for BMR {bmr.batch_number}")
             
             # NEW: Handle raw material release -> material dispensing transition
             if current_execution.phase.phase_name == 'raw_material_release':
-                print(f"Completed raw material release for BMR {bmr.batch_number}, activating material dispensing...")
                 material_dispensing_phase = BatchPhaseExecution.objects.filter(
                     bmr=bmr,
                     phase__phase_name='material_dispensing'
@@ -563,15 +830,14 @@ class WorkflowService:
                 if material_dispensing_phase:
                     material_dispensing_phase.status = 'pending'
                     material_dispensing_phase.save()
-                    print(f"Activated material_dispensing phase for BMR {bmr.batch_number}")
+                    events.info('phase_activated', bmr=bmr.bmr_number, completed='raw_material_release', activated='material_dispensing')
                     return True
                 else:
-                    print(f"WARNING: No material_dispensing phase found for BMR {bmr.batch_number}")
+                    events.warning('phase_missing', bmr=bmr.bmr_number, completed='raw_material_release', expected='material_dispensing')
                     return False
             
             # NEW: Handle regulatory approval -> raw material release transition
             if current_execution.phase.phase_name == 'regulatory_approval':
-                print(f"Completed regulatory approval for BMR {bmr.batch_number}, activating raw material release...")
                 raw_material_release_phase = BatchPhaseExecution.objects.filter(
                     bmr=bmr,
                     phase__phase_name='raw_material_release'
@@ -580,17 +846,15 @@ class WorkflowService:
                 if raw_material_release_phase:
                     raw_material_release_phase.status = 'pending'
                     raw_material_release_phase.save()
-                    print(f"Activated raw_material_release phase for BMR {bmr.batch_number}")
+                    events.info('phase_activated', bmr=bmr.bmr_number, completed='regulatory_approval', activated='raw_material_release')
                     return True
                 else:
-                    print(f"WARNING: No raw_material_release phase found for BMR {bmr.batch_number}")
+                    events.warning('phase_missing', bmr=bmr.bmr_number, completed='regulatory_approval', expected='raw_material_release')
                     return False
             
             # Special handling for sorting -> coating for tablets
             if current_execution.phase.phase_name == 'sorting' and bmr.product.product_type == 'tablet':
-                print(f"Completed sorting for tablet BMR {bmr.batch_number}, handling workflow...")
                 is_coated = bmr.product.is_coated
-                print(f"Is product coated: {is_coated}")
                 
                 # Get coating and packaging phases
                 coating_phase = BatchPhaseExecution.objects.filter(
@@ -604,12 +868,11 @@ class WorkflowService:
                 ).first()
                 
                 if coating_phase and packaging_phase:
-                    print(f"Found coating phase (status: {coating_phase.status}) and packaging phase (status: {packaging_phase.status})")
                     # For coated tablets: always go to coating first
                     if is_coated:
                         coating_phase.status = 'pending'
                         coating_phase.save()
-                        print(f"Activated coating phase for coated product: {bmr.batch_number}")
+                        events.info('phase_activated', bmr=bmr.bmr_number, completed='sorting', activated='coating')
                         return True
                     else:
                         # For uncoated tablets: skip coating, go to packaging
@@ -619,12 +882,12 @@ class WorkflowService:
                         coating_phase.save()
                         packaging_phase.status = 'pending'
                         packaging_phase.save()
-                        print(f"Skipped coating, activated packaging for uncoated product: {bmr.batch_number}")
+                        events.info('phase_activated', bmr=bmr.bmr_number, completed='sorting',
+                                    activated='packaging_material_release', skipped='coating')
                         return True
             
             # Special handling for coating -> packaging for coated tablets
             if current_execution.phase.phase_name == 'coating' and bmr.product.product_type == 'tablet':
-                print(f"Completed coating for tablet BMR {bmr.batch_number}, activating packaging...")
                 packaging_phase = BatchPhaseExecution.objects.filter(
                     bmr=bmr,
                     phase__phase_name='packaging_material_release'
@@ -633,13 +896,13 @@ class WorkflowService:
                 if packaging_phase:
                     packaging_phase.status = 'pending'
                     packaging_phase.save()
-                    print(f"Activated packaging phase after coating: {bmr.batch_number}")
+                    events.info('phase_activated', bmr=bmr.bmr_number, completed='coating',
+                                activated='packaging_material_release')
                     return True
             
             # Special handling for packaging_material_release -> bulk_packing for tablet_2
             if current_execution.phase.phase_name == 'packaging_material_release' and bmr.product.product_type == 'tablet':
                 tablet_type = getattr(bmr.product, 'tablet_type', None)
-                print(f"Completed packaging material release for tablet BMR {bmr.batch_number}, tablet_type: {tablet_type}")
                 
                 if tablet_type == 'tablet_2':
                     # For tablet_2, activate bulk_packing first
@@ -657,11 +920,11 @@ class WorkflowService:
                         if secondary_phase and secondary_phase.status == 'pending':
                             secondary_phase.status = 'not_ready'
                             secondary_phase.save()
-                            print(f"Reset secondary_packaging to not_ready for tablet_2: {bmr.batch_number}")
                         
                         bulk_packing_phase.status = 'pending'
                         bulk_packing_phase.save()
-                        print(f"Activated bulk_packing phase for tablet_2: {bmr.batch_number}")
+                        events.info('phase_activated', bmr=bmr.bmr_number, completed='packaging_material_release',
+                                    activated='bulk_packing', tablet_type=tablet_type)
                         return True  # CRITICAL: Exit here to prevent standard logic from running
                 else:
                     # For normal tablets, activate blister_packing
@@ -673,11 +936,13 @@ class WorkflowService:
                     if blister_packing_phase:
                         blister_packing_phase.status = 'pending'
                         blister_packing_phase.save()
-                        print(f"Activated blister_packing phase for normal tablet: {bmr.batch_number}")
+                        events.info('phase_activated', bmr=bmr.bmr_number, completed='packaging_material_release',
+                                    activated='blister_packing', tablet_type=tablet_type)
                         return True  # CRITICAL: Exit here to prevent standard logic from running
                 
                 # If we reach here, something went wrong with tablet handling
-                print(f"WARNING: Failed to handle tablet packaging transition for BMR {bmr.batch_number}")
+                events.warning('phase_missing', bmr=bmr.bmr_number, completed='packaging_material_release',
+                               expected='bulk_packing' if tablet_type == 'tablet_2' else 'blister_packing')
                 return False
             
             # Special handling for bulk_packing -> secondary_packaging for tablet_2
@@ -693,10 +958,12 @@ class WorkflowService:
                     if secondary_phase:
                         secondary_phase.status = 'pending'
                         secondary_phase.save()
-                        print(f"Activated secondary_packaging phase after bulk_packing for tablet_2: {bmr.batch_number}")
+                        events.info('phase_activated', bmr=bmr.bmr_number, completed='bulk_packing',
+                                    activated='secondary_packaging')
                         return True  # CRITICAL: Exit here to prevent standard logic
                     else:
-                        print(f"WARNING: No secondary_packaging phase found for tablet_2 BMR {bmr.batch_number}")
+                        events.warning('phase_missing', bmr=bmr.bmr_number, completed='bulk_packing',
+                                       expected='secondary_packaging')
                         return False
             
             # Special handling for reprocessing: when completing granulation after post_compression_QC failure
@@ -708,11 +975,7 @@ class WorkflowService:
                     status='failed'
                 ).exists()
                 
-                print(f"\n*** Checking for reprocessing: {bmr.bmr_number}, Failed QC: {failed_qc} ***")
-                
                 if failed_qc:
-                    print(f"\n*** REPROCESSING DETECTED: Completing granulation for BMR {bmr.bmr_number} after QC failure ***")
-                    
                     # Ensure all prerequisite phases for blending are marked as completed
                     prerequisite_phases = BatchPhaseExecution.objects.filter(
                         bmr=bmr,
@@ -720,7 +983,7 @@ class WorkflowService:
                     )
                     for prereq in prerequisite_phases:
                         if prereq.status not in ['completed', 'skipped']:
-                            print(f"Marking prerequisite phase {prereq.phase.phase_name} as completed for BMR {bmr.bmr_number}")
+                            events.debug('prerequisite_forced_complete', bmr=bmr.bmr_number, execution=prereq.pk)
                             prereq.status = 'completed'
                             prereq.completed_date = timezone.now()
                             prereq.save()
@@ -741,27 +1004,26 @@ class WorkflowService:
                                 status='pending',
                                 operator_comments='Auto-created for reprocessing after QC failure'
                             )
-                            print(f"Created new blending phase for BMR {bmr.bmr_number}")
+                            events.debug('phase_created', bmr=bmr.bmr_number, phase='blending')
                         except Exception as e:
-                            print(f"Error creating blending phase: {e}")
+                            events.error('phase_create_failed', bmr=bmr.bmr_number, phase='blending', error=e)
                             return False
                     
                     # Mark current granulation phase as completed
-                    print(f"Marking current granulation phase as completed for BMR {bmr.bmr_number}")
                     current_execution.status = 'completed'
                     current_execution.completed_date = timezone.now()
                     current_execution.completed_by = None  # Set to None since we don't have user context here
                     current_execution.save()
                     
                     # Activate blending phase
-                    print(f"Activating blending phase for reprocessing: {blending_phase.id}, current status: {blending_phase.status}")
                     blending_phase.status = 'pending'
                     blending_phase.started_by = None
                     blending_phase.started_date = None
                     blending_phase.completed_by = None
                     blending_phase.completed_date = None
                     blending_phase.save()
-                    print(f"Blending phase activated for BMR {bmr.bmr_number}")
+                    events.info('phase_activated', bmr=bmr.bmr_number, completed='granulation', activated='blending',
+                                reprocessing=True)
                     
                     # Ensure subsequent phases exist and are in the correct state
                     compression_phase = BatchPhaseExecution.objects.filter(
@@ -779,9 +1041,9 @@ class WorkflowService:
                                 status='not_ready',
                                 operator_comments='Auto-created for reprocessing workflow'
                             )
-                            print(f"Created new compression phase for BMR {bmr.bmr_number}")
+                            events.debug('phase_created', bmr=bmr.bmr_number, phase='compression')
                         except Exception as e:
-                            print(f"Error creating compression phase: {e}")
+                            events.error('phase_create_failed', bmr=bmr.bmr_number, phase='compression', error=e)
                     else:
                         # Reset compression phase to not_ready
                         compression_phase.status = 'not_ready'
@@ -790,7 +1052,6 @@ class WorkflowService:
                         compression_phase.completed_by = None
                         compression_phase.completed_date = None
                         compression_phase.save()
-                        print(f"Reset compression phase to not_ready for BMR {bmr.bmr_number}")
                     
                     # Create or update post_compression_qc phase if needed (separate from failed one)
                     new_qc_phases = BatchPhaseExecution.objects.filter(
@@ -809,15 +1070,13 @@ class WorkflowService:
                                 status='not_ready',
                                 operator_comments='Auto-created for reprocessing workflow'
                             )
-                            print(f"Created new post_compression_qc phase for BMR {bmr.bmr_number}")
+                            events.debug('phase_created', bmr=bmr.bmr_number, phase='post_compression_qc')
                         except Exception as e:
-                            print(f"Error creating post_compression_qc phase: {e}")
+                            events.error('phase_create_failed', bmr=bmr.bmr_number, phase='post_compression_qc', error=e)
                     
                     return True  # Important: Return here to prevent standard logic from running
-                    
-                else:
-                    print(f"Normal granulation completion (not reprocessing) for BMR {bmr.bmr_number}")
-                    # Let standard logic handle normal case
+                
+                # Normal granulation completion (not reprocessing) - let standard logic handle it
             
             # Special handling for blending after reprocessing 
             if current_execution.phase.phase_name == 'blending':
@@ -841,8 +1100,6 @@ class WorkflowService:
                 
                 # For tablets, activate compression next
                 if failed_qc and bmr.product.product_type in ['tablet', 'tablet_normal', 'tablet_2']:
-                    print(f"\n*** REPROCESSING PATH: Completing blending for tablet BMR {bmr.bmr_number} after QC failure ***")
-                    
                     # Mark the original failed QC as 'resolved_reprocessing' to prevent it from interfering later
                     failed_qc_phases = BatchPhaseExecution.objects.filter(
                         bmr=bmr,
@@ -854,7 +1111,7 @@ class WorkflowService:
                         failed_phase.status = 'resolved_reprocessing'
                         failed_phase.operator_comments = (failed_phase.operator_comments or '') + " | RESOLVED through reprocessing workflow"
                         failed_phase.save()
-                        print(f"Marked failed QC phase {failed_phase.id} as 'resolved_reprocessing'")
+                        qc_events.debug('failed_qc_resolved', bmr=bmr.bmr_number, execution=failed_phase.pk)
                     
                     # Ensure all prerequisite phases for compression are completed
                     prerequisite_phases = BatchPhaseExecution.objects.filter(
@@ -863,7 +1120,7 @@ class WorkflowService:
                     )
                     for prereq in prerequisite_phases:
                         if prereq.status not in ['completed', 'skipped']:
-                            print(f"Marking prerequisite phase {prereq.phase.phase_name} as completed for BMR {bmr.bmr_number}")
+                            events.debug('prerequisite_forced_complete', bmr=bmr.bmr_number, execution=prereq.pk)
                             prereq.status = 'completed'
                             prereq.completed_date = timezone.now()
                             prereq.save()
@@ -884,19 +1141,19 @@ class WorkflowService:
                                 status='pending',
                                 operator_comments='Auto-created for reprocessing after QC failure'
                             )
-                            print(f"Created new compression phase for BMR {bmr.bmr_number}")
+                            events.debug('phase_created', bmr=bmr.bmr_number, phase='compression')
                         except Exception as e:
-                            print(f"Error creating compression phase: {e}")
+                            events.error('phase_create_failed', bmr=bmr.bmr_number, phase='compression', error=e)
                             return False
                     
-                    print(f"Activating compression phase for reprocessing: {compression_phase.id}, current status: {compression_phase.status}")
                     compression_phase.status = 'pending'
                     compression_phase.started_by = None
                     compression_phase.started_date = None
                     compression_phase.completed_by = None
                     compression_phase.completed_date = None
                     compression_phase.save()
-                    print(f"Compression phase activated for BMR {bmr.bmr_number} after reprocessing")
+                    events.info('phase_activated', bmr=bmr.bmr_number, completed='blending', activated='compression',
+                                reprocessing=True)
                     
                     # Ensure post_compression_qc phase exists and is in the correct state
                     post_comp_qc_phases = BatchPhaseExecution.objects.filter(
@@ -915,15 +1172,14 @@ class WorkflowService:
                                 status='not_ready',
                                 operator_comments='Auto-created for reprocessing workflow'
                             )
-                            print(f"Created new post_compression_qc phase for BMR {bmr.bmr_number}")
+                            events.debug('phase_created', bmr=bmr.bmr_number, phase='post_compression_qc')
                         except Exception as e:
-                            print(f"Error creating post_compression_qc phase: {e}")
+                            events.error('phase_create_failed', bmr=bmr.bmr_number, phase='post_compression_qc', error=e)
                     
                     return True  # Important: Return here to prevent standard logic from running
                 
                 # For capsules, activate post_blending_qc next
                 elif failed_qc and bmr.product.product_type == 'capsule':
-                    print(f"\n*** REPROCESSING PATH: Completing blending for capsule BMR {bmr.bmr_number} after QC failure ***")
                     # Special handling - explicitly activate post_blending_qc
                     qc_phase = BatchPhaseExecution.objects.filter(
                         bmr=bmr,
@@ -931,13 +1187,13 @@ class WorkflowService:
                     ).first()
                     
                     if qc_phase:
-                        print(f"Activating post_blending_qc phase for reprocessing: {qc_phase.id}, current status: {qc_phase.status}")
                         qc_phase.status = 'pending'
                         qc_phase.save()
-                        print(f"Post-blending QC phase activated for capsule BMR {bmr.bmr_number} after reprocessing")
+                        events.info('phase_activated', bmr=bmr.bmr_number, completed='blending', activated='post_blending_qc',
+                                    reprocessing=True)
                         return True  # Important: Return here to prevent standard logic from running
                     else:
-                        print(f"WARNING: No post_blending_qc phase found for BMR {bmr.bmr_number}")
+                        events.warning('phase_missing', bmr=bmr.bmr_number, completed='blending', expected='post_blending_qc')
                         return False
             
             # Special handling for mixing after reprocessing - ensure post_mixing_qc is activated next
@@ -950,7 +1206,6 @@ class WorkflowService:
                 ).exists()
                 
                 if failed_qc and bmr.product.product_type == 'ointment':
-                    print(f"\n*** REPROCESSING PATH: Completing mixing for BMR {bmr.bmr_number} after QC failure ***")
                     # Special handling - explicitly activate post_mixing_qc
                     qc_phase = BatchPhaseExecution.objects.filter(
                         bmr=bmr,
@@ -958,19 +1213,17 @@ class WorkflowService:
                     ).first()
                     
                     if qc_phase:
-                        print(f"Activating post_mixing_qc phase for reprocessing: {qc_phase.id}, current status: {qc_phase.status}")
                         qc_phase.status = 'pending'
                         qc_phase.save()
-                        print(f"Post-mixing QC phase activated for BMR {bmr.bmr_number} after reprocessing")
+                        events.info('phase_activated', bmr=bmr.bmr_number, completed='mixing', activated='post_mixing_qc',
+                                    reprocessing=True)
                         return True  # Important: Return here to prevent standard logic from running
                     else:
-                        print(f"WARNING: No post_mixing_qc phase found for BMR {bmr.bmr_number}")
+                        events.warning('phase_missing', bmr=bmr.bmr_number, completed='mixing', expected='post_mixing_qc')
                         return False
             
             # Special handling for compression after reprocessing - ensure post_compression_qc is activated next
             if current_execution.phase.phase_name == 'compression':
-                print(f"\n*** Handling compression completion for BMR {bmr.bmr_number} ***")
-                
                 # For tablet products, ensure post_compression_qc phase exists, regardless of reprocessing status
                 if bmr.product.product_type in ['tablet', 'tablet_normal', 'tablet_2']:
                     # Check if there's a failed QC phase that hasn't been resolved
@@ -991,7 +1244,7 @@ class WorkflowService:
                             failed_phase.status = 'resolved_reprocessing'
                             failed_phase.operator_comments = (failed_phase.operator_comments or '') + " | RESOLVED through reprocessing workflow"
                             failed_phase.save()
-                            print(f"Marked failed QC phase {failed_phase.id} as 'resolved_reprocessing'")
+                            qc_events.debug('failed_qc_resolved', bmr=bmr.bmr_number, execution=failed_phase.pk)
                     
                     # Find an active post_compression_qc phase that's not failed or resolved
                     qc_phase = BatchPhaseExecution.objects.filter(
@@ -1001,7 +1254,6 @@ class WorkflowService:
                     ).first()
                     
                     if not qc_phase:
-                        print(f"No non-failed post_compression_qc phase found for BMR {bmr.bmr_number} - creating one")
                         try:
                             # Check if a phase with this combination already exists in any status
                             existing_qc = BatchPhaseExecution.objects.filter(
@@ -1014,7 +1266,8 @@ class WorkflowService:
                                 existing_qc.status = 'pending'
                                 existing_qc.operator_comments = (existing_qc.operator_comments or '') + " | Reactivated for reprocessing workflow"
                                 existing_qc.save()
-                                print(f"Reactivated existing post_compression_qc phase for BMR {bmr.bmr_number}")
+                                events.info('phase_activated', bmr=bmr.bmr_number, completed='compression',
+                                            activated='post_compression_qc', reactivated=True)
                                 return True
                             else:
                                 # Create post_compression_qc phase
@@ -1025,15 +1278,17 @@ class WorkflowService:
                                     status='pending',
                                     operator_comments='Auto-created to ensure proper workflow sequence'
                                 )
-                                print(f"Created new post_compression_qc phase for BMR {bmr.bmr_number}")
+                                events.info('phase_activated', bmr=bmr.bmr_number, completed='compression',
+                                            activated='post_compression_qc', created=True)
                                 return True
                         except Exception as e:
-                            print(f"Error creating post_compression_qc phase: {e}")
+                            events.error('phase_create_failed', bmr=bmr.bmr_number, phase='post_compression_qc', error=e)
                     else:
                         # Ensure QC phase is set to pending
                         qc_phase.status = 'pending'
                         qc_phase.save()
-                        print(f"Set existing post_compression_qc phase to pending for BMR {bmr.bmr_number}")
+                        events.info('phase_activated', bmr=bmr.bmr_number, completed='compression',
+                                    activated='post_compression_qc')
                         return True
                 
                 # Check if this is a reprocessing case (has a failed post_compression_QC)
@@ -1044,8 +1299,6 @@ class WorkflowService:
                 ).exists()
                 
                 if failed_qc and bmr.product.product_type == 'tablet':
-                    print(f"\n*** REPROCESSING PATH: Completing compression for BMR {bmr.bmr_number} after QC failure ***")
-                    
                     # Ensure all prerequisite phases for post_compression_qc are completed
                     prerequisite_phases = BatchPhaseExecution.objects.filter(
                         bmr=bmr,
@@ -1053,7 +1306,7 @@ class WorkflowService:
                     )
                     for prereq in prerequisite_phases:
                         if prereq.status not in ['completed', 'skipped']:
-                            print(f"Marking prerequisite phase {prereq.phase.phase_name} as completed for BMR {bmr.bmr_number}")
+                            events.debug('prerequisite_forced_complete', bmr=bmr.bmr_number, execution=prereq.pk)
                             prereq.status = 'completed'
                             prereq.completed_date = timezone.now()
                             prereq.save()
@@ -1070,7 +1323,6 @@ class WorkflowService:
                 ).exists()
                 
                 if previous_failures:
-                    print(f"\n*** REPROCESSING SUCCESS PATH: Post-blending QC passed for capsule BMR {bmr.bmr_number} after previous failure ***")
                     # Special handling - explicitly activate filling phase
                     filling_phase = BatchPhaseExecution.objects.filter(
                         bmr=bmr,
@@ -1078,10 +1330,10 @@ class WorkflowService:
                     ).first()
                     
                     if filling_phase:
-                        print(f"Activating filling phase after successful reprocessing QC: {filling_phase.id}, current status: {filling_phase.status}")
                         filling_phase.status = 'pending'
                         filling_phase.save()
-                        print(f"Filling phase activated for BMR {bmr.bmr_number} after successful QC reprocessing")
+                        events.info('phase_activated', bmr=bmr.bmr_number, completed='post_blending_qc', activated='filling',
+                                    reprocessing=True)
                         
                         # Mark the previously failed QC phase as resolved
                         failed_qc_phases = BatchPhaseExecution.objects.filter(
@@ -1093,11 +1345,11 @@ class WorkflowService:
                             failed_qc.status = 'resolved'
                             failed_qc.operator_comments += " | RESOLVED by successful retest"
                             failed_qc.save()
-                            print(f"Marked previously failed QC phase {failed_qc.id} as resolved")
+                            qc_events.debug('failed_qc_resolved', bmr=bmr.bmr_number, execution=failed_qc.pk)
                         
                         return True  # Important: Return here to prevent standard logic from running
                     else:
-                        print(f"WARNING: No filling phase found for BMR {bmr.bmr_number}")
+                        events.warning('phase_missing', bmr=bmr.bmr_number, completed='post_blending_qc', expected='filling')
                         return False
             
             # Special handling for post_mixing_qc for ointments - ensure tube_filling is activated next
@@ -1110,7 +1362,6 @@ class WorkflowService:
                 ).exists()
                 
                 if previous_failures:
-                    print(f"\n*** REPROCESSING SUCCESS PATH: Post-mixing QC passed for ointment BMR {bmr.bmr_number} after previous failure ***")
                     # Special handling - explicitly activate tube_filling phase
                     tube_filling_phase = BatchPhaseExecution.objects.filter(
                         bmr=bmr,
@@ -1118,10 +1369,10 @@ class WorkflowService:
                     ).first()
                     
                     if tube_filling_phase:
-                        print(f"Activating tube filling phase after successful reprocessing QC: {tube_filling_phase.id}, current status: {tube_filling_phase.status}")
                         tube_filling_phase.status = 'pending'
                         tube_filling_phase.save()
-                        print(f"Tube filling phase activated for BMR {bmr.bmr_number} after successful QC reprocessing")
+                        events.info('phase_activated', bmr=bmr.bmr_number, completed='post_mixing_qc', activated='tube_filling',
+                                    reprocessing=True)
                         
                         # Mark the previously failed QC phase as resolved
                         failed_qc_phases = BatchPhaseExecution.objects.filter(
@@ -1133,19 +1384,17 @@ class WorkflowService:
                             failed_qc.status = 'resolved'
                             failed_qc.operator_comments += " | RESOLVED by successful retest"
                             failed_qc.save()
-                            print(f"Marked previously failed QC phase {failed_qc.id} as resolved")
+                            qc_events.debug('failed_qc_resolved', bmr=bmr.bmr_number, execution=failed_qc.pk)
                         
                         return True  # Important: Return here to prevent standard logic from running
                     else:
-                        print(f"WARNING: No tube filling phase found for BMR {bmr.bmr_number}")
+                        events.warning('phase_missing', bmr=bmr.bmr_number, completed='post_mixing_qc', expected='tube_filling')
                         return False
             
             # Special handling for post_compression_qc after reprocessing - ensure sorting is activated next
             if current_execution.phase.phase_name == 'post_compression_qc':
                 # Only proceed to sorting if the current QC phase is being completed successfully
                 if current_execution.status == 'in_progress':
-                    print(f"\n*** QC Path: Completing post-compression QC for batch {bmr.batch_number} ***")
-                    
                     # Check if there was a previous failure of this QC phase
                     previous_failures = BatchPhaseExecution.objects.filter(
                         bmr=bmr,
@@ -1153,9 +1402,6 @@ class WorkflowService:
                         status__in=['failed', 'resolved_reprocessing']
                     ).exists()
                     
-                    if previous_failures:
-                        print(f"\n*** REPROCESSING SUCCESS PATH: Post-compression QC passed for batch {bmr.batch_number} after previous failure ***")
-                    
                     # Always activate the sorting phase next after successful QC
                     sorting_phase = BatchPhaseExecution.objects.filter(
                         bmr=bmr,
@@ -1163,10 +1409,10 @@ class WorkflowService:
                     ).first()
                     
                     if sorting_phase:
-                        print(f"Activating sorting phase after successful QC: {sorting_phase.id}, current status: {sorting_phase.status}")
                         sorting_phase.status = 'pending'
                         sorting_phase.save()
-                        print(f"Sorting phase activated for batch {bmr.batch_number} after successful QC")
+                        events.info('phase_activated', bmr=bmr.bmr_number, completed='post_compression_qc',
+                                    activated='sorting', reprocessing=previous_failures)
                         
                         # Mark any previously failed QC phases as resolved
                         failed_qc_phases = BatchPhaseExecution.objects.filter(
@@ -1179,11 +1425,11 @@ class WorkflowService:
                                 failed_qc.status = 'resolved'
                                 failed_qc.operator_comments = (failed_qc.operator_comments or '') + " | RESOLVED by successful retest"
                                 failed_qc.save()
-                                print(f"Marked previously failed QC phase {failed_qc.id} as resolved")
+                                qc_events.debug('failed_qc_resolved', bmr=bmr.bmr_number, execution=failed_qc.pk)
                         
                         return True  # Important: Return here to prevent standard logic from running
                     else:
-                        print(f"WARNING: No sorting phase found for BMR {bmr.bmr_number}")
+                        events.warning('phase_missing', bmr=bmr.bmr_number, completed='post_compression_qc', expected='sorting')
                         # Don't return False here - let the standard logic try to find the next phase
             
             # Standard next phase logic for ALL other cases
@@ -1200,7 +1446,8 @@ class WorkflowService:
                     if next_execution.phase.phase_name != 'coating':
                         next_execution.status = 'pending'
                         next_execution.save()
-                        print(f"Triggered next phase: {next_execution.phase.phase_name} for BMR {bmr.bmr_number}")
+                        events.info('phase_activated', bmr=bmr.bmr_number, completed=current_execution.phase.phase_name,
+                                    activated=next_execution.phase.phase_name)
                         
                         # Special case: When activating compression, ensure post_compression_qc phase exists
                         if next_execution.phase.phase_name == 'compression' and bmr.product.product_type in ['tablet', 'tablet_normal', 'tablet_2']:
@@ -1211,7 +1458,6 @@ class WorkflowService:
                             ).first()
                             
                             if not qc_phase:
-                                print(f"No post_compression_qc phase found for BMR {bmr.bmr_number} - creating one")
                                 try:
                                     # Create post_compression_qc phase
                                     qc_def = ProductionPhase.objects.get(phase_name='post_compression_qc')
@@ -1221,82 +1467,47 @@ class WorkflowService:
                                         status='not_ready',
                                         operator_comments='Auto-created to ensure proper workflow sequence'
                                     )
-                                    print(f"Created new post_compression_qc phase for BMR {bmr.bmr_number}")
+                                    events.debug('phase_created', bmr=bmr.bmr_number, phase='post_compression_qc')
                                 except Exception as e:
-                                    print(f"Error creating post_compression_qc phase: {e}")
+                                    events.error('phase_create_failed', bmr=bmr.bmr_number, phase='post_compression_qc', error=e)
                         
                         return True
             
-            print(f"No more phases to trigger for BMR {bmr.bmr_number}")
-            # Debug: print all phase statuses for this BMR
-            all_phases = BatchPhaseExecution.objects.filter(bmr=bmr).select_related('phase').order_by('phase__phase_order')
-            print("Phase order and statuses:")
-            for p in all_phases:
-                print(f"  {p.phase.phase_order:2d}. {p.phase.phase_name:25} {p.status}")
+            if events.enabled(logging.DEBUG):
+                # Phase order and statuses help explain why nothing was left to activate
+                statuses = BatchPhaseExecution.objects.filter(bmr=bmr).order_by(
+                    'phase__phase_order'
+                ).values_list('phase__phase_name', 'status')
+                events.debug('workflow_exhausted', bmr=bmr.bmr_number, completed=current_execution.phase.phase_name,
+                             phases=[f'{name}:{status}' for name, status in statuses])
             return False
         except BatchPhaseExecution.DoesNotExist:
-            print(f"Current phase execution not found for BMR {bmr.bmr_number}")
-            return False
-        except Exception as e:
-            print(f"Error triggering next phase for BMR {bmr.batch_number}: {e}")
+            events.warning('phase_not_found', bmr=bmr.bmr_number, phase=current_phase)
             return False
         except Exception as e:
-            print(f"Error triggering next phase for BMR {bmr.batch_number}: {e}")
+            events.error('trigger_next_phase_failed', bmr=bmr.bmr_number, error=e)
             return False
     
     @classmethod
     def rollback_to_previous_phase(cls, bmr, failed_phase):
         """Rollback to previous phase when QC fails"""
         try:
-            # Define QC rollback mapping
-            qc_rollback_mapping = {
-                'post_compression_qc': 'granulation',  # Roll back to granulation for tablet QC failures
-                'post_mixing_qc': 'mixing',
-                'post_blending_qc': 'blending',
-            }
-            
             failed_phase_name = failed_phase.phase_name
-            rollback_to_phase = qc_rollback_mapping.get(failed_phase_name)
-            
-            print(f"\n*** QC FAILURE: {bmr.batch_number} ***")
-            print(f"Failed phase: {failed_phase_name}")
-            print(f"Rolling back to: {rollback_to_phase}")
+            rollback_to_phase = registry.qc_rollback_phase(failed_phase_name)
             
             if rollback_to_phase:
-                result = cls.handle_qc_failure_rollback(bmr, failed_phase_name, rollback_to_phase)
-                print(f"Rollback result: {'SUCCESS' if result else 'FAILURE'}")
-                return result
+                return cls.handle_qc_failure_rollback(bmr, failed_phase_name, rollback_to_phase)
             
+            qc_events.warning('rollback_not_configured', bmr=bmr.bmr_number, failed_phase=failed_phase_name)
             return False
         except Exception as e:
-            print(f"Error rolling back for BMR {bmr.batch_number}: {e}")
+            qc_events.error('rollback_failed', bmr=bmr.bmr_number, failed_phase=failed_phase, error=e)
             return False
     
     @classmethod
     def get_phases_for_user_role(cls, bmr, user_role):
         """Get phases that a specific user role can work on"""
-        # Map user roles to phases they can handle
-        role_phase_mapping = {
-            'qa': ['bmr_creation', 'final_qa'],
-            'regulatory': ['regulatory_approval'],
-            'store_manager': ['raw_material_release'],  # Store Manager handles raw material release
-            'dispensing_operator': ['material_dispensing'],  # Dispensing Operator handles material dispensing
-            'packaging_store': ['packaging_material_release'],  # Packaging store handles packaging material release
-            'finished_goods_store': ['finished_goods_store'],  # Finished Goods Store only handles finished goods storage
-            'qc': ['post_compression_qc', 'post_mixing_qc', 'post_blending_qc'],
-            'mixing_operator': ['mixing'],
-            'granulation_operator': ['granulation'],
-            'blending_operator': ['blending'],
-            'compression_operator': ['compression'],
-            'coating_operator': ['coating'],
-            'drying_operator': ['drying'],
-            'filling_operator': ['filling'],
-            'tube_filling_operator': ['tube_filling'],
-            'packing_operator': ['blister_packing', 'bulk_packing', 'secondary_packaging'],
-            'sorting_operator': ['sorting'],
-        }
-        
-        allowed_phases = role_phase_mapping.get(user_role, [])
+        allowed_phases = registry.phases_for_role(user_role)
         
         # Check if there are any failed QC phases that would roll back to this user's responsibility
         has_rollback = False
@@ -1362,7 +1573,7 @@ class WorkflowService:
                         if blending_phase.status not in ['pending', 'in_progress']:
                             blending_phase.status = 'pending'
                             blending_phase.save()
-                            print(f"Reset blending phase to pending for capsule BMR {bmr.bmr_number} after QC failure")
+                            qc_events.info('rework_phase_reopened', bmr=bmr.bmr_number, phase='blending')
                         
                         # Add it to the phases list
                         phases = list(phases)
@@ -1385,7 +1596,7 @@ class WorkflowService:
                         if mixing_phase.status not in ['pending', 'in_progress']:
                             mixing_phase.status = 'pending'
                             mixing_phase.save()
-                            print(f"Reset mixing phase to pending for ointment BMR {bmr.bmr_number} after QC failure")
+                            qc_events.info('rework_phase_reopened', bmr=bmr.bmr_number, phase='mixing')
                         
                         # Add it to the phases list
                         phases = list(phases)
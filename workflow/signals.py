@@ -2,7 +2,10 @@ from django.db.models.signals import post_save
 from django.dispatch import receiver
 from django.utils import timezone
 
-from .models import BatchPhaseExecution, ProductionPhase
+from kampala_pharma.events import get_event_logger
+from .models import BatchPhaseExecution, Machine, ProductionPhase
+
+qc_events = get_event_logger('qc')
 
 @receiver(post_save, sender=BatchPhaseExecution)
 def handle_post_compression_qc_failure(sender, instance, **kwargs):
@@ -30,32 +33,28 @@ def handle_post_compression_qc_failure(sender, instance, **kwargs):
         
         # Skip signal processing if reprocessing has already started
         if reprocessing_started:
-            print(f"Skipping QC failure handling for BMR {bmr.bmr_number} - reprocessing already started")
+            qc_events.debug('qc_failure_skipped', bmr=bmr.bmr_number, reason='reprocessing_started')
             return
         try:
             # Check if this is a tablet product
             bmr = instance.bmr
             if bmr.product.product_type != 'tablet':
-                print(f"Skipping non-tablet product for QC failure rollback: {bmr.batch_number}")
+                qc_events.debug('qc_failure_skipped', bmr=bmr.bmr_number, reason='not_tablet')
                 return
             
-            print(f"\n*** POST-COMPRESSION QC FAILURE DETECTED FOR BMR {bmr.bmr_number} ***")
+            original_batch_number = bmr.batch_number
+            reset_phases = []
             
             # Check if batch already has a reprocessing indicator
-            if "REPROCESS" in bmr.batch_number:
-                print(f"Batch {bmr.batch_number} is already marked for reprocessing")
-            else:
+            if "REPROCESS" not in bmr.batch_number:
                 # Update batch number to indicate reprocessing
                 current_date = timezone.now().strftime('%Y-%m-%d')
-                original_batch_number = bmr.batch_number
                 new_batch_number = f"{original_batch_number}-REPROCESS-{current_date}"
                 
                 bmr.batch_number = new_batch_number
                 bmr.notes = (bmr.notes or '') + f" | This batch is being reprocessed after post-compression QC failure on {current_date}."
                 bmr.last_modified_date = timezone.now()
                 bmr.save()
-                
-                print(f"Updated batch number: {original_batch_number} → {new_batch_number}")
             
             # Reset granulation phase to pending for reprocessing
             # CRITICAL: Check if a blending phase is already in progress or pending
@@ -83,11 +82,7 @@ def handle_post_compression_qc_failure(sender, instance, **kwargs):
                         granulation_phase.completed_date = None
                         granulation_phase.operator_comments = (granulation_phase.operator_comments or "") + f" | Reprocessing after QC failure on {timezone.now().strftime('%Y-%m-%d')}. New batch number: {bmr.batch_number}"
                         granulation_phase.save()
-                        print(f"Reset granulation phase from '{old_status}' to 'pending' for BMR {bmr.bmr_number}")
-                    else:
-                        print(f"Granulation phase already pending for BMR {bmr.bmr_number}")
-            else:
-                print(f"Skipping granulation phase reset for BMR {bmr.bmr_number} as blending is already active")
+                        reset_phases.append(f'granulation:{old_status}->pending')
                 
             # Reset all subsequent phases to not_ready
             subsequent_phases = BatchPhaseExecution.objects.filter(
@@ -95,7 +90,7 @@ def handle_post_compression_qc_failure(sender, instance, **kwargs):
                 phase__phase_name__in=['blending', 'compression', 'post_compression_qc', 'sorting', 'coating', 
                                       'packaging_material_release', 'blister_packing', 'secondary_packaging', 
                                       'final_qa', 'finished_goods_store']
-            )
+            ).select_related('phase')
             
             for phase in subsequent_phases:
                 if phase.status != 'not_ready':
@@ -106,11 +101,36 @@ def handle_post_compression_qc_failure(sender, instance, **kwargs):
                     phase.completed_by = None
                     phase.completed_date = None
                     phase.save()
-                    print(f"Reset {phase.phase.phase_name} phase from '{old_status}' to 'not_ready' for BMR {bmr.bmr_number}")
-                
-            print(f"Successfully set up tablet batch {bmr.bmr_number} for reprocessing after QC failure")
-        except Exception as e:
-            print(f"Error in handle_post_compression_qc_failure: {str(e)}")
+                    reset_phases.append(f'{phase.phase.phase_name}:{old_status}->not_ready')
                 
+            qc_events.info('qc_failure_reprocessing', bmr=bmr.bmr_number, original_batch=original_batch_number,
+                           batch=bmr.batch_number, blending_active=blending_active, reset_phases=reset_phases)
         except Exception as e:
-            print(f"Error in handle_post_compression_qc_failure: {str(e)}")
+            qc_events.error('qc_failure_handling_failed', bmr=bmr.bmr_number, error=e)
+
+
+@receiver(post_save, sender=BatchPhaseExecution)
+def track_phase_change(sender, instance, created, **kwargs):
+    """
+    Act on a phase's status change: mark the phase schedule for re-timing (also when a
+    breakdown is reported), and fold a completion into the duration statistics behind
+    the ETAs. A save that changes neither the status nor the breakdown flag does nothing.
+    """
+    # Rows not loaded from the database (no _loaded_status) are treated as changed
+    status_changed = getattr(instance, '_loaded_status', None) != instance.status
+    breakdown_reported = instance.breakdown_occurred and not getattr(instance, '_loaded_breakdown', False)
+    instance._loaded_status = instance.status
+    instance._loaded_breakdown = instance.breakdown_occurred
+    if not created and (status_changed or breakdown_reported):
+        from .scheduling import request_reschedule
+        request_reschedule()
+    if status_changed and instance.status == 'completed' and instance.completed_date:
+        from .eta import request_stats_update
+        request_stats_update()
+
+
+@receiver(post_save, sender=Machine)
+def reschedule_on_machine_change(sender, instance, created, **kwargs):
+    """A machine added, retired or brought back changes the capacity the schedule assumed; mark it for re-timing"""
+    from .scheduling import request_reschedule
+    request_reschedule()
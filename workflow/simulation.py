@@ -0,0 +1,367 @@
+"""
+What-if simulation of the production floor.
+
+`load_model` snapshots what a plan needs into plain data:
+- each batch's route from WorkflowService.PRODUCT_WORKFLOWS
+- historical phase durations and QC failure rates from BatchPhaseExecution
+- active machines per Machine.machine_type
+- active users per role
+
+`simulate` then runs Monte Carlo replications of a discrete-event model over a process
+pool. In the model, a phase waits until a machine of its type and an operator of its
+role (from workflow.registry) are both free. Durations are drawn from the history of that
+product type and phase. A failed QC phase sends the batch back to its rework phase.
+Failure rates are smoothed with FAILURE_PRIOR_WEIGHT pseudo-outcomes: a product type's
+rate is pulled toward the phase's pooled rate over all product types, and the pooled rate
+toward 0, the rate assumed with no history at all. So one pass stays at 0, and a product
+type with no outcomes of its own uses the pooled rate. Rates are capped at
+MAX_FAILURE_RATE, and a batch is reworked at most MAX_REWORKS times, so a QC phase whose
+only recorded outcome failed can't keep sending a batch back forever.
+
+The result has ETA percentiles per batch and, per phase, the queue wait and the
+utilisation of the machines and operators it competes for.
+
+Replications only touch the snapshot, never the database, so they are safe to run in
+worker processes.
+"""
+import heapq
+import os
+import random
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from datetime import timedelta
+from itertools import repeat
+
+from .registry import qc_rollback_phase, role_for_phase
+
+OPEN_BMR_STATUSES = ['draft', 'submitted', 'approved', 'in_production']
+DONE_STATUSES = {'completed', 'skipped'}
+
+DEFAULT_PHASE_HOURS = 4.0
+MIN_SAMPLES = 5
+HISTORY_DAYS = 365
+PERCENTILES = (10, 50, 90)
+MAX_FAILURE_RATE = 0.9
+FAILURE_PRIOR_WEIGHT = 2
+MAX_REWORKS = 3
+
+
+def _hours(delta):
+    return delta.total_seconds() / 3600
+
+
+def load_model(bmr_ids=(), planned=(), release=None, include_wip=True, history_days=HISTORY_DAYS, now=None):
+    """
+    Snapshot routes, durations, QC failure rates and capacities for a plan.
+
+    `bmr_ids` are existing BMRs released at `release` (default now) from wherever they
+    are in their workflow; `planned` is a list of (product_id, count) for batches that
+    don't exist yet. With `include_wip`, every other open BMR is simulated too, from
+    now, so the plan competes with the work already on the floor.
+    """
+    from django.db.models import Count, Q
+    from django.utils import timezone
+
+    from accounts.models import CustomUser
+    from bmr.models import BMR
+    from products.models import Product
+    from .models import BatchPhaseExecution, Machine, ProductionPhase
+    from .services import WorkflowService
+
+    now = now or timezone.now()
+    release = release or now
+    release_offset = max(_hours(release - now), 0.0)
+    bmr_ids = set(bmr_ids)
+
+    selected = Q(id__in=bmr_ids)
+    if include_wip:
+        selected |= Q(status__in=OPEN_BMR_STATUSES)
+    open_bmrs = list(BMR.objects.filter(selected).select_related('product'))
+    missing = bmr_ids - {bmr.id for bmr in open_bmrs}
+    if missing:
+        raise ValueError(f"Unknown BMR id(s): {', '.join(map(str, sorted(missing)))}")
+
+    done = defaultdict(set)
+    for bmr_id, phase_name in BatchPhaseExecution.objects.filter(
+        bmr__in=open_bmrs, status__in=DONE_STATUSES
+    ).values_list('bmr_id', 'phase__phase_name'):
+        done[bmr_id].add(phase_name)
+
+    jobs = []
+    for bmr in open_bmrs:
+        route = WorkflowService.get_workflow_phase_names(bmr.product)
+        remaining = [phase for phase in route if phase not in done[bmr.id]]
+        if not remaining:
+            continue
+        in_plan = bmr.id in bmr_ids
+        jobs.append({
+            'reference': bmr.batch_number,
+            'bmr_id': bmr.id,
+            'product_type': bmr.product.product_type,
+            'route': remaining,
+            'release': release_offset if in_plan else 0.0,
+            'in_plan': in_plan,
+        })
+
+    products = Product.objects.in_bulk([product_id for product_id, _ in planned])
+    for product_id, count in planned:
+        product = products.get(product_id)
+        if product is None:
+            raise ValueError(f'Unknown product id: {product_id}')
+        route = WorkflowService.get_workflow_phase_names(product)
+        for index in range(count):
+            jobs.append({
+                'reference': f'{product.product_name} #{index + 1}',
+                'bmr_id': None,
+                'product_type': product.product_type,
+                'route': route,
+                'release': release_offset,
+                'in_plan': True,
+            })
+
+    # Historical active time per (product type, phase) and per phase
+    durations = defaultdict(list)
+    history = BatchPhaseExecution.objects.filter(
+        status='completed',
+        started_date__isnull=False,
+        completed_date__gte=now - timedelta(days=history_days),
+    ).values_list('bmr__product__product_type', 'phase__phase_name', 'started_date', 'completed_date')
+    for product_type, phase_name, started, completed in history.iterator(chunk_size=5000):
+        hours = _hours(completed - started)
+        if hours >= 0:
+            durations[f'{product_type}:{phase_name}'].append(hours)
+            durations[phase_name].append(hours)
+
+    estimates = defaultdict(list)
+    for phase_name, hours in ProductionPhase.objects.values_list('phase_name', 'estimated_duration_hours'):
+        if hours:
+            estimates[phase_name].append(float(hours))
+
+    qc_outcomes = BatchPhaseExecution.objects.filter(
+        phase__phase_name__in=[phase for phase in _phases(jobs) if qc_rollback_phase(phase)],
+        status__in=['completed', 'failed'],
+    ).values('bmr__product__product_type', 'phase__phase_name').annotate(
+        failed=Count('id', filter=Q(status='failed')),
+        total=Count('id'),
+    )
+    pooled = defaultdict(lambda: [0, 0])
+    for row in qc_outcomes:
+        pooled[row['phase__phase_name']][0] += row['failed']
+        pooled[row['phase__phase_name']][1] += row['total']
+    failure_rates = {
+        phase: failed / (total + FAILURE_PRIOR_WEIGHT) for phase, (failed, total) in pooled.items()
+    }
+    for row in qc_outcomes:
+        prior = failure_rates[row['phase__phase_name']]
+        failure_rates[f"{row['bmr__product__product_type']}:{row['phase__phase_name']}"] = (
+            (row['failed'] + FAILURE_PRIOR_WEIGHT * prior) / (row['total'] + FAILURE_PRIOR_WEIGHT)
+        )
+
+    machines = dict(
+        Machine.objects.filter(is_active=True).values_list('machine_type').annotate(count=Count('id'))
+    )
+    headcount = dict(
+        CustomUser.objects.filter(is_active=True).values_list('role').annotate(count=Count('id'))
+    )
+    capacity, needs = {}, {}
+    for phase in _phases(jobs):
+        resources = []
+        if machines.get(phase):
+            capacity[f'machine:{phase}'] = machines[phase]
+            resources.append(f'machine:{phase}')
+        role = role_for_phase(phase)
+        if headcount.get(role):
+            capacity[f'role:{role}'] = headcount[role]
+            resources.append(f'role:{role}')
+        needs[phase] = resources
+
+    return {
+        'now': now,
+        'jobs': jobs,
+        'durations': {key: sorted(values) for key, values in durations.items()},
+        'estimates': {phase: sum(hours) / len(hours) for phase, hours in estimates.items()},
+        'failure_rates': failure_rates,
+        'capacity': capacity,
+        'needs': needs,
+    }
+
+
+def _phases(jobs):
+    return {phase for job in jobs for phase in job['route']}
+
+
+def _sample_hours(model, product_type, phase, rng):
+    for key in (f'{product_type}:{phase}', phase):
+        samples = model['durations'].get(key)
+        if samples and len(samples) >= MIN_SAMPLES:
+            return rng.choice(samples)
+    hours = model['estimates'].get(phase, DEFAULT_PHASE_HOURS)
+    return rng.triangular(0.75 * hours, 1.5 * hours, hours)
+
+
+def _failure_rate(model, product_type, phase):
+    for key in (f'{product_type}:{phase}', phase):
+        if key in model['failure_rates']:
+            return min(model['failure_rates'][key], MAX_FAILURE_RATE)
+    return 0
+
+
+def run_replication(model, seed):
+    """One replication; returns finish hours per job, busy hours per resource and waits per phase"""
+    rng = random.Random(seed)
+    jobs, needs = model['jobs'], model['needs']
+    free = dict(model['capacity'])
+    busy = defaultdict(float)
+    waits = defaultdict(list)
+    finish = [None] * len(jobs)
+    position = [0] * len(jobs)
+    reworks = [0] * len(jobs)
+    queue = []  # (enqueued at, sequence, job) in arrival order
+    events = []  # (time, sequence, job)
+    sequence = 0
+
+    for index, job in enumerate(jobs):
+        queue.append((job['release'], sequence, index))
+        sequence += 1
+    queue.sort()
+
+    clock = 0.0
+    while True:
+        # Start every queued phase whose machine and operator are both free, first come first served
+        still_waiting = []
+        for enqueued, seq, index in queue:
+            if enqueued > clock:
+                still_waiting.append((enqueued, seq, index))
+                continue
+            job = jobs[index]
+            phase = job['route'][position[index]]
+            resources = needs[phase]
+            if any(free[resource] <= 0 for resource in resources):
+                still_waiting.append((enqueued, seq, index))
+                continue
+            for resource in resources:
+                free[resource] -= 1
+            hours = _sample_hours(model, job['product_type'], phase, rng)
+            for resource in resources:
+                busy[resource] += hours
+            waits[phase].append(clock - enqueued)
+            heapq.heappush(events, (clock + hours, seq, index))
+        queue = still_waiting
+
+        upcoming = [events[0][0]] if events else []
+        upcoming += [enqueued for enqueued, _, _ in queue if enqueued > clock]
+        if not upcoming:
+            break
+        clock = min(upcoming)
+
+        while events and events[0][0] <= clock:
+            _, _, index = heapq.heappop(events)
+            job = jobs[index]
+            phase = job['route'][position[index]]
+            for resource in needs[phase]:
+                free[resource] += 1
+
+            next_position = position[index] + 1
+            rework = qc_rollback_phase(phase)
+            failure_rate = _failure_rate(model, job['product_type'], phase)
+            if (
+                rework in job['route'][:position[index]]
+                and reworks[index] < MAX_REWORKS
+                and rng.random() < failure_rate
+            ):
+                reworks[index] += 1
+                next_position = job['route'].index(rework)
+
+            if next_position >= len(job['route']):
+                finish[index] = clock
+            else:
+                position[index] = next_position
+                queue.append((clock, sequence, index))
+                sequence += 1
+
+    return {
+        'finish': finish,
+        'makespan': clock,
+        'busy': dict(busy),
+        'waits': {phase: (sum(values), len(values)) for phase, values in waits.items()},
+    }
+
+
+def _run_chunk(model, seeds):
+    return [run_replication(model, seed) for seed in seeds]
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    if not values:
+        return None
+    rank = (len(values) - 1) * pct / 100
+    low = int(rank)
+    high = min(low + 1, len(values) - 1)
+    return values[low] + (values[high] - values[low]) * (rank - low)
+
+
+def simulate(model, replications=1000, workers=None, seed=0):
+    """Run the replications across a process pool and summarise them"""
+    seeds = [seed * 1_000_003 + index for index in range(replications)]
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or replications < 50:
+        runs = _run_chunk(model, seeds)
+    else:
+        size = max(1, -(-replications // (workers * 4)))
+        chunks = [seeds[start:start + size] for start in range(0, replications, size)]
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            runs = [run for chunk in pool.map(_run_chunk, repeat(model), chunks) for run in chunk]
+    return summarise(model, runs)
+
+
+def summarise(model, runs):
+    now, jobs = model['now'], model['jobs']
+
+    def at(hours):
+        return now + timedelta(hours=hours) if hours is not None else None
+
+    batches = []
+    plan_finish = []
+    for index, job in enumerate(jobs):
+        if not job['in_plan']:
+            continue
+        finishes = [run['finish'][index] for run in runs if run['finish'][index] is not None]
+        batches.append({
+            'reference': job['reference'],
+            'bmr_id': job['bmr_id'],
+            'phases_left': len(job['route']),
+            **{f'p{pct}': at(percentile(finishes, pct)) for pct in PERCENTILES},
+        })
+    for run in runs:
+        finishes = [run['finish'][index] for index, job in enumerate(jobs) if job['in_plan']]
+        if finishes and None not in finishes:
+            plan_finish.append(max(finishes))
+
+    utilisation = {}
+    for resource, count in model['capacity'].items():
+        shares = [run['busy'].get(resource, 0) / (count * run['makespan']) for run in runs if run['makespan']]
+        utilisation[resource] = sum(shares) / len(shares) if shares else 0.0
+
+    phases = []
+    for phase, resources in model['needs'].items():
+        total = sum(run['waits'].get(phase, (0, 0))[0] for run in runs)
+        visits = sum(run['waits'].get(phase, (0, 0))[1] for run in runs)
+        phases.append({
+            'phase': phase,
+            'resources': {resource: model['capacity'][resource] for resource in resources},
+            'utilisation': max((utilisation[resource] for resource in resources), default=0.0),
+            'mean_wait_hours': total / visits if visits else 0.0,
+            'visits_per_run': visits / len(runs) if runs else 0.0,
+        })
+    phases.sort(key=lambda row: (row['utilisation'], row['mean_wait_hours']), reverse=True)
+
+    return {
+        'replications': len(runs),
+        'plan_batches': len(batches),
+        'background_batches': sum(1 for job in jobs if not job['in_plan']),
+        'plan_completion': {f'p{pct}': at(percentile(plan_finish, pct)) for pct in PERCENTILES},
+        'batches': batches,
+        'phases': phases,
+        'unconstrained_phases': sorted(phase for phase, resources in model['needs'].items() if not resources),
+    }
@@ -0,0 +1,600 @@
+"""
+Synthetic plant and production history generator for benchmarking and performance testing.
+
+Everything is written with bulk_create/bulk_update so model save() side effects
+(workflow initialisation, inventory transactions, material sync, FGS release
+accounting) are skipped and the equivalent rows are written directly instead.
+Output is fully determined by the seed.
+"""
+import random
+from contextlib import contextmanager
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
+from django.utils import timezone
+
+from accounts.models import CustomUser
+from bmr.models import BMR, BMRMaterial
+from fgs_management.models import FGSInventory, ProductRelease
+from products.models import Product, ProductMaterial
+from raw_materials.models import MaterialDispensing, MaterialDispensingItem, RawMaterial, RawMaterialBatch
+from raw_materials.models_transaction import InventoryTransaction
+from workflow.models import BatchPhaseExecution, Machine, ProductionPhase
+from workflow.services import WorkflowService
+
+SYNTHETIC_PREFIX = 'SYN'
+SYNTHETIC_PASSWORD = 'synthetic'
+
+# (product_type, coating_type, tablet_type, capsule_type) variants to cycle through
+PRODUCT_VARIANTS = [
+    ('ointment', '', '', ''),
+    ('tablet', 'uncoated', 'normal', ''),
+    ('tablet', 'coated', 'normal', ''),
+    ('tablet', 'uncoated', 'tablet_2', ''),
+    ('capsule', '', '', 'normal'),
+    ('capsule', '', '', 'bulk'),
+]
+
+BATCH_SIZE_UNITS = {
+    'ointment': 'tubes',
+    'tablet': 'tablets',
+    'capsule': 'capsules',
+}
+
+# QC phase -> phase production is sent back to when the test fails
+QC_ROLLBACK_TARGETS = {
+    'post_compression_qc': 'granulation',
+    'post_mixing_qc': 'mixing',
+    'post_blending_qc': 'blending',
+}
+
+# Role of the user who works each phase
+PHASE_ROLES = {
+    'bmr_creation': 'qa',
+    'regulatory_approval': 'regulatory',
+    'raw_material_release': 'store_manager',
+    'material_dispensing': 'dispensing_operator',
+    'packaging_material_release': 'packaging_store',
+    'finished_goods_store': 'finished_goods_store',
+    'final_qa': 'qa',
+    'post_compression_qc': 'qc',
+    'post_mixing_qc': 'qc',
+    'post_blending_qc': 'qc',
+    'blister_packing': 'packing_operator',
+    'bulk_packing': 'packing_operator',
+    'secondary_packaging': 'packing_operator',
+}
+
+DEFAULT_PHASE_HOURS = Decimal('4')
+
+
+@contextmanager
+def backdated(*models):
+    """Let bulk_create keep explicit values for auto_now_add fields on the given models"""
+    fields = [
+        field for model in models for field in model._meta.concrete_fields
+        if getattr(field, 'auto_now_add', False)
+    ]
+    for field in fields:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field in fields:
+            field.auto_now_add = True
+
+
+class SyntheticPlant:
+    """Builds a deterministic synthetic plant with a production history of the requested size"""
+
+    def __init__(self, products=6, bmrs=50, materials=20, batches_per_material=3,
+                 releases_per_inventory=2, seed=42, years=1, staff_per_role=1,
+                 qc_failure_rate=0.1, breakdown_rate=0.05, changeover_rate=0.2,
+                 chunk_size=2000, progress=None):
+        self.product_count = products
+        self.bmr_count = bmrs
+        self.material_count = materials
+        self.batches_per_material = batches_per_material
+        self.releases_per_inventory = releases_per_inventory
+        self.seed = seed
+        self.years = years
+        self.staff_per_role = staff_per_role
+        self.qc_failure_rate = qc_failure_rate
+        self.breakdown_rate = breakdown_rate
+        self.changeover_rate = changeover_rate
+        self.chunk_size = chunk_size
+        self.progress = progress
+        self.random = random.Random(seed)
+        self.now = timezone.now()
+        self.start = self.now - timedelta(days=365 * years)
+        self.users = {}
+        self.staff = {}
+        self.counts = {}
+        self.stock = {}
+        self.workflows = {}
+
+    def build(self):
+        """Create the plant and its history, one transaction per chunk of BMRs, and return row counts"""
+        with transaction.atomic():
+            self.create_users()
+            machines = self.create_machines()
+            materials = self.create_raw_materials()
+            products = self.create_products(materials)
+            phases = self.create_phases()
+
+        self.counts.update({
+            'users': sum(len(users) for users in self.staff.values()),
+            'machines': sum(len(pool) for pool in machines.values()),
+            'raw_materials': len(materials),
+            'products': len(products),
+        })
+        boms = self._load_boms(products)
+
+        # Continue numbering after any earlier synthetic runs so batch numbers stay unique
+        offset = BMR.objects.filter(bmr_number__startswith=SYNTHETIC_PREFIX).count()
+        start_times = sorted(
+            self.start + timedelta(seconds=self.random.uniform(0, (self.now - self.start).total_seconds()))
+            for _ in range(self.bmr_count)
+        )
+        for chunk_start in range(0, self.bmr_count, self.chunk_size):
+            chunk_times = start_times[chunk_start:chunk_start + self.chunk_size]
+            with transaction.atomic(), backdated(BMR, BatchPhaseExecution, FGSInventory,
+                                                 ProductRelease, MaterialDispensing):
+                self._build_chunk(offset + chunk_start, chunk_times, products, boms, phases, machines)
+            if self.progress:
+                self.progress(min(chunk_start + self.chunk_size, self.bmr_count), self.bmr_count)
+
+        return self.counts
+
+    def _count(self, key, amount):
+        self.counts[key] = self.counts.get(key, 0) + amount
+
+    def _user(self, role):
+        users = self.staff.get(role)
+        return self.random.choice(users) if users else self.users.get('admin')
+
+    def create_users(self):
+        """staff_per_role users per role; the first is synth_<role>, the rest synth_<role>_<n>"""
+        User = get_user_model()
+        password = make_password(SYNTHETIC_PASSWORD)
+        new_users = []
+        for r, (role, _) in enumerate(CustomUser.ROLE_CHOICES):
+            for n in range(self.staff_per_role):
+                suffix = f'_{n + 1}' if n else ''
+                new_users.append(User(
+                    username=f'synth_{role}{suffix}',
+                    employee_id=f'{SYNTHETIC_PREFIX}-{r:02d}-{n:04d}',
+                    role=role,
+                    department='Synthetic',
+                    password=password,
+                    is_staff=role == 'admin',
+                    is_superuser=role == 'admin',
+                ))
+        User.objects.bulk_create(new_users, ignore_conflicts=True)
+
+        self.staff = {}
+        for user in User.objects.filter(username__startswith='synth_').order_by('username'):
+            self.staff.setdefault(user.role, []).append(user)
+        self.users = {role: users[0] for role, users in self.staff.items()}
+        return self.users
+
+    def create_machines(self):
+        """Two machines per machine type"""
+        Machine.objects.bulk_create([
+            Machine(name=f'{SYNTHETIC_PREFIX} {machine_type} {i}', machine_type=machine_type)
+            for machine_type, _ in Machine.MACHINE_TYPE_CHOICES
+            for i in (1, 2)
+        ], ignore_conflicts=True)
+        machines = {}
+        for machine in Machine.objects.filter(name__startswith=SYNTHETIC_PREFIX, is_active=True):
+            machines.setdefault(machine.machine_type, []).append(machine)
+        return machines
+
+    def create_raw_materials(self):
+        """Raw materials with an opening stock of approved batches plus a few awaiting QC"""
+        categories = [choice for choice, _ in RawMaterial.MATERIAL_CATEGORIES]
+        RawMaterial.objects.bulk_create([
+            RawMaterial(
+                material_code=f'{SYNTHETIC_PREFIX}-RM-{self.seed}-{i:05d}',
+                material_name=f'Synthetic Material {i}',
+                category=categories[i % len(categories)],
+                unit_of_measure='kg',
+                reorder_level=Decimal('10'),
+            )
+            for i in range(self.material_count)
+        ], ignore_conflicts=True)
+        materials = list(RawMaterial.objects.filter(
+            material_code__startswith=f'{SYNTHETIC_PREFIX}-RM-{self.seed}-'
+        ))
+
+        batches = []
+        for material in materials:
+            for b in range(self.batches_per_material):
+                received = self.start - timedelta(days=self.random.randint(1, 60))
+                status = 'pending_qc' if b == 0 and self.random.random() < 0.3 else 'approved'
+                batch = self._new_batch(material, received, status)
+                batches.append(batch)
+                if status == 'approved':
+                    self.stock.setdefault(material.id, []).append(batch)
+        self._save_receipts(batches)
+        return materials
+
+    def _new_batch(self, material, received, status='approved'):
+        quantity = Decimal(self.random.randint(200, 2000))
+        return RawMaterialBatch(
+            material=material,
+            batch_number=f'{SYNTHETIC_PREFIX}{material.id}-{self.random.getrandbits(32):08x}',
+            quantity_received=quantity,
+            quantity_remaining=quantity,
+            supplier='Synthetic Supplier',
+            received_date=received.date(),
+            manufacturing_date=(received - timedelta(days=30)).date(),
+            expiry_date=(received + timedelta(days=730)).date(),
+            status=status,
+            approved_date=received if status == 'approved' else None,
+            approved_by=self.users.get('qc') if status == 'approved' else None,
+            received_by=self.users.get('store_manager'),
+        )
+
+    def _save_receipts(self, batches):
+        """Bulk insert new raw material batches and their 'received' transactions"""
+        RawMaterialBatch.objects.bulk_create(batches, batch_size=1000)
+        InventoryTransaction.objects.bulk_create([
+            InventoryTransaction(
+                material_batch=batch,
+                transaction_type='received',
+                quantity=batch.quantity_received,
+                transaction_date=timezone.make_aware(datetime.combine(batch.received_date, time.min)),
+                user=batch.received_by,
+                notes='Synthetic receipt',
+            )
+            for batch in batches
+        ], batch_size=1000)
+        self._count('raw_material_batches', len(batches))
+        self._count('inventory_transactions', len(batches))
+
+    def create_products(self, materials):
+        """Products cycling through every workflow variant, each with a bill of materials"""
+        products = Product.objects.bulk_create([
+            Product(
+                product_name=f'{SYNTHETIC_PREFIX} Product {self.seed}-{i}',
+                product_type=variant[0],
+                coating_type=variant[1],
+                tablet_type=variant[2],
+                capsule_type=variant[3],
+                standard_batch_size=Decimal(self.random.choice([1000, 5000, 10000, 50000])),
+                batch_size_unit=BATCH_SIZE_UNITS[variant[0]],
+            )
+            for i, variant in ((i, PRODUCT_VARIANTS[i % len(PRODUCT_VARIANTS)])
+                               for i in range(self.product_count))
+        ])
+
+        if materials:
+            bom = []
+            for product in products:
+                for material in self.random.sample(materials, min(4, len(materials))):
+                    bom.append(ProductMaterial(
+                        product=product,
+                        raw_material=material,
+                        required_quantity=Decimal(self.random.randint(1, 20)),
+                        unit_of_measure=material.unit_of_measure,
+                    ))
+            ProductMaterial.objects.bulk_create(bom)
+            Through = Product.raw_materials.through
+            Through.objects.bulk_create([
+                Through(product_id=item.product_id, rawmaterial_id=item.raw_material_id)
+                for item in bom
+            ], ignore_conflicts=True)
+        return products
+
+    def _load_boms(self, products):
+        boms = {product.id: [] for product in products}
+        for item in ProductMaterial.objects.filter(product__in=products).select_related('raw_material'):
+            boms[item.product_id].append(item)
+        return boms
+
+    def create_phases(self):
+        """Make sure every phase of every workflow variant has a ProductionPhase row"""
+        phases = {}
+        for product_type, phase_names in WorkflowService.PRODUCT_WORKFLOWS.items():
+            names = list(phase_names)
+            if 'bulk_packing' not in names and 'blister_packing' in names:
+                names.insert(names.index('blister_packing') + 1, 'bulk_packing')
+            for order, phase_name in enumerate(names, 1):
+                phase, _ = ProductionPhase.objects.get_or_create(
+                    product_type=product_type,
+                    phase_name=phase_name,
+                    defaults={
+                        'phase_order': order,
+                        'requires_approval': phase_name in ['regulatory_approval', 'final_qa'],
+                        'estimated_duration_hours': Decimal(self.random.randint(1, 8)),
+                    }
+                )
+                phases[(product_type, phase_name)] = phase
+        return phases
+
+    def _build_chunk(self, offset, start_times, products, boms, phases, machines):
+        """Simulate and insert one chunk of BMRs with everything hanging off them"""
+        bmrs = []
+        for i, started in enumerate(start_times, offset):
+            bmrs.append(BMR(
+                bmr_number=f'{SYNTHETIC_PREFIX}{self.seed}-{i:08d}'[:20],
+                # 10 character batch numbers keep synthetic rows clear of real XXXYYYY numbers
+                batch_number=f'{i % 1000000:06d}{started.year}',
+                product=self.random.choice(products),
+                status='approved',
+                created_date=started,
+                created_by=self._user('qa'),
+                planned_start_date=started,
+                planned_completion_date=started + timedelta(days=14),
+            ))
+
+        # Simulate first so each row is inserted once in its final state
+        executions = []
+        completed = []
+        dispensed = []
+        for bmr in bmrs:
+            history = self._simulate_workflow(bmr, phases, machines)
+            executions.extend(history.values())
+            dispensing_phase = history.get('material_dispensing')
+            if dispensing_phase is not None and dispensing_phase.status == 'completed':
+                dispensed.append((bmr, dispensing_phase))
+            final = history.get('finished_goods_store')
+            if final is not None and final.status == 'completed':
+                completed.append((bmr, final))
+        BMR.objects.bulk_create(bmrs, batch_size=1000)
+        BatchPhaseExecution.objects.bulk_create(executions, batch_size=1000)
+        self._count('bmrs', len(bmrs))
+        self._count('phase_executions', len(executions))
+
+        self._create_dispensings(dispensed, boms)
+        self._create_fgs(completed)
+
+    def _simulate_workflow(self, bmr, phases, machines):
+        """Walk a BMR through its workflow up to now, including QC failures and rework"""
+        product_type = bmr.product.product_type
+        workflow = self.workflows.get(bmr.product.id)
+        if workflow is None:
+            workflow = self.workflows[bmr.product.id] = WorkflowService.get_workflow_phase_names(bmr.product)
+        history = {
+            name: BatchPhaseExecution(
+                bmr=bmr,
+                phase=phases[(product_type, name)],
+                status='not_ready',
+                created_date=bmr.created_date,
+            )
+            for name in workflow
+        }
+
+        clock = bmr.created_date
+        qc_failures = 0
+        index = 0
+        while index < len(workflow):
+            name = workflow[index]
+            execution = history[name]
+            hours = float(execution.phase.estimated_duration_hours or DEFAULT_PHASE_HOURS)
+            started = clock + timedelta(hours=self.random.expovariate(1 / 3))
+            finished = started + timedelta(hours=hours * self.random.uniform(0.6, 1.8))
+
+            if started > self.now:
+                execution.status = 'pending'
+                break
+
+            execution.started_date = started
+            execution.started_by = self._user(PHASE_ROLES.get(name, f'{name}_operator'))
+            pool = machines.get(name)
+            if pool:
+                execution.machine_used = self.random.choice(pool)
+                if self.random.random() < self.changeover_rate:
+                    execution.changeover_occurred = True
+                    execution.changeover_start_time = started
+                    execution.changeover_end_time = started + timedelta(minutes=self.random.randint(15, 90))
+                    execution.changeover_reason = 'Product changeover'
+                if self.random.random() < self.breakdown_rate:
+                    down = started + timedelta(minutes=self.random.randint(10, 120))
+                    execution.breakdown_occurred = True
+                    execution.breakdown_start_time = down
+                    execution.breakdown_end_time = down + timedelta(minutes=self.random.randint(20, 240))
+                    execution.breakdown_reason = 'Synthetic breakdown'
+                    finished = max(finished, execution.breakdown_end_time)
+
+            if finished > self.now:
+                execution.status = 'in_progress'
+                break
+
+            execution.completed_date = finished
+            execution.completed_by = execution.started_by
+            clock = finished
+
+            target = QC_ROLLBACK_TARGETS.get(name)
+            if target in history and qc_failures < 2 and self.random.random() < self.qc_failure_rate:
+                qc_failures += 1
+                execution.status = 'failed'
+                execution.qc_approved = False
+                execution.qc_approved_by = execution.completed_by
+                execution.qc_approval_date = finished
+                execution.rejection_reason = 'Synthetic QC failure'
+                execution.phase_data = {'qc_failures': qc_failures}
+                # Send production back to the rollback target and reset everything in between
+                rollback_index = workflow.index(target)
+                for rework_name in workflow[rollback_index:index]:
+                    rework = history[rework_name]
+                    rework.status = 'not_ready'
+                    rework.started_date = rework.completed_date = None
+                    rework.started_by = rework.completed_by = None
+                    rework.operator_comments = f'Reprocessing after {name} failure'
+                    rework.phase_data = {'reprocessed': True}
+                history[target].status = 'pending'
+                index = rollback_index
+                continue
+
+            execution.status = 'completed'
+            if name in QC_ROLLBACK_TARGETS or name == 'final_qa':
+                execution.qc_approved = True
+                execution.qc_approved_by = execution.completed_by
+                execution.qc_approval_date = finished
+            if name == 'regulatory_approval':
+                bmr.status = 'approved'
+                bmr.approved_by = execution.completed_by
+                bmr.approved_date = finished
+            elif name == 'material_dispensing':
+                bmr.status = 'in_production'
+                bmr.actual_start_date = finished
+            index += 1
+        else:
+            bmr.status = 'completed'
+            bmr.actual_completion_date = clock
+            bmr.manufacture_date = clock.date()
+            bmr.expiry_date = (clock + timedelta(days=730)).date()
+
+        return history
+
+    def _take_stock(self, material, quantity, when):
+        """Pick the oldest approved batch that covers `quantity`, receiving a new one if needed"""
+        batches = self.stock.setdefault(material.id, [])
+        while batches and batches[0].quantity_remaining < quantity:
+            depleted = batches.pop(0)
+            depleted.status = 'depleted'
+            self._touched.append(depleted)
+        if not batches:
+            batch = self._new_batch(material, when - timedelta(days=self.random.randint(3, 20)))
+            batch.quantity_received = batch.quantity_remaining = max(batch.quantity_received, quantity * 20)
+            batches.append(batch)
+            self._received.append(batch)
+        batch = batches[0]
+        batch.quantity_remaining -= quantity
+        if batch.pk:
+            self._touched.append(batch)
+        return batch
+
+    def _create_dispensings(self, dispensed, boms):
+        """BMR materials, completed dispensings, dispensing items and 'dispensed' transactions"""
+        self._touched = []
+        self._received = []
+        dispensings = []
+        bmr_materials = []
+        items = []
+        for bmr, phase in dispensed:
+            operator = phase.completed_by
+            dispensing = MaterialDispensing(
+                bmr=bmr,
+                dispensing_reference=f'SD{bmr.id:010d}'[:20],
+                status='completed',
+                dispensed_by=operator,
+                requested_date=bmr.approved_date or phase.started_date,
+                started_date=phase.started_date,
+                completed_date=phase.completed_date,
+            )
+            dispensings.append(dispensing)
+            for line in boms.get(bmr.product_id, []):
+                material = line.raw_material
+                batch = self._take_stock(material, line.required_quantity, phase.completed_date)
+                bmr_material = BMRMaterial(
+                    bmr=bmr,
+                    material=material,
+                    material_name=material.material_name,
+                    material_code=material.material_code,
+                    required_quantity=line.required_quantity,
+                    unit_of_measure=line.unit_of_measure,
+                    batch_lot_number=batch.batch_number,
+                    expiry_date=batch.expiry_date,
+                    supplier=batch.supplier,
+                    dispensed_quantity=line.required_quantity,
+                    dispensed_by=operator,
+                    dispensed_date=phase.completed_date,
+                    is_dispensed=True,
+                )
+                bmr_materials.append(bmr_material)
+                items.append(MaterialDispensingItem(
+                    dispensing=dispensing,
+                    bmr_material=bmr_material,
+                    material_batch=batch,
+                    required_quantity=line.required_quantity,
+                    dispensed_quantity=line.required_quantity,
+                    is_dispensed=True,
+                    dispensed_date=phase.completed_date,
+                ))
+
+        # Batches from earlier chunks are updated in place; ones received in this chunk
+        # are inserted with their final remaining quantity
+        touched = {batch.pk: batch for batch in self._touched if batch.pk}
+        if touched:
+            RawMaterialBatch.objects.bulk_update(
+                touched.values(), ['quantity_remaining', 'status'], batch_size=1000
+            )
+        if self._received:
+            self._save_receipts(self._received)
+        MaterialDispensing.objects.bulk_create(dispensings, batch_size=1000)
+        BMRMaterial.objects.bulk_create(bmr_materials, batch_size=1000)
+        MaterialDispensingItem.objects.bulk_create(items, batch_size=1000)
+        InventoryTransaction.objects.bulk_create([
+            InventoryTransaction(
+                material_batch=item.material_batch,
+                transaction_type='dispensed',
+                quantity=item.dispensed_quantity,
+                transaction_date=item.dispensed_date,
+                user=item.dispensing.dispensed_by,
+                reference_bmr=item.dispensing.bmr,
+                notes=f'Dispensed for {item.dispensing.dispensing_reference}',
+            )
+            for item in items
+        ], batch_size=1000)
+        self._count('dispensings', len(dispensings))
+        self._count('dispensing_items', len(items))
+        self._count('inventory_transactions', len(items))
+
+    def _create_fgs(self, completed):
+        """FGS inventory for completed BMRs with releases spread between storage and now"""
+        inventories = []
+        for bmr, phase in completed:
+            inventories.append(FGSInventory(
+                bmr=bmr,
+                product=bmr.product,
+                batch_number=bmr.batch_number,
+                quantity_available=bmr.product.standard_batch_size,
+                status='available',
+                qa_approved_by=self._user('qa'),
+                qa_approval_date=phase.completed_date,
+                created_by=phase.completed_by,
+                created_at=phase.completed_date,
+            ))
+
+        releases = []
+        for inventory in inventories:
+            remaining = inventory.quantity_available
+            window = max((self.now - inventory.created_at).total_seconds(), 1)
+            release_times = sorted(
+                inventory.created_at + timedelta(seconds=self.random.uniform(0, window))
+                for _ in range(self.random.randint(0, self.releases_per_inventory))
+            )
+            for r, released in enumerate(release_times):
+                quantity = (remaining * Decimal(self.random.randint(5, 60)) / 100).quantize(Decimal('1'))
+                if quantity <= 0:
+                    break
+                remaining -= quantity
+                unit_price = Decimal(self.random.randint(50, 500))
+                releases.append(ProductRelease(
+                    inventory=inventory,
+                    release_type=self.random.choice(['sale', 'sale', 'sale', 'transfer', 'donation']),
+                    quantity_released=quantity,
+                    release_date=released,
+                    release_reference=f'{SYNTHETIC_PREFIX}-{inventory.batch_number}-{r}',
+                    customer_name='Synthetic Customer',
+                    unit_price=unit_price,
+                    total_value=quantity * unit_price,
+                    authorized_by=inventory.created_by,
+                    created_by=inventory.created_by,
+                ))
+                inventory.quantity_released_total += quantity
+                inventory.release_count += 1
+                inventory.last_release_date = released
+            inventory.quantity_available = remaining
+            if remaining == 0:
+                inventory.status = 'released'
+        FGSInventory.objects.bulk_create(inventories, batch_size=1000)
+        ProductRelease.objects.bulk_create(releases, batch_size=1000)
+        self._count('fgs_inventory', len(inventories))
+        self._count('releases', len(releases))
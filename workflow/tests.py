@@ -0,0 +1,202 @@
+from datetime import timedelta
+
+import pytest
+from django.core.exceptions import ImproperlyConfigured, PermissionDenied, ValidationError
+from django.db.models import Max
+
+from bmr.models import BMR
+from products.models import Product
+from workflow import eta, registry, simulation
+from workflow.models import BatchPhaseExecution, PhaseDurationStat, SchedulerState
+from workflow.scheduling import mark_schedule_dirty, reschedule_if_dirty
+from workflow.services import WorkflowService
+
+
+def test_registry_tables_are_valid(db):
+    registry.validate()
+
+
+def test_registry_rejects_an_unknown_role(db, monkeypatch):
+    monkeypatch.setattr(registry, 'ROLE_PHASES', {**registry.ROLE_PHASES, 'night_shift': ()})
+    with pytest.raises(ImproperlyConfigured, match='night_shift'):
+        registry.validate()
+
+
+@pytest.fixture
+def new_bmrs(plant):
+    """Three fresh tablet BMRs, each waiting on regulatory approval"""
+    product = Product.objects.filter(product_type='tablet').first()
+    return [
+        BMR.objects.create(product=product, batch_number=f'09{index}2026', created_by=plant.users['qa'])
+        for index in range(3)
+    ]
+
+
+def approval(bmr):
+    return BatchPhaseExecution.objects.select_related('bmr__product', 'phase').get(
+        bmr=bmr, phase__phase_name='regulatory_approval'
+    )
+
+
+def test_apply_transition_starts_and_completes_a_phase(plant, new_bmrs):
+    regulatory = plant.users['regulatory']
+
+    execution = WorkflowService.apply_transition(approval(new_bmrs[0]), 'start', regulatory)
+    assert execution.status == 'in_progress'
+    assert execution.started_by == regulatory
+
+    execution = WorkflowService.apply_transition(execution, 'complete', regulatory, comments='ok')
+    assert execution.status == 'completed'
+    new_bmrs[0].refresh_from_db()
+    assert new_bmrs[0].status == 'approved'
+    assert BatchPhaseExecution.objects.get(
+        bmr=new_bmrs[0], phase__phase_name='raw_material_release'
+    ).status == 'pending'
+
+
+def test_apply_transition_checks_role_state_and_action(plant, new_bmrs):
+    execution = approval(new_bmrs[0])
+
+    with pytest.raises(PermissionDenied):
+        WorkflowService.apply_transition(execution, 'start', plant.users['qc'])
+    with pytest.raises(ValidationError) as error:
+        WorkflowService.apply_transition(execution, 'complete', plant.users['regulatory'])
+    assert error.value.code == 'conflict'
+    with pytest.raises(ValidationError) as error:
+        WorkflowService.apply_transition(execution, 'archive', plant.users['regulatory'])
+    assert error.value.code == 'invalid'
+    assert approval(new_bmrs[0]).status == 'pending'
+
+
+def test_apply_transition_checks_the_stored_status_not_a_stale_copy(plant, new_bmrs):
+    regulatory = plant.users['regulatory']
+    stale = approval(new_bmrs[0])
+    WorkflowService.apply_transition(approval(new_bmrs[0]), 'start', regulatory)
+
+    with pytest.raises(ValidationError, match='the phase is in_progress'):
+        WorkflowService.apply_transition(stale, 'start', regulatory)
+    assert approval(new_bmrs[0]).started_by == regulatory
+
+
+def test_apply_transition_rejection_needs_a_reason(plant, new_bmrs):
+    regulatory = plant.users['regulatory']
+    execution = WorkflowService.apply_transition(approval(new_bmrs[0]), 'start', regulatory)
+
+    with pytest.raises(ValidationError):
+        WorkflowService.apply_transition(execution, 'reject', regulatory)
+    execution = WorkflowService.apply_transition(execution, 'reject', regulatory, comments='incomplete BMR')
+    assert execution.status == 'failed'
+    new_bmrs[0].refresh_from_db()
+    assert new_bmrs[0].status == 'rejected'
+
+
+def test_apply_bulk_transition_reports_each_item(plant, new_bmrs):
+    ids = [approval(bmr).id for bmr in new_bmrs]
+    results = WorkflowService.apply_bulk_transition(
+        [(ids[0], None), (ids[1], None), (0, None)], 'start', plant.users['regulatory']
+    )
+
+    assert [result['success'] for result in results] == [True, True, False]
+    assert results[2]['error'] == 'Phase execution 0 not found'
+    assert set(BatchPhaseExecution.objects.filter(id__in=ids).values_list('id', 'status')) == {
+        (ids[0], 'in_progress'), (ids[1], 'in_progress'), (ids[2], 'pending'),
+    }
+
+
+def test_apply_bulk_transition_skips_items_the_role_cannot_work(plant, new_bmrs):
+    ids = [approval(bmr).id for bmr in new_bmrs[:2]]
+    results = WorkflowService.apply_bulk_transition([(ids[0], None), (ids[1], None)], 'start', plant.users['qc'])
+
+    assert not any(result['success'] for result in results)
+    assert all(result['status'] == 'pending' for result in results)
+    with pytest.raises(ValidationError):
+        WorkflowService.apply_bulk_transition([(ids[0], None)], 'reject', plant.users['regulatory'])
+
+
+def test_status_changes_mark_the_schedule_dirty(plant, new_bmrs, django_capture_on_commit_callbacks):
+    SchedulerState.objects.update(dirty_since=None)
+    execution = approval(new_bmrs[0])
+
+    with django_capture_on_commit_callbacks(execute=True):
+        execution.operator_comments = 'checked'
+        execution.save()
+    assert SchedulerState.objects.get().dirty_since is None
+
+    with django_capture_on_commit_callbacks(execute=True) as callbacks:
+        execution = WorkflowService.apply_transition(execution, 'start', plant.users['regulatory'])
+        WorkflowService.apply_transition(execution, 'complete', plant.users['regulatory'], comments='ok')
+    assert len([callback for callback in callbacks if getattr(callback, 'func', None) is mark_schedule_dirty]) == 1
+    assert SchedulerState.objects.get().dirty_since is not None
+
+    # Nothing has been scheduled yet, so there is nothing to re-time
+    assert reschedule_if_dirty() is None
+
+
+def test_marking_the_schedule_dirty_creates_the_state_row(db):
+    SchedulerState.objects.all().delete()
+
+    mark_schedule_dirty()
+
+    assert SchedulerState.objects.get(pk=SchedulerState.SINGLETON_ID).dirty_since is not None
+
+
+def stats_updates(callbacks):
+    return [callback for callback in callbacks if getattr(callback, 'func', None) is eta._run_stats_update]
+
+
+def samples(phase_name):
+    stat = PhaseDurationStat.objects.filter(product_type='tablet', phase_name=phase_name).first()
+    return stat.samples if stat else 0
+
+
+def test_eta_stats_count_each_completion_once(plant, new_bmrs, django_capture_on_commit_callbacks):
+    eta.rebuild_stats()
+    before = samples('regulatory_approval')
+    regulatory = plant.users['regulatory']
+    executions = [WorkflowService.apply_transition(approval(bmr), 'start', regulatory) for bmr in new_bmrs[:2]]
+
+    with django_capture_on_commit_callbacks(execute=True) as callbacks:
+        for execution in executions:
+            WorkflowService.apply_transition(execution, 'complete', regulatory, comments='ok')
+    assert len(stats_updates(callbacks)) == 1
+    assert samples('regulatory_approval') == before + 2
+
+    with django_capture_on_commit_callbacks(execute=True) as callbacks:
+        executions[0].operator_comments = 'checked again'
+        executions[0].save()
+    assert not stats_updates(callbacks)
+    assert eta.update_stats() == 0
+    assert samples('regulatory_approval') == before + 2
+
+
+def test_eta_stats_pick_up_a_completion_stamped_before_the_latest_counted(plant, new_bmrs):
+    eta.rebuild_stats()
+    before = samples('regulatory_approval')
+    latest = PhaseDurationStat.objects.aggregate(latest=Max('last_completed'))['latest']
+    BatchPhaseExecution.objects.filter(pk=approval(new_bmrs[0]).pk).update(
+        status='completed', started_date=latest - timedelta(hours=2), completed_date=latest - timedelta(hours=1),
+    )
+
+    assert eta.update_stats() == 1
+    assert eta.update_stats() == 0
+    assert samples('regulatory_approval') == before + 1
+
+
+def test_workflow_status_predicts_the_eta_only_when_asked(plant, new_bmrs):
+    assert WorkflowService.get_workflow_status(new_bmrs[0])['eta'] is None
+    assert WorkflowService.get_workflow_status(new_bmrs[0], include_eta=True)['eta']['phases_left'] > 0
+
+
+def test_simulated_failure_rates_shrink_toward_the_pooled_rate(plant, new_bmrs):
+    outcomes = BatchPhaseExecution.objects.filter(
+        phase__phase_name='post_compression_qc', status__in=['completed', 'failed'],
+    )
+    failed, total = outcomes.filter(status='failed').count(), outcomes.count()
+    rates = simulation.load_model()['failure_rates']
+    assert rates['post_compression_qc'] == failed / (total + simulation.FAILURE_PRIOR_WEIGHT)
+
+    # A single pass is no evidence of failures, the same as no history at all
+    outcomes.exclude(pk=outcomes.filter(status='completed').first().pk).update(status='pending')
+    rates = simulation.load_model()['failure_rates']
+    assert rates['post_compression_qc'] == rates['tablet:post_compression_qc'] == 0
+    assert simulation._failure_rate({'failure_rates': rates}, 'capsule', 'post_compression_qc') == 0
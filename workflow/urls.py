@@ -1,5 +1,10 @@
 from django.urls import path
 
+from . import views
+
+app_name = 'workflow'
+
 urlpatterns = [
-    # Workflow URLs will be added here
+    path('api/schedule/', views.schedule_api, name='schedule_api'),
+    path('api/schedule/gantt/', views.gantt_feed, name='gantt_feed'),
 ]
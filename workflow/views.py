@@ -0,0 +1,273 @@
+import hashlib
+import json
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.contrib.auth.decorators import login_required
+from django.core.exceptions import PermissionDenied, ValidationError
+from django.db import IntegrityError, transaction
+from django.http import JsonResponse
+from django.utils import timezone
+from rest_framework.decorators import api_view
+from rest_framework.response import Response
+
+from .models import BatchPhaseExecution, IdempotencyKey, Machine, PhaseSchedule
+from .scheduling import build_schedule, gantt_rows
+from .services import WorkflowService
+
+BULK_TRANSITION_LIMIT = 100
+
+
+def _when(value):
+    return value.isoformat() if value else None
+
+
+def _parse_datetime(value):
+    moment = datetime.fromisoformat(value)
+    return timezone.make_aware(moment) if timezone.is_naive(moment) else moment
+
+
+@login_required
+def schedule_api(request):
+    """
+    Phase schedule summary; POST re-solves it (staff only).
+    
+    POST accepts time_limit (seconds of search, default 2, at most 30) and seed as
+    form or query parameters.
+    """
+    if request.method == 'POST':
+        if not request.user.is_staff:
+            return JsonResponse({'success': False, 'error': 'Only staff can rebuild the schedule'}, status=403)
+        params = request.POST or request.GET
+        try:
+            time_limit = min(float(params.get('time_limit', 2)), 30.0)
+            seed = int(params.get('seed', 0))
+        except ValueError:
+            return JsonResponse({'success': False, 'error': 'time_limit and seed must be numbers'}, status=400)
+        summary = build_schedule(time_limit=time_limit, seed=seed)
+        summary['computed_at'] = _when(summary['computed_at'])
+        return JsonResponse({'success': True, 'summary': summary})
+    
+    schedule = PhaseSchedule.objects.select_related('execution__bmr')
+    latest = schedule.order_by('-scheduled_at').values_list('scheduled_at', flat=True).first()
+    bmrs = {}
+    for row in schedule.only(
+        'planned_start', 'planned_end', 'execution__bmr__batch_number',
+        'execution__bmr__planned_start_date', 'execution__bmr__planned_completion_date',
+    ):
+        bmr = row.execution.bmr
+        bmrs.setdefault(bmr.id, {
+            'bmr_id': bmr.id,
+            'batch_number': bmr.batch_number,
+            'planned_start': _when(bmr.planned_start_date),
+            'planned_completion': _when(bmr.planned_completion_date),
+            'phases': 0,
+        })['phases'] += 1
+    
+    return JsonResponse({
+        'success': True,
+        'scheduled_at': _when(latest),
+        'unscheduled_phases': BatchPhaseExecution.objects.filter(
+            status__in=['pending', 'not_ready'],
+            bmr__status__in=['draft', 'submitted', 'approved', 'in_production'],
+            schedule__isnull=True,
+        ).count(),
+        'bmrs': sorted(bmrs.values(), key=lambda item: item['planned_completion'] or ''),
+    })
+
+
+@login_required
+def gantt_feed(request):
+    """
+    Scheduled phases as Gantt tasks, grouped by machine.
+    
+    Filters: ?start=&end= (ISO datetimes), ?machine_type=, ?bmr=.
+    """
+    try:
+        start = _parse_datetime(request.GET['start']) if request.GET.get('start') else None
+        end = _parse_datetime(request.GET['end']) if request.GET.get('end') else None
+        bmr_id = int(request.GET['bmr']) if request.GET.get('bmr') else None
+    except ValueError:
+        return JsonResponse({'success': False, 'error': 'start/end must be ISO datetimes and bmr an id'}, status=400)
+    
+    tasks = gantt_rows(start=start, end=end, machine_type=request.GET.get('machine_type'), bmr_id=bmr_id)
+    used = {task['machine_id'] for task in tasks}
+    resources = [
+        {'id': machine.id, 'name': machine.name, 'machine_type': machine.machine_type}
+        for machine in Machine.objects.filter(id__in=used).order_by('machine_type', 'name')
+    ]
+    for task in tasks:
+        task['start'] = _when(task['start'])
+        task['end'] = _when(task['end'])
+    return JsonResponse({'success': True, 'resources': resources, 'tasks': tasks})
+
+
+def _queue_row(execution):
+    return {
+        'id': execution.id,
+        'bmr_id': execution.bmr_id,
+        'batch_number': execution.bmr.batch_number,
+        'phase': execution.phase.phase_name,
+        'status': execution.status,
+        'machine': execution.machine_used.name if execution.machine_used else None,
+        'started_date': _when(execution.started_date),
+    }
+
+
+def _downtime(data, name):
+    """(start, end, reason) from a {"start", "end", "reason"} object in the request body"""
+    value = data.get(name)
+    if not value:
+        return None
+    if not isinstance(value, dict) or not value.get('start') or not value.get('end'):
+        raise ValueError(f'{name} needs ISO start and end datetimes')
+    return _parse_datetime(value['start']), _parse_datetime(value['end']), value.get('reason', '')
+
+
+def _run_transition(request, execution_id):
+    """(body, status) for one transition request"""
+    execution = BatchPhaseExecution.objects.select_related('bmr__product', 'phase').filter(pk=execution_id).first()
+    if execution is None:
+        return {'success': False, 'error': f'Phase execution {execution_id} not found'}, 404
+    
+    data = request.data
+    if not isinstance(data, dict):
+        return {'success': False, 'error': 'Expected a JSON object'}, 400
+    try:
+        breakdown = _downtime(data, 'breakdown')
+        changeover = _downtime(data, 'changeover')
+    except ValueError as e:
+        return {'success': False, 'error': str(e)}, 400
+    try:
+        machine_id = int(data['machine_id']) if data.get('machine_id') else None
+    except (TypeError, ValueError):
+        return {'success': False, 'error': 'machine_id must be a machine id'}, 400
+    
+    try:
+        execution = WorkflowService.apply_transition(
+            execution,
+            data.get('action'),
+            request.user,
+            comments=data.get('comments') or '',
+            machine_id=machine_id,
+            breakdown=breakdown,
+            changeover=changeover,
+        )
+    except PermissionDenied as e:
+        return {'success': False, 'error': str(e)}, 403
+    except ValidationError as e:
+        return {'success': False, 'error': e.messages[0]}, 409 if e.code == 'conflict' else 400
+    
+    return {
+        'success': True,
+        'execution': _queue_row(execution),
+        'workflow': WorkflowService.get_workflow_summaries([execution.bmr_id]).get(execution.bmr_id),
+        'queue': [_queue_row(item) for item in WorkflowService.get_role_queue(request.user.role)],
+    }, 200
+
+
+def _idempotent(request, run):
+    """
+    Response of `run()` (a (body, status) pair), stored under the request's
+    Idempotency-Key header when it has one.
+    
+    A retry with the same key and body gets the stored response back with
+    Idempotent-Replayed: true instead of running again; the same key with a different
+    body is refused with 422. Keys expire after IDEMPOTENCY_KEY_TTL_HOURS.
+    """
+    key = request.headers.get('Idempotency-Key', '').strip()
+    if not key:
+        body, status = run()
+        return Response(body, status=status)
+    if len(key) > 255:
+        return Response({'success': False, 'error': 'Idempotency-Key is longer than 255 characters'}, status=400)
+    
+    request_hash = hashlib.sha256(
+        f'{request.method} {request.path}\n{json.dumps(request.data, sort_keys=True, default=str)}'.encode()
+    ).hexdigest()
+    expired = timezone.now() - timedelta(hours=settings.IDEMPOTENCY_KEY_TTL_HOURS)
+    
+    # The key row, the transition and the stored response commit together, so a request
+    # that crashes leaves no key behind and can simply be retried
+    with transaction.atomic():
+        IdempotencyKey.objects.filter(user=request.user, key=key, created_at__lt=expired).delete()
+        try:
+            with transaction.atomic():
+                record = IdempotencyKey.objects.create(user=request.user, key=key, request_hash=request_hash)
+        except IntegrityError:
+            record = IdempotencyKey.objects.select_for_update().get(user=request.user, key=key)
+            if record.request_hash != request_hash:
+                return Response(
+                    {'success': False, 'error': 'Idempotency-Key was already used for a different request'},
+                    status=422,
+                )
+            if record.response_status is None:
+                return Response({'success': False, 'error': 'A request with this Idempotency-Key is in progress'}, status=409)
+            return Response(record.response_body, status=record.response_status, headers={'Idempotent-Replayed': 'true'})
+        
+        body, status = run()
+        record.response_status, record.response_body = status, body
+        record.save(update_fields=['response_status', 'response_body'])
+    return Response(body, status=status)
+
+
+@api_view(['POST'])
+def execution_transition(request, execution_id, version=None):
+    """
+    Start, complete or reject a phase execution and return the caller's updated queue.
+    
+    Body: {"action": "start" | "complete" | "reject", "comments": "...", "machine_id": 1,
+    "breakdown": {"start", "end", "reason"}, "changeover": {...}}. Safe to retry with an
+    Idempotency-Key header.
+    """
+    return _idempotent(request, lambda: _run_transition(request, execution_id))
+
+
+def _run_bulk_transition(request):
+    """(body, status) for one bulk transition request"""
+    data = request.data
+    if not isinstance(data, dict) or not isinstance(data.get('executions'), list) or not data['executions']:
+        return {'success': False, 'error': 'Expected a JSON object with a non-empty executions list'}, 400
+    if len(data['executions']) > BULK_TRANSITION_LIMIT:
+        return {'success': False, 'error': f'At most {BULK_TRANSITION_LIMIT} executions per request'}, 400
+    
+    items = []
+    try:
+        machine_id = int(data['machine_id']) if data.get('machine_id') else None
+        for item in data['executions']:
+            if isinstance(item, dict):
+                items.append((int(item['id']), int(item['machine_id']) if item.get('machine_id') else None))
+            else:
+                items.append((int(item), None))
+    except (KeyError, TypeError, ValueError):
+        return {'success': False, 'error': 'executions must be ids or {"id", "machine_id"} objects'}, 400
+    
+    try:
+        results = WorkflowService.apply_bulk_transition(
+            items, data.get('action'), request.user, comments=data.get('comments') or '', machine_id=machine_id,
+        )
+    except ValidationError as e:
+        return {'success': False, 'error': e.messages[0]}, 400
+    
+    applied = sum(1 for result in results if result['success'])
+    return {
+        'success': applied == len(results),
+        'applied': applied,
+        'failed': len(results) - applied,
+        'results': results,
+        'queue': [_queue_row(item) for item in WorkflowService.get_role_queue(request.user.role)],
+    }, 200
+
+
+@api_view(['POST'])
+def bulk_transition(request, version=None):
+    """
+    Start or complete several phase executions in one request and one transaction.
+    
+    Body: {"action": "start" | "complete", "comments": "...", "machine_id": 1,
+    "executions": [12, {"id": 13, "machine_id": 2}, ...]}. The top-level machine_id is
+    used for executions without their own whose phase needs a machine. Each execution gets a result; ones that fail
+    validation are skipped while the rest are applied. Safe to retry with an
+    Idempotency-Key header.
+    """
+    return _idempotent(request, lambda: _run_bulk_transition(request))